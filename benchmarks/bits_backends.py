@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#=========================================================================
+# bits_backends.py [options]
+#=========================================================================
+# Compare the Bits backends selected by bits_import.py under the current
+# interpreter. Each backend runs in a fresh process because the backend
+# is chosen at import time.
+#
+#  -h --help           Display this message
+#
+#  --ops <n>           Number of iterations of the Bits32 micro-benchmark
+#  --cycles <n>        Number of cycles of the RTL simulation
+#  --stages <n>        Number of stages of the simulated AccumChain
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--ops",    default=200000, type=int )
+  p.add_argument( "--cycles", default=2000,   type=int )
+  p.add_argument( "--stages", default=32,     type=int )
+  p.add_argument( "--worker", action="store_true", help=argparse.SUPPRESS )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Worker
+#=========================================================================
+
+def run_worker( opts ):
+  from designs import AccumChain
+  from pymtl3 import Bits, Bits32, SimulationPass
+
+  # Bits32 add/compare loop like the ones inside update blocks
+
+  a, b = Bits32(3), Bits32(5)
+  start = time.perf_counter()
+  for i in range( opts.ops ):
+    a = a + b
+    if a > b:
+      b = b ^ a
+    b = a[0:16] + b[16:32]
+  micro = time.perf_counter() - start
+
+  # RTL simulation of an add/compare datapath
+
+  model = AccumChain( opts.stages )
+  model.elaborate()
+  model.apply( SimulationPass() )
+  model.sim_reset()
+
+  start = time.perf_counter()
+  for i in range( opts.cycles ):
+    model.tick()
+  sim = time.perf_counter() - start
+
+  print( json.dumps( { 'backend': Bits.__module__, 'micro': micro, 'sim': sim } ) )
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  if opts.worker:
+    run_worker( opts )
+    return
+
+  backends = [
+    ( "default", {} ),
+    ( "python",  { "PYMTL_BITS": "1" } ),
+  ]
+
+  print()
+  print( f"  {'backend':30} {'ops/s':>12} {'cycles/s':>12}" )
+  for name, extra_env in backends:
+    env = dict( os.environ, **extra_env )
+    out = subprocess.check_output( [ sys.executable, os.path.abspath( __file__ ),
+                                     "--worker", "--ops", str(opts.ops),
+                                     "--cycles", str(opts.cycles),
+                                     "--stages", str(opts.stages) ], env=env )
+    r = json.loads( out.decode().strip().splitlines()[-1] )
+    print( f"  {r['backend']:30} {opts.ops/r['micro']:12.0f} {opts.cycles/r['sim']:12.1f}" )
+  print()
+
+main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+#=========================================================================
+# bits_ops.py [options]
+#=========================================================================
+# Time individual Bits operators and a Bits32 add/compare loop with the
+# Bits backend selected by bits_import.py. Set PYMTL_BITS=1 to force the
+# pure-Python backend.
+#
+#  -h --help           Display this message
+#
+#  --number <n>        Number of iterations per operator
+#  --nbits <n>         Bitwidth of the operands
+
+import argparse
+import os
+import sys
+import timeit
+
+# Hack to add project root to python path
+root_dir = os.path.dirname( os.path.abspath( __file__ ) )
+while root_dir:
+  if os.path.exists( root_dir + os.path.sep + "pytest.ini" ):
+    sys.path.insert( 0, root_dir )
+    break
+  root_dir = os.path.dirname( root_dir )
+
+from pymtl3 import Bits, mk_bits
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--number", default=200000, type=int )
+  p.add_argument( "--nbits",  default=32,     type=int )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def add_cmp_loop( a, b, n ):
+  for i in range( n ):
+    a = a + b
+    if a < b:
+      b = b - a
+
+def main():
+  opts = parse_cmdline()
+
+  BitsN = mk_bits( opts.nbits )
+  env = {
+    'a'    : BitsN( 0x1234567 ),
+    'b'    : BitsN( 0x7654321 ),
+    'c'    : BitsN( 3 ),
+    'half' : opts.nbits // 2,
+    'BitsN': BitsN,
+  }
+
+  stmts = [
+    ( "a + b",         "add"       ),
+    ( "a - b",         "sub"       ),
+    ( "a & b",         "and"       ),
+    ( "a + 1",         "add int"   ),
+    ( "a == b",        "eq"        ),
+    ( "a < b",         "lt"        ),
+    ( "~a",            "invert"    ),
+    ( "a << c",        "lshift"    ),
+    ( "a[0:half]",     "slice"     ),
+    ( "a[0]",          "index"     ),
+    ( "BitsN(42)",     "construct" ),
+    ( "a.clone()",     "clone"     ),
+  ]
+
+  print()
+  print( f"  backend = {Bits.__module__}, nbits = {opts.nbits}" )
+  print()
+  for stmt, name in stmts:
+    t = timeit.timeit( stmt, globals=env, number=opts.number )
+    print( f"  {name:12} {t/opts.number*1e9:8.1f} ns/op" )
+
+  t = timeit.timeit( lambda: add_cmp_loop( env['a'], env['b'], opts.number ), number=1 )
+  print( f"  {'add/cmp loop':12} {t/opts.number*1e9:8.1f} ns/iter" )
+  print()
+
+main()
@@ -0,0 +1,289 @@
+"""
+========================================================================
+designs.py
+========================================================================
+Parameterized synthetic designs shared by the simulator benchmarks.
+"""
+import os
+import sys
+
+# Hack to add project root to python path
+
+root_dir = os.path.dirname( os.path.abspath( __file__ ) )
+while root_dir:
+  if os.path.exists( root_dir + os.path.sep + "pytest.ini" ):
+    sys.path.insert( 0, root_dir )
+    break
+  root_dir = os.path.dirname( root_dir )
+
+from pymtl3 import *
+
+#-------------------------------------------------------------------------
+# AccumStage
+#-------------------------------------------------------------------------
+# One stage of a datapath: add, compare, and a register.
+
+class AccumStage( Component ):
+
+  def construct( s, nbits=32 ):
+    Type = mk_bits( nbits )
+
+    s.in_ = InPort ( Type )
+    s.out = OutPort( Type )
+
+    s.sum = Wire( Type )
+    s.acc = Wire( Type )
+
+    @s.update
+    def up_sum():
+      if s.in_ > s.acc:
+        s.sum = s.in_ + s.acc
+      else:
+        s.sum = s.in_ - s.acc
+
+    @s.update_ff
+    def up_acc():
+      s.acc <<= s.sum
+
+    @s.update
+    def up_out():
+      s.out = s.acc ^ s.in_
+
+#-------------------------------------------------------------------------
+# AccumChain
+#-------------------------------------------------------------------------
+# A chain of nstages AccumStage with a free-running counter at the head.
+# Every update block is active every cycle.
+
+class AccumChain( Component ):
+
+  def construct( s, nstages=16, nbits=32 ):
+    Type = mk_bits( nbits )
+
+    s.out    = OutPort( Type )
+    s.count  = Wire( Type )
+    s.stages = [ AccumStage( nbits ) for _ in range(nstages) ]
+
+    s.stages[0].in_ //= s.count
+    for i in range(1, nstages):
+      s.stages[i].in_ //= s.stages[i-1].out
+    s.out //= s.stages[-1].out
+
+    @s.update_ff
+    def up_count():
+      s.count <<= s.count + Type(1)
+
+  def line_trace( s ):
+    return f"{s.count}|{s.out}"
+
+#-------------------------------------------------------------------------
+# IdleTile
+#-------------------------------------------------------------------------
+# A tile that only does work when the shared pointer selects it. Used to
+# model mostly-quiescent designs such as idle routers and stalled caches.
+
+class IdleTile( Component ):
+
+  def construct( s, tile_id, PtrType, nbits=32, period=64 ):
+    Type = mk_bits( nbits )
+
+    s.ptr = InPort ( PtrType )
+    s.in_ = InPort ( Type )
+    s.out = OutPort( Type )
+
+    s.en    = Wire( Bits1 )
+    s.reg0  = Wire( Type )
+    s.reg1  = Wire( Type )
+    s.nxt0  = Wire( Type )
+    s.nxt1  = Wire( Type )
+
+    @s.update
+    def up_en():
+      s.en = Bits1( s.ptr == PtrType( tile_id * period ) )
+
+    @s.update
+    def up_nxt():
+      if s.en:
+        s.nxt0 = s.in_ + s.reg0
+        s.nxt1 = s.reg0 + s.reg1
+      else:
+        s.nxt0 = s.reg0
+        s.nxt1 = s.reg1
+
+    @s.update_ff
+    def up_regs():
+      s.reg0 <<= s.nxt0
+      s.reg1 <<= s.nxt1
+
+    @s.update
+    def up_out():
+      s.out = s.reg1
+
+#-------------------------------------------------------------------------
+# IdleMesh
+#-------------------------------------------------------------------------
+# ntiles IdleTile where at most one tile is enabled in any given cycle.
+
+class IdleMesh( Component ):
+
+  def construct( s, ntiles=64, nbits=32, period=64 ):
+    Type    = mk_bits( nbits )
+    PtrType = mk_bits( clog2( ntiles * period ) + 1 )
+
+    s.out   = OutPort( Type )
+    s.ptr   = Wire( PtrType )
+    s.tiles = [ IdleTile( i, PtrType, nbits, period ) for i in range(ntiles) ]
+
+    for i in range(ntiles):
+      s.tiles[i].ptr //= s.ptr
+      s.tiles[i].in_ //= s.tiles[i-1].out if i else Type(1)
+    s.out //= s.tiles[-1].out
+
+    @s.update_ff
+    def up_ptr():
+      if s.ptr == PtrType(ntiles * period - 1):
+        s.ptr <<= PtrType(0)
+      else:
+        s.ptr <<= s.ptr + PtrType(1)
+
+  def line_trace( s ):
+    return f"{s.ptr}|{s.out}"
+
+#-------------------------------------------------------------------------
+# AccumGrid
+#-------------------------------------------------------------------------
+# nrows independent AccumChain of ncols stages. Most nets are inside the
+# rows, so the design has many instances of the same component with
+# internal nets.
+
+class AccumGrid( Component ):
+
+  def construct( s, nrows=64, ncols=16, nbits=32 ):
+    Type = mk_bits( nbits )
+
+    s.out  = OutPort( Type )
+    s.rows = [ AccumChain( ncols, nbits ) for _ in range(nrows) ]
+    s.out //= s.rows[-1].out
+
+  def line_trace( s ):
+    return s.rows[-1].line_trace()
+
+#-------------------------------------------------------------------------
+# HandshakeStage
+#-------------------------------------------------------------------------
+# A one-entry val/rdy buffer whose val flows forward and whose rdy flows
+# backward combinationally in the same update block.
+
+class HandshakeStage( Component ):
+
+  def construct( s ):
+    s.in_val  = InPort ( Bits1 )
+    s.in_rdy  = OutPort( Bits1 )
+    s.out_val = OutPort( Bits1 )
+    s.out_rdy = InPort ( Bits1 )
+
+    s.full = Wire( Bits1 )
+
+    @s.update
+    def up_handshake():
+      s.out_val = s.full | s.in_val
+      s.in_rdy  = s.out_rdy | ~s.full
+
+    @s.update_ff
+    def up_full():
+      s.full <<= ( s.full | s.in_val ) & ~s.out_rdy
+
+#-------------------------------------------------------------------------
+# HandshakeChain
+#-------------------------------------------------------------------------
+# A chain of nstages HandshakeStage. All stages form a single
+# combinational SCC because of the val/rdy false cycles.
+
+class HandshakeChain( Component ):
+
+  def construct( s, nstages=16 ):
+    s.count    = Wire( Bits8 )
+    s.head_val = Wire( Bits1 )
+    s.tail_rdy = Wire( Bits1 )
+
+    s.stages = [ HandshakeStage() for _ in range(nstages) ]
+
+    s.stages[0].in_val //= s.head_val
+    for i in range(1, nstages):
+      s.stages[i].in_val    //= s.stages[i-1].out_val
+      s.stages[i-1].out_rdy //= s.stages[i].in_rdy
+    s.stages[-1].out_rdy //= s.tail_rdy
+
+    @s.update_ff
+    def up_count():
+      s.count <<= s.count + Bits8(1)
+
+    @s.update
+    def up_head_tail():
+      s.head_val = s.count[0:2] == Bits2(0)
+      s.tail_rdy = s.count[2:5] != Bits3(0)
+
+  def line_trace( s ):
+    return "".join( [ str(x.full) for x in s.stages ] )
+
+#-------------------------------------------------------------------------
+# HandshakeArray
+#-------------------------------------------------------------------------
+# nchains independent HandshakeChain, i.e. nchains separate SCCs. Used to
+# measure how schedule construction scales with the number of SCCs.
+
+class HandshakeArray( Component ):
+
+  def construct( s, nchains=16, nstages=2 ):
+    s.chains = [ HandshakeChain( nstages ) for _ in range(nchains) ]
+
+  def line_trace( s ):
+    return "|".join( [ x.line_trace() for x in s.chains ] )
+
+#-------------------------------------------------------------------------
+# RingTile
+#-------------------------------------------------------------------------
+# A chain of nstages AccumStage whose output is registered, so that the
+# tile only talks to its neighbors with one cycle of latency.
+
+class RingTile( Component ):
+
+  def construct( s, nstages=64, nbits=32 ):
+    Type = mk_bits( nbits )
+
+    s.in_ = InPort ( Type )
+    s.out = OutPort( Type )
+
+    s.tail  = Wire( Type )
+    s.out_r = Wire( Type )
+
+    s.stages = [ AccumStage( nbits ) for _ in range(nstages) ]
+    s.stages[0].in_ //= s.in_
+    for i in range(1, nstages):
+      s.stages[i].in_ //= s.stages[i-1].out
+    s.tail //= s.stages[-1].out
+    s.out  //= s.out_r
+
+    @s.update_ff
+    def up_out_r():
+      s.out_r <<= s.tail
+
+#-------------------------------------------------------------------------
+# TileRing
+#-------------------------------------------------------------------------
+# ntiles RingTile connected in a ring. The tiles can be simulated in
+# separate partitions.
+
+class TileRing( Component ):
+
+  def construct( s, ntiles=8, nstages=64, nbits=32 ):
+    Type = mk_bits( nbits )
+
+    s.out   = OutPort( Type )
+    s.tiles = [ RingTile( nstages, nbits ) for _ in range(ntiles) ]
+    for i in range(ntiles):
+      s.tiles[i].in_ //= s.tiles[i-1].out
+    s.out //= s.tiles[-1].out
+
+  def line_trace( s ):
+    return f"{s.out}"
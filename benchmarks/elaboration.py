@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#=========================================================================
+# elaboration.py [options]
+#=========================================================================
+# Time elaboration-to-first-tick of synthetic designs with many nets, and
+# the share of it spent in GenDAGPass, with net blocks compiled one net
+# at a time and batched per LCA component.
+#
+#  -h --help           Display this message
+#
+#  --stages <n>        Number of stages of the AccumChain design
+#  --rows <n>          Number of 16-stage rows of the AccumGrid design
+#  --tiles <n>         Number of tiles of the IdleMesh design
+#  --repeat <n>        Number of fresh models per measurement
+
+import argparse
+import gc
+import sys
+import time
+
+from designs import AccumChain, AccumGrid, IdleMesh
+from pymtl3.passes.sim.AddSimUtilFuncsPass import AddSimUtilFuncsPass
+from pymtl3.passes.sim.DynamicSchedulePass import DynamicSchedulePass
+from pymtl3.passes.sim.GenDAGPass import GenDAGPass
+from pymtl3.passes.sim.SimpleTickPass import SimpleTickPass
+from pymtl3.passes.sim.WrapGreenletPass import WrapGreenletPass
+from pymtl3.passes.tracing.CLLineTracePass import CLLineTracePass
+from pymtl3.passes.tracing.CollectSignalPass import CollectSignalPass
+from pymtl3.passes.tracing.LineTraceParamPass import LineTraceParamPass
+from pymtl3.passes.tracing.PrintWavePass import PrintWavePass
+from pymtl3.passes.tracing.VcdGenerationPass import VcdGenerationPass
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--stages", default=2000, type=int )
+  p.add_argument( "--rows",   default=128,  type=int )
+  p.add_argument( "--tiles",  default=500,  type=int )
+  p.add_argument( "--repeat", default=5,    type=int )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+# Same passes as SimulationPass, with GenDAGPass timed on its own.
+
+def measure( mk_model, batch, repeat ):
+  best_gendag = best_total = float('inf')
+  for i in range( repeat ):
+    gc.collect()
+    t0 = time.perf_counter()
+    m = mk_model()
+    m.elaborate()
+
+    t1 = time.perf_counter()
+    m.apply( GenDAGPass( batch=batch ) )
+    t2 = time.perf_counter()
+
+    m.apply( WrapGreenletPass() )
+    m.apply( CLLineTracePass() )
+    m.apply( DynamicSchedulePass() )
+    m.apply( VcdGenerationPass() )
+    m.apply( CollectSignalPass() )
+    m.apply( PrintWavePass() )
+    m.apply( SimpleTickPass() )
+    m.apply( AddSimUtilFuncsPass() )
+    m.apply( LineTraceParamPass() )
+    m.lock_in_simulation()
+    m.sim_reset()
+    m.tick()
+    t3 = time.perf_counter()
+
+    best_gendag = min( best_gendag, t2 - t1 )
+    best_total  = min( best_total,  t3 - t0 )
+  return len( m._dag.genblks ), best_gendag, best_total
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  designs = [
+    ( f"AccumChain({opts.stages})", lambda: AccumChain( opts.stages ) ),
+    ( f"AccumGrid({opts.rows}x16)", lambda: AccumGrid( opts.rows, 16 ) ),
+    ( f"IdleMesh({opts.tiles})",    lambda: IdleMesh( opts.tiles ) ),
+  ]
+
+  print()
+  print( f"  {'design':18} {'mode':8} {'nets':>6} {'GenDAG ms':>10} {'total ms':>10}" )
+  for name, mk_model in designs:
+    for batch in [ False, True ]:
+      nets, gendag, total = measure( mk_model, batch, opts.repeat )
+      mode = "batch" if batch else "per-net"
+      print( f"  {name:18} {mode:8} {nets:6} {gendag*1000:10.1f} {total*1000:10.1f}" )
+  print()
+
+main()
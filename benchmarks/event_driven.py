@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#=========================================================================
+# event_driven.py [options]
+#=========================================================================
+# Compare the static schedule of DynamicSchedulePass with the
+# activity-driven schedule of EventDrivenSchedulePass. IdleMesh is a
+# low-activity design where at most one tile is enabled per cycle, and
+# AccumChain is a design where every block is active every cycle.
+#
+#  -h --help           Display this message
+#
+#  --cycles <n>        Number of cycles to simulate
+#  --tiles <n>         Number of tiles of the IdleMesh design
+#  --stages <n>        Number of stages of the AccumChain design
+
+import argparse
+import sys
+import time
+
+from designs import AccumChain, IdleMesh
+from pymtl3 import *
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--cycles", default=2000, type=int )
+  p.add_argument( "--tiles",  default=64,   type=int )
+  p.add_argument( "--stages", default=32,   type=int )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+
+def simulate( mk_model, event_driven, ncycles ):
+  m = mk_model()
+  m.apply( SimulationPass( event_driven=event_driven ) )
+  m.sim_reset()
+
+  t0 = time.perf_counter()
+  for i in range( ncycles ):
+    m.tick()
+  elapsed = time.perf_counter() - t0
+
+  return m.line_trace(), elapsed
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  designs = [
+    ( f"IdleMesh({opts.tiles})",    lambda: IdleMesh( opts.tiles ) ),
+    ( f"AccumChain({opts.stages})", lambda: AccumChain( opts.stages ) ),
+  ]
+
+  print()
+  print( f"  {'design':16} {'static cps':>12} {'event cps':>12} {'speedup':>8}" )
+  for name, mk_model in designs:
+    trace0, t_static = simulate( mk_model, False, opts.cycles )
+    trace1, t_event  = simulate( mk_model, True,  opts.cycles )
+    assert trace0 == trace1, f"{name}: {trace0} != {trace1}"
+    print( f"  {name:16} {opts.cycles/t_static:12.0f} {opts.cycles/t_event:12.0f} {t_static/t_event:7.2f}x" )
+  print()
+
+main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#=========================================================================
+# helpers_ops.py [options]
+#=========================================================================
+# Time concat/zext/sext/reduce_xor from pymtl3.datatypes.helpers against
+# the previous Bits-domain implementations that built intermediate Bits
+# objects and looped over individual bits.
+#
+#  -h --help           Display this message
+#
+#  --number <n>        Number of iterations per helper
+
+import argparse
+import os
+import sys
+import timeit
+
+# Hack to add project root to python path
+root_dir = os.path.dirname( os.path.abspath( __file__ ) )
+while root_dir:
+  if os.path.exists( root_dir + os.path.sep + "pytest.ini" ):
+    sys.path.insert( 0, root_dir )
+    break
+  root_dir = os.path.dirname( root_dir )
+
+from pymtl3 import *
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--number", default=100000, type=int )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Previous implementations
+#=========================================================================
+
+def old_concat( *args ):
+  end = sum( x.nbits for x in args )
+  concat_bits = Bits( end, 0 )
+  for x in args:
+    x_nbits = x.nbits
+    concat_bits[ end - x_nbits : end ] = x
+    end -= x_nbits
+  return concat_bits
+
+def old_zext( value, new_width ):
+  assert new_width > value.nbits
+  return Bits( new_width, value )
+
+def old_sext( value, new_width ):
+  assert new_width > value.nbits
+  return Bits( new_width, value.int() )
+
+def old_reduce_xor( value ):
+  pop_count = 0
+  value = int(value)
+  while value != 0:
+    pop_count += value & 1
+    value >>= 1
+  return b1( pop_count & 1 )
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  env = {
+    'a': Bits8(0x9c), 'b': Bits16(0x8421), 'c': Bits32(0xdeadbeef),
+    'd': Bits64(0xfedcba9876543210),
+    'concat': concat, 'zext': zext, 'sext': sext, 'reduce_xor': reduce_xor,
+    'old_concat': old_concat, 'old_zext': old_zext, 'old_sext': old_sext,
+    'old_reduce_xor': old_reduce_xor,
+  }
+
+  stmts = [
+    ( "concat( a, b, c )", "concat x3" ),
+    ( "concat( a, b, c, d, a, b )", "concat x6" ),
+    ( "zext( b, 32 )", "zext" ),
+    ( "sext( b, 32 )", "sext" ),
+    ( "reduce_xor( c )", "reduce_xor32" ),
+    ( "reduce_xor( d )", "reduce_xor64" ),
+  ]
+
+  print()
+  print( f"  backend = {Bits.__module__}" )
+  print()
+  print( f"  {'helper':14} {'old ns/op':>10} {'new ns/op':>10} {'speedup':>8}" )
+  for stmt, name in stmts:
+    t_old = min( timeit.repeat( "old_" + stmt, globals=env, number=opts.number, repeat=5 ) )
+    t_new = min( timeit.repeat( stmt, globals=env, number=opts.number, repeat=5 ) )
+    print( f"  {name:14} {t_old/opts.number*1e9:10.1f} {t_new/opts.number*1e9:10.1f} {t_old/t_new:7.2f}x" )
+  print()
+
+main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#=========================================================================
+# import_time.py [options]
+#=========================================================================
+# Measure cold "import pymtl3" and "from pymtl3 import *" latency. Every
+# sample runs in a fresh interpreter after the tree has been byte-compiled
+# with compileall. With --baseline <rev>, the same measurement is done on
+# a git worktree of that revision so that the numbers can be compared
+# before and after a change. The compiled CBits
+# extension of this tree is copied into the worktree so that both use
+# the same Bits backend.
+#
+#  -h --help           Display this message
+#
+#  --samples <n>       Number of fresh interpreters per measurement
+#  --baseline <rev>    Git revision to compare against
+
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--samples",  default=20,   type=int )
+  p.add_argument( "--baseline", default=None )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+
+stmts = [
+  ( "import pymtl3",          "import pymtl3"          ),
+  ( "from pymtl3 import *",   "from pymtl3 import *"   ),
+]
+
+def measure( root, stmt, samples ):
+  src = "import time\n" \
+        "t0 = time.perf_counter()\n" \
+        f"{stmt}\n" \
+        "print( time.perf_counter() - t0 )\n"
+  ts = []
+  for i in range( samples ):
+    out = subprocess.check_output( [ sys.executable, "-c", src ], cwd=root )
+    ts.append( float( out.decode().strip().splitlines()[-1] ) * 1000 )
+  return statistics.median( ts ), min( ts )
+
+def report( name, root, samples ):
+  subprocess.check_call( [ sys.executable, "-m", "compileall", "-q", "pymtl3" ],
+                         cwd=root, stdout=subprocess.DEVNULL )
+  print( f"  {name}" )
+  for stmt, label in stmts:
+    med, best = measure( root, stmt, samples )
+    print( f"    {label:24} median {med:7.1f} ms   min {best:7.1f} ms" )
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+  print()
+  if opts.baseline:
+    tmpdir = tempfile.mkdtemp()
+    wt = os.path.join( tmpdir, "baseline" )
+    subprocess.check_call( [ "git", "worktree", "add", "--detach", "-q", wt, opts.baseline ], cwd=root )
+    try:
+      for so in glob.glob( os.path.join( root, "pymtl3", "datatypes", "CBits*.so" ) ):
+        shutil.copy( so, os.path.join( wt, "pymtl3", "datatypes" ) )
+      report( f"baseline ({opts.baseline})", wt, opts.samples )
+    finally:
+      subprocess.check_call( [ "git", "worktree", "remove", "--force", wt ], cwd=root )
+      shutil.rmtree( tmpdir, ignore_errors=True )
+
+  report( "current", root, opts.samples )
+  print()
+
+main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#=========================================================================
+# partitioned.py [options]
+#=========================================================================
+# Compare the single-process sim_run() with sim_run_partitioned() on a
+# TileRing, where each tile only talks to its neighbors through a
+# registered output. The partitioned run has to be faster than the
+# single process by more than the cost of one barrier per cycle.
+#
+#  -h --help           Display this message
+#
+#  --cycles <n>        Number of cycles to simulate
+#  --tiles <n>         Number of tiles in the ring
+#  --stages <n>        Number of AccumStage per tile
+#  --nprocs <n>        Numbers of partitions to try
+
+import argparse
+import os
+import sys
+import time
+
+from designs import TileRing
+from pymtl3 import *
+from pymtl3.passes import PartitionedSimPass
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--cycles", default=2000, type=int )
+  p.add_argument( "--tiles",  default=8,    type=int )
+  p.add_argument( "--stages", default=[4, 64], type=int, nargs="+" )
+  p.add_argument( "--nprocs", default=[1, 2, 4, 8], type=int, nargs="+" )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+
+def simulate( ntiles, nstages, ncycles, nprocs ):
+  m = TileRing( ntiles, nstages )
+  m.apply( SimulationPass() )
+  if nprocs:
+    m.apply( PartitionedSimPass( nprocs=nprocs ) )
+  m.sim_reset()
+
+  t0 = time.perf_counter()
+  if nprocs:
+    m.sim_run_partitioned( ncycles )
+  else:
+    m.sim_run( ncycles )
+  elapsed = time.perf_counter() - t0
+
+  return m.line_trace(), elapsed
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  print()
+  print( f"  {os.cpu_count()} CPUs" )
+  print( f"  {'design':16} {'sim_run cps':>14}" +
+         "".join( [ f"{f'{x} procs cps':>16}" for x in opts.nprocs ] ) )
+  for nstages in opts.stages:
+    ref, elapsed = simulate( opts.tiles, nstages, opts.cycles, 0 )
+    results = [ f"{opts.cycles/elapsed:14.0f}" ]
+    for nprocs in opts.nprocs:
+      trace, elapsed = simulate( opts.tiles, nstages, opts.cycles, nprocs )
+      assert trace == ref, (trace, ref)
+      results.append( f"{opts.cycles/elapsed:16.0f}" )
+    print( f"  {f'TileRing({opts.tiles},{nstages})':16} " + "".join( results ) )
+  print()
+
+main()
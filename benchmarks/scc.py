@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#=========================================================================
+# scc.py [options]
+#=========================================================================
+# Simulate HandshakeChain, a design whose val/rdy handshakes form one
+# large combinational SCC, and report the simulation speed together with
+# the intra-SCC statistics: sweeps over the SCC and update block
+# executions per cycle.
+#
+#  -h --help           Display this message
+#
+#  --cycles <n>        Number of cycles to simulate
+#  --stages <n>        Numbers of stages of the HandshakeChain designs
+
+import argparse
+import sys
+import time
+
+from designs import HandshakeChain
+from pymtl3 import *
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--cycles", default=3000, type=int )
+  p.add_argument( "--stages", default=[4, 16, 64], type=int, nargs="+" )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  print()
+  print( f"  {'design':20} {'cps':>10} {'sweeps/cycle':>14} {'execs/cycle':>12} {'max execs':>10}" )
+  for nstages in opts.stages:
+    m = HandshakeChain( nstages )
+    m.apply( SimulationPass() )
+    m.sim_reset()
+
+    t0 = time.perf_counter()
+    m.sim_run( opts.cycles )
+    elapsed = time.perf_counter() - t0
+
+    for name, (ncalls, nsweeps, nexecs, max_nexecs) in m._sched.scc_stats.items():
+      print( f"  {f'HandshakeChain({nstages})':20} {opts.cycles/elapsed:10.0f} "
+             f"{nsweeps/ncalls:14.2f} {nexecs/ncalls:12.2f} {max_nexecs:10}" )
+  print()
+
+main()
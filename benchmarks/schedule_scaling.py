@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#=========================================================================
+# schedule_scaling.py [options]
+#=========================================================================
+# Time schedule construction against the number of update blocks. The
+# AccumChain designs have no combinational SCC, and the HandshakeArray
+# designs have one SCC per chain, which stresses per-SCC work.
+#
+#  -h --help           Display this message
+#
+#  --sizes <n>         Numbers of stages/chains of the designs
+#  --passes <p>        Schedule passes to time (dynamic, mamba)
+
+import argparse
+import gc
+import sys
+import time
+
+from designs import AccumChain, HandshakeArray
+from pymtl3.passes.mamba.Mamba2020Pass import Mamba2020Pass
+from pymtl3.passes.sim.DynamicSchedulePass import DynamicSchedulePass
+from pymtl3.passes.sim.GenDAGPass import GenDAGPass
+from pymtl3.passes.sim.WrapGreenletPass import WrapGreenletPass
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--sizes",  default=[64, 256, 1024], type=int, nargs="+" )
+  p.add_argument( "--passes", default=["dynamic", "mamba"], nargs="+",
+                  choices=["dynamic", "mamba"] )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+
+sched_passes = {
+  "dynamic": lambda: DynamicSchedulePass(),
+  "mamba":   lambda: Mamba2020Pass(),
+}
+
+def time_schedule( mk_model, name ):
+  m = mk_model()
+  m.elaborate()
+  GenDAGPass()( m )
+  if name == "mamba":
+    WrapGreenletPass()( m )
+
+  gc.collect()
+  t0 = time.perf_counter()
+  sched_passes[ name ]()( m )
+  elapsed = time.perf_counter() - t0
+
+  nblks = len( m._dag.final_upblks )
+  return nblks, elapsed
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  designs = []
+  for n in opts.sizes:
+    designs.append( ( f"AccumChain({n})",     lambda n=n: AccumChain( n ) ) )
+  for n in opts.sizes:
+    designs.append( ( f"HandshakeArray({n})", lambda n=n: HandshakeArray( n ) ) )
+
+  print()
+  print( f"  {'design':22} {'blocks':>8}" + "".join( [ f"{x+' (ms)':>14}" for x in opts.passes ] ) )
+  for name, mk_model in designs:
+    results = []
+    for p in opts.passes:
+      nblks, elapsed = time_schedule( mk_model, p )
+      results.append( f"{elapsed*1000:14.1f}" )
+    print( f"  {name:22} {nblks:8}" + "".join( results ) )
+  print()
+
+main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#=========================================================================
+# sim_run.py [options]
+#=========================================================================
+# Compare a Python loop calling tick() once per cycle with a single
+# sim_run() call, with and without an early-exit predicate. The
+# difference is the per-cycle Python call overhead, which matters most
+# for small designs simulated for many cycles.
+#
+#  -h --help           Display this message
+#
+#  --cycles <n>        Number of cycles to simulate
+#  --stages <n>        Number of stages of the AccumChain designs
+
+import argparse
+import sys
+import time
+
+from designs import AccumChain
+from pymtl3 import *
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--cycles", default=20000,  type=int )
+  p.add_argument( "--stages", default=[1, 4, 16], type=int, nargs="+" )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+
+def simulate( nstages, ncycles, mode ):
+  m = AccumChain( nstages )
+  m.apply( SimulationPass() )
+  m.sim_reset()
+
+  # Never true, only to pay for the predicate
+  def done():
+    return m.simulated_cycles < 0
+
+  t0 = time.perf_counter()
+  if mode == "tick":
+    while not done() and m.simulated_cycles < ncycles:
+      m.tick()
+  elif mode == "sim_run":
+    m.sim_run( ncycles - m.simulated_cycles )
+  else:
+    m.sim_run( ncycles - m.simulated_cycles, until=done )
+  elapsed = time.perf_counter() - t0
+
+  return m.line_trace(), elapsed
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  modes = [ "tick", "sim_run", "sim_run(until)" ]
+
+  print()
+  print( f"  {'design':16}" + "".join( [ f"{x+' cps':>20}" for x in modes ] ) )
+  for nstages in opts.stages:
+    traces, results = [], []
+    for mode in modes:
+      trace, elapsed = simulate( nstages, opts.cycles, mode )
+      traces.append( trace )
+      results.append( f"{opts.cycles/elapsed:20.0f}" )
+    assert all( x == traces[0] for x in traces ), traces
+    print( f"  {f'AccumChain({nstages})':16}" + "".join( results ) )
+  print()
+
+main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#=========================================================================
+# vcd.py [options]
+#=========================================================================
+# Measure the simulation speed of AccumChain designs without waveform
+# tracing, with VCD tracing and with the PyMTL waveform format, to see
+# the per-cycle cost of dumping the value changes of every net and the
+# size of the dumps. "window" is VCD tracing with a window that starts
+# after the last cycle, i.e. the cost of waiting for the window, and
+# "flight" keeps the last 1024 cycles in memory without dumping them.
+#
+#  -h --help           Display this message
+#
+#  --cycles <n>        Number of cycles to simulate
+#  --stages <n>        Number of stages of the AccumChain designs
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from designs import AccumChain
+from pymtl3 import *
+from pymtl3.passes import TracingConfigs
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+class ArgumentParserWithCustomError(argparse.ArgumentParser):
+  def error( self, msg = "" ):
+    if ( msg ): print("\n"+f" ERROR: {msg}")
+    print("")
+    file = open( sys.argv[0] )
+    for ( lineno, line ) in enumerate( file ):
+      if ( line[0] != '#' ): sys.exit(msg != "")
+      if ( (lineno == 2) or (lineno >= 4) ): print(line[1:].rstrip("\n"))
+
+def parse_cmdline():
+  p = ArgumentParserWithCustomError( add_help=False )
+
+  p.add_argument( "-h", "--help",  action="store_true" )
+  p.add_argument( "--cycles", default=5000,  type=int )
+  p.add_argument( "--stages", default=[4, 16, 64], type=int, nargs="+" )
+
+  opts = p.parse_args()
+  if opts.help: p.error()
+  return opts
+
+#=========================================================================
+# Measurement
+#=========================================================================
+
+def simulate( nstages, ncycles, mode, tmpdir ):
+  m = AccumChain( nstages )
+  tracing, kwargs = mode, {}
+  if mode == "window":
+    tracing, kwargs = "vcd", { "start_cycle": ncycles + 2 }
+  m.config_tracing = TracingConfigs( tracing=tracing,
+                       vcd_file_name=os.path.join( tmpdir, f"chain{nstages}" ), **kwargs )
+  m.apply( SimulationPass() )
+  m.sim_reset()
+
+  t0 = time.perf_counter()
+  m.sim_run( ncycles )
+  if tracing == "vcd":
+    m.close_vcd()
+  elif tracing == "pwf":
+    m.close_pwf()
+  elapsed = time.perf_counter() - t0
+
+  size = 0
+  if tracing in [ "vcd", "pwf" ]:
+    size = os.path.getsize( os.path.join( tmpdir, f"chain{nstages}.{tracing}" ) )
+
+  return m.line_trace(), elapsed, size
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main():
+  opts = parse_cmdline()
+
+  modes = [ "none", "vcd", "pwf", "window", "flight" ]
+
+  with tempfile.TemporaryDirectory() as tmpdir:
+    print()
+    print( f"  {'design':16}" + "".join( [ f"{x+' cps':>16}" for x in modes ] ) +
+           "".join( [ f"{x+' KB':>16}" for x in modes[1:3] ] ) )
+    for nstages in opts.stages:
+      traces, results, sizes = [], [], []
+      for mode in modes:
+        trace, elapsed, size = simulate( nstages, opts.cycles, mode, tmpdir )
+        traces.append( trace )
+        results.append( f"{opts.cycles/elapsed:16.0f}" )
+        if mode in [ "vcd", "pwf" ]:
+          sizes.append( f"{size/1024:16.1f}" )
+      assert all( x == traces[0] for x in traces ), traces
+      print( f"  {f'AccumChain({nstages})':16}" + "".join( results + sizes ) )
+    print()
+
+main()
@@ -1,5 +1,21 @@
-from .datatypes import *
-from .datatypes import _bitwidths
+from . import datatypes
+from .datatypes import (
+    Bits,
+    BitsArray,
+    _bitwidths,
+    bitstruct,
+    clog2,
+    concat,
+    get_nbits,
+    mk_bits,
+    mk_bitstruct,
+    reduce_and,
+    reduce_or,
+    reduce_xor,
+    sext,
+    to_bits,
+    zext,
+)
 from .dsl.Component import Component
 from .dsl.ComponentLevel3 import connect
 from .dsl.ComponentLevel5 import method_port
@@ -21,7 +37,7 @@ from .dsl.Connectable import (
 )
 from .dsl.ConstraintTypes import RD, WR, M, U
 from .dsl.Placeholder import Placeholder
-from .passes import TracingConfigs, TranslationConfigs, VerilatorImportConfigs
+from .passes import ProfilingConfigs, TracingConfigs, TranslationConfigs, VerilatorImportConfigs
 from .passes.backends.verilog import TranslationImportPass, VerilatorImportPass
 from .passes.PassGroups import SimulationPass
 
@@ -36,12 +52,19 @@ __all__ = [
   'blocking', 'CalleeIfcFL', 'CallerIfcFL',
 
   'SimulationPass', 'TracingConfigs', 'TranslationImportPass', 'VerilatorImportPass',
-  'VerilatorImportConfigs', 'TranslationConfigs',
+  'VerilatorImportConfigs', 'TranslationConfigs', 'ProfilingConfigs',
   'Component', 'Placeholder',
 
   'sext', 'zext', 'clog2', 'concat', 'reduce_and', 'reduce_or', 'reduce_xor',
-  'mk_bits', 'Bits',
+  'mk_bits', 'Bits', 'BitsArray',
   'mk_bitstruct', 'bitstruct',
   'to_bits', 'get_nbits',
 ] + [ "Bits{}".format(x) for x in _bitwidths ] \
   + [ "b{}".format(x) for x in _bitwidths ]
+
+# BitsN/bN are created on first access. Note that "from pymtl3 import *"
+# still creates every BitsN listed in __all__.
+def __getattr__( name ):
+  if datatypes.bits_import._parse_bits_name( name ):
+    return getattr( datatypes.bits_import, name )
+  raise AttributeError( f"module {__name__!r} has no attribute {name!r}" )
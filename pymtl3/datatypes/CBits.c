@@ -0,0 +1,905 @@
+/*
+========================================================================
+CBits.c
+========================================================================
+CPython C-extension implementation of fixed-bitwidth data type. This is
+a drop-in replacement of the pure-Python Bits in PythonBits.py that is
+picked up by bits_import.py when mamba is not available. The value is
+always kept as a non-negative Python int in [0, 2**nbits). Widths up to
+64 bits are computed with native 64-bit arithmetic and the rest falls
+back to Python long arithmetic with cached masks.
+*/
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <structmember.h>
+
+typedef unsigned long long u64;
+
+typedef struct {
+  PyObject_HEAD
+  int       nbits;
+  PyObject *value; /* int in [0, 2**nbits) */
+  PyObject *next;  /* int written by <<= and committed by _flip() */
+} BitsObject;
+
+static PyTypeObject BitsType;
+
+#define Bits_Check(op)  PyObject_TypeCheck(op, &BitsType)
+#define BITS(op)        ((BitsObject *)(op))
+#define NATIVE(nbits)   ((nbits) <= 64)
+#define MASK64(nbits)   ((nbits) >= 64 ? ~0ULL : ((1ULL << (nbits)) - 1))
+
+/*----------------------------------------------------------------------
+ Mask cache
+----------------------------------------------------------------------*/
+// We cache (1 << nbits) - 1 for the commonly used wide bitwidths so that
+// wide arithmetic doesn't recompute the mask every time.
+
+#define MASK_CACHE_SIZE 1025
+
+static PyObject *mask_cache[ MASK_CACHE_SIZE ];
+static PyObject *py_zero;
+static PyObject *py_one;
+static PyObject *str_nbits;
+
+/* Returns a new reference */
+static PyObject *
+get_mask( int nbits )
+{
+  PyObject *shamt, *shifted, *mask;
+
+  if( nbits < MASK_CACHE_SIZE && mask_cache[nbits] ) {
+    Py_INCREF( mask_cache[nbits] );
+    return mask_cache[nbits];
+  }
+
+  shamt = PyLong_FromLong( nbits );
+  if( !shamt ) return NULL;
+  shifted = PyNumber_Lshift( py_one, shamt );
+  Py_DECREF( shamt );
+  if( !shifted ) return NULL;
+  mask = PyNumber_Subtract( shifted, py_one );
+  Py_DECREF( shifted );
+  if( !mask ) return NULL;
+
+  if( nbits < MASK_CACHE_SIZE ) {
+    Py_INCREF( mask );
+    mask_cache[nbits] = mask;
+  }
+  return mask;
+}
+
+/* Mask an int to nbits. Steals a reference to v. */
+static PyObject *
+mask_long( PyObject *v, int nbits )
+{
+  PyObject *mask, *ret;
+
+  if( !v ) return NULL;
+
+  if( NATIVE(nbits) ) {
+    u64 x = PyLong_AsUnsignedLongLongMask( v );
+    Py_DECREF( v );
+    if( x == (u64)-1 && PyErr_Occurred() ) return NULL;
+    return PyLong_FromUnsignedLongLong( x & MASK64(nbits) );
+  }
+
+  mask = get_mask( nbits );
+  if( !mask ) { Py_DECREF( v ); return NULL; }
+  ret = PyNumber_And( v, mask );
+  Py_DECREF( mask );
+  Py_DECREF( v );
+  return ret;
+}
+
+/* Convert anything int() accepts to an int. Returns a new reference. */
+static PyObject *
+as_long( PyObject *o )
+{
+  if( Bits_Check(o) ) {
+    Py_INCREF( BITS(o)->value );
+    return BITS(o)->value;
+  }
+  if( PyLong_CheckExact(o) ) {
+    Py_INCREF( o );
+    return o;
+  }
+  return PyNumber_Long( o );
+}
+
+/* Same as as_long but returns NotImplemented-friendly NULL without an
+   error set if o cannot be converted because of a TypeError. */
+static PyObject *
+as_long_or_notimpl( PyObject *o, int *notimpl )
+{
+  PyObject *ret = as_long( o );
+  *notimpl = 0;
+  if( !ret && PyErr_ExceptionMatches( PyExc_TypeError ) ) {
+    PyErr_Clear();
+    *notimpl = 1;
+  }
+  return ret;
+}
+
+/*----------------------------------------------------------------------
+ Construction
+----------------------------------------------------------------------*/
+
+/* Create a new Bits with an already-masked value. Steals value. */
+static PyObject *
+Bits_make( int nbits, PyObject *value )
+{
+  BitsObject *ret;
+
+  if( !value ) return NULL;
+
+  ret = PyObject_New( BitsObject, &BitsType );
+  if( !ret ) { Py_DECREF( value ); return NULL; }
+  ret->nbits = nbits;
+  ret->value = value;
+  ret->next  = NULL;
+  return (PyObject *)ret;
+}
+
+static PyObject *
+Bits_make_u64( int nbits, u64 x )
+{
+  return Bits_make( nbits, PyLong_FromUnsignedLongLong( x & MASK64(nbits) ) );
+}
+
+/* BitsN subclasses created by bits_import.mk_bits have an integer nbits
+   class attribute. Returns it, or -1 for Bits itself and other types. */
+static int
+subtype_nbits( PyTypeObject *type )
+{
+  PyObject *n;
+
+  if( type == &BitsType ) return -1;
+  n = _PyType_Lookup( type, str_nbits );
+  if( !n || !PyLong_CheckExact( n ) ) return -1;
+  return (int)PyLong_AsLong( n );
+}
+
+/* Bits( nbits=32, value=0 ), or BitsN( value=0 ) for a subclass with an
+   integer nbits class attribute. A subclass that passes both arguments,
+   e.g. Bits.__new__( cls, nbits, value ), still works. */
+static PyObject *
+Bits_new( PyTypeObject *type, PyObject *args, PyObject *kwds )
+{
+  static char *kwlist[]   = { "nbits", "value", NULL };
+  static char *kwlist_n[] = { "value", NULL };
+  int nbits = 32;
+  PyObject *value = NULL;
+  BitsObject *self;
+  int sub_nbits = subtype_nbits( type );
+
+  if( sub_nbits >= 0 && PyTuple_GET_SIZE( args ) <= 1 &&
+      !( kwds && PyDict_GetItemString( kwds, "nbits" ) ) ) {
+    nbits = sub_nbits;
+    if( !kwds && PyTuple_GET_SIZE( args ) == 1 )
+      value = PyTuple_GET_ITEM( args, 0 );
+    else if( !PyArg_ParseTupleAndKeywords( args, kwds, "|O:Bits", kwlist_n, &value ) )
+      return NULL;
+  }
+  else if( !PyArg_ParseTupleAndKeywords( args, kwds, "|iO:Bits", kwlist, &nbits, &value ) )
+    return NULL;
+
+  if( nbits < 0 ) {
+    PyErr_Format( PyExc_ValueError, "Bits width must be non-negative, got %d", nbits );
+    return NULL;
+  }
+
+  self = (BitsObject *)type->tp_alloc( type, 0 );
+  if( !self ) return NULL;
+
+  self->nbits = nbits;
+  self->next  = NULL;
+
+  if( value ) {
+    self->value = mask_long( as_long( value ), nbits );
+    if( !self->value ) { Py_DECREF( self ); return NULL; }
+  }
+  else {
+    self->value = PyLong_FromLong( 0 );
+  }
+  return (PyObject *)self;
+}
+
+static void
+Bits_dealloc( BitsObject *self )
+{
+  Py_XDECREF( self->value );
+  Py_XDECREF( self->next );
+  Py_TYPE(self)->tp_free( (PyObject *)self );
+}
+
+/*----------------------------------------------------------------------
+ Double buffering
+----------------------------------------------------------------------*/
+
+static PyObject *
+Bits_ilshift( PyObject *self, PyObject *x )
+{
+  BitsObject *s = BITS(self);
+
+  if( !Bits_Check(x) ) {
+    PyErr_Format( PyExc_TypeError, "Assign %R to Bits", (PyObject *)Py_TYPE(x) );
+    return NULL;
+  }
+  if( BITS(x)->nbits != s->nbits ) {
+    PyErr_Format( PyExc_AssertionError,
+                  "Bitwidth mismatch during <<=, assigning Bits%d <<= Bits%d",
+                  s->nbits, BITS(x)->nbits );
+    return NULL;
+  }
+  Py_INCREF( BITS(x)->value );
+  Py_XSETREF( s->next, BITS(x)->value );
+  Py_INCREF( self );
+  return self;
+}
+
+static PyObject *
+Bits_flip( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  if( !self->next ) {
+    PyErr_SetString( PyExc_AttributeError, "_next" );
+    return NULL;
+  }
+  Py_INCREF( self->next );
+  Py_SETREF( self->value, self->next );
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+Bits_clone( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  Py_INCREF( self->value );
+  return Bits_make( self->nbits, self->value );
+}
+
+static PyObject *
+Bits_deepcopy( BitsObject *self, PyObject *Py_UNUSED(memo) )
+{
+  Py_INCREF( self->value );
+  return Bits_make( self->nbits, self->value );
+}
+
+static PyObject *
+Bits_reduce( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  // BitsN subclasses only take the value as constructor argument
+  if( Py_TYPE(self) == &BitsType )
+    return Py_BuildValue( "(O(iO))", (PyObject *)Py_TYPE(self), self->nbits, self->value );
+  return Py_BuildValue( "(O(O))", (PyObject *)Py_TYPE(self), self->value );
+}
+
+/*----------------------------------------------------------------------
+ Slicing
+----------------------------------------------------------------------*/
+
+static int
+get_slice_bounds( BitsObject *self, PyObject *idx, long *start, long *stop )
+{
+  PySliceObject *slc = (PySliceObject *)idx;
+  PyObject *tmp;
+  int has_step;
+
+  tmp = PyNumber_Long( slc->start );
+  if( !tmp ) return -1;
+  *start = PyLong_AsLong( tmp );
+  Py_DECREF( tmp );
+  if( *start == -1 && PyErr_Occurred() ) return -1;
+
+  tmp = PyNumber_Long( slc->stop );
+  if( !tmp ) return -1;
+  *stop = PyLong_AsLong( tmp );
+  Py_DECREF( tmp );
+  if( *stop == -1 && PyErr_Occurred() ) return -1;
+
+  has_step = PyObject_IsTrue( slc->step );
+  if( has_step < 0 ) return -1;
+
+  if( has_step || *start >= *stop || *start < 0 || *stop > self->nbits ) {
+    PyErr_Format( PyExc_AssertionError,
+                  "Invalid access: [%ld:%ld] in a Bits%d instance",
+                  *start, *stop, self->nbits );
+    return -1;
+  }
+  return 0;
+}
+
+static int
+get_index( BitsObject *self, PyObject *idx, long *i )
+{
+  PyObject *tmp = as_long( idx );
+  if( !tmp ) return -1;
+  *i = PyLong_AsLong( tmp );
+  Py_DECREF( tmp );
+  if( *i == -1 && PyErr_Occurred() ) return -1;
+
+  if( *i < 0 || *i >= self->nbits ) {
+    PyErr_SetNone( PyExc_AssertionError );
+    return -1;
+  }
+  return 0;
+}
+
+/* (v >> start) & ((1 << width) - 1) for wide values. New reference. */
+static PyObject *
+long_extract( PyObject *v, long start, int width )
+{
+  PyObject *shamt, *shifted;
+
+  shamt = PyLong_FromLong( start );
+  if( !shamt ) return NULL;
+  shifted = PyNumber_Rshift( v, shamt );
+  Py_DECREF( shamt );
+  return mask_long( shifted, width );
+}
+
+static PyObject *
+Bits_getitem( BitsObject *self, PyObject *idx )
+{
+  long start, stop, i;
+
+  if( PySlice_Check(idx) ) {
+    if( get_slice_bounds( self, idx, &start, &stop ) < 0 ) return NULL;
+
+    if( NATIVE(self->nbits) ) {
+      u64 sv = PyLong_AsUnsignedLongLongMask( self->value );
+      return Bits_make_u64( (int)(stop - start), sv >> start );
+    }
+    return Bits_make( (int)(stop - start),
+                      long_extract( self->value, start, (int)(stop - start) ) );
+  }
+
+  if( get_index( self, idx, &i ) < 0 ) return NULL;
+
+  if( NATIVE(self->nbits) ) {
+    u64 sv = PyLong_AsUnsignedLongLongMask( self->value );
+    return Bits_make_u64( 1, sv >> i );
+  }
+  return Bits_make( 1, long_extract( self->value, i, 1 ) );
+}
+
+/* Replace bits [start, stop) of v with x. All arguments are borrowed. */
+static PyObject *
+long_insert( PyObject *v, long start, long stop, PyObject *x )
+{
+  PyObject *shamt = NULL, *hole = NULL, *inv = NULL, *cleared = NULL;
+  PyObject *field = NULL, *shifted = NULL, *ret = NULL;
+
+  Py_INCREF( x );
+  field = mask_long( x, (int)(stop - start) );
+  if( !field ) goto done;
+
+  shamt = PyLong_FromLong( start );
+  if( !shamt ) goto done;
+
+  hole = get_mask( (int)(stop - start) );
+  if( !hole ) goto done;
+  Py_SETREF( hole, PyNumber_Lshift( hole, shamt ) );
+  if( !hole ) goto done;
+  inv = PyNumber_Invert( hole );
+  if( !inv ) goto done;
+  cleared = PyNumber_And( v, inv );
+  if( !cleared ) goto done;
+
+  shifted = PyNumber_Lshift( field, shamt );
+  if( !shifted ) goto done;
+  ret = PyNumber_Or( cleared, shifted );
+
+done:
+  Py_XDECREF( shamt );
+  Py_XDECREF( hole );
+  Py_XDECREF( inv );
+  Py_XDECREF( cleared );
+  Py_XDECREF( field );
+  Py_XDECREF( shifted );
+  return ret;
+}
+
+static int
+Bits_setitem( BitsObject *self, PyObject *idx, PyObject *v )
+{
+  long start, stop;
+  PyObject *x, *nv;
+
+  if( !v ) {
+    PyErr_SetString( PyExc_TypeError, "Bits does not support item deletion" );
+    return -1;
+  }
+
+  if( PySlice_Check(idx) ) {
+    if( get_slice_bounds( self, idx, &start, &stop ) < 0 ) return -1;
+  }
+  else {
+    if( get_index( self, idx, &start ) < 0 ) return -1;
+    stop = start + 1;
+  }
+
+  x = as_long( v );
+  if( !x ) return -1;
+
+  if( NATIVE(self->nbits) ) {
+    u64 sv    = PyLong_AsUnsignedLongLongMask( self->value );
+    u64 xv    = PyLong_AsUnsignedLongLongMask( x );
+    u64 field = MASK64( stop - start ) << start;
+    Py_DECREF( x );
+    if( xv == (u64)-1 && PyErr_Occurred() ) return -1;
+    nv = PyLong_FromUnsignedLongLong( (sv & ~field) | ((xv << start) & field) );
+  }
+  else {
+    nv = long_insert( self->value, start, stop, x );
+    Py_DECREF( x );
+  }
+
+  if( !nv ) return -1;
+  Py_SETREF( self->value, nv );
+  return 0;
+}
+
+/*----------------------------------------------------------------------
+ Arithmetics
+----------------------------------------------------------------------*/
+// Same semantics as PythonBits: if the other operand is also Bits, the
+// result takes the larger bitwidth; otherwise the other operand is
+// converted with int() and the result takes the bitwidth of the Bits
+// operand. Reflected operands are handled in the same slot.
+
+typedef enum { OP_ADD, OP_SUB, OP_RSUB, OP_MUL, OP_AND, OP_OR, OP_XOR } binop_t;
+
+static PyObject *
+bits_binop( PyObject *a, PyObject *b, binop_t op )
+{
+  BitsObject *self;
+  PyObject *other, *ov, *r;
+  int nbits, notimpl;
+
+  if( Bits_Check(a) ) {
+    self = BITS(a); other = b;
+  }
+  else {
+    self = BITS(b); other = a;
+    if( op == OP_SUB ) op = OP_RSUB;
+  }
+
+  nbits = self->nbits;
+  if( Bits_Check(other) && BITS(other)->nbits > nbits )
+    nbits = BITS(other)->nbits;
+
+  ov = as_long_or_notimpl( other, &notimpl );
+  if( !ov ) {
+    if( notimpl ) Py_RETURN_NOTIMPLEMENTED;
+    return NULL;
+  }
+
+  if( NATIVE(nbits) ) {
+    u64 x = PyLong_AsUnsignedLongLongMask( self->value );
+    u64 y = PyLong_AsUnsignedLongLongMask( ov );
+    u64 z = 0;
+    Py_DECREF( ov );
+    if( y == (u64)-1 && PyErr_Occurred() ) return NULL;
+
+    switch( op ) {
+      case OP_ADD:  z = x + y; break;
+      case OP_SUB:  z = x - y; break;
+      case OP_RSUB: z = y - x; break;
+      case OP_MUL:  z = x * y; break;
+      case OP_AND:  z = x & y; break;
+      case OP_OR:   z = x | y; break;
+      case OP_XOR:  z = x ^ y; break;
+    }
+    return Bits_make_u64( nbits, z );
+  }
+
+  switch( op ) {
+    case OP_ADD:  r = PyNumber_Add( self->value, ov );      break;
+    case OP_SUB:  r = PyNumber_Subtract( self->value, ov ); break;
+    case OP_RSUB: r = PyNumber_Subtract( ov, self->value ); break;
+    case OP_MUL:  r = PyNumber_Multiply( self->value, ov ); break;
+    case OP_AND:  r = PyNumber_And( self->value, ov );      break;
+    case OP_OR:   r = PyNumber_Or( self->value, ov );       break;
+    default:      r = PyNumber_Xor( self->value, ov );      break;
+  }
+  Py_DECREF( ov );
+  return Bits_make( nbits, mask_long( r, nbits ) );
+}
+
+static PyObject *Bits_add( PyObject *a, PyObject *b ) { return bits_binop( a, b, OP_ADD ); }
+static PyObject *Bits_sub( PyObject *a, PyObject *b ) { return bits_binop( a, b, OP_SUB ); }
+static PyObject *Bits_mul( PyObject *a, PyObject *b ) { return bits_binop( a, b, OP_MUL ); }
+static PyObject *Bits_and( PyObject *a, PyObject *b ) { return bits_binop( a, b, OP_AND ); }
+static PyObject *Bits_or ( PyObject *a, PyObject *b ) { return bits_binop( a, b, OP_OR  ); }
+static PyObject *Bits_xor( PyObject *a, PyObject *b ) { return bits_binop( a, b, OP_XOR ); }
+
+/* Operators without reflected versions in PythonBits */
+static PyObject *
+Bits_floordiv( PyObject *a, PyObject *b )
+{
+  PyObject *ov, *q;
+  int nbits, notimpl, neg;
+
+  if( !Bits_Check(a) ) Py_RETURN_NOTIMPLEMENTED;
+
+  nbits = BITS(a)->nbits;
+  if( Bits_Check(b) && BITS(b)->nbits > nbits )
+    nbits = BITS(b)->nbits;
+
+  ov = as_long_or_notimpl( b, &notimpl );
+  if( !ov ) {
+    if( notimpl ) Py_RETURN_NOTIMPLEMENTED;
+    return NULL;
+  }
+
+  // PythonBits truncates towards zero
+  neg = PyObject_RichCompareBool( ov, py_zero, Py_LT );
+  if( neg < 0 ) { Py_DECREF( ov ); return NULL; }
+  if( neg ) {
+    Py_SETREF( ov, PyNumber_Negative( ov ) );
+    if( !ov ) return NULL;
+  }
+  q = PyNumber_FloorDivide( BITS(a)->value, ov );
+  Py_DECREF( ov );
+  if( q && neg ) Py_SETREF( q, PyNumber_Negative( q ) );
+
+  return Bits_make( nbits, mask_long( q, nbits ) );
+}
+
+static PyObject *
+Bits_mod( PyObject *a, PyObject *b )
+{
+  PyObject *ov, *r;
+  int nbits, notimpl;
+
+  if( !Bits_Check(a) ) Py_RETURN_NOTIMPLEMENTED;
+
+  nbits = BITS(a)->nbits;
+  if( Bits_Check(b) && BITS(b)->nbits > nbits )
+    nbits = BITS(b)->nbits;
+
+  ov = as_long_or_notimpl( b, &notimpl );
+  if( !ov ) {
+    if( notimpl ) Py_RETURN_NOTIMPLEMENTED;
+    return NULL;
+  }
+  r = PyNumber_Remainder( BITS(a)->value, ov );
+  Py_DECREF( ov );
+  return Bits_make( nbits, mask_long( r, nbits ) );
+}
+
+static PyObject *
+Bits_invert( BitsObject *self )
+{
+  if( NATIVE(self->nbits) )
+    return Bits_make_u64( self->nbits, ~PyLong_AsUnsignedLongLongMask( self->value ) );
+  return Bits_make( self->nbits, mask_long( PyNumber_Invert( self->value ), self->nbits ) );
+}
+
+static PyObject *
+bits_shift( PyObject *a, PyObject *b, int left )
+{
+  BitsObject *self;
+  PyObject *ov, *r;
+  long long shamt;
+  int nbits, notimpl, overflow;
+
+  if( !Bits_Check(a) ) Py_RETURN_NOTIMPLEMENTED;
+  self  = BITS(a);
+  nbits = self->nbits;
+
+  ov = as_long_or_notimpl( b, &notimpl );
+  if( !ov ) {
+    if( notimpl ) Py_RETURN_NOTIMPLEMENTED;
+    return NULL;
+  }
+
+  shamt = PyLong_AsLongLongAndOverflow( ov, &overflow );
+  if( shamt == -1 && PyErr_Occurred() ) { Py_DECREF( ov ); return NULL; }
+
+  // Negative shift amounts raise the same ValueError as Python int
+  if( overflow < 0 || shamt < 0 ) {
+    r = left ? PyNumber_Lshift( self->value, ov ) : PyNumber_Rshift( self->value, ov );
+    Py_DECREF( ov );
+    return Bits_make( nbits, mask_long( r, nbits ) );
+  }
+
+  if( overflow > 0 || shamt >= nbits ) {
+    Py_DECREF( ov );
+    return Bits_make( nbits, PyLong_FromLong( 0 ) );
+  }
+
+  if( NATIVE(nbits) ) {
+    u64 x = PyLong_AsUnsignedLongLongMask( self->value );
+    Py_DECREF( ov );
+    return Bits_make_u64( nbits, left ? x << shamt : x >> shamt );
+  }
+
+  r = left ? PyNumber_Lshift( self->value, ov ) : PyNumber_Rshift( self->value, ov );
+  Py_DECREF( ov );
+  return Bits_make( nbits, mask_long( r, nbits ) );
+}
+
+static PyObject *Bits_lshift( PyObject *a, PyObject *b ) { return bits_shift( a, b, 1 ); }
+static PyObject *Bits_rshift( PyObject *a, PyObject *b ) { return bits_shift( a, b, 0 ); }
+
+static int
+Bits_bool( BitsObject *self )
+{
+  return PyObject_IsTrue( self->value );
+}
+
+static PyObject *
+Bits_int( BitsObject *self )
+{
+  Py_INCREF( self->value );
+  return self->value;
+}
+
+/*----------------------------------------------------------------------
+ Comparisons
+----------------------------------------------------------------------*/
+
+static PyObject *
+Bits_richcompare( PyObject *a, PyObject *b, int op )
+{
+  PyObject *ov;
+  int res;
+
+  // Python reflects comparisons so a is always Bits here
+  ov = as_long( b );
+  if( !ov ) {
+    if( op == Py_EQ || op == Py_NE ) {
+      PyErr_Clear();
+      if( op == Py_EQ ) Py_RETURN_FALSE;
+      Py_RETURN_TRUE;
+    }
+    return NULL;
+  }
+
+  res = PyObject_RichCompareBool( BITS(a)->value, ov, op );
+  Py_DECREF( ov );
+  if( res < 0 ) return NULL;
+  return Bits_make( 1, PyLong_FromLong( res ) );
+}
+
+static Py_hash_t
+Bits_hash( BitsObject *self )
+{
+  Py_hash_t ret;
+  PyObject *t = Py_BuildValue( "(iO)", self->nbits, self->value );
+  if( !t ) return -1;
+  ret = PyObject_Hash( t );
+  Py_DECREF( t );
+  return ret;
+}
+
+/*----------------------------------------------------------------------
+ Conversion and printing
+----------------------------------------------------------------------*/
+
+static PyObject *
+Bits_sint( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  PyObject *top, *mask, *ret;
+  int sign;
+
+  if( self->nbits == 0 ) return PyLong_FromLong( 0 );
+
+  if( NATIVE(self->nbits) ) {
+    u64 x = PyLong_AsUnsignedLongLongMask( self->value );
+    if( !( (x >> (self->nbits - 1)) & 1 ) )
+      return PyLong_FromUnsignedLongLong( x );
+    // Sign-extend to 64 bits
+    return PyLong_FromLongLong( (long long)(x | ~MASK64(self->nbits)) );
+  }
+
+  top = long_extract( self->value, self->nbits - 1, 1 );
+  if( !top ) return NULL;
+  sign = PyObject_IsTrue( top );
+  Py_DECREF( top );
+  if( sign < 0 ) return NULL;
+
+  if( !sign ) {
+    Py_INCREF( self->value );
+    return self->value;
+  }
+
+  mask = get_mask( self->nbits );
+  if( !mask ) return NULL;
+  // value - 2**nbits == value - mask - 1
+  ret = PyNumber_Subtract( self->value, mask );
+  Py_DECREF( mask );
+  if( ret ) Py_SETREF( ret, PyNumber_Subtract( ret, py_one ) );
+  return ret;
+}
+
+static PyObject *
+format_value( BitsObject *self, char spec, int width )
+{
+  PyObject *fmt, *ret;
+  fmt = PyUnicode_FromFormat( "0%d%c", width, spec );
+  if( !fmt ) return NULL;
+  ret = PyObject_Format( self->value, fmt );
+  Py_DECREF( fmt );
+  return ret;
+}
+
+#define HEX_WIDTH(nbits) ((((nbits) - 1) >> 2) + 1)
+#define OCT_WIDTH(nbits) ((((nbits) - 1) >> 1) + 1)
+
+static PyObject *
+Bits_repr( BitsObject *self )
+{
+  PyObject *s, *ret;
+  s = format_value( self, 'x', HEX_WIDTH(self->nbits) );
+  if( !s ) return NULL;
+  ret = PyUnicode_FromFormat( "Bits%d(0x%U)", self->nbits, s );
+  Py_DECREF( s );
+  return ret;
+}
+
+static PyObject *
+Bits_str( BitsObject *self )
+{
+  return format_value( self, 'x', HEX_WIDTH(self->nbits) );
+}
+
+static PyObject *
+prefixed( BitsObject *self, const char *prefix, char spec, int width )
+{
+  PyObject *s, *ret;
+  s = format_value( self, spec, width );
+  if( !s ) return NULL;
+  ret = PyUnicode_FromFormat( "%s%U", prefix, s );
+  Py_DECREF( s );
+  return ret;
+}
+
+static PyObject *
+Bits_bin( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  return prefixed( self, "0b", 'b', self->nbits );
+}
+
+static PyObject *
+Bits_oct( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  return prefixed( self, "0o", 'o', OCT_WIDTH(self->nbits) );
+}
+
+static PyObject *
+Bits_hex( BitsObject *self, PyObject *Py_UNUSED(ignored) )
+{
+  return prefixed( self, "0x", 'x', HEX_WIDTH(self->nbits) );
+}
+
+/*----------------------------------------------------------------------
+ Attributes
+----------------------------------------------------------------------*/
+
+static PyObject *
+Bits_get_value( BitsObject *self, void *closure )
+{
+  Py_INCREF( self->value );
+  return self->value;
+}
+
+static int
+Bits_set_value( BitsObject *self, PyObject *v, void *closure )
+{
+  PyObject *nv;
+  if( !v ) {
+    PyErr_SetString( PyExc_AttributeError, "cannot delete value" );
+    return -1;
+  }
+  nv = mask_long( as_long( v ), self->nbits );
+  if( !nv ) return -1;
+  Py_SETREF( self->value, nv );
+  return 0;
+}
+
+static PyGetSetDef Bits_getset[] = {
+  { "value", (getter)Bits_get_value, (setter)Bits_set_value, NULL, NULL },
+  { NULL }
+};
+
+static PyMemberDef Bits_members[] = {
+  { "nbits", T_INT,       offsetof(BitsObject, nbits), 0, NULL },
+  { "_next", T_OBJECT_EX, offsetof(BitsObject, next),  0, NULL },
+  { NULL }
+};
+
+static PyMethodDef Bits_methods[] = {
+  { "_flip",        (PyCFunction)Bits_flip,     METH_NOARGS, NULL },
+  { "clone",        (PyCFunction)Bits_clone,    METH_NOARGS, NULL },
+  { "__deepcopy__", (PyCFunction)Bits_deepcopy, METH_O,      NULL },
+  { "__reduce__",   (PyCFunction)Bits_reduce,   METH_NOARGS, NULL },
+  { "int",          (PyCFunction)Bits_sint,     METH_NOARGS, NULL },
+  { "uint",         (PyCFunction)Bits_int,      METH_NOARGS, NULL },
+  { "bin",          (PyCFunction)Bits_bin,      METH_NOARGS, NULL },
+  { "oct",          (PyCFunction)Bits_oct,      METH_NOARGS, NULL },
+  { "hex",          (PyCFunction)Bits_hex,      METH_NOARGS, NULL },
+  { "__oct__",      (PyCFunction)Bits_oct,      METH_NOARGS, NULL },
+  { "__hex__",      (PyCFunction)Bits_hex,      METH_NOARGS, NULL },
+  { NULL }
+};
+
+static PyNumberMethods Bits_as_number = {
+  .nb_add              = Bits_add,
+  .nb_subtract         = Bits_sub,
+  .nb_multiply         = Bits_mul,
+  .nb_remainder        = Bits_mod,
+  .nb_bool             = (inquiry)Bits_bool,
+  .nb_invert           = (unaryfunc)Bits_invert,
+  .nb_lshift           = Bits_lshift,
+  .nb_rshift           = Bits_rshift,
+  .nb_and              = Bits_and,
+  .nb_xor              = Bits_xor,
+  .nb_or               = Bits_or,
+  .nb_int              = (unaryfunc)Bits_int,
+  .nb_inplace_lshift   = Bits_ilshift,
+  .nb_floor_divide     = Bits_floordiv,
+  .nb_index            = (unaryfunc)Bits_int,
+};
+
+static PyMappingMethods Bits_as_mapping = {
+  .mp_subscript     = (binaryfunc)Bits_getitem,
+  .mp_ass_subscript = (objobjargproc)Bits_setitem,
+};
+
+static PyTypeObject BitsType = {
+  PyVarObject_HEAD_INIT(NULL, 0)
+  .tp_name        = "pymtl3.datatypes.CBits.Bits",
+  .tp_basicsize   = sizeof(BitsObject),
+  .tp_itemsize    = 0,
+  .tp_dealloc     = (destructor)Bits_dealloc,
+  .tp_repr        = (reprfunc)Bits_repr,
+  .tp_as_number   = &Bits_as_number,
+  .tp_as_mapping  = &Bits_as_mapping,
+  .tp_hash        = (hashfunc)Bits_hash,
+  .tp_str         = (reprfunc)Bits_str,
+  .tp_flags       = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,
+  .tp_doc         = "Fixed-bitwidth data type implemented in C.",
+  .tp_richcompare = Bits_richcompare,
+  .tp_methods     = Bits_methods,
+  .tp_members     = Bits_members,
+  .tp_getset      = Bits_getset,
+  .tp_new         = Bits_new,
+};
+
+/*----------------------------------------------------------------------
+ Module
+----------------------------------------------------------------------*/
+
+static struct PyModuleDef CBits_module = {
+  PyModuleDef_HEAD_INIT,
+  .m_name = "CBits",
+  .m_doc  = "C implementation of PyMTL Bits.",
+  .m_size = -1,
+};
+
+PyMODINIT_FUNC
+PyInit_CBits( void )
+{
+  PyObject *m;
+
+  if( PyType_Ready( &BitsType ) < 0 ) return NULL;
+
+  py_zero = PyLong_FromLong( 0 );
+  py_one  = PyLong_FromLong( 1 );
+  str_nbits = PyUnicode_InternFromString( "nbits" );
+  if( !py_zero || !py_one || !str_nbits ) return NULL;
+
+  m = PyModule_Create( &CBits_module );
+  if( !m ) return NULL;
+
+  Py_INCREF( &BitsType );
+  if( PyModule_AddObject( m, "Bits", (PyObject *)&BitsType ) < 0 ) {
+    Py_DECREF( &BitsType );
+    Py_DECREF( m );
+    return NULL;
+  }
+  return m;
+}
@@ -8,13 +8,38 @@ Author : Shunning Jiang
 Date   : Oct 31, 2017
 """
 
+# Fixed-width BitsN classes generated by bits_import.py, keyed by width.
+# bits_import.py fills this dictionary when PythonBits is the selected
+# backend. Arithmetic results directly instantiate these classes instead
+# of going through the generic constructor.
+_bits_types = {}
+
+# Per-width masks. Widths that are not precomputed are filled on demand.
+
+class _MaskTable( dict ):
+  def __missing__( self, nbits ):
+    mask = self[ nbits ] = (1 << nbits) - 1
+    return mask
+
+_masks = _MaskTable( (n, (1 << n) - 1) for n in range(513) )
+
+_new = object.__new__
+
+def _new_bits( nbits, value ):
+  # value is assumed to be already masked
+  cls = _bits_types.get( nbits )
+  if cls is None:
+    return Bits( nbits, value )
+  ret = _new( cls )
+  ret.value = value
+  return ret
 
 class Bits:
   __slots__ = ( "nbits", "value" )
 
   def __init__( self, nbits=32, value=0 ):
     self.nbits = nbits
-    self.value = int(value) & ((1 << nbits) - 1)
+    self.value = int(value) & _masks[ nbits ]
 
   def __ilshift__( self, x ):
     try:
@@ -28,27 +53,27 @@ class Bits:
     self.value = self._next
 
   def clone( self ):
-    return Bits( self.nbits, self.value )
+    return _new_bits( self.nbits, self.value )
 
   def __deepcopy__( self, memo ):
-    return Bits( self.nbits, self.value )
+    return _new_bits( self.nbits, self.value )
 
   # Arithmetics
   def __getitem__( self, idx ):
-    sv = int(self.value)
+    sv = self.value
 
     if isinstance( idx, slice ):
       start, stop = int(idx.start), int(idx.stop)
       assert not idx.step and start < stop and start >= 0 and stop <= self.nbits, \
             "Invalid access: [{}:{}] in a Bits{} instance".format( start, stop, self.nbits )
-      return Bits( stop-start, (sv & ((1 << stop) - 1)) >> start )
+      return _new_bits( stop-start, (sv >> start) & _masks[ stop-start ] )
 
     i = int(idx)
     assert 0 <= i < self.nbits
-    return Bits( 1, (sv >> i) & 1 )
+    return _new_bits( 1, (sv >> i) & 1 )
 
   def __setitem__( self, idx, v ):
-    sv = int(self.value)
+    sv = self.value
 
     if isinstance( idx, slice ):
       start, stop = int(idx.start), int(idx.stop)
@@ -56,51 +81,73 @@ class Bits:
             "Invalid access: [{}:{}] in a Bits{} instance".format( start, stop, self.nbits )
 
       self.value = (sv & (~((1 << stop) - (1 << start)))) | \
-                   ((int(v) & ((1 << (stop - start)) - 1)) << start)
+                   ((int(v) & _masks[ stop - start ]) << start)
       return
 
     i = int(idx)
     assert 0 <= i < self.nbits
     self.value = (sv & ~(1 << i)) | ((int(v) & 1) << i)
 
+  # For binary operators, if the other operand is also Bits the result
+  # takes the larger bitwidth. Otherwise it takes self's bitwidth.
+
   def __add__( self, other ):
-    try:    return Bits( max(self.nbits, other.nbits), int(self.value) + int(other) )
-    except: return Bits( self.nbits, int(self.value) + int(other) )
+    nbits = self.nbits
+    if isinstance( other, Bits ):
+      if other.nbits > nbits: nbits = other.nbits
+      return _new_bits( nbits, (self.value + other.value) & _masks[ nbits ] )
+    return _new_bits( nbits, (self.value + int(other)) & _masks[ nbits ] )
 
   def __radd__( self, other ):
     return self.__add__( other )
 
   def __sub__( self, other ):
-    try:    return Bits( max(self.nbits, other.nbits), int(self.value) - int(other) )
-    except: return Bits( self.nbits, int(self.value) - int(other) )
+    nbits = self.nbits
+    if isinstance( other, Bits ):
+      if other.nbits > nbits: nbits = other.nbits
+      return _new_bits( nbits, (self.value - other.value) & _masks[ nbits ] )
+    return _new_bits( nbits, (self.value - int(other)) & _masks[ nbits ] )
 
   def __rsub__( self, other ):
-    return Bits( self.nbits, other ) - self
+    nbits = self.nbits
+    return _new_bits( nbits, (int(other) - self.value) & _masks[ nbits ] )
 
   def __mul__( self, other ):
-    try:    return Bits( max(self.nbits, other.nbits), int(self.value) * int(other) )
-    except: return Bits( self.nbits, int(self.value) * int(other) )
+    nbits = self.nbits
+    if isinstance( other, Bits ):
+      if other.nbits > nbits: nbits = other.nbits
+      return _new_bits( nbits, (self.value * other.value) & _masks[ nbits ] )
+    return _new_bits( nbits, (self.value * int(other)) & _masks[ nbits ] )
 
   def __rmul__( self, other ):
     return self.__mul__( other )
 
   def __and__( self, other ):
-    try:    return Bits( max(self.nbits, other.nbits), int(self.value) & int(other) )
-    except: return Bits( self.nbits, int(self.value) & int(other) )
+    nbits = self.nbits
+    if isinstance( other, Bits ):
+      if other.nbits > nbits: nbits = other.nbits
+      return _new_bits( nbits, self.value & other.value )
+    return _new_bits( nbits, self.value & int(other) )
 
   def __rand__( self, other ):
     return self.__and__( other )
 
   def __or__( self, other ):
-    try:    return Bits( max(self.nbits, other.nbits), int(self.value) | int(other) )
-    except: return Bits( self.nbits, int(self.value) | int(other) )
+    nbits = self.nbits
+    if isinstance( other, Bits ):
+      if other.nbits > nbits: nbits = other.nbits
+      return _new_bits( nbits, self.value | other.value )
+    return _new_bits( nbits, (self.value | int(other)) & _masks[ nbits ] )
 
   def __ror__( self, other ):
     return self.__or__( other )
 
   def __xor__( self, other ):
-    try:    return Bits( max(self.nbits, other.nbits), int(self.value) ^ int(other) )
-    except: return Bits( self.nbits, int(self.value) ^ int(other) )
+    nbits = self.nbits
+    if isinstance( other, Bits ):
+      if other.nbits > nbits: nbits = other.nbits
+      return _new_bits( nbits, self.value ^ other.value )
+    return _new_bits( nbits, (self.value ^ int(other)) & _masks[ nbits ] )
 
   def __rxor__( self, other ):
     return self.__xor__( other )
@@ -118,24 +165,26 @@ class Bits:
     except: return Bits( self.nbits, int(self.value) % int(other) )
 
   def __invert__( self ):
-    return Bits( self.nbits, ~int(self.value) )
+    nbits = self.nbits
+    return _new_bits( nbits, (~self.value) & _masks[ nbits ] )
 
   def __lshift__( self, other ):
-    nb = int(self.nbits)
+    nb = self.nbits
     # TODO this doesn't work perfectly. We need a really smart
     # optimization that avoids the guard totally
-    if int(other) >= nb: return Bits( nb )
-    return Bits( nb, int(self.value) << int(other) )
+    other = int(other)
+    if other >= nb: return _new_bits( nb, 0 )
+    return _new_bits( nb, (self.value << other) & _masks[ nb ] )
 
   def __rshift__( self, other ):
-    return Bits( self.nbits, int(self.value) >> int(other) )
+    return _new_bits( self.nbits, self.value >> int(other) )
 
   def __eq__( self, other ):
     try:
       other = int(other)
     except:
       return False
-    return Bits( 1, int(self.value) == other )
+    return _new_bits( 1, (self.value == other) & 1 )
 
   def __hash__( self ):
     return hash((self.nbits, self.value))
@@ -145,36 +194,36 @@ class Bits:
       other = int(other)
     except:
       return True
-    return Bits( 1, int(self.value) != other )
+    return _new_bits( 1, (self.value != other) & 1 )
 
   def __lt__( self, other ):
-    return Bits( 1, int(self.value) < int(other) )
+    return _new_bits( 1, (self.value < int(other)) & 1 )
 
   def __le__( self, other ):
-    return Bits( 1, int(self.value) <= int(other) )
+    return _new_bits( 1, (self.value <= int(other)) & 1 )
 
   def __gt__( self, other ):
-    return Bits( 1, int(self.value) > int(other) )
+    return _new_bits( 1, (self.value > int(other)) & 1 )
 
   def __ge__( self, other ):
-    return Bits( 1, int(self.value) >= int(other) )
+    return _new_bits( 1, (self.value >= int(other)) & 1 )
 
   def __bool__( self ):
-    return int(self.value) != 0
+    return self.value != 0
 
   def __int__( self ):
-    return int(self.value)
+    return self.value
 
   def int( self ):
     if self.value >> (self.nbits - 1):
-      return -int(~self + 1)
-    return int(self.value)
+      return self.value - (1 << self.nbits)
+    return self.value
 
   def uint( self ):
-    return int(self.value)
+    return self.value
 
   def __index__( self ):
-    return int(self.value)
+    return self.value
 
   # Print
 
@@ -1,5 +1,6 @@
-from .bits_import import *
-from .bits_import import _bitwidths
+from . import bits_import
+from .bits_import import Bits, _bitwidths, mk_bits
+from .bits_array import BitsArray
 from .bitstructs import bitstruct, is_bitstruct_class, is_bitstruct_inst, mk_bitstruct
 from .helpers import (
     clog2,
@@ -13,3 +14,17 @@ from .helpers import (
     to_bits,
     zext,
 )
+
+__all__ = [
+  'Bits', 'mk_bits', 'BitsArray',
+  'bitstruct', 'is_bitstruct_class', 'is_bitstruct_inst', 'mk_bitstruct',
+  'clog2', 'concat', 'get_bitstruct_inst_all_classes', 'get_nbits',
+  'reduce_and', 'reduce_or', 'reduce_xor', 'sext', 'to_bits', 'zext',
+] + [ "Bits{}".format(x) for x in _bitwidths ] \
+  + [ "b{}".format(x) for x in _bitwidths ]
+
+# BitsN/bN are created on first access by bits_import.mk_bits
+def __getattr__( name ):
+  if bits_import._parse_bits_name( name ):
+    return getattr( bits_import, name )
+  raise AttributeError( f"module {__name__!r} has no attribute {name!r}" )
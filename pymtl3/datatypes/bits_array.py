@@ -0,0 +1,250 @@
+"""
+========================================================================
+bits_array.py
+========================================================================
+A fixed-length array of fixed-bitwidth values stored in a contiguous
+NumPy array. Each entry takes one uint64 lane if nbits <= 64, or
+ceil(nbits/64) little-endian uint64 lanes otherwise.
+
+Indexing a BitsArray returns a BitsN "view" of the entry. A view behaves
+exactly like a BitsN value for reading and arithmetic, while writes done
+through the view (<<= and bit-slice assignment) go back to the array.
+This is what allows lock_in_simulation to replace a list of signals with
+a BitsArray without changing the update blocks that access it.
+
+NumPy is an optional dependency. It is only imported when a BitsArray is
+created.
+"""
+from .bits_import import mk_bits
+
+_np = None
+
+def _import_numpy():
+  global _np
+  if _np is None:
+    try:
+      import numpy
+    except ImportError:
+      raise ImportError( "BitsArray requires NumPy. Please install numpy "
+                         "or keep the list of BitsN instead." )
+    _np = numpy
+  return _np
+
+#-------------------------------------------------------------------------
+# Element views
+#-------------------------------------------------------------------------
+# One view class is created per bitwidth on demand. A view is a snapshot
+# of the entry at the time it is read; writing through the view updates
+# both the view and the array.
+
+_view_types = {}
+
+def _mk_view_type( nbits ):
+  try:
+    return _view_types[ nbits ]
+  except KeyError:
+    pass
+
+  BitsN = mk_bits( nbits )
+
+  def __ilshift__( self, x ):
+    try:
+      assert x.nbits == self.nbits, f"Bitwidth mismatch during <<=, assigning Bits{self.nbits} <<= Bits{x.nbits}"
+    except AttributeError:
+      raise TypeError(f"Assign {type(x)} to Bits")
+    self._array._stage( self._index, int(x) )
+    return self
+
+  def _flip( self ):
+    self._array._flip()
+
+  def __setitem__( self, idx, v ):
+    BitsN.__setitem__( self, idx, v )
+    self._array._set( self._index, int(self) )
+
+  def __reduce__( self ):
+    return ( BitsN, ( int(self), ) )
+
+  cls = _view_types[ nbits ] = type( f"Bits{nbits}View", ( BitsN, ), {
+    '__slots__'  : ( '_array', '_index' ),
+    '__ilshift__': __ilshift__,
+    '_flip'      : _flip,
+    '__setitem__': __setitem__,
+    '__reduce__' : __reduce__,
+  })
+  return cls
+
+#-------------------------------------------------------------------------
+# BitsArray
+#-------------------------------------------------------------------------
+
+class BitsArray:
+
+  def __init__( s, nbits, length, value=0 ):
+    np = _import_numpy()
+
+    assert nbits > 0 and length >= 0
+    s.nbits  = nbits
+    s.length = length
+    s.nwords = (nbits + 63) >> 6
+    s._mask  = (1 << nbits) - 1
+
+    shape = (length,) if s.nwords == 1 else (length, s.nwords)
+    s._data = np.zeros( shape, dtype='<u8' )
+
+    # Values written by <<= are staged in _next and committed by _flip
+    s._next         = np.zeros( shape, dtype='<u8' )
+    s._pending      = np.zeros( (length,) if s.nwords == 1 else (length, 1), dtype=bool )
+    s._has_pending  = False
+
+    s._view_type = _mk_view_type( nbits )
+
+    if value:
+      s.fill( value )
+
+  # Word conversion
+
+  def _to_words( s, value ):
+    return _np.frombuffer( value.to_bytes( s.nwords << 3, 'little' ), dtype='<u8' )
+
+  def _get( s, i ):
+    if s.nwords == 1:
+      return int( s._data[i] )
+    return int.from_bytes( s._data[i].tobytes(), 'little' )
+
+  def _set( s, i, value ):
+    if s.nwords == 1:
+      s._data[i] = value & s._mask
+    else:
+      s._data[i] = s._to_words( value & s._mask )
+
+  def _stage( s, i, value ):
+    if s.nwords == 1:
+      s._next[i] = value & s._mask
+    else:
+      s._next[i] = s._to_words( value & s._mask )
+    s._pending[i] = True
+    s._has_pending = True
+
+  def _flip( s ):
+    if s._has_pending:
+      _np.copyto( s._data, s._next, where=s._pending )
+      s._pending.fill( False )
+      s._has_pending = False
+
+  def _normalize_index( s, i ):
+    i = int(i)
+    if i < 0:
+      i += s.length
+    if not 0 <= i < s.length:
+      raise IndexError( f"BitsArray index {i} out of range [0, {s.length})" )
+    return i
+
+  # Element access
+
+  def __len__( s ):
+    return s.length
+
+  def __getitem__( s, idx ):
+    if isinstance( idx, slice ):
+      return [ s[i] for i in range( *idx.indices( s.length ) ) ]
+
+    i = s._normalize_index( idx )
+    ret = s._view_type( s._get( i ) )
+    ret._array = s
+    ret._index = i
+    return ret
+
+  def __setitem__( s, idx, v ):
+    if isinstance( idx, slice ):
+      indices = range( *idx.indices( s.length ) )
+      assert len(indices) == len(v), "BitsArray slice assignment cannot change the length"
+      for i, x in zip( indices, v ):
+        s[i] = x
+      return
+
+    i = s._normalize_index( idx )
+
+    # x[i] <<= y evaluates to x.__setitem__( i, x[i] ) after the view has
+    # staged the value, so writing the view back must be a no-op.
+    if v.__class__ is s._view_type and v._array is s and v._index == i:
+      return
+    s._set( i, int(v) )
+
+  def __iter__( s ):
+    for i in range( s.length ):
+      yield s[i]
+
+  # Vectorized bulk operations
+
+  def fill( s, value ):
+    value = int(value) & s._mask
+    if s.nwords == 1:
+      s._data.fill( value )
+    else:
+      s._data[:] = s._to_words( value )
+
+  def reset( s ):
+    s._data.fill( 0 )
+    s._pending.fill( False )
+    s._has_pending = False
+
+  def load( s, values, start=0 ):
+    np = _np
+    if isinstance( values, np.ndarray ) and s.nwords == 1:
+      n = len(values)
+      assert start + n <= s.length, "BitsArray.load out of range"
+      s._data[ start:start+n ] = values.astype( '<u8' ) & np.uint64( s._mask )
+      return
+
+    values = list( values )
+    n = len(values)
+    assert start + n <= s.length, "BitsArray.load out of range"
+    mask = s._mask
+    if s.nwords == 1:
+      s._data[ start:start+n ] = [ int(v) & mask for v in values ]
+    else:
+      nbytes = s.nwords << 3
+      buf = b''.join( (int(v) & mask).to_bytes( nbytes, 'little' ) for v in values )
+      s._data[ start:start+n ] = np.frombuffer( buf, dtype='<u8' ).reshape( n, s.nwords )
+
+  def tolist( s ):
+    if s.nwords == 1:
+      return s._data.tolist()
+    return [ int.from_bytes( row.tobytes(), 'little' ) for row in s._data ]
+
+  def snapshot( s ):
+    return s._data.copy()
+
+  def changed( s, snapshot ):
+    diff = s._data != snapshot
+    if s.nwords > 1:
+      diff = diff.any( axis=1 )
+    return _np.flatnonzero( diff ).tolist()
+
+  def as_numpy( s ):
+    return s._data
+
+  def clone( s ):
+    ret = BitsArray( s.nbits, s.length )
+    ret._data[:] = s._data
+    return ret
+
+  def __deepcopy__( s, memo ):
+    return s.clone()
+
+  def __eq__( s, other ):
+    if isinstance( other, BitsArray ):
+      return s.nbits == other.nbits and s.length == other.length and \
+             bool( (s._data == other._data).all() )
+    try:
+      return s.tolist() == [ int(x) for x in other ]
+    except TypeError:
+      return False
+
+  __hash__ = None
+
+  def __repr__( s ):
+    width = ((s.nbits-1)>>2)+1
+    return "BitsArray{}[{}]({})".format( s.nbits, s.length,
+            ", ".join( "0x" + "{:x}".format(x).zfill(width) for x in s.tolist() ) )
@@ -4,65 +4,98 @@ bits_import.py
 ========================================================================
 Import RPython Bits from PyPy mamba module if the environment variable
 that forces the use of Python Bits is set, and there is actually an
-importable Bits in mamba module. Otherwise import the Pure-Python
-implementation in Bits.py. Then generate a bunch of fixed-width BitsN
-types for PyMTL use.
+importable Bits in mamba module. Otherwise import the C-extension
+implementation in CBits.c if it has been compiled, and fall back to the
+Pure-Python implementation in PythonBits.py.
+
+Fixed-width BitsN types are created on demand by mk_bits, which is the
+only place that creates them. Accessing BitsN or bN as an attribute of
+this module goes through the module-level __getattr__ and hence mk_bits.
 
 Author : Shunning Jiang
 Date   : Aug 23, 2018
 """
 import os
 
-from pymtl3.utils import custom_exec
+# Each backend provides a factory that creates the BitsN class. BitsN
+# only takes the value as constructor argument.
+
+def _mk_python_bits_type( nbits ):
+  def __init__( s, value=0 ):
+    Bits.__init__( s, nbits, value )
+  return type( f"Bits{nbits}", (Bits,), {
+    'nbits': nbits, '__init__': __init__, '__module__': __name__,
+  })
+
+def _mk_mamba_bits_type( nbits ):
+  def __new__( cls, value=0 ):
+    return Bits.__new__( cls, nbits, value )
+  return type( f"Bits{nbits}", (Bits,), {
+    'nbits': nbits, '__new__': __new__, '__module__': __name__,
+  })
 
-# This __new__ approach has better performance
-# bits_template = """
-# class Bits{nbits}:
-  # nbits = {nbits}
-  # def __new__( cls, value = 0 ):
-    # return Bits( {nbits}, value )
+# CBits constructs a subclass that has an integer nbits class attribute
+# from the value alone, so no Python-level __new__ is needed.
+
+def _mk_c_bits_type( nbits ):
+  return type( f"Bits{nbits}", (Bits,), {
+    'nbits': nbits, '__slots__': (), '__module__': __name__,
+  })
 
 if os.getenv("PYMTL_BITS") == "1":
   from .PythonBits import Bits
   # print "[env: PYMTL_BITS=1] Use Python Bits"
-  bits_template = """
-class Bits{0}(Bits):
-  nbits = {0}
-  def __init__( s, value=0 ):
-    return super().__init__( {0}, value )
-_bits_types[{0}] = b{0} = Bits{0}
-"""
+  _mk_bits_type = _mk_python_bits_type
 else:
   try:
     from mamba import Bits
     # print "[default w/  Mamba] Use Mamba Bits"
-    bits_template = """
-class Bits{0}(Bits):
-  nbits = {0}
-  def __new__( cls, value=0 ):
-    return Bits.__new__( cls, {0}, value )
-_bits_types[{0}] = b{0} = Bits{0}
-"""
+    _mk_bits_type = _mk_mamba_bits_type
   except ImportError:
-    from .PythonBits import Bits
-    # print "[default w/o Mamba] Use Python Bits"
-    bits_template = """
-class Bits{0}(Bits):
-  nbits = {0}
-  def __init__( s, value=0 ):
-    return super().__init__( {0}, value )
-_bits_types[{0}] = b{0} = Bits{0}
-"""
+    try:
+      from .CBits import Bits
+      # print "[default w/o Mamba] Use C Bits"
+      _mk_bits_type = _mk_c_bits_type
+    except ImportError:
+      from .PythonBits import Bits
+      # print "[default w/o Mamba] Use Python Bits"
+      _mk_bits_type = _mk_python_bits_type
 
+# The bitwidths that pymtl3 exports as BitsN/bN in __all__
 _bitwidths  = list(range(1, 256)) + [ 384, 512 ]
 _bits_types = dict()
 
-custom_exec(compile( "".join([ bits_template.format(nbits) for nbits in _bitwidths ]),
-                     filename="bits_import.py", mode="exec"), globals(), locals() )
+# PythonBits creates arithmetic results of the cached BitsN types
+if _mk_bits_type is _mk_python_bits_type:
+  from . import PythonBits
+  PythonBits._bits_types = _bits_types
+
+# Star-importing this module creates all the exported BitsN types. Use
+# explicit imports or mk_bits to only create what is needed.
+__all__ = [ 'Bits', 'mk_bits' ] + [ f"Bits{x}" for x in _bitwidths ] \
+                                + [ f"b{x}" for x in _bitwidths ]
 
 def mk_bits( nbits ):
   # assert nbits < 512, "We don't allow bitwidth to exceed 512."
-  if nbits not in _bits_types:
-    custom_exec(compile( bits_template.format(nbits), filename=f"Bits{nbits}", mode="exec" ),
-                globals(), locals() )
-  return _bits_types[nbits]
+  try:
+    return _bits_types[ nbits ]
+  except KeyError:
+    pass
+
+  cls = _bits_types[ nbits ] = _mk_bits_type( nbits )
+  globals()[ f"Bits{nbits}" ] = globals()[ f"b{nbits}" ] = cls
+  return cls
+
+def _parse_bits_name( name ):
+  if   name[:4] == "Bits": digits = name[4:]
+  elif name[:1] == "b":    digits = name[1:]
+  else:                    return 0
+  if not digits.isdigit() or digits[0] == "0":
+    return 0
+  return int( digits )
+
+def __getattr__( name ):
+  nbits = _parse_bits_name( name )
+  if nbits:
+    return mk_bits( nbits )
+  raise AttributeError( f"module {__name__!r} has no attribute {name!r}" )
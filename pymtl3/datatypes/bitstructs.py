@@ -45,6 +45,14 @@ class Pixel:
   def __str__( self ):
     return f'({self.r},{self.g},{self.b})'
 
+With @bitstruct(packed=True) (or mk_bitstruct(..., packed=True)) the
+struct is stored as a single packed integer and each field becomes a
+property that extracts/inserts its bits. The first field occupies the
+most significant bits, the same layout as to_bits. Packed bit structs
+only support BitsN fields. A field read returns a view of the field
+bits: x.f[0:4] = v writes through to the struct, while x.f <<= v raises
+TypeError since only the whole struct can be <<='ed (x <<= y).
+
 Author : Yanghui Ou, Shunning Jiang
   Date : Oct 19, 2019
 """
@@ -56,7 +64,7 @@ import py
 
 from pymtl3.utils import custom_exec
 
-from .bits_import import *
+from .bits_import import Bits
 
 #-------------------------------------------------------------------------
 # Constants
@@ -72,6 +80,18 @@ from .bits_import import *
 
 _FIELDS = '__bitstruct_fields__'
 
+# Packed bit structs additionally carry their total bitwidth in this
+# attribute.
+
+_PACKED = '__bitstruct_packed__'
+
+# Every bit struct class also stores its total bitwidth and the layout of
+# the top-level fields (name -> (lsb offset, nbits)) in to_bits order.
+# Both are computed once at decoration time.
+
+_NBITS  = '__bitstruct_nbits__'
+_LAYOUT = '__bitstruct_layout__'
+
 def is_bitstruct_inst( obj ):
   """Returns True if obj is an instance of a dataclass."""
   return hasattr(type(obj), _FIELDS)
@@ -341,6 +361,179 @@ def _mk_deepcopy_fn( fields ):
     clone_strs + [ ')' ],
   )
 #-------------------------------------------------------------------------
+# _get_layout
+#-------------------------------------------------------------------------
+# Computes the bitwidth of every field and its offset in the concatenated
+# bits. The first field occupies the most significant bits.
+
+def _get_field_nbits( type_ ):
+  if isinstance( type_, list ):
+    return len( type_ ) * _get_field_nbits( type_[0] )
+  if issubclass( type_, Bits ):
+    return type_.nbits
+  return getattr( type_, _NBITS )
+
+def _get_layout( fields ):
+  layout = {}
+  offset = 0
+  for name, type_ in reversed( list( fields.items() ) ):
+    nbits = _get_field_nbits( type_ )
+    layout[ name ] = ( offset, nbits )
+    offset += nbits
+  return { name: layout[ name ] for name in fields }, offset
+
+#-------------------------------------------------------------------------
+# _mk_to_bits_value_fn
+#-------------------------------------------------------------------------
+# Creates a function that returns the concatenated bits of all fields as
+# an integer, which is used by to_bits. For example, if fields contains
+# x (Bits4), y ([Bits8, Bits8]), and z (a bit struct), it looks like:
+#
+# def _to_bits_value( self ):
+#   return (int(self.x) << 20) | (int(self.y[0]) << 12) | \
+#          (int(self.y[1]) << 4) | self.z._to_bits_value()
+
+def _gen_to_bits_terms( type_, prefix, offset, terms ):
+  if isinstance( type_, list ):
+    elem_nbits = _get_field_nbits( type_[0] )
+    n = len( type_ )
+    for i in range( n ):
+      _gen_to_bits_terms( type_[0], f"{prefix}[{i}]",
+                          offset + (n - 1 - i) * elem_nbits, terms )
+    return
+
+  value = f"int({prefix})" if issubclass( type_, Bits ) else \
+          f"{prefix}._to_bits_value()"
+  terms.append( f"({value} << {offset})" if offset else value )
+
+def _mk_to_bits_value_fn( fields, layout ):
+  terms = []
+  for name, type_ in fields.items():
+    _gen_to_bits_terms( type_, f'self.{name}', layout[ name ][0], terms )
+
+  return _create_fn(
+    '_to_bits_value',
+    [ 'self' ],
+    [ f'return {" | ".join( terms )}' ],
+  )
+
+#-------------------------------------------------------------------------
+# Packed bit struct
+#-------------------------------------------------------------------------
+# A packed bit struct keeps all fields in self._value. For example, if
+# fields contains two field x (Bits4) and y (Bits8), the generated
+# functions look like the following:
+#
+# def __init__( s, x = 0, y = 0 ):
+#   s._value = ((int(x) & 0xf) << 8) | (int(y) & 0xff)
+#
+# def _get_x( self ):
+#   ret = _view_x( (self._value >> 8) & 0xf )
+#   ret._parent = self
+#   return ret
+#
+# def _set_x( self, v ):
+#   self._value = (self._value & 0xff) | ((int(v) & 0xf) << 8)
+#
+# _view_x is a subclass of the field type whose __setitem__ writes the
+# field back to its parent. __eq__, __hash__, clone, __ilshift__ and
+# _flip only touch self._value.
+
+def _check_packed_fields( cls, fields ):
+  for name, type_ in fields.items():
+    if isinstance( type_, list ) or not issubclass( type_, Bits ):
+      raise TypeError( "Packed BitStruct only supports BitsN fields:\n"
+                      f"- Field '{name}' of BitStruct {cls.__name__} is annotated as {type_}." )
+
+def _mk_packed_init_fn( self_name, layout ):
+  args = [ self_name ] + [ f'{name} = 0' for name in layout ]
+  terms = [ f'((int({name}) & {(1 << nbits) - 1:#x}) << {offset})'
+            for name, (offset, nbits) in layout.items() ]
+  return _create_fn(
+    '__init__',
+    args,
+    [ f'{self_name}._value = {" | ".join( terms )}' ],
+  )
+
+def _mk_packed_field_view( cls, name, type_, offset ):
+  _setitem = type_.__setitem__
+
+  # Only the written bits go to the parent
+  def __setitem__( self, idx, v ):
+    _setitem( self, idx, v )
+    if isinstance( idx, slice ):
+      start, stop = int(idx.start), int(idx.stop)
+    else:
+      start = int(idx)
+      stop  = start + 1
+    mask = ((1 << (stop - start)) - 1) << (start + offset)
+    p = self._parent
+    p._value = (p._value & ~mask) | ((int(self) << offset) & mask)
+
+  def __ilshift__( self, o ):
+    raise TypeError( f"Cannot <<= field '{name}' of packed BitStruct {cls.__name__}, "
+                      "please <<= the whole struct instead." )
+
+  return type( type_.__name__, (type_,), {
+    '__slots__': ( '_parent', ), '__module__': type_.__module__,
+    '__setitem__': __setitem__, '__ilshift__': __ilshift__,
+  } )
+
+def _mk_packed_field_property( cls, name, type_, offset, total ):
+  nbits = type_.nbits
+  mask  = (1 << nbits) - 1
+  keep  = ((1 << total) - 1) ^ (mask << offset)
+
+  getter = _create_fn(
+    f'_get_{name}',
+    [ 'self' ],
+    [ f'ret = _view( (self._value >> {offset}) & {mask:#x} )',
+       'ret._parent = self',
+       'return ret' ],
+    _globals = { '_view': _mk_packed_field_view( cls, name, type_, offset ) },
+  )
+  setter = _create_fn(
+    f'_set_{name}',
+    [ 'self', 'v' ],
+    [ f'self._value = (self._value & {keep:#x}) | ((int(v) & {mask:#x}) << {offset})' ],
+  )
+  return property( getter, setter )
+
+def _mk_packed_fns( cls ):
+  _new = object.__new__
+
+  def __eq__( self, other ):
+    return other.__class__ is self.__class__ and self._value == other._value
+
+  def __hash__( self ):
+    return hash( (self.__class__.__name__, self._value) )
+
+  def clone( self ):
+    ret = _new( cls )
+    ret._value = self._value
+    return ret
+
+  def __deepcopy__( self, memo ):
+    ret = _new( cls )
+    ret._value = self._value
+    return ret
+
+  def __ilshift__( self, o ):
+    if o.__class__ is not cls:
+      raise TypeError( f"Cannot <<= {o!r} of type {o.__class__.__name__} to "
+                       f"packed BitStruct {cls.__name__}" )
+    self._next = o._value
+    return self
+
+  def _flip( self ):
+    self._value = self._next
+
+  def _to_bits_value( self ):
+    return self._value
+
+  return __eq__, __hash__, clone, __deepcopy__, __ilshift__, _flip, _to_bits_value
+
+#-------------------------------------------------------------------------
 # _check_valid_array
 #-------------------------------------------------------------------------
 
@@ -412,7 +605,7 @@ def _get_self_name( fields ):
 _bitstruct_hash_cache = {}
 
 def _process_class( cls, add_init=True, add_str=True, add_repr=True,
-                    add_hash=True ):
+                    add_hash=True, packed=False ):
 
   # Get annotations of the class
   cls_annotations = cls.__dict__.get('__annotations__', {})
@@ -436,17 +629,31 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
     hashable_fields[ a_name ] = _convert_list_to_tuple( a_type )
 
   cls._hash = _hash = hash( (cls.__name__, *tuple(hashable_fields.items()),
-                             add_init, add_str, add_repr, add_hash) )
+                             add_init, add_str, add_repr, add_hash, packed) )
 
   if _hash in _bitstruct_hash_cache:
     return _bitstruct_hash_cache[ _hash ]
 
   _bitstruct_hash_cache[ _hash ] = cls
 
+  if packed:
+    _check_packed_fields( cls, fields )
+
   # Stamp the special attribute so that translation pass can identify it
   # as bit struct.
   setattr( cls, _FIELDS, fields )
 
+  # Precompute the bitwidth and layout used by get_nbits/to_bits
+  layout, total_nbits = _get_layout( fields )
+  setattr( cls, _LAYOUT, layout )
+  setattr( cls, _NBITS, total_nbits )
+
+  assert not '_to_bits_value' in cls.__dict__
+
+  if packed:
+    return _process_packed_class( cls, fields, layout, total_nbits,
+                                  add_init, add_str, add_repr, add_hash )
+
   # Add methods to the class
 
   # Create __init__. Here I follow the dataclass convention that we only
@@ -497,6 +704,8 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
 
   cls.__deepcopy__ = _mk_deepcopy_fn( fields )
 
+  cls._to_bits_value = _mk_to_bits_value_fn( fields, layout )
+
   assert not 'get_field_type' in cls.__dict__
 
   def get_field_type( cls, name ):
@@ -506,7 +715,66 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
 
   cls.get_field_type = classmethod(get_field_type)
 
-  # TODO: maybe add a to_bits and from bits function.
+  return cls
+
+#-------------------------------------------------------------------------
+# _process_packed_class
+#-------------------------------------------------------------------------
+# Add methods and field properties of a packed bit struct to cls.
+
+def _process_packed_class( cls, fields, layout, total_nbits, add_init,
+                           add_str, add_repr, add_hash ):
+
+  setattr( cls, _PACKED, total_nbits )
+
+  # Default storage for user-defined __init__ that only sets fields
+  cls._value = 0
+
+  if add_init:
+    if not '__init__' in cls.__dict__:
+      cls.__init__ = _mk_packed_init_fn( _get_self_name(fields), layout )
+
+  for name, (offset, nbits) in layout.items():
+    setattr( cls, name, _mk_packed_field_property( cls, name, fields[ name ], offset, total_nbits ) )
+
+  if add_str:
+    if not '__str__' in cls.__dict__:
+      cls.__str__ = _mk_str_fn( fields )
+
+  if add_repr:
+    if not '__repr__' in cls.__dict__:
+      cls.__repr__ = _mk_repr_fn( fields )
+
+  __eq__, __hash__, clone, __deepcopy__, __ilshift__, _flip, _to_bits_value = _mk_packed_fns( cls )
+
+  if not '__eq__' in cls.__dict__:
+    cls.__eq__ = __eq__
+  else:
+    w_msg = ( f'Overwriting {cls.__qualname__}\'s __eq__ may cause the '
+              'translated verilog behaves differently from PyMTL '
+              'simulation.')
+    warnings.warn( w_msg )
+
+  if add_hash:
+    if not '__hash__' in cls.__dict__:
+      cls.__hash__ = __hash__
+
+  assert not '__ilshift__' in cls.__dict__ and not '_flip' in cls.__dict__
+  cls.__ilshift__, cls._flip = __ilshift__, _flip
+
+  assert not 'clone' in cls.__dict__ and not '__deepcopy__' in cls.__dict__
+  cls.clone, cls.__deepcopy__ = clone, __deepcopy__
+
+  cls._to_bits_value = _to_bits_value
+
+  assert not 'get_field_type' in cls.__dict__
+
+  def get_field_type( cls, name ):
+    if name in cls.__bitstruct_fields__:
+      return cls.__bitstruct_fields__[ name ]
+    raise AttributeError( f"{cls} has no field '{name}'" )
+
+  cls.get_field_type = classmethod(get_field_type)
 
   return cls
 
@@ -516,10 +784,11 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
 # The actual class decorator. We add a * in the argument list so that the
 # following argument can only be used as keyword arguments.
 
-def bitstruct( _cls=None, *, add_init=True, add_str=True, add_repr=True, add_hash=True ):
+def bitstruct( _cls=None, *, add_init=True, add_str=True, add_repr=True,
+               add_hash=True, packed=False ):
 
   def wrap( cls ):
-    return _process_class( cls, add_init, add_str, add_repr )
+    return _process_class( cls, add_init, add_str, add_repr, packed=packed )
 
   # Called as @bitstruct(...)
   if _cls is None:
@@ -535,7 +804,7 @@ def bitstruct( _cls=None, *, add_init=True, add_str=True, add_repr=True, add_has
 # TODO: should we add base parameters to support inheritence?
 
 def mk_bitstruct( cls_name, fields, *, namespace=None, add_init=True,
-                   add_str=True, add_repr=True, add_hash=True ):
+                   add_str=True, add_repr=True, add_hash=True, packed=False ):
 
   # copy namespace since  will mutate it
   namespace = {} if namespace is None else namespace.copy()
@@ -554,4 +823,4 @@ def mk_bitstruct( cls_name, fields, *, namespace=None, add_init=True,
   namespace['__annotations__'] = annos
   cls = types.new_class( cls_name, (), {}, lambda ns: ns.update( namespace ) )
   return bitstruct( cls, add_init=add_init, add_str=add_str,
-                    add_repr=add_repr, add_hash=add_hash )
+                    add_repr=add_repr, add_hash=add_hash, packed=packed )
@@ -12,21 +12,30 @@ import functools
 import math
 import operator
 
-from .bits_import import *
+from .bits_import import Bits, b1
 from .bitstructs import is_bitstruct_class, is_bitstruct_inst
 
+# concat and reduce_xor run inside update blocks of translated datapaths.
+# They stay in the integer domain and only create the result Bits object.
+
+try:
+  _popcount = int.bit_count
+except AttributeError: # Python < 3.10
+  def _popcount( value ):
+    return bin( value ).count( "1" )
+
 try:
   from mamba import concat
 except:
   def concat( *args ):
-    end = sum( x.nbits for x in args )
-    concat_bits = Bits( end, 0 )
+    nbits = 0
+    value = 0
     for x in args:
       x_nbits = x.nbits
-      concat_bits[ end - x_nbits : end ] = x
-      end -= x_nbits
+      value = (value << x_nbits) | int(x)
+      nbits += x_nbits
 
-    return concat_bits
+    return Bits( nbits, value )
 
 def zext( value, new_width ):
   assert new_width > value.nbits
@@ -54,26 +63,32 @@ def reduce_or( value ):
 
 def reduce_xor( value ):
   try:
-    pop_count = 0
-    value = int(value)
-    while value != 0:
-      pop_count += value & 1
-      value >>= 1
-    return b1( pop_count & 1 )
-
+    return b1( _popcount( int(value) ) & 1 )
   except AttributeError:
     raise TypeError("Cannot call reduce_xor on int")
 
+# Bitwidths of Bits and BitStruct types. Lists of types are not
+# hashable and are summed up on every call.
+_nbits_cache = {}
+
 def get_nbits( Type ):
-  if isinstance( Type, list ):
+  try:
+    return _nbits_cache[ Type ]
+  except KeyError:
+    pass
+  except TypeError:
+    assert isinstance( Type, list ), f"{Type} is not a valid PyMTL data type!"
     return sum(get_nbits(v) for v in Type )
 
   assert isinstance( Type, type )
   if issubclass( Type, Bits ):
-    return Type.nbits
+    nbits = Type.nbits
+  else:
+    assert is_bitstruct_class( Type ), f"{Type} is not a valid PyMTL data type!"
+    nbits = Type.__bitstruct_nbits__
 
-  assert is_bitstruct_class( Type ), f"{Type} is not a valid PyMTL data type!"
-  return sum(get_nbits(v) for v in Type.__bitstruct_fields__.values())
+  _nbits_cache[ Type ] = nbits
+  return nbits
 
 def to_bits( obj ):
   if isinstance( obj, list ):
@@ -86,7 +101,7 @@ def to_bits( obj ):
   assert not isinstance( obj, int ), f"{obj} is an integer, not Bits or Bitstruct."
   # BitStruct
   assert is_bitstruct_inst( obj ), f"{obj} is not a valid PyMTL Bitstruct!"
-  return concat( *[ to_bits(getattr(obj, v)) for v in obj.__bitstruct_fields__.keys() ] )
+  return Bits( obj.__bitstruct_nbits__, obj._to_bits_value() )
 
 def get_bitstruct_inst_all_classes( obj ):
   # list: put all types together
@@ -0,0 +1,366 @@
+"""
+========================================================================
+shared_store.py
+========================================================================
+A SharedSignalStore keeps the values of BitsN signals at fixed offsets in
+one multiprocessing.shared_memory block, so that other processes (e.g. a
+waveform viewer, a coverage collector or a C model) can sample the state
+of a simulation without going through the Python objects.
+
+The block starts with a 64-byte header, followed by the layout as JSON
+and the values. Each value takes ceil(nbits/64) little-endian uint64
+lanes starting at a lane index given by the layout:
+
+  offset  0: magic b"PYMTLSS1"
+  offset  8: sequence number, odd while the simulator is in a cycle
+  offset 16: number of simulated cycles
+  offset 24: byte offset of the layout
+  offset 32: byte length of the layout
+  offset 40: byte offset of the values
+  offset 48: number of uint64 lanes of the values
+
+The layout is {"signals": [[name, nbits, lane], ...]}. Readers use the
+sequence number as a seqlock: a copy of the values is consistent if the
+sequence number was even and did not change while copying.
+
+lock_in_simulation( shared_memory=True ) backs the signals with a store.
+Reading a signal returns a BitsN "view" like the elements of a BitsArray:
+it behaves like a BitsN value, and writes through the view (<<= and
+bit-slice assignment) go back to the store. Assigning a signal attribute
+writes the store directly.
+"""
+import json
+import struct
+import time
+import weakref
+from multiprocessing import shared_memory
+
+from .bits_import import mk_bits
+
+_MAGIC  = b"PYMTLSS1"
+_HEADER = struct.Struct( "<8sQQQQQQ" )
+_SEQ    = struct.Struct( "<Q" )
+
+_HEADER_SIZE = 64
+
+#-------------------------------------------------------------------------
+# Element views
+#-------------------------------------------------------------------------
+# One view class is created per bitwidth on demand. A view is a snapshot
+# of the value at the time it is read; writing through the view updates
+# both the view and the store. Values written by <<= are staged in the
+# store and committed by _flip.
+
+_view_types = {}
+
+def _mk_view_type( nbits ):
+  try:
+    return _view_types[ nbits ]
+  except KeyError:
+    pass
+
+  BitsN = mk_bits( nbits )
+
+  def __ilshift__( self, x ):
+    try:
+      assert x.nbits == self.nbits, f"Bitwidth mismatch during <<=, assigning Bits{self.nbits} <<= Bits{x.nbits}"
+    except AttributeError:
+      raise TypeError(f"Assign {type(x)} to Bits")
+    self._store._pending[ self._index ] = int(x)
+    return self
+
+  def _flip( self ):
+    self._store._flip( self._index )
+
+  def __setitem__( self, idx, v ):
+    BitsN.__setitem__( self, idx, v )
+    self._store._set( self._index, int(self) )
+
+  def __reduce__( self ):
+    return ( BitsN, ( int(self), ) )
+
+  cls = _view_types[ nbits ] = type( f"Bits{nbits}SharedView", ( BitsN, ), {
+    '__slots__'  : ( '_store', '_index' ),
+    '__ilshift__': __ilshift__,
+    '_flip'      : _flip,
+    '__setitem__': __setitem__,
+    '__reduce__' : __reduce__,
+  })
+  return cls
+
+def _detach( value ):
+  # Turn views into plain BitsN, e.g. before the store is released
+  if type(value) in _view_types.values():
+    return mk_bits( value.nbits )( int(value) )
+  if isinstance( value, SharedBitsList ):
+    return [ _detach( x ) for x in value ]
+  return value
+
+# Names of the blocks created by this process. The resource tracker only
+# knows about a block once, so attaching to one of them in the same process
+# must not unregister it.
+_owned_names = set()
+
+def _release( shm, views, owner ):
+  for x in views:
+    x.release()
+  shm.close()
+  if owner:
+    _owned_names.discard( shm._name )
+    try:
+      shm.unlink()
+    except FileNotFoundError:
+      pass
+
+#-------------------------------------------------------------------------
+# SharedSignalStore
+#-------------------------------------------------------------------------
+
+class SharedSignalStore:
+
+  # signals is a list of (name, nbits). A new shared memory block is
+  # created, with the given name if there is one.
+
+  def __init__( s, signals, name=None ):
+    layout, lane = [], 0
+    for x, nbits in signals:
+      layout.append( [ x, nbits, lane ] )
+      lane += (nbits + 63) >> 6
+
+    layout_bytes = json.dumps( { "signals": layout } ).encode()
+    data_off = ( _HEADER_SIZE + len(layout_bytes) + 63 ) & ~63
+
+    shm = shared_memory.SharedMemory( name=name, create=True,
+                                      size=data_off + max( lane, 1 ) * 8 )
+    shm.buf[ _HEADER_SIZE:_HEADER_SIZE + len(layout_bytes) ] = layout_bytes
+    _HEADER.pack_into( shm.buf, 0, _MAGIC, 0, 0, _HEADER_SIZE, len(layout_bytes),
+                       data_off, lane )
+
+    _owned_names.add( shm._name )
+    s._setup( shm, layout, data_off, lane, owner=True )
+
+  @classmethod
+  def attach( cls, name ):
+    # Attach to the store of a simulation running in another process
+    shm = shared_memory.SharedMemory( name=name )
+    if shm._name not in _owned_names:
+      try:
+        # Only the creator unlinks the block
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister( shm._name, "shared_memory" )
+      except Exception:
+        pass
+
+    magic, _, _, layout_off, layout_len, data_off, nlanes = _HEADER.unpack_from( shm.buf, 0 )
+    if magic != _MAGIC:
+      shm.close()
+      raise ValueError( f"{name} is not a PyMTL signal store" )
+    layout = json.loads( bytes( shm.buf[ layout_off:layout_off + layout_len ] ) )[ "signals" ]
+
+    ret = cls.__new__( cls )
+    ret._setup( shm, layout, data_off, nlanes, owner=False )
+    return ret
+
+  def _setup( s, shm, layout, data_off, nlanes, owner ):
+    s._shm    = shm
+    s.name    = shm.name
+    s._owner  = owner
+    s._data   = shm.buf[ data_off:data_off + max( nlanes, 1 ) * 8 ]
+    s._words  = s._data.cast( 'Q' )
+
+    s.names   = [ x[0] for x in layout ]
+    s.index   = { x[0]: i for i, x in enumerate( layout ) }
+    s._nbits  = [ x[1] for x in layout ]
+    s._lanes  = [ x[2] for x in layout ]
+    s._masks  = [ (1 << x[1]) - 1 for x in layout ]
+
+    s._pending = {}
+    s._classes = []
+
+    # The memoryviews must be released before the block is closed, also
+    # when the store is garbage collected without close()
+    s._finalizer = weakref.finalize( s, _release, shm, [ s._words, s._data ], owner )
+
+  # Value access by signal index
+
+  def _get( s, i ):
+    lane, nbits = s._lanes[i], s._nbits[i]
+    if nbits <= 64:
+      return s._words[ lane ]
+    return int.from_bytes( s._data[ lane*8:(lane + ((nbits + 63) >> 6))*8 ], 'little' )
+
+  def _set( s, i, value ):
+    lane, nbits = s._lanes[i], s._nbits[i]
+    value = int(value) & s._masks[i]
+    if nbits <= 64:
+      s._words[ lane ] = value
+    else:
+      nbytes = ((nbits + 63) >> 6) << 3
+      s._data[ lane*8:lane*8 + nbytes ] = value.to_bytes( nbytes, 'little' )
+
+  def _flip( s, i ):
+    value = s._pending.pop( i, None )
+    if value is not None:
+      s._set( i, value )
+
+  def view( s, i ):
+    ret = _mk_view_type( s._nbits[i] )( s._get(i) )
+    ret._store = s
+    ret._index = i
+    return ret
+
+  # Seqlock
+
+  @property
+  def seq( s ):
+    return _SEQ.unpack_from( s._shm.buf, 8 )[0]
+
+  @property
+  def cycles( s ):
+    return _SEQ.unpack_from( s._shm.buf, 16 )[0]
+
+  def begin( s ):
+    _SEQ.pack_into( s._shm.buf, 8, s.seq | 1 )
+
+  def end( s, cycles ):
+    _SEQ.pack_into( s._shm.buf, 16, cycles )
+    _SEQ.pack_into( s._shm.buf, 8, (s.seq | 1) + 1 )
+
+  def _consistent( s, read, timeout ):
+    deadline = None
+    while True:
+      seq = s.seq
+      if not seq & 1:
+        ret = read()
+        if s.seq == seq:
+          return ret
+      if deadline is None:
+        deadline = time.monotonic() + timeout
+      elif time.monotonic() > deadline:
+        raise TimeoutError( f"{s.name} did not reach the end of a cycle in {timeout}s" )
+
+  def read( s, name, timeout=1.0 ):
+    i = s.index[ name ]
+    return s._consistent( lambda: s._get(i), timeout )
+
+  def snapshot( s, timeout=1.0 ):
+    def read():
+      words = bytes( s._data )
+      return { x: int.from_bytes( words[ lane*8:(lane + ((n + 63) >> 6))*8 ], 'little' )
+               for x, n, lane in zip( s.names, s._nbits, s._lanes ) }
+    return s._consistent( read, timeout )
+
+  # Release
+
+  def close( s ):
+    for obj, cls in reversed( s._classes ):
+      obj.__class__ = cls
+    s._classes = []
+    s._finalizer()
+
+  def __repr__( s ):
+    return f"SharedSignalStore({s.name!r}, {len(s.names)} signals)"
+
+#-------------------------------------------------------------------------
+# SharedBitsList
+#-------------------------------------------------------------------------
+# Replaces a list of BitsN signals.
+
+class SharedBitsList:
+
+  def __init__( s, store, indices ):
+    s._store   = store
+    s._indices = indices
+
+  def __len__( s ):
+    return len(s._indices)
+
+  def __getitem__( s, idx ):
+    if isinstance( idx, slice ):
+      return [ s._store.view(i) for i in s._indices[ idx ] ]
+    return s._store.view( s._indices[ int(idx) ] )
+
+  def __setitem__( s, idx, v ):
+    if isinstance( idx, slice ):
+      indices = s._indices[ idx ]
+      assert len(indices) == len(v), "SharedBitsList slice assignment cannot change the length"
+      for i, x in zip( indices, v ):
+        s._store._set( i, x )
+      return
+
+    i = s._indices[ int(idx) ]
+    # x[i] <<= y writes the view back, which must be a no-op
+    if getattr( v, '_store', None ) is s._store and v._index == i:
+      return
+    s._store._set( i, v )
+
+  def __iter__( s ):
+    for i in s._indices:
+      yield s._store.view(i)
+
+  def tolist( s ):
+    return [ s._store._get(i) for i in s._indices ]
+
+  def __repr__( s ):
+    return f"SharedBitsList({s.tolist()})"
+
+#-------------------------------------------------------------------------
+# lock_in_shared_store
+#-------------------------------------------------------------------------
+# attrs is a list of (obj, attr, signal) and lists is a list of
+# (container, key, [signals]) where the container is an object or a list.
+# Every object with signal attributes gets its own subclass whose
+# properties access the store.
+
+def _mk_property( store, i ):
+  View  = _mk_view_type( store._nbits[i] )
+  words = store._words
+  lane  = store._lanes[i]
+  mask  = store._masks[i]
+
+  if store._nbits[i] <= 64:
+    def fget( self ):
+      ret = View( words[ lane ] )
+      ret._store = store
+      ret._index = i
+      return ret
+
+    def fset( self, v ):
+      words[ lane ] = int(v) & mask
+
+  else:
+    def fget( self ):
+      return store.view( i )
+
+    def fset( self, v ):
+      store._set( i, v )
+
+  return property( fget, fset )
+
+def lock_in_shared_store( attrs, lists, name=None ):
+  signals = [ x for _, _, x in attrs ] + [ y for _, _, x in lists for y in x ]
+  store   = SharedSignalStore( [ ( repr(x), x._dsl.Type.nbits ) for x in signals ], name )
+
+  obj_props = {}
+  for i, (obj, attr, _) in enumerate( attrs ):
+    if id(obj) not in obj_props:
+      obj_props[ id(obj) ] = ( obj, {} )
+    obj_props[ id(obj) ][1][ attr ] = _mk_property( store, i )
+
+  for obj, props in obj_props.values():
+    cls = obj.__class__
+    store._classes.append( (obj, cls) )
+    for attr in props:
+      obj.__dict__.pop( attr, None )
+    obj.__class__ = type( cls.__name__, (cls,), props )
+
+  i = len(attrs)
+  for container, key, x in lists:
+    value = SharedBitsList( store, list( range( i, i + len(x) ) ) )
+    i += len(x)
+    if isinstance( container, list ):
+      container[ key ] = value
+    else:
+      setattr( container, key, value )
+
+  return store
@@ -0,0 +1,161 @@
+"""
+==========================================================================
+CBits_test.py
+==========================================================================
+Compare the C-extension Bits against the pure-Python Bits.
+"""
+import copy
+import pickle
+
+import hypothesis
+import pytest
+from hypothesis import strategies as st
+
+from pymtl3.datatypes import PythonBits
+
+CBits = pytest.importorskip( "pymtl3.datatypes.CBits" )
+
+PyB = PythonBits.Bits
+CB  = CBits.Bits
+
+widths = st.sampled_from( [ 1, 3, 8, 31, 32, 63, 64, 65, 128, 300 ] )
+
+@st.composite
+def bits_pair( draw ):
+  nbits = draw( widths )
+  value = draw( st.integers( min_value=0, max_value=(1<<nbits)-1 ) )
+  return nbits, value
+
+def same( c, p ):
+  assert type(c) is CB and c.nbits == p.nbits and c.value == p.value
+
+@hypothesis.given( bits_pair(), bits_pair(), st.integers( -(1<<70), 1<<70 ) )
+@hypothesis.settings( max_examples=200 )
+def test_binary_ops( a, b, i ):
+  ca, pa = CB( *a ), PyB( *a )
+  cb, pb = CB( *b ), PyB( *b )
+
+  for op in [ '__add__', '__sub__', '__mul__', '__and__', '__or__', '__xor__' ]:
+    same( getattr(ca, op)( cb ), getattr(pa, op)( pb ) )
+    same( getattr(ca, op)( i ), getattr(pa, op)( i ) )
+
+  same( i + ca, i + pa )
+  same( i - ca, i - pa )
+  same( i * ca, i * pa )
+  same( i & ca, i & pa )
+  same( i | ca, i | pa )
+  same( i ^ ca, i ^ pa )
+
+  same( ~ca, ~pa )
+  if b[1]:
+    same( ca % cb, pa % pb )
+    # PythonBits divides through float, so only compare exact cases
+    if a[0] <= 32 and b[0] <= 32:
+      same( ca // cb, pa // pb )
+
+  for cmp in [ '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__' ]:
+    same( getattr(ca, cmp)( cb ), getattr(pa, cmp)( pb ) )
+    same( getattr(ca, cmp)( i ), getattr(pa, cmp)( i ) )
+
+@hypothesis.given( bits_pair(), st.integers( 0, 400 ) )
+def test_shifts( a, shamt ):
+  ca, pa = CB( *a ), PyB( *a )
+  same( ca << shamt, pa << shamt )
+  same( ca >> shamt, pa >> shamt )
+  same( ca << CB( 9, shamt ), pa << PyB( 9, shamt ) )
+
+@hypothesis.given( bits_pair(), st.data() )
+def test_slicing( a, data ):
+  nbits = a[0]
+  ca, pa = CB( *a ), PyB( *a )
+
+  start = data.draw( st.integers( 0, nbits-1 ) )
+  stop  = data.draw( st.integers( start+1, nbits ) )
+  v     = data.draw( st.integers( 0, (1<<70) ) )
+
+  same( ca[start:stop], pa[start:stop] )
+  same( ca[start], pa[start] )
+
+  ca[start:stop] = v
+  pa[start:stop] = v
+  same( ca, pa )
+
+  ca[start] = v
+  pa[start] = v
+  same( ca, pa )
+
+@hypothesis.given( bits_pair() )
+def test_conversion( a ):
+  ca, pa = CB( *a ), PyB( *a )
+  assert int(ca) == int(pa)
+  assert ca.int() == pa.int()
+  assert ca.uint() == pa.uint()
+  assert bool(ca) == bool(pa)
+  assert repr(ca) == repr(pa)
+  assert str(ca) == str(pa)
+  assert ca.bin() == pa.bin()
+  assert ca.oct() == pa.oct()
+  assert ca.hex() == pa.hex()
+  assert hash(ca) == hash(pa)
+  assert [ 0, 1, 2 ][ CB( 2, 1 ) ] == 1
+
+def test_constructor_masks():
+  assert CB( 4, 0x1f ).value == 0xf
+  assert CB( 4, -1 ).value == 0xf
+  assert CB( 100, -1 ).value == (1 << 100) - 1
+  assert CB( nbits=8, value=CB( 16, 0x1234 ) ).value == 0x34
+  assert CB().nbits == 32
+  with pytest.raises( ValueError ):
+    CB( -1 )
+
+def test_double_buffer():
+  x = CB( 8, 1 )
+  with pytest.raises( AttributeError ):
+    x._flip()
+  x <<= CB( 8, 42 )
+  assert x.value == 1
+  x._flip()
+  assert x.value == 42
+
+  with pytest.raises( AssertionError ):
+    x <<= CB( 9, 42 )
+  with pytest.raises( TypeError ):
+    x <<= 42
+
+def test_invalid_access():
+  x = CB( 8, 1 )
+  with pytest.raises( AssertionError ):
+    x[8]
+  with pytest.raises( AssertionError ):
+    x[4:2]
+  with pytest.raises( AssertionError ):
+    x[0:9]
+  assert (x == None) is False
+  assert (x != None) is True
+
+def test_subclass_and_copy():
+  class Bits8( CB ):
+    nbits = 8
+    def __new__( cls, value=0 ):
+      return CB.__new__( cls, 8, value )
+
+  x = Bits8( 0x1ff )
+  assert x.nbits == 8 and x.value == 0xff
+  assert Bits8.nbits == 8
+  assert type(x.clone()) is CB
+  assert copy.deepcopy( x ) == x
+  y = copy.copy( x )
+  assert type(y) is Bits8 and y == x
+  z = pickle.loads( pickle.dumps( CB( 70, 3 ) ) )
+  assert z.nbits == 70 and z.value == 3
+
+def test_subclass_nbits_attribute():
+  # This is how bits_import.mk_bits creates BitsN for the C backend
+  Bits8 = type( "Bits8", (CB,), { 'nbits': 8, '__slots__': () } )
+
+  assert Bits8( 0x1ff ).value == 0xff
+  assert Bits8().value == 0
+  assert Bits8( value=CB( 16, 0x1234 ) ).value == 0x34
+  assert Bits8( 0x1ff ).nbits == 8
+  assert type( Bits8( 1 ) ) is Bits8
+  assert copy.copy( Bits8( 3 ) ) == Bits8( 3 )
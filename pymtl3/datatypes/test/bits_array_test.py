@@ -0,0 +1,115 @@
+"""
+==========================================================================
+bits_array_test.py
+==========================================================================
+Test cases for the NumPy-backed BitsArray.
+"""
+import copy
+
+import pytest
+
+from pymtl3 import *
+from pymtl3.datatypes.bits_array import BitsArray
+
+pytest.importorskip( "numpy" )
+
+@pytest.mark.parametrize( "nbits", [ 1, 8, 32, 64, 65, 128, 200 ] )
+def test_get_set( nbits ):
+  BitsN = mk_bits( nbits )
+  mask  = (1 << nbits) - 1
+  a = BitsArray( nbits, 8 )
+
+  assert len(a) == 8
+  assert a.tolist() == [0] * 8
+
+  a[3] = BitsN( 0x1234567890abcdef1234567890abcdef & mask )
+  a[-1] = -1
+  x = a[3]
+  assert isinstance( x, BitsN )
+  assert x.nbits == nbits
+  assert x == BitsN( 0x1234567890abcdef1234567890abcdef & mask )
+  assert a[7] == BitsN( mask )
+  assert a.tolist() == [ 0, 0, 0, 0x1234567890abcdef1234567890abcdef & mask, 0, 0, 0, mask ]
+
+  # arithmetic on a view gives plain BitsN
+  y = x + BitsN(1)
+  assert y == BitsN( (int(x) + 1) & mask )
+  assert a[3] == x
+
+  with pytest.raises( IndexError ):
+    a[8]
+
+def test_view_writes():
+  a = BitsArray( 16, 4 )
+  a[1][0:8] = 0xab
+  a[1][15]  = 1
+  assert a[1] == Bits16( 0x80ab )
+
+  a[2] <<= Bits16( 0x1234 )
+  assert a[2] == Bits16( 0 )
+  a[0]._flip()
+  assert a[2] == Bits16( 0x1234 )
+
+  with pytest.raises( AssertionError ):
+    a[2] <<= Bits8( 1 )
+  with pytest.raises( TypeError ):
+    a[2] <<= 1
+
+@pytest.mark.parametrize( "nbits", [ 32, 100 ] )
+def test_bulk_ops( nbits ):
+  a = BitsArray( nbits, 16, value=7 )
+  assert a.tolist() == [7] * 16
+
+  snap = a.snapshot()
+  a.load( range(4), start=2 )
+  assert a.tolist()[:7] == [ 7, 7, 0, 1, 2, 3, 7 ]
+  assert a.changed( snap ) == [ 2, 3, 4, 5 ]
+
+  b = copy.deepcopy( a )
+  assert b == a and b is not a
+  b[0] = 1
+  assert b != a
+
+  a.reset()
+  assert a.tolist() == [0] * 16
+  assert [ int(x) for x in b ][:3] == [ 1, 7, 0 ]
+
+def test_load_numpy():
+  np = pytest.importorskip( "numpy" )
+  a = BitsArray( 8, 4 )
+  a.load( np.array( [ 1, 255, 256, 3 ] ) )
+  assert a.tolist() == [ 1, 255, 0, 3 ]
+
+#-------------------------------------------------------------------------
+# lock_in_simulation( bits_array=True )
+#-------------------------------------------------------------------------
+
+class PassThrough( Component ):
+
+  def construct( s, n=4 ):
+    s.in_ = [ InPort ( Bits32 ) for _ in range(n) ]
+    s.out = [ OutPort( Bits32 ) for _ in range(n) ]
+
+    for i in range(n):
+      s.out[i] //= s.in_[i]
+
+def test_lock_in_simulation_bits_array():
+  m = PassThrough()
+  m.elaborate()
+  m.apply( SimulationPass( bits_array=True ) )
+  m.sim_reset()
+
+  assert isinstance( m.in_, BitsArray ) and isinstance( m.out, BitsArray )
+
+  for i in range(4):
+    m.in_[i] = Bits32( i + 10 )
+  m.tick()
+  assert m.out.tolist() == [ 10, 11, 12, 13 ]
+  assert m.out[1] == Bits32( 11 )
+
+  m.in_.load( [ 1, 2, 3, 4 ] )
+  m.tick()
+  assert m.out.tolist() == [ 1, 2, 3, 4 ]
+
+  m.unlock_simulation()
+  assert isinstance( m.in_, list ) and isinstance( m.in_[0], InPort )
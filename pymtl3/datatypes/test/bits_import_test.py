@@ -0,0 +1,61 @@
+"""
+==========================================================================
+bits_import_test.py
+==========================================================================
+Test cases for on-demand creation of BitsN types.
+"""
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+import pymtl3
+from pymtl3.datatypes import bits_import
+from pymtl3.datatypes.bits_import import Bits, mk_bits
+
+
+def test_mk_bits_single_creation_path():
+  assert mk_bits( 77 ) is mk_bits( 77 )
+  assert bits_import.Bits77 is mk_bits( 77 )
+  assert bits_import.b77 is mk_bits( 77 )
+  assert mk_bits( 1000 ).nbits == 1000
+  assert bits_import.Bits1000 is mk_bits( 1000 )
+
+def test_getattr():
+  from pymtl3.datatypes import Bits123
+  import pymtl3
+  assert Bits123 is mk_bits( 123 )
+  assert pymtl3.Bits123 is Bits123
+  assert pymtl3.datatypes.b123 is Bits123
+
+  x = Bits123( -1 )
+  assert x.nbits == 123 and int(x) == (1 << 123) - 1
+  assert isinstance( x, Bits )
+  assert pickle.loads( pickle.dumps( x ) ) == x
+
+  for name in [ "Bits0", "Bits01", "bits8", "b", "bx", "Bitsx" ]:
+    with pytest.raises( AttributeError ):
+      getattr( bits_import, name )
+
+  # Other names are not forwarded to bits_import
+  import pymtl3.datatypes
+  for mod in [ pymtl3, pymtl3.datatypes ]:
+    with pytest.raises( AttributeError, match=f"module '{mod.__name__}' has no attribute 'foo'" ):
+      mod.foo
+    with pytest.raises( AttributeError ):
+      mod._mk_bits_type
+
+def test_lazy_import():
+  # A fresh interpreter only creates the BitsN it uses
+  out = subprocess.check_output( [ sys.executable, "-c",
+    "import pymtl3\n"
+    "from pymtl3.datatypes import bits_import\n"
+    "print( len( bits_import._bits_types ) )\n"
+    "from pymtl3 import *\n"
+    "print( len( bits_import._bits_types ), Bits255.nbits, b512.nbits )\n" ],
+    cwd=os.path.dirname( pymtl3.__path__[0] ) )
+  before, after = out.decode().split("\n")[:2]
+  assert int( before ) < 10
+  assert after == f"{len( bits_import._bitwidths )} 255 512"
@@ -506,3 +506,140 @@ def test_mk_high_d_list_struct_inside():
   c.y[9][2][0][2].x = Bits4(3)
   print(c.y[9][2][0][2])
   assert b != c
+
+#-------------------------------------------------------------------------
+# Packed bitstruct
+#-------------------------------------------------------------------------
+
+@bitstruct( packed=True )
+class PackedMsg:
+  type_ : Bits4
+  addr  : Bits16
+  data  : Bits100
+
+@bitstruct
+class UnpackedMsg:
+  type_ : Bits4
+  addr  : Bits16
+  data  : Bits100
+
+def test_packed_fields():
+  msg = PackedMsg( 3, 0x1ffff, -1 )
+  assert msg._value == (3 << 116) | (0xffff << 100) | ((1 << 100) - 1)
+  assert msg.type_ == Bits4(3) and isinstance( msg.type_, Bits4 )
+  assert msg.addr  == Bits16(0xffff)
+  assert msg.data  == Bits100((1 << 100) - 1)
+
+  msg.addr = Bits16(0x1234)
+  msg.data = 5
+  assert msg.type_ == 3 and msg.addr == 0x1234 and msg.data == 5
+  assert str(msg) == str( UnpackedMsg( 3, 0x1234, 5 ) )
+  assert repr(msg) == "PackedMsg(Bits4(0x3),Bits16(0x1234),Bits100(0x0000000000000000000000005))"
+
+def test_packed_eq_hash_clone():
+  a = PackedMsg( 1, 2, 3 )
+  b = a.clone()
+  c = deepcopy( a )
+  assert a == b == c
+  assert hash(a) == hash(b)
+  assert a is not b and a is not c
+
+  b.data = 4
+  assert a != b and a.data == 3
+  assert a != UnpackedMsg( 1, 2, 3 )
+
+  a <<= b
+  assert a.data == 3
+  a._flip()
+  assert a == b
+
+def test_packed_to_bits():
+  from ..helpers import get_nbits, to_bits
+  msg = PackedMsg( 0xa, 0xbeef, 0x123 )
+  assert get_nbits( PackedMsg ) == 120
+  assert to_bits( msg ) == to_bits( UnpackedMsg( 0xa, 0xbeef, 0x123 ) )
+  assert to_bits( msg ).nbits == 120
+
+def test_packed_mk_bitstruct():
+  A = mk_bitstruct( "PackedA", { 'x': Bits4, 'y': Bits8 }, packed=True )
+  B = mk_bitstruct( "PackedA", { 'x': Bits4, 'y': Bits8 } )
+  assert A is not B
+  assert A.__bitstruct_packed__ == 12
+  assert A( 1, 2 ).y == 2
+
+def test_packed_wrong_field():
+  with pytest.raises( TypeError ):
+    @bitstruct( packed=True )
+    class A:
+      x : [ Bits4, Bits4 ]
+
+  with pytest.raises( TypeError ):
+    @bitstruct( packed=True )
+    class B:
+      x : PackedMsg
+
+def test_packed_component():
+  class A( Component ):
+    def construct( s ):
+      s.in_ =  InPort( PackedMsg )
+      s.out = OutPort( PackedMsg )
+      s.reg = OutPort( PackedMsg )
+
+      @s.update
+      def up_packed():
+        s.out = s.in_.clone()
+        s.out.addr = s.in_.addr + Bits16(1)
+
+      @s.update_ff
+      def up_reg():
+        s.reg <<= s.out
+
+  dut = A()
+  dut.elaborate()
+  dut.apply( simple_sim_pass )
+  dut.in_ = PackedMsg( 1, 2, 3 )
+  dut.tick()
+  assert dut.out == PackedMsg( 1, 3, 3 )
+  assert dut.in_ == PackedMsg( 1, 2, 3 )
+  dut.tick()
+  assert dut.reg == PackedMsg( 1, 3, 3 )
+
+def test_packed_field_writes():
+  msg = PackedMsg( 1, 0x1234, 5 )
+  msg.addr[0:4] = Bits4(0xf)
+  msg.addr[15] = Bits1(1)
+  msg.data[99] = Bits1(1)
+  assert msg == PackedMsg( 1, 0x923f, (1 << 99) | 5 )
+
+  # A field read is a view that writes the bits it sets to the struct it
+  # came from
+  addr = msg.addr
+  msg.addr = 0
+  addr[4:8] = Bits4(7)
+  assert msg.addr == 0x0070 and msg.type_ == 1
+
+  with pytest.raises( TypeError ):
+    msg.addr <<= Bits16(2)
+
+  with pytest.raises( TypeError ):
+    msg <<= Bits120(0)
+  with pytest.raises( TypeError ):
+    msg <<= UnpackedMsg( 1, 2, 3 )
+
+def test_packed_component_field_slice():
+  class A( Component ):
+    def construct( s ):
+      s.in_ =  InPort( PackedMsg )
+      s.out = OutPort( PackedMsg )
+
+      @s.update
+      def up_packed():
+        s.out = s.in_.clone()
+        s.out.addr[0:4] = s.in_.type_
+
+  dut = A()
+  dut.elaborate()
+  dut.apply( simple_sim_pass )
+  dut.in_ = PackedMsg( 5, 0x1230, 3 )
+  dut.tick()
+  assert dut.out == PackedMsg( 5, 0x1235, 3 )
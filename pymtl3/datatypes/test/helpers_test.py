@@ -7,8 +7,11 @@ Test cases for helper functions
 Author : Shunning Jiang
   Date : Nov 30, 2019
 """
+import hypothesis
+from hypothesis import strategies as st
 
 from pymtl3.datatypes import *
+from pymtl3.datatypes import strategies as pst
 from pymtl3.datatypes.helpers import get_bitstruct_inst_all_classes
 
 
@@ -80,3 +83,86 @@ def test_get_bitstruct_inst_all_classes():
   print(get_bitstruct_inst_all_classes( a ))
   print({Bits4, Bits8, SomeMsg1, Bits6, SomeMsg2})
   assert get_bitstruct_inst_all_classes( a ) == {Bits4, Bits8, SomeMsg1, Bits6, SomeMsg2}
+
+#-------------------------------------------------------------------------
+# Property tests against the Bits-domain reference implementations
+#-------------------------------------------------------------------------
+
+def ref_concat( *args ):
+  end = sum( x.nbits for x in args )
+  concat_bits = Bits( end, 0 )
+  for x in args:
+    x_nbits = x.nbits
+    concat_bits[ end - x_nbits : end ] = x
+    end -= x_nbits
+  return concat_bits
+
+def ref_zext( value, new_width ):
+  return Bits( new_width, value )
+
+def ref_sext( value, new_width ):
+  return Bits( new_width, value.int() )
+
+def ref_reduce_xor( value ):
+  pop_count = 0
+  value = int(value)
+  while value != 0:
+    pop_count += value & 1
+    value >>= 1
+  return b1( pop_count & 1 )
+
+widths = st.sampled_from( [ 1, 2, 7, 8, 31, 32, 33, 63, 64, 65, 128, 255 ] )
+
+def same( x, y ):
+  assert x.nbits == y.nbits and int(x) == int(y)
+
+@hypothesis.given( st.lists( widths.flatmap( pst.bits ), min_size=1, max_size=6 ) )
+def test_concat_property( args ):
+  same( concat( *args ), ref_concat( *args ) )
+
+@hypothesis.given( widths.flatmap( pst.bits ), st.integers( 1, 200 ) )
+def test_zext_sext_property( value, extra ):
+  new_width = value.nbits + extra
+  same( zext( value, new_width ), ref_zext( value, new_width ) )
+  same( sext( value, new_width ), ref_sext( value, new_width ) )
+
+@hypothesis.given( widths.flatmap( pst.bits ) )
+def test_reduce_xor_property( value ):
+  same( reduce_xor( value ), ref_reduce_xor( value ) )
+
+def ref_to_bits( obj ):
+  if isinstance( obj, list ):
+    return ref_concat( *[ ref_to_bits(x) for x in obj ] )
+  if isinstance( obj, Bits ):
+    return obj
+  return ref_concat( *[ ref_to_bits(getattr(obj, v)) for v in obj.__bitstruct_fields__.keys() ] )
+
+def ref_get_nbits( Type ):
+  if isinstance( Type, list ):
+    return sum( ref_get_nbits(v) for v in Type )
+  if issubclass( Type, Bits ):
+    return Type.nbits
+  return sum( ref_get_nbits(v) for v in Type.__bitstruct_fields__.values() )
+
+@bitstruct
+class LayoutInner:
+  a: [ Bits3, Bits3, Bits3 ]
+  b: Bits17
+
+@bitstruct
+class LayoutOuter:
+  x: Bits5
+  y: [ [ LayoutInner, LayoutInner ] ] * 3
+  z: Bits70
+  w: LayoutInner
+
+def test_bitstruct_layout():
+  assert LayoutInner.__bitstruct_layout__ == { 'a': (17, 9), 'b': (0, 17) }
+  assert LayoutInner.__bitstruct_nbits__ == 26
+  assert LayoutOuter.__bitstruct_nbits__ == 5 + 6*26 + 70 + 26
+  assert get_nbits( LayoutOuter ) == ref_get_nbits( LayoutOuter )
+  assert get_nbits( [ LayoutOuter, LayoutInner ] ) == ref_get_nbits( [ LayoutOuter, LayoutInner ] )
+
+@hypothesis.given( pst.bitstructs( LayoutOuter ) )
+def test_to_bits_property( obj ):
+  same( to_bits( obj ), ref_to_bits( obj ) )
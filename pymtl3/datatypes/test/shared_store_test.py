@@ -0,0 +1,205 @@
+"""
+==========================================================================
+shared_store_test.py
+==========================================================================
+Test cases for the shared-memory signal store.
+"""
+import pytest
+
+from pymtl3 import *
+from pymtl3.datatypes.shared_store import SharedBitsList, SharedSignalStore
+from pymtl3.passes.sim.DynamicSchedulePass import DynamicSchedulePass
+from pymtl3.passes.sim.GenDAGPass import GenDAGPass
+from pymtl3.passes.sim.SimpleTickPass import SimpleTickPass
+from pymtl3.passes.tracing.ProfileSimPass import ProfileSimPass
+
+
+def test_store_get_set():
+  store = SharedSignalStore( [ ("a", 8), ("b", 64), ("c", 200) ] )
+  try:
+    store._set( 0, 0x1ff )
+    store._set( 1, -1 )
+    store._set( 2, (1 << 199) | 0x1234 )
+    assert store._get(0) == 0xff
+    assert store._get(1) == (1 << 64) - 1
+    assert store._get(2) == (1 << 199) | 0x1234
+
+    x = store.view(2)
+    assert isinstance( x, Bits200 ) and x == Bits200( (1 << 199) | 0x1234 )
+    x[0:8] = 0xab
+    assert store._get(2) == (1 << 199) | 0x12ab
+
+    # <<= is staged until _flip
+    y = store.view(0)
+    y <<= Bits8( 0x42 )
+    assert store._get(0) == 0xff
+    y._flip()
+    assert store._get(0) == 0x42
+
+    with pytest.raises( AssertionError ):
+      y <<= Bits16( 1 )
+  finally:
+    store.close()
+
+def test_shared_bits_list():
+  store = SharedSignalStore( [ ("a", 8), ("b", 8), ("c", 8) ] )
+  try:
+    x = SharedBitsList( store, [ 0, 1, 2 ] )
+    x[0] = Bits8( 1 )
+    x[1] <<= Bits8( 2 )
+    assert x.tolist() == [ 1, 0, 0 ]
+    x[1]._flip()
+    assert x.tolist() == [ 1, 2, 0 ]
+    x[1:3] = [ Bits8( 3 ), Bits8( 4 ) ]
+    assert list( x ) == [ 1, 3, 4 ] and len(x) == 3
+    assert x[-1] == Bits8( 4 )
+  finally:
+    store.close()
+
+def test_attach_and_seqlock():
+  store = SharedSignalStore( [ ("top.x", 16), ("top.y", 100) ] )
+  try:
+    other = SharedSignalStore.attach( store.name )
+    assert other.names == [ "top.x", "top.y" ]
+
+    store.begin()
+    store._set( 0, 7 )
+    store._set( 1, 1 << 99 )
+    assert other.seq & 1
+    with pytest.raises( TimeoutError ):
+      other.read( "top.x", timeout=0.01 )
+    store.end( 3 )
+
+    assert other.cycles == 3
+    assert other.read( "top.x" ) == 7
+    assert other.snapshot() == { "top.x": 7, "top.y": 1 << 99 }
+    other.close()
+  finally:
+    store.close()
+
+  with pytest.raises( FileNotFoundError ):
+    SharedSignalStore.attach( store.name )
+
+#-------------------------------------------------------------------------
+# lock_in_simulation( shared_memory=True )
+#-------------------------------------------------------------------------
+
+class Acc( Component ):
+
+  def construct( s, step ):
+    s.en  = InPort ( Bits1 )
+    s.out = OutPort( Bits32 )
+    s.r   = Wire( Bits32 )
+    s.out //= s.r
+
+    @s.update_ff
+    def up_r():
+      if s.reset:
+        s.r <<= Bits32( 0 )
+      elif s.en:
+        s.r <<= s.r + Bits32( step )
+
+class Counter( Component ):
+
+  def construct( s, n=4 ):
+    s.en     = InPort ( Bits1 )
+    s.out    = OutPort( Bits32 )
+    s.wide   = OutPort( Bits96 )
+    s.wide_r = Wire( Bits96 )
+    s.accs   = [ Acc( i + 1 ) for i in range(n) ]
+    s.outs   = [ OutPort( Bits32 ) for _ in range(n) ]
+    s.first  = Wire( Bits32 )
+    s.last   = Wire( Bits32 )
+    s.count  = 0
+
+    s.wide  //= s.wide_r
+    s.first //= s.outs[0]
+    s.last  //= s.outs[n-1]
+    for i in range(n):
+      s.accs[i].en //= s.en
+      s.outs[i]    //= s.accs[i].out
+
+    @s.update_ff
+    def up_wide():
+      if s.reset:
+        s.wide_r <<= Bits96( 0 )
+      else:
+        s.wide_r <<= concat( s.wide_r[0:64], s.out )
+
+    @s.update
+    def up_out():
+      s.out = s.first + s.last
+      s.count += 1
+
+def _run( m, ncycles ):
+  m.sim_reset()
+  m.en = Bits1( 1 )
+  trace = []
+  for i in range( ncycles ):
+    m.tick()
+    trace.append( ( int(m.out), int(m.wide), [ int(x) for x in m.outs ] ) )
+  return trace
+
+def test_lock_in_simulation_shared_memory():
+  ref = Counter()
+  ref.apply( SimulationPass() )
+
+  m = Counter()
+  m.apply( SimulationPass( shared_memory=True ) )
+  store = m.get_signal_store()
+  assert isinstance( store, SharedSignalStore )
+  assert isinstance( m.outs, SharedBitsList )
+
+  assert _run( m, 10 ) == _run( ref, 10 )
+  assert m.count == ref.count
+
+  # Another process sees the values at the end of the last cycle
+  other = SharedSignalStore.attach( store.name )
+  assert other.cycles == m.simulated_cycles
+  snapshot = other.snapshot()
+  assert snapshot[ "s.out" ] == int( m.out )
+  assert snapshot[ "s.wide" ] == int( m.wide )
+  other.close()
+
+  assert m.sim_run( 5 ) == 5
+  ref.sim_run( 5 )
+  assert m.wide == ref.wide
+
+  m.unlock_simulation()
+  assert m.get_signal_store() is None
+  assert isinstance( m.out, OutPort ) and isinstance( m.outs[0], OutPort )
+
+  values = { x[1]: x[2] for x in m._dsl.swapped_values[ m ] }
+  assert type( values[ "wide" ] ) is Bits96 and values[ "wide" ] == ref.wide
+  assert values[ "outs" ] == list( ref.outs )
+
+def test_seqlock_without_simulation_pass():
+  m = Counter()
+  m.elaborate()
+  m.apply( GenDAGPass() )
+  m.apply( DynamicSchedulePass() )
+  m.apply( SimpleTickPass() )
+  m.lock_in_simulation( shared_memory=True )
+
+  other = SharedSignalStore.attach( m.get_signal_store().name )
+  seq = other.seq
+  m.reset = Bits1( 1 )
+  m.tick()
+  m.reset = Bits1( 0 )
+  m.en = Bits1( 1 )
+  assert ( other.seq, other.cycles ) == ( seq + 2, 1 )
+
+  # Every cycle of sim_run is marked, with and without until
+  assert m.sim_run( 5 ) == 5
+  assert ( other.seq, other.cycles ) == ( seq + 12, 6 )
+  assert m.sim_run( 5, until=lambda: m.simulated_cycles == 8 ) == 2
+  assert ( other.seq, other.cycles ) == ( seq + 16, 8 )
+  assert other.read( "s.out" ) == int( m.out )
+
+  # So are the ones of the profiled tick and sim_run
+  m.apply( ProfileSimPass() )
+  m.tick()
+  m.sim_run( 2 )
+  assert ( other.seq, other.cycles ) == ( seq + 22, 11 )
+  other.close()
+
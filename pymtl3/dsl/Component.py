@@ -9,7 +9,7 @@ Author : Yanghui Ou
 """
 from collections import defaultdict
 
-from pymtl3.datatypes import Bits1
+from pymtl3.datatypes import Bits, Bits1
 
 from .ComponentLevel1 import ComponentLevel1
 from .ComponentLevel7 import ComponentLevel7
@@ -452,10 +452,47 @@ class Component( ComponentLevel7 ):
 
   # TODO maybe we should implement these two lock/unlock APIs as passes?
   # They expose kernel implementation details though ...
-  def lock_in_simulation( s ):
+  # If bits_array is True, every one-dimensional list of Bits signals
+  # that share the same type is replaced by a single BitsArray instead of
+  # a list of BitsN objects.
+  # If shared_memory is True, the values of all Bits signals and lists of
+  # Bits signals are kept in one SharedSignalStore (see
+  # pymtl3/datatypes/shared_store.py) that other processes can attach to.
+  # The tick and sim_run generated by SimpleTickPass mark every cycle in
+  # the seqlock of the store.
+
+  def lock_in_simulation( s, bits_array=False, shared_memory=False ):
     s._check_called_at_elaborate_top( "lock_in_simulation" )
+    assert not (bits_array and shared_memory), "bits_array and shared_memory cannot be used together"
 
     swapped_signals = defaultdict(list)
+    s._dsl.signal_store = None
+
+    if shared_memory:
+      from pymtl3.datatypes.shared_store import lock_in_shared_store
+
+      shared_attrs = []
+      shared_lists = []
+
+      def is_bits_signal( obj ):
+        if not isinstance( obj, Signal ):
+          return False
+        Type = obj._dsl.Type
+        return isinstance( Type, type ) and issubclass( Type, Bits )
+
+      def is_shared_list( obj ):
+        return obj and all( is_bits_signal( x ) for x in obj )
+
+    if bits_array:
+      from pymtl3.datatypes.bits_array import BitsArray
+
+      def is_bits_array_list( obj ):
+        if not obj or not isinstance( obj[0], Signal ):
+          return False
+        Type = obj[0]._dsl.Type
+        if not isinstance( Type, type ) or not issubclass( Type, Bits ):
+          return False
+        return all( isinstance( x, Signal ) and x._dsl.Type is Type for x in obj )
 
     # Swap all Signal objects with actual data
 
@@ -464,7 +501,13 @@ class Component( ComponentLevel7 ):
       current_obj, host = Q.pop()
       if isinstance( current_obj, list ):
         for i, obj in enumerate( current_obj ):
-          if isinstance( obj, Signal ):
+          # Only lists of Bits signals are backed by the store, not Bits
+          # signals in lists with other kinds of elements
+          if shared_memory and isinstance( obj, list ) and is_shared_list( obj ):
+            shared_lists.append( (current_obj, i, obj) )
+            swapped_signals[ host ].append( (current_obj, i, obj, True) )
+
+          elif isinstance( obj, Signal ):
             try:
               current_obj[i] = obj.default_value()
             except Exception as e:
@@ -485,7 +528,15 @@ class Component( ComponentLevel7 ):
       elif isinstance( current_obj, NamedObject ):
         for i, obj in current_obj.__dict__.items():
           if i[0] != '_': # impossible to have tuple
-            if isinstance( obj, Signal ):
+            if shared_memory and is_bits_signal( obj ):
+              shared_attrs.append( (current_obj, i, obj) )
+              swapped_signals[ host ].append( (current_obj, i, obj, False) )
+
+            elif shared_memory and isinstance( obj, list ) and is_shared_list( obj ):
+              shared_lists.append( (current_obj, i, obj) )
+              swapped_signals[ host ].append( (current_obj, i, obj, False) )
+
+            elif isinstance( obj, Signal ):
               try:
                 value = obj.default_value()
               except Exception as e:
@@ -500,11 +551,18 @@ class Component( ComponentLevel7 ):
 
               swapped_signals[ host ].append( (current_obj, i, obj, False) )
 
+            elif bits_array and isinstance( obj, list ) and is_bits_array_list( obj ):
+              setattr( current_obj, i, BitsArray( obj[0]._dsl.Type.nbits, len(obj) ) )
+              swapped_signals[ host ].append( (current_obj, i, obj, False) )
+
             elif isinstance( obj, Component ):
               Q.append( (obj, obj) )
             elif isinstance( obj, (Interface, list) ):
               Q.append( (obj, host) )
 
+    if shared_memory:
+      s._dsl.signal_store = lock_in_shared_store( shared_attrs, shared_lists )
+
     s._dsl.swapped_signals = swapped_signals
     s._dsl.locked_simulation = True
 
@@ -515,19 +573,37 @@ class Component( ComponentLevel7 ):
     except:
       raise AttributeError("Cannot unlock an unlocked/never locked model.")
 
+    store = getattr( s._dsl, 'signal_store', None )
+
     swapped_values  = defaultdict(list)
+    for component, records in s._dsl.swapped_signals.items():
+      for current_obj, i, obj, is_list in records:
+        value = current_obj[i] if is_list else getattr(current_obj, i)
+        if store is not None:
+          from pymtl3.datatypes.shared_store import _detach
+          value = _detach( value )
+        swapped_values[ component ].append( (current_obj, i, value, is_list) )
+
+    # Release the store before putting the signals back so that the
+    # attributes are no longer properties of the store
+    if store is not None:
+      store.close()
+      s._dsl.signal_store = None
+
     for component, records in s._dsl.swapped_signals.items():
       for current_obj, i, obj, is_list in records:
         if is_list:
-          swapped_values[ component ].append( (current_obj, i, current_obj[i], is_list) )
           current_obj[i] = obj
         else:
-          swapped_values[ component ].append( (current_obj, i, getattr(current_obj, i), is_list) )
           setattr( current_obj, i, obj )
 
     s._dsl.swapped_values = swapped_values
     s._dsl.locked_simulation = False
 
+  def get_signal_store( s ):
+    s._check_called_at_elaborate_top( "get_signal_store" )
+    return getattr( s._dsl, 'signal_store', None )
+
   """ APIs that provide local metadata of a component """
 
   def get_component_level( s ):
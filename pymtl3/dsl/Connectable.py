@@ -292,13 +292,16 @@ class Signal( NamedObject, Connectable ):
     if s.is_leaf_signal():   return [ s ]
 
     leaf_signals = []
+    # Packed bitstructs keep fields as properties instead of in __dict__
     def recursive_getattr( m, instance ):
-      for x in instance.__dict__:
+      fields = getattr( instance.__class__, '__bitstruct_packed__', 0 ) and \
+               instance.__class__.__bitstruct_fields__
+      for x in fields or instance.__dict__:
         signal = getattr( m, x )
         if signal.is_leaf_signal():
           leaf_signals.append( signal )
         else:
-          recursive_getattr( signal, instance.__dict__[x] )
+          recursive_getattr( signal, getattr( instance, x ) )
 
     # OK now it's not Bits or int, let's instantiate it if it's never
     # accessed
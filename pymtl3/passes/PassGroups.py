@@ -3,15 +3,23 @@ from pymtl3.dsl import Component
 from .autotick.OpenLoopCLPass import OpenLoopCLPass
 from .BasePass import BasePass
 from .sim.AddSimUtilFuncsPass import AddSimUtilFuncsPass
+from .sim.CheckpointPass import CheckpointPass
 from .sim.DynamicSchedulePass import DynamicSchedulePass
+from .sim.EventDrivenSchedulePass import EventDrivenSchedulePass
 from .sim.GenDAGPass import GenDAGPass
+from .sim.OptimizeDAGPass import OptimizeDAGPass
+from .sim.PartitionedSimPass import PartitionedSimPass
 from .sim.SimpleSchedulePass import SimpleSchedulePass
 from .sim.SimpleTickPass import SimpleTickPass
 from .sim.WrapGreenletPass import WrapGreenletPass
 from .tracing.CLLineTracePass import CLLineTracePass
 from .tracing.CollectSignalPass import CollectSignalPass
+from .tracing.FlightRecorderPass import FlightRecorderPass
 from .tracing.LineTraceParamPass import LineTraceParamPass
 from .tracing.PrintWavePass import PrintWavePass
+from .tracing.ProfileSimPass import ProfileSimPass
+from .tracing.PwfGenerationPass import PwfGenerationPass
+from .tracing.SamplingProfilePass import SamplingProfilePass
 from .tracing.VcdGenerationPass import VcdGenerationPass
 
 
@@ -34,19 +42,44 @@ class SimpleSimPass( BasePass ):
 # This pass is created to be used for 2019 isca tutorial.
 # Now we can always use this
 class SimulationPass( BasePass ):
+  def __init__( s, bits_array=False, event_driven=False, shared_memory=False,
+                dead_blocks=False ):
+    s.bits_array    = bits_array
+    s.event_driven  = event_driven
+    s.shared_memory = shared_memory
+    s.dead_blocks   = dead_blocks
+
   def __call__( s, top ):
     top.elaborate()
     GenDAGPass()( top )
+    OptimizeDAGPass( dead_blocks=s.dead_blocks )( top )
     WrapGreenletPass()( top )
     CLLineTracePass()( top )
-    DynamicSchedulePass()( top )
+    if s.event_driven:
+      EventDrivenSchedulePass()( top )
+    else:
+      DynamicSchedulePass()( top )
     VcdGenerationPass()( top )
+    PwfGenerationPass()( top )
+    FlightRecorderPass()( top )
     CollectSignalPass()( top )
     PrintWavePass()( top )
     SimpleTickPass()( top )
     AddSimUtilFuncsPass()( top )
+    CheckpointPass()( top )
     LineTraceParamPass()( top )
-    top.lock_in_simulation()
+    SamplingProfilePass()( top )
+    top.lock_in_simulation( bits_array=s.bits_array, shared_memory=s.shared_memory )
+    OptimizeDAGPass.run_init_blocks( top )
+    s.wrap_tick( top )
+
+  # Wrap the generated tick and sim_run. Passes that regenerate them after
+  # SimulationPass, like ProfileSimPass, have to apply this again.
+
+  @staticmethod
+  def wrap_tick( top ):
+    FlightRecorderPass.wrap_tick( top )
+
 
 class AutoTickSimPass( BasePass ):
   def __init__( s, print_line_trace=True ):
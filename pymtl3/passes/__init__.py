@@ -1,4 +1,5 @@
 from .backends.verilog.import_.VerilatorImportConfigs import VerilatorImportConfigs
 from .backends.verilog.translation.TranslationConfigs import TranslationConfigs
 from .PassGroups import *
+from .tracing.ProfilingConfigs import ProfilingConfigs
 from .tracing.TracingConfigs import TracingConfigs
@@ -20,6 +20,7 @@ from pymtl3.dsl.errors import UpblkCyclicError
 
 from ..BasePass import BasePass, PassMetadata
 from ..errors import PassOrderError
+from ..sim.ScheduleGraph import ScheduleGraph
 from ..sim.SimpleSchedulePass import SimpleSchedulePass, dump_dag
 from ..sim.SimpleTickPass import SimpleTickPass
 from ..tracing.CLLineTracePass import CLLineTracePass
@@ -45,7 +46,7 @@ class OpenLoopCLPass( BasePass ):
 
     # Construct the graph with top level callee port
     V = top._dag.final_upblks - top.get_all_update_ff()
-    E = set()
+    rdy_method_edges = []
 
     # We collect all top level callee ports/nonblocking callee interfaces
     top_level_callee_ports = top.get_all_object_filter(
@@ -76,7 +77,7 @@ class OpenLoopCLPass( BasePass ):
     for x in top_level_nb_ifcs:
       V.add( x.method )
       V.add( x.rdy )
-      E.add( (x.rdy, x.method) )
+      rdy_method_edges.append( (x.rdy, x.method) )
 
       method_guard_mapping[x.method] = x.rdy
       guard_method_mapping[x.rdy] = x.method
@@ -87,14 +88,9 @@ class OpenLoopCLPass( BasePass ):
       method_callee_mapping[m] = x.method
       method_callee_mapping[r] = x.rdy
 
-    G   = { v: [] for v in V }
-    G_T = { v: [] for v in V }
-
+    graph = ScheduleGraph( V, rdy_method_edges )
     for (u, v) in top._dag.all_constraints:
-      if u in V and v in V:
-        E.add( (u, v) )
-        G  [u].append( v )
-        G_T[v].append( u )
+      graph.add_edge( u, v )
 
     # In addition to existing constraints, we process the constraints that
     # involve top level callee ports. NOTE THAT we assume the user never
@@ -115,10 +111,9 @@ class OpenLoopCLPass( BasePass ):
       if yy in method_guard_mapping:
         yy = method_guard_mapping[ yy ]
 
-      if xx in V and yy in V:
-        E.add( (xx, yy) )
-        G  [xx].append( yy )
-        G_T[yy].append( xx )
+      graph.add_edge( xx, yy )
+
+    G, G_T, E = graph.G, graph.G_T, graph.E
 
     if 'MAMBA_DAG' in os.environ:
       dump_dag( top, V, E )
@@ -127,88 +122,28 @@ class OpenLoopCLPass( BasePass ):
     # Run Kosaraju's algorithm to shrink all strongly connected components
     # (SCCs) into super nodes
     #---------------------------------------------------------------------
-    # See passes/sim/DynamicSchedulePass.py
-    # TODO refactor this
-
-    PO = []
-
-    vertices = list(G.keys())
-    random.shuffle(vertices)
-    visited = set()
-
-    for u in vertices:
-      stack = [ (u, False) ]
-      while stack:
-        u, second_visit = stack.pop()
-
-        if second_visit:
-          PO.append( u )
-        elif u not in visited:
-          visited.add( u )
-          stack.append( (u, True) )
-          for v in reversed(G[u]):
-            stack.append( (v, False) )
-
-    RPO = PO[::-1]
-
-    # Second bfs on G_T to generate SCCs
-
-    SCCs  = []
-    v_SCC = {}
-    visited = set()
-
-    for u in RPO:
-      if u not in visited:
-        visited.add( u )
-        scc = set()
-        SCCs.append( scc )
-        Q = deque( [u] )
-        scc.add( u )
-        while Q:
-          u = Q.popleft()
-          v_SCC[u] = len(SCCs) - 1
-          for v in G_T[u]:
-            if v not in visited:
-              visited.add( v )
-              Q.append( v )
-              scc.add( v )
-
-    # Construct a new graph of SCCs
 
-    G_new = { i: set() for i in range(len(SCCs)) }
-    InD   = { i: 0     for i in range(len(SCCs)) }
+    SCCs, G_new = graph.compute_sccs()
 
-    for (u, v) in E: # u -> v
-      scc_u, scc_v = v_SCC[u], v_SCC[v]
-      if scc_u != scc_v and scc_v not in G_new[ scc_u ]:
-        InD[ scc_v ] += 1
-        G_new[ scc_u ].add( scc_v )
+    InD = { i: 0 for i in range(len(SCCs)) }
+    for u, vs in G_new.items():
+      for v in vs:
+        InD[ v ] += 1
 
     # Perform topological sort on SCCs
 
     scc_pred = {}
     scc_schedule = []
 
-    Q = list( [ i for i in range(len(SCCs)) if not InD[i] ] )
+    Q = deque( [ i for i in range(len(SCCs)) if not InD[i] ] )
     for x in Q:
       scc_pred[ x ] = None
 
-    list_version_of_SCCs = [ list(x) for x in SCCs ]
+    # Q holds SCC ids which are never in the method/guard mappings, so the
+    # first ready SCC is always taken
     while Q:
-      # random.shuffle(Q)
-
-      # Prioritize update blocks instead of method
-      # TODO make it O(logn) by balanced BST if needed ...
-      found = False
-      for i in range(len(Q)):
-        m = Q[i]
-        if m not in method_guard_mapping or m not in guard_method_mapping:
-          u = Q.pop(i)
-          found = True
-          break
-
-      if found:
-        scc_schedule.append( u )
+      u = Q.popleft()
+      scc_schedule.append( u )
 
       for v in G_new[u]:
         InD[v] -= 1
@@ -249,10 +184,7 @@ class OpenLoopCLPass( BasePass ):
         if scc_pred[i] is None:
           # We start bfs from the block that has the least number of input
           # edges in the SCC
-          InD = { v: 0 for v in scc }
-          for (u, v) in E: # u -> v
-            if u in scc and v in scc:
-              InD[ v ] += 1
+          InD = graph.scc_in_degrees( i )
           Q.append( max(InD, key=InD.get) )
 
         else:
@@ -277,10 +209,9 @@ class OpenLoopCLPass( BasePass ):
 
         scc_id += 1
         variables = set()
-        for (u, v) in E:
+        for (u, v) in graph.scc_edges[i]:
           # Collect all variables that triggers other blocks in the SCC
-          if u in scc and v in scc:
-            variables.update( constraint_objs[ (u, v) ] )
+          variables.update( constraint_objs[ (u, v) ] )
 
         # generate a loop for scc
         # Shunning: we just simply loop over the whole SCC block
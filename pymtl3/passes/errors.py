@@ -17,6 +17,12 @@ class ModelTypeError( Exception ):
   def __init__( self, typename ):
     return super().__init__( f"This pass can only be applied to {typename}" )
 
+class PartitionError( Exception ):
+  """ Raise when a design cannot be simulated in separate partitions """
+
+class CheckpointError( Exception ):
+  """ Raise when a checkpoint cannot be taken or restored """
+
 class TranslationError( Exception ):
   """ Raise when translation goes wrong """
   def __init__( self, blk, x ):
@@ -8,10 +8,11 @@ Date   : Feb 14, 2020
 """
 
 import ast
-from queue import PriorityQueue
+from heapq import heappop, heappush
 
 from ..BasePass import BasePass, PassMetadata
 from ..errors import PassOrderError
+from ..sim.ScheduleGraph import ScheduleGraph
 from ..sim.SimpleSchedulePass import SimpleSchedulePass, check_schedule
 
 # FIXME also apply branchiness to all update_ff blocks
@@ -110,16 +111,10 @@ class HeuristicTopoPass( BasePass ):
 
     # Construct the intra-cycle graph based on normal update blocks
 
-    V   = top._dag.final_upblks - top.get_all_update_ff()
-    E   = set()
-    Es  = { v: [] for v in V }
-    InD = { v: 0  for v in V }
-
-    for (u, v) in top._dag.all_constraints: # u -> v
-      if u in V and v in V:
-        InD[v] += 1
-        Es[u].append( v )
-        E.add( (u, v) )
+    V     = top._dag.final_upblks - top.get_all_update_ff()
+    graph = ScheduleGraph( V, top._dag.all_constraints )
+    E, Es = graph.E, graph.G
+    InD   = graph.in_degrees()
 
     # Extract branchiness
 
@@ -141,17 +136,17 @@ class HeuristicTopoPass( BasePass ):
     # Python3 doesn't have hash for functions
     id_v = { id(v): v for v in V}
 
-    Q = PriorityQueue(0)
+    Q = []
     for v in V:
       if not InD[v]:
-        Q.put( (branchiness[ v ], id(v)) )
+        heappush( Q, (branchiness[ v ], id(v)) )
 
-    while not Q.empty():
-      br, u = Q.get()
+    while Q:
+      br, u = heappop( Q )
       update_schedule.append( id_v[u] )
       for v in Es[id_v[u]]:
         InD[v] -= 1
         if not InD[v]:
-          Q.put( (branchiness[ v ], id(v)) )
+          heappush( Q, (branchiness[ v ], id(v)) )
 
     check_schedule( top, update_schedule, V, E, InD )
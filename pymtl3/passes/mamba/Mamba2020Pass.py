@@ -6,17 +6,19 @@
 # Date   : Feb 14, 2020
 
 import os
-from collections import defaultdict, deque
+from collections import deque
+from copy import deepcopy
 
 import py
 
-from pymtl3.datatypes import Bits, is_bitstruct_class
 from pymtl3.dsl import MethodPort
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
 from pymtl3.utils import custom_exec
 
-from ..sim.DynamicSchedulePass import kosaraju_scc
+from ..sim.DynamicSchedulePass import gen_scc_worklist_src
+from ..sim.KernelCache import get_kernel_cache
+from ..sim.ScheduleGraph import MinMaxPriorityQueue, ScheduleGraph
 from ..sim.SimpleSchedulePass import SimpleSchedulePass, dump_dag
 from ..sim.SimpleTickPass import SimpleTickPass
 from .HeuristicTopoPass import CountBranchesLoops
@@ -38,6 +40,7 @@ class Mamba2020Pass( BasePass ):
       raise Exception("Some schedule pass has already been applied!")
 
     top._sched = PassMetadata()
+    top._sched.scc_stats = {}
 
     # Extract branchiness first
     # Initialize all generated net block to 0 branchiness
@@ -99,7 +102,12 @@ class Mamba2020Pass( BasePass ):
 
     # use custom_exec to compile the meta block
     _locals = {}
-    custom_exec( py.code.Source( gen_src ).compile(), _globals, _locals )
+    kernel_cache = get_kernel_cache()
+    if kernel_cache is not None:
+      code = kernel_cache.compile( gen_src, f"Meta block {meta_id}" )
+    else:
+      code = py.code.Source( gen_src ).compile()
+    custom_exec( code, _globals, _locals )
     ret = _locals[ f'meta_block{meta_id}' ]
     if _DEBUG: print(gen_src)
 
@@ -170,24 +178,16 @@ class Mamba2020Pass( BasePass ):
 
     # Construct the intra-cycle graph based on normal update blocks
 
-    V   = top._dag.final_upblks - top.get_all_update_ff()
-
-    G   = { v: [] for v in V }
-    G_T = { v: [] for v in V } # transpose graph
-
-    E = set()
-    for (u, v) in top._dag.all_constraints: # u -> v
-      if u in V and v in V:
-        G  [u].append( v )
-        G_T[v].append( u )
-        E.add( (u, v) )
+    V     = top._dag.final_upblks - top.get_all_update_ff()
+    graph = ScheduleGraph( V, top._dag.all_constraints )
+    G, G_T, E = graph.G, graph.G_T, graph.E
 
     if 'MAMBA_DAG' in os.environ:
       dump_dag( top, V, E )
 
     # Compute SCC using Kosaraju's algorithm
 
-    SCCs, G_new = kosaraju_scc( G, G_T )
+    SCCs, G_new = graph.compute_sccs()
 
     # This function compiles a SCC block
     scc_id = 0 # global id across all sccs
@@ -195,6 +195,7 @@ class Mamba2020Pass( BasePass ):
       nonlocal scc_id
 
       scc = SCCs[i]
+      scc_edges = graph.scc_edges[i]
 
       if len(scc) == 1:
         return list(scc)[0]
@@ -217,10 +218,7 @@ class Mamba2020Pass( BasePass ):
       if scc_pred[i] is None:
         # We start bfs from the block that has the least number of input
         # edges in the SCC
-        InD = { v: 0 for v in scc }
-        for (u, v) in E: # u -> v
-          if u in scc and v in scc:
-            InD[ v ] += 1
+        InD = graph.scc_in_degrees( i )
         Q.append( max(InD, key=InD.get) )
 
       else:
@@ -243,91 +241,6 @@ class Mamba2020Pass( BasePass ):
             Q.append( v )
             visited.add( v )
 
-      variables = set()
-      for (u, v) in E:
-        # Collect all variables that triggers other blocks in the SCC
-        if u in scc and v in scc:
-          variables.update( constraint_objs[ (u, v) ] )
-
-      if len(variables) == 0:
-        raise Exception("There is a cyclic dependency without involving variables."
-                        "Probably a loop that involves update_once:\n{}".format(", ".join( [ x.__name__ for x in scc] )))
-
-      # generate a loop for scc
-      # Shunning: we just simply loop over the whole SCC block
-      # TODO performance optimizations using Mamba techniques within a SCC block
-
-      template = """
-from copy import deepcopy
-def wrapped_SCC_{0}():
-  N = 0
-  while True:
-    N += 1
-    if N > 100:
-      raise Exception("Combinational loop detected at runtime in {{{4}}} after 100 iters!")
-    {1}
-    {3}
-    {2}
-    # print( "SCC block{0} is executed", num_iters, "times" )
-    break
-generated_block = wrapped_SCC_{0}
-"""
-
-      # clean up non-top variables if top is there. For slices of Bits
-      # we directly use the top level wide Bits since Bits clone is
-      # rpython code
-
-      final_variables = set()
-
-      for x in sorted( variables, key=repr ):
-        w = x.get_top_level_signal()
-        if w is x:
-          final_variables.add( x )
-          continue
-
-        # w is not x
-        if issubclass( w._dsl.Type, Bits ):
-          if w not in final_variables:
-            final_variables.add( w )
-        elif is_bitstruct_class( w._dsl.Type ):
-          if w not in final_variables:
-            final_variables.add( x )
-        else:
-          final_variables.add( x )
-
-      # also group them by common ancestor to reduce byte code
-      # TODO use longest-common-prefix (LCP) algorithms ...
-
-      final_var_host = defaultdict(list)
-      for x in final_variables:
-        final_var_host[ x.get_host_component() ].append( x )
-
-      # Then, we generate the Python code that saves variables at the
-      # beginning of each SCC iteration and the code that checks if the
-      # values of those variables have changed
-      copy_srcs  = []
-      check_srcs = []
-
-      var_id = 0
-      for host, var_list in final_var_host.items():
-        hostlen = len(repr(host))
-
-        copy_srcs.append( f"host = {host!r}" )
-        check_srcs.append( f"host = {host!r}" )
-
-        sub_check_srcs = []
-
-        for var in var_list:
-          var_id += 1
-          subname = repr(var)[hostlen+1:]
-          if issubclass( var._dsl.Type, Bits ):     copy_srcs.append( f"t{var_id}=host.{subname}.clone()" )
-          elif is_bitstruct_class( var._dsl.Type ): copy_srcs.append( f"t{var_id}=host.{subname}.clone()" )
-          else:                                     copy_srcs.append( f"t{var_id}=deepcopy(host.{subname})" )
-
-          sub_check_srcs.append( f"host.{subname} != t{var_id}" )
-
-        check_srcs.append( f"if { ' or '.join(sub_check_srcs)}: continue" )
-
       # Divide all blks into meta blocks
       # Branchiness factor is the bound of branchiness in a meta block.
       branchiness_factor = 20
@@ -337,14 +250,17 @@ generated_block = wrapped_SCC_{0}
       cur_meta, cur_br, cur_count = [], 0, 0
       scc_schedule = []
 
-      _globals = { 's': top }
-      blk_srcs = []
+      # The units of the worklist engine are either single blocks or meta
+      # blocks
+      units = []
+      stats = [ 0, 0, 0, 0 ]
+      top._sched.scc_stats[ f"wrapped_SCC_{scc_id}" ] = stats
+      _globals = { 's': top, 'stats': stats, 'deepcopy': deepcopy }
 
       # If there is only 10 blocks, we directly unroll it
       if len(tmp_schedule) < 10:
-        blk_srcs = []
         for i, b in enumerate(tmp_schedule):
-          blk_srcs.append( f"blk{i}() # [br {self.branchiness[b]}, loop {int(self.only_loop_at_top[b])}] {b.__name__}" )
+          units.append( [ b ] )
           _globals[f"blk{i}"] = b # put it into the block's closure
 
       else:
@@ -382,11 +298,9 @@ generated_block = wrapped_SCC_{0}
         assert num_blks == len(tmp_schedule), f"Some blocks are missing during trace breaking of SCC "\
                                               f"({num_blks} compiled, {len(tmp_schedule)} total)"
 
-        blk_srcs = []
-
         if len(scc_schedule) == 1:
           for i, b in enumerate( scc_schedule[-1] ):
-            blk_srcs.append( f"blk{i}() # [br {self.branchiness[b]}, loop {int(self.only_loop_at_top[b])}] {b.__name__}" )
+            units.append( [ b ] )
             _globals[ f"blk{i}" ] = b
 
         else:
@@ -402,19 +316,20 @@ generated_block = wrapped_SCC_{0}
             # _globals[ f"blk_of_last_meta{i}" ] = b
 
           for i, meta in enumerate( scc_schedule ):
-            b = self.compile_meta_block( meta )
-            blk_srcs.append( f"{b.__name__}()" )
-            _globals[ b.__name__ ] = b
-
+            units.append( meta )
+            _globals[ f"blk{i}" ] = self.compile_meta_block( meta )
 
-      scc_block_src = template.format( scc_id, "; ".join( copy_srcs ), "\n    ".join( check_srcs ),
-                                       '\n    '.join(blk_srcs),
-                                       ", ".join( [ x.__name__ for x in scc] ) )
+      scc_block_src = gen_scc_worklist_src( scc_id, units, scc_edges, constraint_objs )
 
       if _DEBUG: print(scc_block_src, "\n", "="*100 )
 
       _locals  = {}
-      custom_exec(py.code.Source( scc_block_src ).compile(), _globals, _locals)
+      kernel_cache = get_kernel_cache()
+      if kernel_cache is not None:
+        code = kernel_cache.compile( scc_block_src, f"SCC block {scc_id}" )
+      else:
+        code = py.code.Source( scc_block_src ).compile()
+      custom_exec(code, _globals, _locals)
       return _locals[ 'generated_block' ]
 
     # Now we generate meta blocks for each SCC and produce final schedule
@@ -438,26 +353,13 @@ generated_block = wrapped_SCC_{0}
       for v in vs:
         InD[ v ] += 1
 
-    # Shunning: reuse this binary search from TraceBreakingPass. Not the
-    # most efficient one. Ideally we want to use two heaps or a balanced
-    # binary search tree ... TODO
-
-    def insert_sortedlist( arr, key, item ):
-      left, right = -1, len(arr)
-      while left + 1 < right:
-        mid = (left + right) >> 1
-        if arr[mid][0] <= key:
-          left = mid
-        else:
-          right = mid
-      arr.insert( right, ( key, item ) )
-
     # scc_pred is for heuristic hamiltonian path ... It records for each
     # scc, in the schedule who is the predecessor that reduce its input
     # degree to zero.
     scc_pred = {}
 
-    Q = []
+    # Blocks are popped from both ends of the priority queue
+    Q = MinMaxPriorityQueue()
     cnt = 0
 
     # Put the graph input nodes into the queue
@@ -466,9 +368,9 @@ generated_block = wrapped_SCC_{0}
         cnt += 1
         scc_pred[v] = None
         if v in nontrivial_sccs or v in trivial_loop_sccs:
-          insert_sortedlist( Q, (0, -cnt), v )
+          Q.push( (0, -cnt), v )
         else:
-          insert_sortedlist( Q, (self.branchiness[list(SCCs[v])[0]], -cnt), v )
+          Q.push( (self.branchiness[list(SCCs[v])[0]], -cnt), v )
 
     schedule = []
 
@@ -492,9 +394,9 @@ generated_block = wrapped_SCC_{0}
           # Basically we want to pop in a DFS order such that the variable
           # most recently written can directly feed into the next block
           if v in nontrivial_sccs or v in trivial_loop_sccs:
-            insert_sortedlist( Q, (0, -cnt), v )
+            Q.push( (0, -cnt), v )
           else:
-            insert_sortedlist( Q, (self.branchiness[list(SCCs[v])[0]], -cnt), v )
+            Q.push( (self.branchiness[list(SCCs[v])[0]], -cnt), v )
 
     # Run topological sort
 
@@ -503,7 +405,7 @@ generated_block = wrapped_SCC_{0}
 
     while Q:
       if cur_br == 0:
-        (br, _), u = Q.pop(0)
+        (br, _), u = Q.pop_min()
 
         cur_meta.append( compile_scc(u) )
         cur_br += br
@@ -514,7 +416,7 @@ generated_block = wrapped_SCC_{0}
           cur_meta, cur_br, cur_count = [], 0, 0
 
       else:
-        (br, _), u = Q.pop()
+        (br, _), u = Q.pop_max()
 
         # If no branchy block available, directly start a new metablock
         if br == 0:
@@ -573,6 +475,10 @@ generated_block = wrapped_SCC_{0}
     if hasattr( top, "_tracing" ):
       if hasattr( top._tracing, "vcd_func" ):
         final_schedule.append( top._tracing.vcd_func )
+      if hasattr( top._tracing, "pwf_func" ):
+        final_schedule.append( top._tracing.pwf_func )
+      if hasattr( top._tracing, "flight_func" ):
+        final_schedule.append( top._tracing.flight_func )
       if hasattr( top._tracing, "collect_text_sigs" ):
         final_schedule.append( top._tracing.collect_text_sigs )
 
@@ -584,18 +490,22 @@ generated_block = wrapped_SCC_{0}
       def advance_sim_cycle():
         top.simulated_cycles += 1
       return advance_sim_cycle
+    pre_schedule = list( final_schedule )
     final_schedule.append( generate_advance_sim_cycle(top) )
+    post_schedule = []
 
     # clear cl method flag
     if hasattr( top, "_tracing" ):
       if hasattr( top._tracing, "clear_cl_trace" ):
-        final_schedule.append( top._tracing.clear_cl_trace )
+        post_schedule.append( top._tracing.clear_cl_trace )
 
     # execute all update blocks
-    final_schedule.extend( top._sched.update_schedule )
+    post_schedule.extend( top._sched.update_schedule )
+    final_schedule.extend( post_schedule )
 
     # Generate tick
     top.tick = UnrollTickPass.gen_tick_function( final_schedule )
+    top.sim_run = SimpleTickPass.gen_sim_run_function( top, pre_schedule, post_schedule )
     # reset sim_cycles
     top.simulated_cycles = 0
 
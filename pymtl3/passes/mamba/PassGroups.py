@@ -5,6 +5,7 @@ from ..sim.SimpleSchedulePass import SimpleSchedulePass
 from ..sim.WrapGreenletPass import WrapGreenletPass
 from ..tracing.CLLineTracePass import CLLineTracePass
 from ..tracing.LineTraceParamPass import LineTraceParamPass
+from ..tracing.SamplingProfilePass import SamplingProfilePass
 from .HeuristicTopoPass import HeuristicTopoPass
 from .Mamba2020Pass import Mamba2020Pass
 from .TraceBreakingSchedTickPass import TraceBreakingSchedTickPass
@@ -50,4 +51,5 @@ class Mamba2020( BasePass ):
       LineTraceParamPass()( top )
     Mamba2020Pass()( top )
     AddSimUtilFuncsPass()( top )
+    SamplingProfilePass()( top )
     top.lock_in_simulation()
@@ -13,6 +13,7 @@ from pymtl3.dsl import *
 
 from ..BasePass import BasePass, PassMetadata
 from ..errors import PassOrderError
+from ..sim.ScheduleGraph import MinMaxPriorityQueue, ScheduleGraph
 from ..sim.SimpleSchedulePass import SimpleSchedulePass, check_schedule
 from .HeuristicTopoPass import CountBranchesLoops
 
@@ -37,16 +38,10 @@ class TraceBreakingSchedTickPass( BasePass ):
 
     # Construct the intra-cycle graph based on normal update blocks
 
-    V   = top._dag.final_upblks - top.get_all_update_ff()
-    E   = set()
-    Es  = { v: [] for v in V }
-    InD = { v: 0  for v in V }
-
-    for (u, v) in top._dag.all_constraints: # u -> v
-      if u in V and v in V:
-        InD[v] += 1
-        Es[u].append( v )
-        E.add( (u, v) )
+    V     = top._dag.final_upblks - top.get_all_update_ff()
+    graph = ScheduleGraph( V, top._dag.all_constraints )
+    E, Es = graph.E, graph.G
+    InD   = graph.in_degrees()
 
     # Extract branchiness
 
@@ -66,25 +61,14 @@ class TraceBreakingSchedTickPass( BasePass ):
     # block, we then append a couple of branchy blocks till the
     # branchiness bound is reached, after which we break the trace.
     #
-    # TODO now I'm using binary-search. Ideally a double-ended
-    # priority queue or a balanced binary search tree (AVL/Treap/RB) can
-    # reduce it to O(nlogn). I didn't find any efficient python impl.
-
-    def insert_sortedlist( arr, priority, item ):
-      left, right = -1, len(arr)
-      while left < right-1:
-        mid = (left + right) >> 1
-        if  arr[mid][0] <= priority:
-          left = mid
-        else:
-          right = mid
-      arr.insert( right, (priority, item) )
+    # A double-ended priority queue gives us both the least and the most
+    # branchy ready block in O(logn).
 
-    Q = []
+    Q = MinMaxPriorityQueue()
     for v in V:
       if not InD[v]:
         br = branchiness[ v ]
-        insert_sortedlist( Q, br, v )
+        Q.push( br, v )
 
     # Branchiness factor is the bound of branchiness in a meta block.
     branchiness_factor = 8
@@ -102,7 +86,7 @@ class TraceBreakingSchedTickPass( BasePass ):
     while Q:
       # If currently there is no branchiness, append less branchy block
       if current_branchiness == 0:
-        (br, u) = Q.pop(0)
+        (br, u) = Q.pop_min()
 
         # Update the current
         current_blk_count += 1
@@ -117,7 +101,7 @@ class TraceBreakingSchedTickPass( BasePass ):
       # We already append a branchy block
       else:
         # Find the most branchy block
-        (br, u) = Q.pop()
+        (br, u) = Q.pop_max()
 
         # If no branchy block available, directly start a new metablock
 
@@ -148,7 +132,7 @@ class TraceBreakingSchedTickPass( BasePass ):
       for v in Es[u]:
         InD[v] -= 1
         if not InD[v]:
-          insert_sortedlist( Q, branchiness[ v ], v )
+          Q.push( branchiness[ v ], v )
 
     # Append the last meta block
     if current_meta:
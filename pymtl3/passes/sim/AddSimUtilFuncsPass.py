@@ -11,6 +11,8 @@ from pymtl3.datatypes import b1
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
 
+from .OptimizeDAGPass import OptimizeDAGPass
+
 
 class AddSimUtilFuncsPass( BasePass ):
   def __init__( self, active_high=True ):
@@ -35,6 +37,10 @@ class AddSimUtilFuncsPass( BasePass ):
   # Simulation related APIs
   def create_reset( top, active_high ):
     def reset( print_line_trace=False ):
+      # Constant nets are not in the schedule. Apply them again since the
+      # model may have been locked in again after they were first applied.
+      OptimizeDAGPass.run_init_blocks( top )
+
       if print_line_trace:
         print()
       top.reset = b1( active_high )
@@ -43,6 +49,11 @@ class AddSimUtilFuncsPass( BasePass ):
         print( f"{top.simulated_cycles:3}r {top.line_trace()}" )
       top.tick()
       top.reset = b1( not active_high )
+
+      # Waveforms are only flushed to the file here, on close and at exit
+      vcd_file = getattr( getattr( top, "_tracing", None ), "vcd_file", None )
+      if vcd_file is not None:
+        vcd_file.flush()
     return reset
 
   @staticmethod
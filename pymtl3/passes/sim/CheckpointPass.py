@@ -0,0 +1,357 @@
+"""
+========================================================================
+CheckpointPass.py
+========================================================================
+Add top.sim_checkpoint( path ) and top.sim_restore( path ) that save and
+load the whole state of a locked-in simulation between two ticks.
+
+A checkpoint holds the value of every signal that lock_in_simulation
+swapped in, the plain Python state of every component (e.g. the deques
+of the CL queues and delay pipes), the bytearrays of the components
+(e.g. MemoryFL.mem) and the number of simulated cycles. Restoring it into
+a model of the same design built with the same passes continues the
+simulation exactly where the checkpoint was taken.
+
+The file is laid out as follows:
+
+  offset  0: magic b"PYMTLCK1"
+  offset  8: number of simulated cycles
+  offset 16: byte offset of the index
+  offset 24: byte length of the index
+  offset 32: byte offset of the signal values
+  offset 40: byte length of the signal values
+
+The index is a pickled dict with the signal names and bitwidths, the
+pickled Python state and the offsets of the bytearrays. Signal values are
+packed back to back as ceil(nbits/8) little-endian bytes each. Every
+bytearray starts at a page boundary and is copied from a memory map of
+the file when restoring, so a multi-GB memory is never read into an
+intermediate buffer.
+"""
+import mmap
+import pickle
+import struct
+import warnings
+from collections import deque
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+
+from pymtl3.datatypes import Bits, is_bitstruct_inst, mk_bits
+from pymtl3.dsl import Component
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.passes.BasePass import BasePass
+from pymtl3.passes.errors import CheckpointError, PassOrderError
+
+from .OptimizeDAGPass import OptimizeDAGPass
+
+_MAGIC  = b"PYMTLCK1"
+_HEADER = struct.Struct( "<8sQQQQQ" )
+
+_HEADER_SIZE = 64
+_PAGE_SIZE   = mmap.ALLOCATIONGRANULARITY
+
+#-------------------------------------------------------------------------
+# Signal values
+#-------------------------------------------------------------------------
+# A record of swapped_signals holds either a single signal, whose value is
+# a BitsN, a bit struct or a plain Python value, or a list of signals that
+# lock_in_simulation replaced by a single BitsArray or SharedBitsList.
+
+def _get_value( current_obj, i, is_list ):
+  return current_obj[i] if is_list else getattr( current_obj, i )
+
+def _signal_name( obj ):
+  if isinstance( obj, list ):
+    return repr(obj[0]).rsplit( '[', 1 )[0]
+  return repr(obj)
+
+def _get_nbits( obj, value ):
+  if isinstance( obj, list ):
+    return obj[0]._dsl.Type.nbits
+  if isinstance( value, Bits ):
+    return value.nbits
+  if is_bitstruct_inst( value ):
+    return value.__bitstruct_nbits__
+  return None # not a fixed-width value
+
+def _to_ints( value ):
+  if isinstance( value, Bits ):
+    return [ int(value) ]
+  if is_bitstruct_inst( value ):
+    return [ value._to_bits_value() ]
+  return value.tolist()
+
+# The value is written back into the existing object so that objects
+# shared by several signals (e.g. through net blocks) see it as well.
+
+def _set_field( container, key, Type, v, is_list ):
+  if isinstance( Type, list ):
+    obj   = container[key] if is_list else getattr( container, key )
+    nbits = _get_type_nbits( Type[0] )
+    for j, T in enumerate( Type ):
+      _set_field( obj, j, T, v >> ((len(Type)-1-j) * nbits), True )
+
+  elif issubclass( Type, Bits ):
+    v = Type( v & ((1 << Type.nbits) - 1) )
+    if is_list:
+      container[key] = v
+    else:
+      setattr( container, key, v )
+
+  else:
+    _set_bitstruct( container[key] if is_list else getattr( container, key ), v )
+
+def _get_type_nbits( Type ):
+  if isinstance( Type, list ):
+    return len(Type) * _get_type_nbits( Type[0] )
+  if issubclass( Type, Bits ):
+    return Type.nbits
+  return Type.__bitstruct_nbits__
+
+def _set_bitstruct( obj, v ):
+  cls = obj.__class__
+  if hasattr( cls, '__bitstruct_packed__' ):
+    obj._value = v & ((1 << cls.__bitstruct_nbits__) - 1)
+    return
+  for name, (offset, _) in cls.__bitstruct_layout__.items():
+    _set_field( obj, name, cls.__bitstruct_fields__[ name ], v >> offset, False )
+
+def _set_value( value, ints ):
+  if isinstance( value, Bits ):
+    value <<= mk_bits( value.nbits )( ints[0] )
+    value._flip()
+  elif is_bitstruct_inst( value ):
+    _set_bitstruct( value, ints[0] )
+  else:
+    value[:] = ints
+
+#-------------------------------------------------------------------------
+# Python state of components
+#-------------------------------------------------------------------------
+# Attributes that hold signals, components, functions or other parts of
+# the elaborated model are not state. Among the rest, bytearrays are
+# stored raw and everything else is pickled.
+
+_skipped_types = ( NamedObject, type, FunctionType, MethodType, BuiltinFunctionType, ModuleType )
+
+def _is_structure( v, signal_lists ):
+  if isinstance( v, _skipped_types ):
+    return True
+  if isinstance( v, (list, tuple) ):
+    return id(v) in signal_lists or any( _is_structure( x, signal_lists ) for x in v )
+  if isinstance( v, dict ):
+    return any( _is_structure( x, signal_lists ) for x in v.values() )
+  return False
+
+def _get_state_attrs( top ):
+  signal_attrs, signal_lists = set(), set()
+  for records in top._dsl.swapped_signals.values():
+    for current_obj, i, _, is_list in records:
+      if is_list:
+        signal_lists.add( id(current_obj) )
+      else:
+        signal_attrs.add( (id(current_obj), i) )
+
+  ret = []
+  for c in sorted( top.get_all_object_filter( lambda x: isinstance( x, Component ) ), key=repr ):
+    attrs = [ (name, v) for name, v in c.__dict__.items()
+              if name[0] != '_' and (id(c), name) not in signal_attrs and
+                 not _is_structure( v, signal_lists ) ]
+    ret.append( (c, attrs) )
+  return ret
+
+# Containers are updated in place since update blocks and other objects
+# may hold on to them.
+
+def _restore_attr( c, name, v ):
+  old = c.__dict__.get( name )
+  if type(old) is type(v):
+    if isinstance( old, deque ) and old.maxlen == v.maxlen:
+      old.clear()
+      old.extend( v )
+      return
+    if isinstance( old, (list, bytearray) ):
+      old[:] = v
+      return
+    if isinstance( old, (dict, set) ):
+      old.clear()
+      old.update( v )
+      return
+  setattr( c, name, v )
+
+#-------------------------------------------------------------------------
+# CheckpointPass
+#-------------------------------------------------------------------------
+
+class CheckpointPass( BasePass ):
+
+  def __call__( self, top ):
+    if not hasattr( top, "tick" ):
+      raise PassOrderError( "tick" )
+
+    for x in [ "sim_checkpoint", "sim_restore" ]:
+      if hasattr( top, x ):
+        raise AttributeError( f"Please modify the attribute top.{x} to "
+                              "a different name." )
+
+    top.sim_checkpoint = self.create_checkpoint( top )
+    top.sim_restore    = self.create_restore( top )
+
+  @staticmethod
+  def _get_records( top ):
+    if not getattr( top._dsl, 'locked_simulation', False ):
+      raise CheckpointError( "checkpoints can only be taken of a locked-in simulation" )
+    return [ x for records in top._dsl.swapped_signals.values() for x in records ]
+
+  @staticmethod
+  def create_checkpoint( top ):
+
+    def sim_checkpoint( path ):
+      records = CheckpointPass._get_records( top )
+
+      signals, values, others = [], bytearray(), {}
+      for current_obj, i, obj, is_list in records:
+        name  = _signal_name( obj )
+        value = _get_value( current_obj, i, is_list )
+        nbits = _get_nbits( obj, value )
+        if nbits is None:
+          others[ name ] = value
+          continue
+        nbytes = (nbits + 7) >> 3
+        ints   = _to_ints( value )
+        signals.append( (name, nbits, len(ints)) )
+        for v in ints:
+          values += v.to_bytes( nbytes, 'little' )
+
+      state, blobs, unpicklable = {}, [], []
+      for c, attrs in _get_state_attrs( top ):
+        picklable = {}
+        for name, v in attrs:
+          if isinstance( v, bytearray ):
+            blobs.append( (repr(c), name, v) )
+            continue
+          try:
+            pickle.dumps( v )
+            picklable[ name ] = v
+          except Exception:
+            unpicklable.append( f"{c!r}.{name}" )
+        if picklable:
+          state[ repr(c) ] = picklable
+
+      if unpicklable:
+        warnings.warn( f"the following attributes cannot be pickled and are not "
+                       f"in the checkpoint: {', '.join( unpicklable )}" )
+
+      # Lay out the bytearrays at page boundaries after the index
+      blob_index = []
+      index = { 'signals': signals, 'others': others, 'state': state, 'blobs': blob_index }
+      index_len = len( pickle.dumps( index ) )
+      while True:
+        blob_index.clear()
+        values_off = _HEADER_SIZE + index_len
+        off = values_off + len(values)
+        for cname, name, v in blobs:
+          off = (off + _PAGE_SIZE - 1) // _PAGE_SIZE * _PAGE_SIZE
+          blob_index.append( (cname, name, off, len(v)) )
+          off += len(v)
+        index_bytes = pickle.dumps( index )
+        # The offsets are part of the index, so the index may grow
+        if len(index_bytes) <= index_len:
+          break
+        index_len = len(index_bytes)
+      index_bytes = index_bytes.ljust( index_len, b'\0' )
+
+      with open( path, 'wb' ) as f:
+        f.write( _HEADER.pack( _MAGIC, top.simulated_cycles, _HEADER_SIZE,
+                               index_len, values_off, len(values) ).ljust( _HEADER_SIZE, b'\0' ) )
+        f.write( index_bytes )
+        f.write( values )
+        for (_, _, v), (_, _, off, _) in zip( blobs, blob_index ):
+          f.write( b'\0' * (off - f.tell()) )
+          f.write( memoryview( v ) )
+
+    return sim_checkpoint
+
+  @staticmethod
+  def create_restore( top ):
+
+    def sim_restore( path ):
+      records = CheckpointPass._get_records( top )
+
+      with open( path, 'rb' ) as f:
+        with mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ ) as mm:
+          magic, cycles, index_off, index_len, values_off, values_len = \
+            _HEADER.unpack_from( mm, 0 )
+          if magic != _MAGIC:
+            raise CheckpointError( f"{path} is not a PyMTL checkpoint" )
+
+          index  = pickle.loads( mm[ index_off:index_off + index_len ] )
+          values = mm[ values_off:values_off + values_len ]
+
+          # Check that the checkpoint comes from the same design before
+          # touching the model
+
+          current = []
+          for current_obj, i, obj, is_list in records:
+            name  = _signal_name( obj )
+            value = _get_value( current_obj, i, is_list )
+            nbits = _get_nbits( obj, value )
+            if nbits is not None:
+              current.append( (name, nbits, len( _to_ints( value ) )) )
+          if current != index['signals']:
+            raise CheckpointError( f"{path} was taken of a different design than {top!r}" )
+
+          components = { repr(c): (c, dict(attrs))
+                         for c, attrs in _get_state_attrs( top ) }
+          for cname, name, off, n in index['blobs']:
+            if cname not in components or name not in components[cname][1]:
+              raise CheckpointError( f"{path} has {cname}.{name} that {top!r} doesn't have" )
+
+          off = 0
+          for current_obj, i, obj, is_list in records:
+            name  = _signal_name( obj )
+            value = _get_value( current_obj, i, is_list )
+            nbits = _get_nbits( obj, value )
+            if nbits is None:
+              if name in index['others']:
+                if is_list:
+                  current_obj[i] = index['others'][ name ]
+                else:
+                  setattr( current_obj, i, index['others'][ name ] )
+              continue
+
+            nbytes = (nbits + 7) >> 3
+            ints = []
+            for _ in range( len( _to_ints( value ) ) ):
+              ints.append( int.from_bytes( values[ off:off + nbytes ], 'little' ) )
+              off += nbytes
+            _set_value( value, ints )
+
+          for cname, attrs in index['state'].items():
+            c = components[ cname ][0]
+            for name, v in attrs.items():
+              _restore_attr( c, name, v )
+
+          view = memoryview( mm )
+          try:
+            for cname, name, off, n in index['blobs']:
+              c = components[ cname ][0]
+              old = c.__dict__[ name ]
+              if len(old) == n:
+                memoryview( old )[:] = view[ off:off + n ]
+              else:
+                setattr( c, name, bytearray( view[ off:off + n ] ) )
+          finally:
+            view.release()
+
+      top.simulated_cycles = cycles
+
+      # Constant nets are not in the schedule, so apply them again in case
+      # the model was locked in again since they were first applied
+      OptimizeDAGPass.run_init_blocks( top )
+
+      # The event-driven scheduler has to re-evaluate every block
+      ed = getattr( top._sched, "event_driven", None )
+      if ed is not None:
+        ed.dirty[:] = [ True ] * len( ed.dirty )
+
+    return sim_restore
@@ -16,8 +16,9 @@ from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
 from pymtl3.utils import custom_exec
 
+from .KernelCache import final_upblk_keys, get_kernel_cache
+from .ScheduleGraph import ScheduleGraph
 from .SimpleSchedulePass import SimpleSchedulePass, dump_dag
-from .SimpleTickPass import SimpleTickPass
 
 
 class DynamicSchedulePass( BasePass ):
@@ -29,36 +30,79 @@ class DynamicSchedulePass( BasePass ):
       raise Exception("Some schedule pass has already been applied!")
 
     top._sched = PassMetadata()
+    top._sched.scc_stats = {}
 
-    self.schedule_intra_cycle( top )
+    # Reuse the intra-cycle schedule of the same design from the kernel
+    # cache if there is one
+
+    kernel_cache = get_kernel_cache()
+    if kernel_cache is None or not self.load_cached_schedule( top, kernel_cache ):
+      self.schedule_intra_cycle( top )
+      if kernel_cache is not None:
+        self.store_cached_schedule( top, kernel_cache )
+
+    # SCC block -> the update blocks inside the SCC
+    top._sched.scc_members = { x: y[2] for x, y in self.scc_blocks.items() }
 
     # Reuse simple's ff and flip schedule
     simple = SimpleSchedulePass()
     simple.schedule_ff( top )
     simple.schedule_posedge_flip( top )
 
-  def schedule_intra_cycle( self, top ):
+  def load_cached_schedule( self, top, kernel_cache ):
+    entries = kernel_cache.load_schedule( "dynamic", top )
+    if entries is None:
+      return False
+
+    blks = final_upblk_keys( top )
+    schedule = []
+    self.scc_blocks = {}
+    try:
+      for x in entries:
+        if isinstance( x, str ):
+          schedule.append( blks[x] )
+        else:
+          scc_id, src, scc = x
+          scc = [ blks[y] for y in scc ]
+          blk = gen_wrapped_SCCblk( top, scc, src, scc_id )
+          self.scc_blocks[ blk ] = ( scc_id, src, scc )
+          schedule.append( blk )
+    except KeyError:
+      return False
+
+    top._sched.update_schedule = schedule
+    return True
+
+  def store_cached_schedule( self, top, kernel_cache ):
+    keys = { y: x for x, y in final_upblk_keys( top ).items() }
+
+    entries = []
+    for blk in top._sched.update_schedule:
+      if blk in self.scc_blocks:
+        scc_id, src, scc = self.scc_blocks[ blk ]
+        entries.append( ( scc_id, src, [ keys[x] for x in scc ] ) )
+      else:
+        entries.append( keys[ blk ] )
 
-    # Construct the intra-cycle graph based on normal update blocks
+    kernel_cache.store_schedule( "dynamic", top, entries )
 
-    V   = top._dag.final_upblks - top.get_all_update_ff()
+  def schedule_intra_cycle( self, top ):
 
-    G   = { v: [] for v in V }
-    G_T = { v: [] for v in V } # transpose graph
+    # SCC wrapper -> (scc_id, src, intra-SCC schedule)
+    self.scc_blocks = {}
 
-    E = set()
-    for (u, v) in top._dag.all_constraints: # u -> v
-      if u in V and v in V:
-        G  [u].append( v )
-        G_T[v].append( u )
-        E.add( (u, v) )
+    # Construct the intra-cycle graph based on normal update blocks
+
+    V     = top._dag.final_upblks - top.get_all_update_ff()
+    graph = ScheduleGraph( V, top._dag.all_constraints )
+    G, G_T, E = graph.G, graph.G_T, graph.E
 
     if 'MAMBA_DAG' in os.environ:
       dump_dag( top, V, E )
 
     # Compute SCC using Kosaraju's algorithm
 
-    SCCs, G_new = kosaraju_scc( G, G_T )
+    SCCs, G_new = graph.compute_sccs()
 
     # Perform topological sort on SCCs
 
@@ -116,10 +160,7 @@ class DynamicSchedulePass( BasePass ):
         if scc_pred[i] is None:
           # We start bfs from the block that has the least number of input
           # edges in the SCC
-          InD = { v: 0 for v in scc }
-          for (u, v) in E: # u -> v
-            if u in scc and v in scc:
-              InD[ v ] += 1
+          InD = graph.scc_in_degrees( i )
           Q.append( max(InD, key=InD.get) )
 
         else:
@@ -143,197 +184,136 @@ class DynamicSchedulePass( BasePass ):
               visited.add( v )
 
         scc_id += 1
-        variables = set()
-        for (u, v) in E:
-          # Collect all variables that triggers other blocks in the SCC
-          if u in scc and v in scc:
-            variables.update( constraint_objs[ (u, v) ] )
-
-        if len(variables) == 0:
-          raise Exception("There is a cyclic dependency without involving variables."
-                          "Probably a loop that involves update_once:\n{}".format(", ".join( [ x.__name__ for x in scc] )))
-
-        # generate a loop for scc
-        # Shunning: we just simply loop over the whole SCC block
-        # TODO performance optimizations using Mamba techniques within a SCC block
-
-        def gen_wrapped_SCCblk( s, scc, src ):
-          from pymtl3.dsl.errors import UpblkCyclicError
-
-          # TODO mamba?
-          scc_tick_func = SimpleTickPass.gen_tick_function( scc )
-          _globals = { 's': s, 'scc_tick_func': scc_tick_func, 'deepcopy': deepcopy }
-          _locals  = {}
-
-          custom_exec(py.code.Source( src ).compile(), _globals, _locals)
-          return _locals[ 'generated_block' ]
-
-        template = """
-def wrapped_SCC_{0}():
-  N = 0
+
+        # Only the blocks downstream of a variable that changed are
+        # re-executed within the SCC
+        scc_block_src = gen_scc_worklist_src( scc_id, [ [x] for x in tmp_schedule ],
+                                              graph.scc_edges[i], constraint_objs )
+
+        blk = gen_wrapped_SCCblk( top, tmp_schedule, scc_block_src, scc_id )
+        self.scc_blocks[ blk ] = ( scc_id, scc_block_src, tmp_schedule )
+        schedule.append( blk )
+
+#-------------------------------------------------------------------------
+# gen_scc_worklist_src
+#-------------------------------------------------------------------------
+# Generate a worklist-driven SCC block. E contains the edges inside the
+# SCC (other edges are ignored). Each unit is a list of update
+# blocks that is executed as a whole by calling blk{i}(). All units are
+# marked dirty when the SCC block is entered. After a unit executes, the
+# variables it writes that trigger other blocks in the SCC are compared
+# against their last seen values, and only the units reading a changed
+# variable are marked dirty. Sweeps over the units in the given order are
+# repeated until no unit is dirty. A unit with an incoming edge that does
+# not involve any variable (e.g. an explicit constraint) is marked dirty
+# whenever any variable changes.
+#
+# The generated block updates its statistics in the global list stats:
+# [ number of calls, number of sweeps, number of unit executions, the most
+# unit executions in a single call ].
+
+def gen_scc_worklist_src( scc_id, units, E, constraint_objs ):
+
+  unit_pos = {}
+  for i, unit in enumerate( units ):
+    for j, blk in enumerate( unit ):
+      unit_pos[ blk ] = (i, j)
+
+  # For slices of Bits we directly use the top level wide Bits since
+  # Bits clone is cheap
+
+  def normalize( x ):
+    w = x.get_top_level_signal()
+    if w is x or issubclass( w._dsl.Type, Bits ):
+      return w
+    return x
+
+  checked_by = defaultdict(set) # variable -> units that write it
+  wake_up    = defaultdict(set) # variable -> units that read it
+  blind      = set()
+
+  for (u, v) in E: # u -> v
+    if u in unit_pos and v in unit_pos:
+      (a, i), (b, j) = unit_pos[u], unit_pos[v]
+      objs = constraint_objs.get( (u, v) )
+      if not objs:
+        blind.add( b )
+        continue
+
+      for x in objs:
+        x = normalize( x )
+        checked_by[ x ].add( a )
+        # v executes after u in the same unit and sees the new value
+        if a != b or j < i:
+          wake_up[ x ].add( b )
+
+  scc_names = ", ".join( [ x.__name__ for unit in units for x in unit ] )
+
+  if not checked_by:
+    raise Exception("There is a cyclic dependency without involving variables."
+                    "Probably a loop that involves update_once:\n{}".format( scc_names ))
+
+  variables = [ x for x in sorted( checked_by, key=repr ) if wake_up[x] or blind ]
+
+  copy_srcs = []
+  unit_srcs = []
+  unit_vars = defaultdict(list)
+
+  def gen_copy( x, src ):
+    if issubclass( x._dsl.Type, Bits ):     return f"{src}.clone()"
+    elif is_bitstruct_class( x._dsl.Type ): return f"{src}.clone()"
+    else:                                   return f"deepcopy({src})"
+
+  for k, x in enumerate( variables ):
+    copy_srcs.append( f"t{k} = {gen_copy( x, repr(x) )}" )
+    for a in sorted( checked_by[x] ):
+      unit_vars[ a ].append( (k, x) )
+
+  for i, unit in enumerate( units ):
+    name = unit[0].__name__ if len(unit) == 1 else f"{len(unit)} blocks"
+    unit_srcs.extend( [ f"if d{i}:",
+                        f"  d{i} = False; n += 1",
+                        f"  blk{i}() # {name}" ] )
+    for k, x in unit_vars[i]:
+      marks = " = ".join( [ f"d{b}" for b in sorted( wake_up[x] | blind ) ] )
+      unit_srcs.extend( [ f"  _v = {x!r}",
+                          f"  if _v != t{k}:",
+                          f"    t{k} = {gen_copy( x, '_v' )}; {marks} = True" ] )
+
+  dirty = [ f"d{i}" for i in range(len(units)) ]
+
+  return f"""
+def wrapped_SCC_{scc_id}():
+  {"; ".join( copy_srcs )}
+  {" = ".join( dirty )} = True
+  N = n = 0
   while True:
     N += 1
     if N > 100:
-      raise Exception("Combinational loop detected at runtime in {{{3}}} after 100 iters!")
-    {1}
-    scc_tick_func()
-    {2}
-    # print( "SCC block{0} is executed", num_iters, "times" )
-    break
-generated_block = wrapped_SCC_{0}
-          """
-
-        copy_srcs  = []
-        check_srcs = []
-        # print_srcs = []
-
-        # clean up non-top variables if top is there. remove slices
-
-        final_variables = set()
-
-        for x in sorted( variables, key=repr ):
-          w = x.get_top_level_signal()
-          if w is x:
-            final_variables.add( x )
-            continue
-
-          # w is not x
-          if issubclass( w._dsl.Type, Bits ):
-            if w not in final_variables:
-              final_variables.add( w )
-          elif is_bitstruct_class( w._dsl.Type ):
-            if w not in final_variables:
-              final_variables.add( x )
-          else:
-            final_variables.add( x )
-
-        # group them by host component so that we create less bytecode
-
-        final_var_host = defaultdict(list)
-        for x in final_variables:
-          final_var_host[ x.get_host_component() ].append( x )
-
-        # create a block of copy/check code for each host component. Need
-        # to allocate global var_id across different host components.
-
-        var_id = 0
-        for host, var_list in final_var_host.items():
-
-          copy_srcs .append( f"host={host!r}" )
-          check_srcs.append( f"host={host!r}" )
-
-          sub_check_srcs = []
-
-          hostlen = len(repr(host))
-          for var in var_list:
-            var_id += 1
-            subname = repr(var)[hostlen+1:]
-            if issubclass( var._dsl.Type, Bits ):     copy_srcs.append( f"t{var_id}=host.{subname}.clone()" )
-            elif is_bitstruct_class( var._dsl.Type ): copy_srcs.append( f"t{var_id}=host.{subname}.clone()" )
-            else:                                     copy_srcs.append( f"t{var_id}=deepcopy(host.{subname})" )
-
-            sub_check_srcs.append( f"host.{subname} != t{var_id}" )
-
-          check_srcs.append( f"if { ' or '.join(sub_check_srcs)}: continue" )
-
-        scc_block_src = template.format( scc_id, "; ".join( copy_srcs ), "\n    ".join( check_srcs ),
-                                         ", ".join( [ x.__name__ for x in scc] ) )
-
-        # print(scc_block_src)
-        schedule.append( gen_wrapped_SCCblk( top, tmp_schedule, scc_block_src ) )
-
-def kosaraju_scc( G, G_T ):
-
-    #---------------------------------------------------------------------
-    # Run Kosaraju's algorithm to shrink all strongly connected components
-    # (SCCs) into super nodes
-    #---------------------------------------------------------------------
-
-    # First dfs on G to generate reverse post-order (RPO)
-    # Shunning: we emulate the system stack to implement non-recursive
-    # post-order DFS algorithm. At the beginning, I implemented a more
-    # succinct recursive DFS but it turned out that a 1500-depth chain in
-    # the graph will reach the CPython max recursion depth.
-    # https://docs.python.org/3/library/sys.html#sys.getrecursionlimit
-
-    PO = []
-
-    vertices = list(G.keys())
-    # random.shuffle(vertices)
-    visited = set()
-
-    # The commented algorithm loyally emulates the system stack by storing
-    # the loop index in each stack element and push only one new element
-    # to stack in every iteration. This is basically what recursive dfs
-    # does.
-    #
-    # for u in vertices:
-    #   if u not in visited:
-    #     stack = [ (u, False) ]
-    #     while stack:
-    #       u, idx = stack.pop()
-    #       visited.add( u )
-    #       if idx == len(G[u]):
-    #         PO.append( u )
-    #       else:
-    #         while idx < len(G[u]) and G[u][-idx] in visited:
-    #           idx += 1
-    #         if idx < len(G[u]):
-    #           stack.append( (u, idx) )
-    #           stack.append( (G[u][-idx], 0) )
-    #         else:
-    #           PO.append( u )
-
-    # The following algorithm push all adjacent elements to the stack at
-    # once and later check visited set to avoid redundant visit (instead
-    # of checking visited set when pushing element to the stack). I added
-    # a second_visit flag to add the node to post-order.
-
-    for u in vertices:
-      stack = [ (u, False) ]
-      while stack:
-        u, second_visit = stack.pop()
-
-        if second_visit:
-          PO.append( u )
-        elif u not in visited:
-          visited.add( u )
-          stack.append( (u, True) )
-          for v in reversed(G[u]):
-            stack.append( (v, False) )
-
-    RPO = PO[::-1]
-
-    # Second bfs on G_T to generate SCCs
-
-    SCCs  = []
-    v_SCC = {}
-    visited = set()
-
-    for u in RPO:
-      if u not in visited:
-        visited.add( u )
-        scc = set()
-        SCCs.append( scc )
-        Q = deque( [u] )
-        scc.add( u )
-        while Q:
-          u = Q.popleft()
-          v_SCC[u] = len(SCCs) - 1
-          for v in G_T[u]:
-            if v not in visited:
-              visited.add( v )
-              Q.append( v )
-              scc.add( v )
-
-    # Construct a new graph of SCCs
-
-    G_new = { i: set() for i in range(len(SCCs)) }
-
-    for u, vs in G.items():
-      for v in vs: # u -> v
-        scc_u, scc_v = v_SCC[u], v_SCC[v]
-        if scc_u != scc_v and scc_v not in G_new[ scc_u ]:
-          G_new[ scc_u ].add( scc_v )
-
-    return SCCs, G_new
+      raise Exception("Combinational loop detected at runtime in {{{scc_names}}} after 100 iters!")
+    {( chr(10) + "    " ).join( unit_srcs )}
+    if not ({" or ".join( dirty )}):
+      break
+  stats[0] += 1; stats[1] += N; stats[2] += n
+  if n > stats[3]: stats[3] = n
+generated_block = wrapped_SCC_{scc_id}
+"""
+
+def gen_wrapped_SCCblk( s, scc, src, scc_id ):
+
+  # The statistics of the SCC block are kept in top._sched.scc_stats
+  stats = [ 0, 0, 0, 0 ]
+  s._sched.scc_stats[ f"wrapped_SCC_{scc_id}" ] = stats
+
+  _globals = { 's': s, 'stats': stats, 'deepcopy': deepcopy }
+  for i, blk in enumerate( scc ):
+    _globals[ f"blk{i}" ] = blk
+  _locals  = {}
+
+  kernel_cache = get_kernel_cache()
+  if kernel_cache is not None:
+    code = kernel_cache.compile( src, f"SCC block {scc_id} at {s!r}" )
+  else:
+    code = py.code.Source( src ).compile()
+  custom_exec(code, _globals, _locals)
+  return _locals[ 'generated_block' ]
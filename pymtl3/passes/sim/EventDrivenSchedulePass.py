@@ -0,0 +1,339 @@
+"""
+========================================================================
+EventDrivenSchedulePass.py
+========================================================================
+Generate an activity-driven schedule. The static schedule produced by
+DynamicSchedulePass is kept, but a combinational update block is only
+executed if one of the signals it reads has changed since its last
+execution. After a block executes, the signals it writes are compared
+against the values seen last time and the readers of the signals that
+changed are marked for execution. Since readers always come after
+writers in the static schedule, one pass over the schedule in the same
+topological order is still enough.
+
+Sequential (update_ff) blocks are treated the same way: they execute at
+the clock edge only if one of their inputs changed, and only the
+registers of the blocks that executed are flipped and compared to wake up
+their readers.
+
+Skipping a block is only correct if it is a function of the signals it
+reads. The following blocks always execute:
+
+- SCC blocks;
+- blocks that call methods or belong to components with method ports,
+  whose state is not visible as signals;
+- blocks that read Python state, i.e. a non-signal attribute of a
+  component like s.mem[i] or s.count, a mutable object from the closure
+  or the module globals, or a function of the random/time/os/sys
+  modules. Parameters should be kept in the closure instead of in a
+  component attribute.
+
+Writes to Python state whose result is not read again by the block, like
+s.nexec += 1, are not reads. Plain functions called by a block are
+assumed to be pure; the blocks that call impure ones must be marked with
+always_execute, e.g. EventDrivenSchedulePass( always_execute=[ blk ] ).
+"""
+import ast
+import builtins
+import types
+from collections import defaultdict
+from copy import deepcopy
+from linecache import cache as line_cache
+
+from pymtl3.datatypes import Bits, is_bitstruct_class
+from pymtl3.dsl import Component, Interface, Signal
+from pymtl3.passes.BasePass import PassMetadata
+from pymtl3.utils import custom_exec
+
+from .DynamicSchedulePass import DynamicSchedulePass
+from .KernelCache import get_kernel_cache
+
+
+# Values of the closure or the globals of a block that cannot change
+
+_CONSTANT_TYPES = ( int, float, bool, str, bytes, type(None), type,
+                    types.FunctionType, types.BuiltinFunctionType )
+
+_IMPURE_MODULES = { 'random', 'time', 'os', 'sys' }
+
+# All nodes in the body of the function of an update block, without the
+# decorator like @s.update
+
+def _body_nodes( tree ):
+  return [ x for func in tree.body for stmt in func.body for x in ast.walk( stmt ) ]
+
+class EventDrivenSchedulePass( DynamicSchedulePass ):
+  def __init__( self, always_execute=() ):
+    self.always_execute = set( always_execute )
+
+  def __call__( self, top ):
+    super().__call__( top )
+
+    self.schedule_event_driven( top )
+
+  #-----------------------------------------------------------------------
+  # _reads_python_state
+  #-----------------------------------------------------------------------
+  # Check every chain like s.x[i].y or mod.f that a block loads. The chain
+  # is resolved from its root name until the first signal; anything else
+  # that is not a component, an interface or a constant is state.
+
+  def _reads_python_state( self, top, blk ):
+    host = top.get_update_block_host_component( blk )
+    info = host.get_update_block_info( blk )
+    if info is None:
+      return True
+    nodes = _body_nodes( info[-1] )
+
+    closure = {}
+    if blk.__closure__:
+      closure = { name: cell.cell_contents
+                  for name, cell in zip( blk.__code__.co_freevars, blk.__closure__ ) }
+
+    local_names = { x.id for x in nodes
+                    if isinstance( x, ast.Name ) and not isinstance( x.ctx, ast.Load ) }
+
+    def is_constant( obj ):
+      if isinstance( obj, (types.FunctionType, types.BuiltinFunctionType) ):
+        return getattr( obj, '__module__', None ) not in _IMPURE_MODULES
+      if isinstance( obj, tuple ):
+        return all( is_constant( x ) for x in obj )
+      return isinstance( obj, _CONSTANT_TYPES )
+
+    def is_stateful( node ):
+      path = []
+      while isinstance( node, (ast.Attribute, ast.Subscript) ):
+        path.append( node.attr if isinstance( node, ast.Attribute ) else None )
+        node = node.value
+      if not isinstance( node, ast.Name ) or node.id in local_names:
+        return False
+
+      name = node.id
+      if name in closure:
+        obj = closure[ name ]
+      elif name in blk.__globals__:
+        obj = blk.__globals__[ name ]
+      else:
+        obj = getattr( builtins, name, None )
+
+      parent = None
+      for attr in reversed( path ):
+        if isinstance( obj, Signal ):
+          return False
+        if isinstance( obj, list ):
+          # Only lists of signals, components and interfaces
+          while isinstance( obj, list ) and obj:
+            obj = obj[0]
+          if not isinstance( obj, (Signal, Component, Interface) ):
+            return True
+          if attr is None:
+            continue
+        if attr is None:
+          return True
+        if not isinstance( obj, (Component, Interface, types.ModuleType) ):
+          return True
+        parent, obj = obj, getattr( obj, attr, None )
+
+      if isinstance( obj, (Signal, Component, Interface, types.ModuleType) ):
+        return False
+      while isinstance( obj, list ) and obj:
+        obj = obj[0]
+      if isinstance( obj, (Signal, Component, Interface) ):
+        return False
+      # Other attributes of a component may be changed from outside
+      if isinstance( parent, (Component, Interface) ) and \
+         not isinstance( obj, (types.FunctionType, types.MethodType) ):
+        return True
+      return not is_constant( obj )
+
+    # Only the outermost node of each loaded chain. Assignment targets
+    # are writes, their indices are separate chains.
+    inner = { x.value for x in nodes if isinstance( x, (ast.Attribute, ast.Subscript) ) }
+
+    for node in nodes:
+      if isinstance( node, (ast.Name, ast.Attribute, ast.Subscript) ) and \
+         isinstance( node.ctx, ast.Load ) and node not in inner and is_stateful( node ):
+        return True
+    return False
+
+  def _get_node_reads_writes( self, top, blk ):
+    # Return the top level signals read/written by an update block in
+    # the static schedule, and whether it has to execute every cycle.
+
+    upblk_reads, upblk_writes, upblk_calls = top.get_all_upblk_metadata()
+    genblk_reads  = top._dag.genblk_reads
+    genblk_writes = top._dag.genblk_writes
+    wrapped = { y: x for x, y in getattr( top._dag, 'blk_greenlet_mapping', {} ).items() }
+
+    if blk in self.scc_members:
+      members = self.scc_members[ blk ]
+    else:
+      members = [ wrapped.get( blk, blk ) ]
+
+    reads, writes = set(), set()
+    always = blk in self.scc_members
+
+    for x in members:
+      x = wrapped.get( x, x )
+      if x in genblk_writes:
+        reads .update( genblk_reads.get( x, () ) )
+        writes.update( genblk_writes[ x ] )
+      else:
+        reads .update( upblk_reads.get( x, () ) )
+        writes.update( upblk_writes.get( x, () ) )
+        if upblk_calls.get( x ) or top.get_update_block_host_component( x ) in self.cl_hosts or \
+           x in self.always_execute or self._reads_python_state( top, x ):
+          always = True
+
+    reads  = { x.get_top_level_signal() for x in reads  if x.is_signal() }
+    writes = { x.get_top_level_signal() for x in writes if x.is_signal() }
+    return reads, writes, always
+
+  def schedule_event_driven( self, top ):
+
+    self.scc_members = top._sched.scc_members
+
+    # Components with method ports keep their state in Python attributes
+    self.cl_hosts = { x.get_host_component()
+                      for x in getattr( top._dsl, 'all_method_ports', () ) }
+
+    schedule  = top._sched.update_schedule
+    update_ff = top._sched.schedule_ff
+
+    # Combinational blocks are nodes [0, n) in topological order and
+    # sequential blocks are nodes [n, n+m). Build the sensitivity lists
+    # (signal -> nodes) from their reads.
+
+    nodes   = []
+    readers = defaultdict(set)
+    written = set()
+
+    for i, blk in enumerate( schedule + update_ff ):
+      reads, writes, always = self._get_node_reads_writes( top, blk )
+      nodes.append( (blk, writes, always) )
+      written.update( writes )
+      for x in reads:
+        readers[ x ].add( i )
+
+    n = len(schedule)
+
+    # Signals that are read but not written by any block are driven from
+    # outside, e.g. top level input ports written by the test harness.
+    sources = sorted( [ x for x in readers if x not in written ], key=repr )
+
+    # Double-buffered signals that no sequential block writes
+    ff_written = set()
+    for _, writes, _ in nodes[n:]:
+      ff_written.update( writes )
+    other_flips = sorted( [ x for x in top._dsl.all_signals
+                            if x._dsl.needs_double_buffer and x not in ff_written ], key=repr )
+
+    # Generate the comparison against and the update of the last seen
+    # value of a signal that wakes up the blocks reading it
+
+    snap_ids = {}
+
+    def gen_check( x, indent ):
+      if x not in readers:
+        return []
+      try:
+        j = snap_ids[ x ]
+      except KeyError:
+        j = snap_ids[ x ] = len(snap_ids)
+
+      Type = x._dsl.Type
+      if isinstance( Type, type ) and ( issubclass( Type, Bits ) or is_bitstruct_class( Type ) ):
+        copy = "_v.clone()"
+      elif Type is int:
+        copy = "_v"
+      else:
+        copy = "deepcopy( _v )"
+
+      marks = " = ".join( [ f"d[{k}]" for k in sorted(readers[x]) ] )
+      return [ f"{indent}_v = {x!r}",
+               f"{indent}if _v != snap[{j}]:",
+               f"{indent}  snap[{j}] = {copy}; {marks} = True" ]
+
+    def gen_blk( i, blk, always, indent ):
+      if always:
+        return [ f"{indent}# {blk.__name__}",
+                 f"{indent}blk{i}()" ], indent
+      return [ f"{indent}# {blk.__name__}",
+               f"{indent}if d[{i}]:",
+               f"{indent}  d[{i}] = False; blk{i}()" ], indent + "  "
+
+    source_srcs = []
+    for x in sources:
+      source_srcs.extend( gen_check( x, "    " ) )
+
+    # Combinational blocks, checking what they write right after
+
+    comb_srcs = list( source_srcs )
+    for i, (blk, writes, always) in enumerate( nodes[:n] ):
+      srcs, indent = gen_blk( i, blk, always, "    " )
+      comb_srcs.extend( srcs )
+      for x in sorted( writes, key=repr ):
+        comb_srcs.extend( gen_check( x, indent ) )
+
+    # Sequential blocks, recording which ones ran in r
+
+    ff_srcs = list( source_srcs )
+    for i, (blk, writes, always) in enumerate( nodes[n:], n ):
+      srcs, indent = gen_blk( i, blk, always, "    " )
+      ff_srcs.extend( srcs )
+      ff_srcs.append( f"{indent}r[{i-n}] = True" )
+
+    # Only the registers of the sequential blocks that ran can change at
+    # the clock edge
+
+    flip_srcs = [ f"    {x!r}._flip()" for x in other_flips ]
+    for i, (blk, writes, always) in enumerate( nodes[n:], n ):
+      flip_srcs.append( f"    if r[{i-n}]:" )
+      flip_srcs.append( f"      r[{i-n}] = False" )
+      for x in sorted( writes, key=repr ):
+        if x._dsl.needs_double_buffer:
+          flip_srcs.append( f"      {x!r}._flip()" )
+        flip_srcs.extend( gen_check( x, "      " ) )
+
+    src = """
+def compile_event_driven( s, blks, d, r, snap, deepcopy ):
+  {}
+  def comb_phase():
+    {}
+  def ff_phase():
+    {}
+  def flip_phase():
+    {}
+  return comb_phase, ff_phase, flip_phase
+""".format( "\n  ".join( [ f"blk{i} = blks[{i}]" for i in range(len(nodes)) ] ),
+            "\n".join( comb_srcs ).lstrip() or "pass",
+            "\n".join( ff_srcs   ).lstrip() or "pass",
+            "\n".join( flip_srcs ).lstrip() or "pass" )
+
+    fname = f"Event-driven schedule at {top!r}"
+    kernel_cache = get_kernel_cache()
+    if kernel_cache is not None:
+      code = kernel_cache.compile( src, fname )
+    else:
+      code = compile( src, filename=fname, mode="exec" )
+      line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
+
+    _locals = {}
+    custom_exec( code, {}, _locals )
+
+    # All blocks are active in the first cycle
+    dirty = [ True  ] * len(nodes)
+    ran   = [ False ] * len(update_ff)
+    snap  = [ None  ] * len(snap_ids)
+
+    comb_phase, ff_phase, flip_phase = _locals['compile_event_driven']( top,
+                                         [ x[0] for x in nodes ], dirty, ran, snap, deepcopy )
+
+    top._sched.event_driven = ed = PassMetadata()
+    ed.static_update_schedule = schedule
+    ed.static_schedule_ff     = update_ff
+    ed.dirty                  = dirty
+
+    top._sched.update_schedule       = [ comb_phase ]
+    top._sched.schedule_ff           = [ ff_phase ]
+    top._sched.schedule_posedge_flip = [ flip_phase ]
@@ -11,16 +11,66 @@ Date   : Jan 18, 2018
 from collections import defaultdict, deque
 from linecache import cache as line_cache
 
-from pymtl3.datatypes import *
-from pymtl3.datatypes.helpers import get_bitstruct_inst_all_classes
+from pymtl3.datatypes import Bits
 from pymtl3.dsl import *
 from pymtl3.dsl.errors import LeftoverPlaceholderError
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.utils import custom_exec
 
+from .KernelCache import get_kernel_cache
+
+
+#-------------------------------------------------------------------------
+# _gen_const_str
+#-------------------------------------------------------------------------
+# Generate the source string that reconstructs a constant writer of a net.
+# Every BitsN/BitStruct class used by the constant is referred to by a
+# name in _globals. A class gets its own __name__ unless a different class
+# with the same name is already there, in which case a generated alias
+# such as Point__1 is used. This allows two different structs that happen
+# to share a name to co-exist in the same generated module.
+
+def _gen_const_str( obj, _globals, aliases ):
+  if isinstance( obj, list ):
+    return "[{}]".format( ",".join( [ _gen_const_str( x, _globals, aliases )
+                                      for x in obj ] ) )
+
+  if isinstance( obj, int ):
+    return repr(obj)
+
+  cls = obj.__class__
+  try:
+    name = aliases[ cls ]
+  except KeyError:
+    name = cls.__name__
+    i = 0
+    while name in _globals:
+      i += 1
+      name = f"{cls.__name__}__{i}"
+    _globals[ name ] = cls
+    aliases[ cls ] = name
+
+  if isinstance( obj, Bits ):
+    if cls is Bits:
+      return f"{name}({obj.nbits},{int(obj):#x})"
+    return f"{name}({int(obj):#x})"
+
+  return "{}({})".format( name, ",".join( [
+            _gen_const_str( getattr( obj, v ), _globals, aliases )
+            for v in obj.__bitstruct_fields__.keys() ] ) )
+
+def _sanitize( name ):
+  return name.replace( " ", "" ) \
+             .replace( ".", "_" ).replace( ":", "_" ) \
+             .replace( "[", "_" ).replace( "]", "_" ) \
+             .replace( "(", "_" ).replace( ")", "_" ) \
+             .replace( ",", "_" )
 
 class GenDAGPass( BasePass ):
 
+  def __init__( self, batch=True ):
+    self.batch = batch
+
   def __call__( self, top ):
     top.check()
     top._dag = PassMetadata()
@@ -47,19 +97,37 @@ class GenDAGPass( BasePass ):
     top._dag.genblk_writes  = {}
     # top._dag.genblk_src     = {}
 
-    # Fall back to compiling one block at a time
-    # This is currently because there might be different structs with
-    # the same name but essentially different type. It requires name
-    # disambiguation to let them co-exist in closure. With block-by-block
-    # compilation, we minimize the effect.
+    # In batch mode, all net blocks whose LCA is the same component are
+    # emitted into one module source and compiled/executed once. This
+    # avoids one compile() and one linecache entry per net. Since the
+    # source only refers to signals relative to the LCA, all instances of
+    # the same component produce the same source, so each distinct source
+    # is compiled once and its code object is executed with the globals
+    # of every LCA. Without batch mode each net is compiled on its own.
 
     # TODO see if directly compiling AST instead of source can be faster
-    def compile_net_blk( _globals, src ):
+    code_cache   = {}
+    kernel_cache = get_kernel_cache()
+
+    def compile_net_blks( lca, _globals, srcs ):
       _locals = {}
-      fname = f"Net at {_globals['s']!r}"
-      custom_exec( compile( src, filename=fname, mode="exec"), _globals, _locals )
-      line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
-      return list(_locals.values())[0]
+      src = "".join( srcs )
+      try:
+        code = code_cache[ src ]
+      except KeyError:
+        fname = f"Net at {lca!r}" if len(srcs) == 1 else f"Nets at {lca!r}"
+        if kernel_cache is not None:
+          code = kernel_cache.compile( src, fname )
+        else:
+          code = compile( src, filename=fname, mode="exec" )
+          line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
+        if self.batch:
+          code_cache[ src ] = code
+      custom_exec( code, _globals, _locals )
+      return _locals
+
+    # lca -> [ _globals, type aliases, used block names, [(name, src, writer, readers)] ]
+    lca_nets = {}
 
     for writer, signals in top.get_all_value_nets():
       if len(signals) == 1:
@@ -102,38 +170,61 @@ class GenDAGPass( BasePass ):
         for i in range( fanout ):
           rd_lcas[i] = rd_lcas[i].get_parent_object()
 
+      if self.batch and wr_lca in lca_nets:
+        _globals, aliases, names, nets = lca_nets[ wr_lca ]
+      else:
+        _globals, aliases, names, nets = {'s': wr_lca }, {}, set(), []
+        lca_nets[ wr_lca if self.batch else writer ] = [ _globals, aliases, names, nets ]
+
       lca_len = len( repr(wr_lca) )
-      _globals = {'s': wr_lca }
 
       if isinstance( writer, Const ) and type(writer._dsl.const) is not int:
-        types = get_bitstruct_inst_all_classes( writer._dsl.const )
+        wstr = _gen_const_str( writer._dsl.const, _globals, aliases )
+      else:
+        wstr = f"s.{repr(writer)[lca_len+1:]}"
 
-        for t in types:
-          if t.__name__ in _globals:
-            assert t is _globals[ t.__name__ ], "Cannot handle two subfields with the same struct name but different structs"
-          _globals[ t.__name__ ] = t
-        wstr = repr(writer)
+      # Nets and readers come out of sets. Sort them so that the generated
+      # source of a component does not depend on the iteration order.
+      rstrs   = sorted( [ f"s.{repr(x)[lca_len+1:]}" for x in readers ] )
+      upblk_name = _sanitize( f"{writer!r}__{fanout}" )
 
+      # In batch mode the name in the source is also relative to the LCA
+      # so that all instances of a component generate the same source.
+      # The function is renamed to upblk_name after execution.
+      if self.batch and writer.is_signal():
+        src_name = _sanitize( f"s.{repr(writer)[lca_len+1:]}__{fanout}" )
       else:
-        wstr = f"s.{repr(writer)[lca_len+1:]}"
+        src_name = upblk_name
 
-      rstrs   = [ f"s.{repr(x)[lca_len+1:]}" for x in readers ]
-      upblk_name = f"{writer!r}__{fanout}".replace( " ", "" ) \
-                      .replace( ".", "_" ).replace( ":", "_" ) \
-                      .replace( "[", "_" ).replace( "]", "_" ) \
-                      .replace( "(", "_" ).replace( ")", "_" ) \
-                      .replace( ",", "_" )
+      # Different constant writers can have the same repr
+      name, i = src_name, 0
+      while name in names:
+        i += 1
+        name = f"{src_name}__{i}"
+      if i:
+        upblk_name = f"{upblk_name}__{i}"
+      names.add( name )
 
       gen_src = """
 def {}():
-  {} = {}""".format( upblk_name, " = ".join( rstrs ), wstr )
+  {} = {}
+""".format( name, " = ".join( rstrs ), wstr )
+
+      nets.append( (name, upblk_name, gen_src, writer, readers) )
+
+    for key, (_globals, _, _, nets) in lca_nets.items():
+      nets.sort( key=lambda x: x[0] )
+      _locals = compile_net_blks( _globals['s'], _globals, [ x[2] for x in nets ] )
 
-      blk = compile_net_blk( _globals, gen_src )
+      for name, upblk_name, _, writer, readers in nets:
+        blk = _locals[ name ]
+        blk.__name__ = blk.__qualname__ = upblk_name
 
-      top._dag.genblks.add( blk )
-      if writer.is_signal():
-        top._dag.genblk_reads[ blk ] = [ writer ]
-      top._dag.genblk_writes[ blk ] = readers
+        top._dag.genblks.add( blk )
+        top._dag.genblk_hostobj[ blk ] = _globals['s']
+        if writer.is_signal():
+          top._dag.genblk_reads[ blk ] = [ writer ]
+        top._dag.genblk_writes[ blk ] = readers
 
     # Get the final list of update blocks
     top._dag.final_upblks = top.get_all_update_blocks() | top._dag.genblks
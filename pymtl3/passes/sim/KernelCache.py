@@ -0,0 +1,179 @@
+"""
+========================================================================
+KernelCache.py
+========================================================================
+A persistent on-disk cache of the code that simulation passes generate.
+
+Generated sources (net blocks, double-buffer flip functions, SCC wrappers
+and meta blocks) are compiled through KernelCache.compile, which is
+content-addressed: the marshalled code object is stored under the hash
+of the source, so a rerun only unmarshals what it would otherwise
+compile. In addition, schedules are stored under a structural hash of
+the elaborated design so that a schedule pass can skip constructing the
+schedule when the design has not changed.
+
+The cache is enabled by setting PYMTL_KERNEL_CACHE to a directory.
+"""
+import hashlib
+import linecache
+import marshal
+import os
+import sys
+import textwrap
+from importlib.util import MAGIC_NUMBER
+
+# Bump this when a pass changes the code or schedule it generates
+_CACHE_VERSION = "2"
+
+_caches = {}
+
+def get_kernel_cache():
+  path = os.getenv( "PYMTL_KERNEL_CACHE" )
+  if not path:
+    return None
+  try:
+    return _caches[ path ]
+  except KeyError:
+    ret = _caches[ path ] = KernelCache( path )
+    return ret
+
+#-------------------------------------------------------------------------
+# Block keys
+#-------------------------------------------------------------------------
+# Update blocks are identified by their host component and name, and net
+# blocks by the first of their readers, which belongs to only one net.
+
+def upblk_key( top, blk ):
+  try:
+    return f"{top.get_update_block_host_component( blk )!r}.{blk.__name__}"
+  except KeyError:
+    return f"net:{min( [ repr(x) for x in top._dag.genblk_writes[ blk ] ] )}"
+
+def final_upblk_keys( top ):
+  mapping = getattr( top._dag, "blk_greenlet_mapping", {} )
+  wrapped = { y: x for x, y in mapping.items() }
+
+  ret = {}
+  for blk in top._dag.final_upblks:
+    if blk in wrapped:
+      ret[ upblk_key( top, wrapped[ blk ] ) + "@greenlet" ] = blk
+    else:
+      ret[ upblk_key( top, blk ) ] = blk
+  return ret
+
+#-------------------------------------------------------------------------
+# design_hash
+#-------------------------------------------------------------------------
+# Hash everything that the schedule depends on: update blocks and what
+# they read/write/call, nets, explicit constraints, method nets and the
+# signals that need double buffering.
+
+def design_hash( top ):
+  try:
+    return top._dag.design_hash
+  except AttributeError:
+    pass
+
+  reads, writes, calls = top.get_all_upblk_metadata()
+  update_ff = top.get_all_update_ff()
+  hostobj   = top._dsl.all_upblk_hostobj
+  U_U, RD_U, WR_U, U_M = top.get_all_explicit_constraints()
+
+  # The repr of a function or a bound method contains its address
+  def key( x ):
+    if x in hostobj:
+      return upblk_key( top, x )
+    if hasattr( x, "__self__" ) and hasattr( x, "__name__" ):
+      return f"{x.__self__!r}.{x.__name__}"
+    return repr(x)
+
+  lines = []
+
+  for blk in top.get_all_update_blocks():
+    lines.append( "U {} {} R {} W {} C {}".format( key(blk), int(blk in update_ff),
+      " ".join( sorted( [ repr(x) for x in reads.get( blk, () ) ] ) ),
+      " ".join( sorted( [ repr(x) for x in writes.get( blk, () ) ] ) ),
+      " ".join( sorted( [ key(x) for x in calls.get( blk, () ) ] ) ) ) )
+
+  for writer, signals in top.get_all_value_nets():
+    lines.append( "N {} {}".format( repr(writer),
+      " ".join( sorted( [ repr(x) for x in signals ] ) ) ) )
+
+  for writer, net in top.get_all_method_nets():
+    lines.append( "M {} {}".format( repr(writer),
+      " ".join( sorted( [ repr(x) for x in net ] ) ) ) )
+
+  for (x, y) in U_U:
+    lines.append( f"UU {key(x)} {key(y)}" )
+  for typ, constraints in [ ( "RD", RD_U ), ( "WR", WR_U ) ]:
+    for obj, blks in constraints.items():
+      for (sign, blk) in blks:
+        lines.append( f"{typ} {obj!r} {sign} {key(blk)}" )
+  for (x, y, is_equal) in U_M:
+    lines.append( f"UM {key(x)} {key(y)} {int(is_equal)}" )
+
+  for x in top._dsl.all_signals:
+    lines.append( f"S {x!r} {x._dsl.Type.__module__}.{x._dsl.Type.__qualname__} "
+                  f"{int(x._dsl.needs_double_buffer)}" )
+
+  h = hashlib.sha256()
+  h.update( f"{_CACHE_VERSION} {sys.version}\n".encode() )
+  h.update( "\n".join( sorted( lines ) ).encode() )
+  top._dag.design_hash = ret = h.hexdigest()
+  return ret
+
+#-------------------------------------------------------------------------
+# KernelCache
+#-------------------------------------------------------------------------
+
+class KernelCache:
+
+  def __init__( s, path ):
+    s.path  = os.path.abspath( path )
+    s._code = {}
+    s.hits  = s.misses = 0
+
+  def _file( s, kind, digest ):
+    return os.path.join( s.path, kind, digest[:2], digest )
+
+  def _read( s, kind, digest ):
+    try:
+      with open( s._file( kind, digest ), "rb" ) as f:
+        return marshal.loads( f.read() )
+    except (OSError, EOFError, ValueError, TypeError):
+      return None
+
+  def _write( s, kind, digest, obj ):
+    fname = s._file( kind, digest )
+    os.makedirs( os.path.dirname( fname ), exist_ok=True )
+    # Write to a temporary file first so that concurrent runs never see
+    # a partial entry
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    with open( tmp, "wb" ) as f:
+      f.write( marshal.dumps( obj ) )
+    os.replace( tmp, fname )
+
+  def compile( s, src, filename ):
+    src = textwrap.dedent( src )
+    digest = hashlib.sha256( MAGIC_NUMBER + filename.encode() + b"\0" +
+                             src.encode() ).hexdigest()
+    try:
+      code = s._code[ digest ]
+    except KeyError:
+      code = s._read( "code", digest )
+      if code is None:
+        s.misses += 1
+        code = compile( src, filename=filename, mode="exec" )
+        s._write( "code", digest, code )
+      else:
+        s.hits += 1
+      s._code[ digest ] = code
+
+    linecache.cache[ filename ] = (len(src), None, src.splitlines(), filename )
+    return code
+
+  def load_schedule( s, name, top ):
+    return s._read( "sched", f"{design_hash( top )}-{name}" )
+
+  def store_schedule( s, name, top, schedule ):
+    s._write( "sched", f"{design_hash( top )}-{name}", schedule )
@@ -0,0 +1,227 @@
+"""
+========================================================================
+OptimizeDAGPass.py
+========================================================================
+Remove update blocks that do not need to be executed every cycle from
+the DAG generated by GenDAGPass, before a schedule pass consumes it.
+
+- const_prop: a net whose writer is a Const never changes after reset,
+  so its net block is moved from top._dag.final_upblks to
+  top._dag.init_blks. These blocks are executed by run_init_blocks
+  after the model is locked in for simulation, and again by sim_reset and
+  sim_restore since unlocking and locking in the model again resets
+  every signal.
+
+- dead_blocks: a combinational block whose outputs are never read by
+  any other block is removed. A write is considered read if another
+  block reads any part of the same signal, if the signal belongs to the
+  top component (the test harness can read it), or if it is passed in
+  keep. This is iterated until no block can be removed, so a chain of
+  blocks that only feeds an unused debug output goes away as a whole.
+  Only blocks without side effects other than signal writes are
+  removed: blocks that call methods, raise, assert, or call/assign
+  anything that is not a signal are kept.
+
+Dead block elimination is off by default since signals that are only
+read by line_trace or by the test harness below the top component are
+not visible to the pass. It is skipped when waveforms are dumped.
+
+The number of eliminated blocks is reported in top._dag.opt_stats.
+"""
+import ast
+from collections import defaultdict
+
+from pymtl3.datatypes import Bits
+from pymtl3.dsl import Component, Interface, Signal
+from pymtl3.passes.BasePass import BasePass
+from pymtl3.passes.errors import PassOrderError
+
+# Calls that can be made by a block without side effects other than the
+# returned value
+
+_IMPURE_FUNCS = { 'print', 'exec', 'eval', 'open', 'input', 'setattr',
+                  'delattr', 'globals', 'locals', 'next' }
+_PURE_METHODS = { x for x in dir(Bits) if not x.startswith('_') }
+
+def _root_signal( obj ):
+  while True:
+    parent = obj.get_parent_object()
+    if not isinstance( parent, Signal ):
+      return obj
+    obj = parent
+
+class OptimizeDAGPass( BasePass ):
+
+  def __init__( self, const_prop=True, dead_blocks=False, keep=(), verbose=False ):
+    self.const_prop  = const_prop
+    self.dead_blocks = dead_blocks
+    self.keep        = keep
+    self.verbose     = verbose
+
+  def __call__( self, top ):
+    if not hasattr( top, "_dag" ) or not hasattr( top._dag, "all_constraints" ):
+      raise PassOrderError( "_dag" )
+
+    top._dag.init_blks = []
+    top._dag.dead_blks = []
+
+    if self.const_prop:
+      self.hoist_const_nets( top )
+
+    if self.dead_blocks:
+      tracing = getattr( top, "config_tracing", None )
+      if tracing is None or tracing.tracing == 'none':
+        self.eliminate_dead_blocks( top )
+
+    top._dag.opt_stats = { 'const': len(top._dag.init_blks),
+                           'dead' : len(top._dag.dead_blks) }
+    if self.verbose:
+      print( f"OptimizeDAGPass: hoisted {top._dag.opt_stats['const']} constant "
+             f"net blocks, eliminated {top._dag.opt_stats['dead']} dead blocks" )
+
+  @staticmethod
+  def run_init_blocks( top ):
+    for blk in getattr( top._dag, "init_blks", () ):
+      blk()
+
+  #-----------------------------------------------------------------------
+  # Constant propagation
+  #-----------------------------------------------------------------------
+  # GenDAGPass only records the reads of a net block with a signal writer
+
+  def hoist_const_nets( self, top ):
+    const_blks = { x for x in top._dag.genblks if x not in top._dag.genblk_reads }
+    top._dag.init_blks = sorted( const_blks, key=lambda x: x.__name__ )
+    self._remove( top, const_blks )
+
+  #-----------------------------------------------------------------------
+  # Dead block elimination
+  #-----------------------------------------------------------------------
+
+  def eliminate_dead_blocks( self, top ):
+    upblk_reads, upblk_writes, upblk_calls = top.get_all_upblk_metadata()
+    genblk_reads, genblk_writes = top._dag.genblk_reads, top._dag.genblk_writes
+    update_ff = top.get_all_update_ff()
+
+    def get_reads( blk ):
+      return genblk_reads.get( blk, () ) if blk in top._dag.genblks else upblk_reads[ blk ]
+
+    def get_writes( blk ):
+      return genblk_writes[ blk ] if blk in top._dag.genblks else upblk_writes[ blk ]
+
+    keep_roots = { _root_signal( x ) for x in self.keep }
+
+    def is_observable( root ):
+      return root in keep_roots or root.get_host_component() is top
+
+    candidates = set()
+    for blk in top._dag.final_upblks:
+      if blk in update_ff:
+        continue
+      if blk in top._dag.genblks:
+        candidates.add( blk )
+      elif not upblk_calls.get( blk ) and self._is_pure( top, blk ):
+        candidates.add( blk )
+
+    # root signal -> blocks that read it
+    readers = defaultdict(set)
+    for blk in top._dag.final_upblks:
+      for x in get_reads( blk ):
+        readers[ _root_signal( x ) ].add( blk )
+
+    dead = set()
+    changed = True
+    while changed:
+      changed = False
+      for blk in candidates - dead:
+        for x in get_writes( blk ):
+          root = _root_signal( x )
+          if is_observable( root ) or readers[ root ] - {blk} - dead:
+            break
+        else:
+          dead.add( blk )
+          changed = True
+
+    top._dag.dead_blks = sorted( dead, key=lambda x: x.__name__ )
+    self._remove( top, dead )
+
+  # Only allow a block to compute values and write them to signals or
+  # local variables. The host component is looked up by the name the
+  # block uses for it (usually s).
+
+  def _is_pure( self, top, blk ):
+    host = top.get_update_block_host_component( blk )
+    info = host.get_update_block_info( blk )
+    if info is None:
+      return False
+    tree = info[-1]
+
+    closure = {}
+    if blk.__closure__:
+      closure = { name: cell.cell_contents
+                  for name, cell in zip( blk.__code__.co_freevars, blk.__closure__ ) }
+
+    def is_signal_target( node ):
+      if isinstance( node, ast.Name ):
+        return True
+      if isinstance( node, (ast.Tuple, ast.List) ):
+        return all( is_signal_target( x ) for x in node.elts )
+
+      # Strip the trailing indexing/slicing, then resolve s.x.y until the
+      # first signal or list
+      while isinstance( node, ast.Subscript ):
+        node = node.value
+      attrs = []
+      while isinstance( node, ast.Attribute ):
+        attrs.append( node.attr )
+        node = node.value
+      if not isinstance( node, ast.Name ) or closure.get( node.id ) is not host:
+        return False
+
+      obj = host
+      for attr in reversed( attrs ):
+        obj = getattr( obj, attr, None )
+        # Python lists that hold something else than signals are state
+        while isinstance( obj, list ) and obj:
+          obj = obj[0]
+        if isinstance( obj, Signal ):
+          return True
+        if not isinstance( obj, (Component, Interface) ):
+          return False
+      return False
+
+    for node in ast.walk( tree ):
+      if isinstance( node, (ast.Global, ast.Nonlocal, ast.Delete, ast.Assert,
+                            ast.Raise, ast.Yield, ast.YieldFrom, ast.Await) ):
+        return False
+      if isinstance( node, ast.Expr ) and isinstance( node.value, ast.Call ):
+        return False
+      if isinstance( node, ast.Call ):
+        func = node.func
+        if isinstance( func, ast.Name ) and func.id in _IMPURE_FUNCS:
+          return False
+        if isinstance( func, ast.Attribute ) and func.attr not in _PURE_METHODS:
+          return False
+      if isinstance( node, ast.Assign ):
+        if not all( is_signal_target( x ) for x in node.targets ):
+          return False
+      if isinstance( node, (ast.AugAssign, ast.AnnAssign) ):
+        if not is_signal_target( node.target ):
+          return False
+    return True
+
+  #-----------------------------------------------------------------------
+  # _remove
+  #-----------------------------------------------------------------------
+
+  def _remove( self, top, blks ):
+    if not blks:
+      return
+    dag = top._dag
+    dag.final_upblks = dag.final_upblks - blks
+    dag.genblks      = dag.genblks - blks
+    dag.all_constraints = { (x, y) for (x, y) in dag.all_constraints
+                            if x not in blks and y not in blks }
+    for (x, y) in list( dag.constraint_objs ):
+      if x in blks or y in blks:
+        del dag.constraint_objs[ (x, y) ]
@@ -0,0 +1,599 @@
+"""
+========================================================================
+PartitionedSimPass.py
+========================================================================
+Simulate independent partitions of a design in parallel processes.
+
+The top-level child components are grouped into partitions and each
+partition is simulated in its own process forked from the locked-in
+model. A partition only executes the update blocks of its components.
+Net blocks that connect several partitions are executed in every
+partition that owns one of their readers.
+
+The partitions may only communicate through signals that are written by
+update_ff blocks, i.e. with at least one cycle of latency. This is the
+case for tiles connected by queues whose output ports are registered.
+Since such a signal only changes at the clock edge, each partition
+publishes the new values of the signals it sends right after the posedge
+flip, all partitions meet at a barrier, and each copies the values it
+receives into its own model before evaluating the combinational logic
+of the cycle. The result is identical to the single-process simulation.
+Any other dependence between partitions is rejected with a
+PartitionError when the pass is applied, and so are designs that dump
+waveforms, since the workers do not run the tracing functions.
+
+After the run, the workers send the values of the signals they wrote and
+the plain Python state of their components back to the main process.
+The main process simulates the first partition itself.
+"""
+import multiprocessing
+import os
+import pickle
+import traceback
+import warnings
+from collections import defaultdict
+from linecache import cache as line_cache
+from mmap import mmap
+from threading import BrokenBarrierError
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+
+from pymtl3.datatypes import Bits, is_bitstruct_class
+from pymtl3.datatypes.bits_array import BitsArray
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+from pymtl3.passes.errors import PartitionError, PassOrderError
+from pymtl3.utils import custom_exec
+
+from .KernelCache import get_kernel_cache
+
+#-------------------------------------------------------------------------
+# Conversion between values and integers
+#-------------------------------------------------------------------------
+# Values cross the process boundary as the integer of their bits. The
+# value is written back into the existing object so that objects shared
+# by several signals (e.g. through net blocks) see it as well: BitsN with
+# <<= and _flip, bit structs field by field.
+
+def gen_to_int( expr, Type ):
+  if issubclass( Type, Bits ):
+    return f"int({expr})"
+  return f"{expr}._to_bits_value()"
+
+def _get_nbits( Type ):
+  if isinstance( Type, list ):
+    return len(Type) * _get_nbits( Type[0] )
+  if issubclass( Type, Bits ):
+    return Type.nbits
+  return Type.__bitstruct_nbits__
+
+def _gen_field_writes( prefix, Type, offset, v, _globals, lines ):
+  if isinstance( Type, list ):
+    nbits = _get_nbits( Type[0] )
+    for i, T in enumerate( Type ):
+      _gen_field_writes( f"{prefix}[{i}]", T, offset + (len(Type)-1-i) * nbits,
+                         v, _globals, lines )
+
+  elif issubclass( Type, Bits ):
+    _globals[ Type.__name__ ] = Type
+    lines.append( f"{prefix} = {Type.__name__}( ({v} >> {offset}) & {(1 << Type.nbits) - 1:#x} )" )
+
+  elif hasattr( Type, '__bitstruct_packed__' ):
+    lines.append( f"{prefix}._value = ({v} >> {offset}) & {(1 << Type.__bitstruct_nbits__) - 1:#x}" )
+
+  else:
+    for name, (field_offset, _) in Type.__bitstruct_layout__.items():
+      _gen_field_writes( f"{prefix}.{name}", Type.__bitstruct_fields__[ name ],
+                         offset + field_offset, v, _globals, lines )
+
+def gen_from_int( expr, Type, v, _globals ):
+  lines = [ f"_x = {expr}" ]
+  if issubclass( Type, Bits ):
+    _globals[ Type.__name__ ] = Type
+    lines.append( f"_x <<= {Type.__name__}( {v} ); _x._flip()" )
+  else:
+    _gen_field_writes( "_x", Type, 0, v, _globals, lines )
+  return lines
+
+def _is_bits_type( Type ):
+  return isinstance( Type, type ) and ( issubclass( Type, Bits ) or is_bitstruct_class( Type ) )
+
+#-------------------------------------------------------------------------
+# _RemoteTraceback
+#-------------------------------------------------------------------------
+# Carries the traceback of an exception raised in a worker as the cause
+# of the exception re-raised in the main process.
+
+class _RemoteTraceback( Exception ):
+  def __init__( s, tb ):
+    s.tb = tb
+
+  def __str__( s ):
+    return s.tb
+
+#-------------------------------------------------------------------------
+# PartitionedSimPass
+#-------------------------------------------------------------------------
+# partitions is a list of lists of top-level child components. If it is
+# not given, the children are distributed over at most nprocs partitions
+# (by default the number of CPUs) balancing the number of update blocks.
+# The pass adds top.sim_run_partitioned( ncycles ).
+
+class PartitionedSimPass( BasePass ):
+
+  def __init__( self, nprocs=None, partitions=None ):
+    self.nprocs     = nprocs
+    self.partitions = partitions
+
+  def __call__( self, top ):
+    if not hasattr( top, "_sched" ) or not hasattr( top._sched, "update_schedule" ):
+      raise PassOrderError( "update_schedule" )
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+      raise PartitionError( "partitioned simulation needs the fork start method" )
+
+    if top.get_signal_store() is not None:
+      raise PartitionError( "partitioned simulation does not support signals in shared memory" )
+
+    tracing = getattr( top, "_tracing", None )
+    for x in [ "vcd_func", "pwf_func", "flight_func", "collect_text_sigs" ]:
+      if hasattr( tracing, x ):
+        raise PartitionError( f"partitioned simulation does not support tracing (top._tracing.{x})" )
+
+    top._partition = PassMetadata()
+
+    self.assign_partitions( top )
+    self.collect_nodes( top )
+    self.check_boundaries( top )
+    self.gen_partitions( top )
+
+    top.sim_run_partitioned = self.gen_sim_run_partitioned( top )
+
+  #-----------------------------------------------------------------------
+  # assign_partitions
+  #-----------------------------------------------------------------------
+
+  def assign_partitions( self, top ):
+    children = sorted( top.get_child_components(), key=repr )
+
+    if self.partitions is not None:
+      self.child_part = {}
+      for i, group in enumerate( self.partitions ):
+        for c in group:
+          if c not in children:
+            raise PartitionError( f"{c!r} is not a child component of the top" )
+          if c in self.child_part:
+            raise PartitionError( f"{c!r} is assigned to more than one partition" )
+          self.child_part[ c ] = i
+      for c in children:
+        if c not in self.child_part:
+          raise PartitionError( f"{c!r} is not assigned to any partition" )
+      self.nparts = max( len(self.partitions), 1 )
+
+    else:
+      # Longest-processing-time-first with the number of update blocks of
+      # the subtree as the cost
+      cost = defaultdict(int)
+      for blk in top._dag.final_upblks:
+        if blk not in top._dag.genblks:
+          c = self._get_child( top, top.get_update_block_host_component( blk ) )
+          cost[ c ] += 1
+
+      self.nparts = max( min( self.nprocs or os.cpu_count() or 1, len(children) ), 1 )
+      load = [ 0 ] * self.nparts
+      self.child_part = {}
+      for c in sorted( children, key=lambda x: -cost[x] ):
+        i = min( range(self.nparts), key=lambda x: load[x] )
+        self.child_part[ c ] = i
+        load[i] += cost[c]
+
+    top._partition.nparts = self.nparts
+    top._partition.child_part = self.child_part
+
+  def _get_child( self, top, c ):
+    # The top-level child that contains c, or None for top itself
+    if c is top:
+      return None
+    parent = c.get_parent_object()
+    while parent is not top:
+      c, parent = parent, parent.get_parent_object()
+    return c
+
+  def _get_part( self, top, c ):
+    # Top-level blocks and signals belong to the first partition
+    try:
+      return self.comp_part[ c ]
+    except KeyError:
+      child = self._get_child( top, c )
+      ret = self.comp_part[ c ] = 0 if child is None else self.child_part[ child ]
+      return ret
+
+  #-----------------------------------------------------------------------
+  # collect_nodes
+  #-----------------------------------------------------------------------
+  # A node is an entry of the static schedule: an update block, a net
+  # block, or an SCC block. Each node gets the partitions it executes in
+  # and the top-level signals it reads and writes.
+
+  def collect_nodes( self, top ):
+    self.comp_part = {}
+
+    ed = getattr( top._sched, "event_driven", None )
+    if ed is not None:
+      schedule, update_ff = ed.static_update_schedule, ed.static_schedule_ff
+    else:
+      schedule, update_ff = top._sched.update_schedule, top._sched.schedule_ff
+
+    scc_members = getattr( top._sched, "scc_members", {} )
+    wrapped = { y: x for x, y in getattr( top._dag, 'blk_greenlet_mapping', {} ).items() }
+
+    upblk_reads, upblk_writes, _ = top.get_all_upblk_metadata()
+    genblk_reads  = top._dag.genblk_reads
+    genblk_writes = top._dag.genblk_writes
+
+    def sig_part( x ):
+      return self._get_part( top, x.get_host_component() )
+
+    self.nodes = []
+    for blk in schedule + update_ff:
+      parts, reads, writes = set(), set(), set()
+      is_genblk = True
+
+      for x in scc_members.get( blk, [ blk ] ):
+        x = wrapped.get( x, x )
+        if x in genblk_writes:
+          parts .update( sig_part(y) for y in genblk_writes[ x ] )
+          reads .update( genblk_reads.get( x, () ) )
+          writes.update( genblk_writes[ x ] )
+        else:
+          is_genblk = False
+          parts .add   ( self._get_part( top, top.get_update_block_host_component( x ) ) )
+          reads .update( upblk_reads.get( x, () ) )
+          writes.update( upblk_writes.get( x, () ) )
+
+      if len(parts) > 1 and not is_genblk:
+        raise PartitionError( f"combinational loop {blk.__name__} spans partitions "
+                              f"{sorted(parts)}" )
+
+      reads  = { x.get_top_level_signal() for x in reads  if x.is_signal() }
+      writes = { x.get_top_level_signal() for x in writes if x.is_signal() }
+      self.nodes.append( (blk, frozenset(parts), reads, writes) )
+
+    self.ncomb = len(schedule)
+
+    # Method calls cannot cross partitions
+    for writer, net in top.get_all_method_nets():
+      parts = { self._get_part( top, x.get_host_component() ) for x in net }
+      if len(parts) > 1:
+        raise PartitionError( f"method connection {sorted( [ repr(x) for x in net ] )} "
+                              f"spans partitions {sorted(parts)}" )
+
+  #-----------------------------------------------------------------------
+  # check_boundaries
+  #-----------------------------------------------------------------------
+  # A node executing in partition P that reads a signal written by a node
+  # that does not execute in P needs the signal from another partition.
+  # This is only legal if the writer is a sequential block of a single
+  # partition Q, in which case Q sends the signal to P every cycle.
+
+  def check_boundaries( self, top ):
+    writers = defaultdict(list)
+    for i, (blk, parts, reads, writes) in enumerate( self.nodes ):
+      for x in writes:
+        writers[ x ].append( i )
+
+    self.owner = {}
+    for x, ws in writers.items():
+      owners = { self.nodes[i][1] for i in ws }
+      if len(owners) > 1:
+        raise PartitionError( f"{x!r} is written by {', '.join( [ self.nodes[i][0].__name__ for i in ws ] )} "
+                              f"in different partitions" )
+      self.owner[ x ] = owners.pop()
+
+    self.recv = defaultdict(set) # P -> signals received by P
+    self.send = defaultdict(set) # Q -> signals sent by Q
+
+    for i, (blk, parts, reads, writes) in enumerate( self.nodes ):
+      for x in reads:
+        for j in writers.get( x, () ):
+          wblk, wparts, _, _ = self.nodes[j]
+          missing = parts - wparts
+          if not missing:
+            continue
+
+          if j < self.ncomb or len(wparts) != 1:
+            raise PartitionError( f"{blk.__name__} in partition {min(missing)} reads {x!r} "
+              f"which is written combinationally by {wblk.__name__} in partition "
+              f"{min(wparts)}. Partitions can only communicate through signals "
+              f"written by update_ff blocks." )
+
+          if not _is_bits_type( x._dsl.Type ):
+            raise PartitionError( f"{x!r} of type {x._dsl.Type} crosses partitions. "
+                                   "Only Bits and BitStruct signals are supported." )
+
+          self.send[ next(iter(wparts)) ].add( x )
+          for P in missing:
+            self.recv[ P ].add( x )
+
+    # Explicit constraints between blocks of different partitions cannot be
+    # enforced
+    node_of = {}
+    scc_members = getattr( top._sched, "scc_members", {} )
+    for i, (blk, _, _, _) in enumerate( self.nodes[:self.ncomb] ):
+      for x in scc_members.get( blk, [ blk ] ):
+        node_of[ x ] = i
+    for (u, v) in top._dag.all_constraints:
+      if u in node_of and v in node_of:
+        pu, pv = self.nodes[ node_of[u] ][1], self.nodes[ node_of[v] ][1]
+        if not pv <= pu:
+          raise PartitionError( f"{u.__name__} in partition {min(pu)} has to execute before "
+                                f"{v.__name__} in partition {min(pv - pu)}" )
+
+  #-----------------------------------------------------------------------
+  # gen_partitions
+  #-----------------------------------------------------------------------
+
+  def gen_partitions( self, top ):
+    nparts = self.nparts
+
+    # Byte offsets of the sent signals in each half of the double-buffered
+    # exchange area
+
+    offsets = {}
+    size = 0
+    for x in sorted( set().union( *self.send.values() ), key=repr ):
+      nbytes = ( _get_nbits( x._dsl.Type ) + 7 ) >> 3
+      offsets[ x ] = ( size, nbytes )
+      size += nbytes
+
+    p = top._partition
+    p.offsets   = offsets
+    p.exchange  = size > 0
+    p.buf       = mmap( -1, 2 * size ) if size else None
+    p.barrier   = multiprocessing.get_context( "fork" ).Barrier( nparts ) if size else None
+
+    # Double-buffered signals are flipped by the partition that writes them
+
+    flips = defaultdict(list)
+    for x in sorted( top._dsl.all_signals, key=repr ):
+      if x._dsl.needs_double_buffer:
+        parts = self.owner.get( x.get_top_level_signal(), range(nparts) )
+        for P in parts:
+          flips[ P ].append( x )
+
+    clear_cl_trace = getattr( getattr( top, "_tracing", None ), "clear_cl_trace", None )
+
+    p.runs = []
+    for P in range( nparts ):
+      ff_blks   = [ x[0] for x in self.nodes[self.ncomb:] if P in x[1] ]
+      comb_blks = [ x[0] for x in self.nodes[:self.ncomb] if P in x[1] ]
+      p.runs.append( self.gen_run( top, P, ff_blks, comb_blks, flips[P],
+                                   clear_cl_trace, size ) )
+
+    # The values written by each partition are sent back after the run.
+    # Signals written by nodes that run in several partitions are
+    # recomputed by the main process.
+
+    shipped = defaultdict(list)
+    for x, parts in sorted( self.owner.items(), key=lambda x: repr(x[0]) ):
+      if len(parts) == 1:
+        shipped[ next(iter(parts)) ].append( x )
+
+    p.collects = [ None ]
+    p.applies  = [ None ]
+    for P in range( 1, nparts ):
+      collect, apply = self.gen_ship( top, P, shipped[P] )
+      p.collects.append( collect )
+      p.applies .append( apply )
+
+    p.shared_blks = [ x[0] for x in self.nodes[:self.ncomb] if len(x[1]) > 1 ]
+    p.components  = [ [ c for c in top.get_all_components()
+                        if c is not top and self._get_part( top, c ) == P ]
+                      for P in range( nparts ) ]
+
+  def _compile( self, top, src, fname, _globals ):
+    kernel_cache = get_kernel_cache()
+    if kernel_cache is not None:
+      code = kernel_cache.compile( src, fname )
+    else:
+      code = compile( src, filename=fname, mode="exec" )
+      line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
+    _locals = {}
+    custom_exec( code, _globals, _locals )
+    return _locals
+
+  def gen_run( self, top, P, ff_blks, comb_blks, flips, clear_cl_trace, size ):
+    p = top._partition
+    _globals = {}
+
+    blks = ff_blks + comb_blks
+    body = [ f"blk{i}() # {x.__name__}" for i, x in enumerate( ff_blks ) ]
+    body.extend( [ f"{x!r}._flip()" for x in flips ] )
+
+    if p.exchange:
+      for x in sorted( self.send[P], key=repr ):
+        off, nbytes = p.offsets[ x ]
+        body.append( f"buf[o+{off}:o+{off+nbytes}] = "
+                     f"{gen_to_int( repr(x), x._dsl.Type )}.to_bytes( {nbytes}, 'little' )" )
+      body.append( "wait()" )
+      for x in sorted( self.recv[P], key=repr ):
+        off, nbytes = p.offsets[ x ]
+        body.extend( gen_from_int( repr(x), x._dsl.Type,
+                     f"int.from_bytes( buf[o+{off}:o+{off+nbytes}], 'little' )", _globals ) )
+      body.append( f"o = {size} - o" )
+
+    if clear_cl_trace is not None:
+      body.append( "clear_cl_trace()" )
+    body.extend( [ f"blk{i}() # {x.__name__}" for i, x in enumerate( comb_blks, len(ff_blks) ) ] )
+
+    src = """
+def compile_partition( s, blks, buf, wait, clear_cl_trace ):
+  {}
+  def run( ncycles ):
+    o = 0
+    for _ in range( ncycles ):
+      {}
+  return run
+""".format( "\n  ".join( [ f"blk{i} = blks[{i}]" for i in range(len(blks)) ] ),
+            "\n      ".join( body ) or "pass" )
+
+    _locals = self._compile( top, src, f"Partition {P} at {top!r}", _globals )
+    wait = p.barrier.wait if p.barrier is not None else None
+    return _locals['compile_partition']( top, blks, p.buf, wait, clear_cl_trace )
+
+  def gen_ship( self, top, P, signals ):
+    _globals = {}
+    values, applies = [], []
+    for i, x in enumerate( signals ):
+      Type = x._dsl.Type
+      if _is_bits_type( Type ):
+        values.append( gen_to_int( repr(x), Type ) )
+        applies.extend( gen_from_int( repr(x), Type, f"v[{i}]", _globals ) )
+      else:
+        values.append( repr(x) )
+        applies.append( f"{x!r} = v[{i}]" )
+
+    src = """
+def compile_ship( s ):
+  def collect():
+    return [ {} ]
+  def apply( v ):
+    {}
+  return collect, apply
+""".format( ", ".join( values ), "\n    ".join( applies ) or "pass" )
+
+    _locals = self._compile( top, src, f"Partition {P} state at {top!r}", _globals )
+    return _locals['compile_ship']( top )
+
+  #-----------------------------------------------------------------------
+  # gen_sim_run_partitioned
+  #-----------------------------------------------------------------------
+
+  def gen_sim_run_partitioned( self, top ):
+    p = top._partition
+
+    def sim_run_partitioned( ncycles ):
+      ctx = multiprocessing.get_context( "fork" )
+      if p.barrier is not None:
+        p.barrier.reset()
+      signal_attrs, signal_lists = _get_signal_attrs( top )
+
+      def worker( P, conn ):
+        try:
+          p.runs[P]( ncycles )
+          conn.send( ( None, p.collects[P](),
+                       _collect_state( p.components[P], signal_attrs, signal_lists ) ) )
+        except BaseException as e:
+          if p.barrier is not None:
+            p.barrier.abort()
+          try:
+            conn.send( ( ( e, traceback.format_exc() ), None, None ) )
+          except Exception:
+            conn.send( ( ( None, traceback.format_exc() ), None, None ) )
+        conn.close()
+
+      procs = []
+      for P in range( 1, p.nparts ):
+        r, w = ctx.Pipe( duplex=False )
+        proc = ctx.Process( target=worker, args=(P, w), daemon=True )
+        proc.start()
+        w.close()
+        procs.append( (P, proc, r) )
+
+      error = None
+      try:
+        p.runs[0]( ncycles )
+      except BrokenBarrierError:
+        pass
+      except BaseException as e:
+        if p.barrier is not None:
+          p.barrier.abort()
+        error = ( e, None )
+
+      results = []
+      for P, proc, r in procs:
+        try:
+          remote_error, values, state = r.recv()
+        except EOFError:
+          remote_error, values, state = ( None, f"partition {P} exited unexpectedly" ), None, None
+        proc.join()
+        if remote_error is not None:
+          # Report the failure that broke the barrier, not the partitions
+          # that were waiting on it
+          e, _ = remote_error
+          if error is None or isinstance( error[0], BrokenBarrierError ) and \
+                              not isinstance( e, BrokenBarrierError ):
+            error = remote_error
+        results.append( (P, values, state) )
+
+      if error is not None:
+        e, tb = error
+        if tb is None:
+          raise e
+        if e is None:
+          raise RuntimeError( tb )
+        raise e from _RemoteTraceback( tb )
+
+      # Bring the state of the other partitions back to the main process
+      failed = []
+      for P, values, state in results:
+        for c, (attrs, unpicklable) in zip( p.components[P], state ):
+          for name, value in attrs.items():
+            setattr( c, name, value )
+          failed.extend( [ f"{c!r}.{x}" for x in unpicklable ] )
+        p.applies[P]( values )
+      if failed:
+        warnings.warn( f"the following attributes cannot be sent back from the "
+                       f"partitions and are stale: {', '.join( failed )}" )
+
+      for blk in p.shared_blks:
+        blk()
+
+      ed = getattr( top._sched, "event_driven", None )
+      if ed is not None:
+        ed.dirty[:] = [ True ] * len( ed.dirty )
+
+      top.simulated_cycles += ncycles
+      return ncycles
+
+    return sim_run_partitioned
+
+#-------------------------------------------------------------------------
+# Python state of components
+#-------------------------------------------------------------------------
+
+def _get_signal_attrs( top ):
+  # (id(obj), attr) of signal values and ids of lists holding signals
+  signal_attrs, signal_lists = set(), set()
+  for records in top._dsl.swapped_signals.values():
+    for current_obj, i, _, is_list in records:
+      if is_list:
+        signal_lists.add( id(current_obj) )
+      else:
+        if isinstance( getattr( current_obj, i ), BitsArray ):
+          raise PartitionError( "partitioned simulation does not support bits_array=True" )
+        signal_attrs.add( (id(current_obj), i) )
+  return signal_attrs, signal_lists
+
+_skipped_types = ( NamedObject, type, FunctionType, MethodType, BuiltinFunctionType, ModuleType )
+
+def _is_structure( v, signal_lists ):
+  if isinstance( v, _skipped_types ):
+    return True
+  if isinstance( v, list ):
+    return id(v) in signal_lists or any( _is_structure( x, signal_lists ) for x in v )
+  return False
+
+def _collect_state( components, signal_attrs, signal_lists ):
+  state = []
+  for c in components:
+    attrs, unpicklable = {}, []
+    for name, v in c.__dict__.items():
+      if name[0] == '_' or (id(c), name) in signal_attrs or _is_structure( v, signal_lists ):
+        continue
+      try:
+        pickle.dumps( v )
+        attrs[ name ] = v
+      except Exception:
+        unpicklable.append( name )
+    state.append( (attrs, unpicklable) )
+  return state
@@ -0,0 +1,219 @@
+"""
+========================================================================
+ScheduleGraph.py
+========================================================================
+Indexed graph structures shared by the schedule passes.
+
+ScheduleGraph keeps the adjacency lists of the update block graph and,
+once the SCCs are computed, buckets the edges inside each SCC so that
+per-SCC work is proportional to the size of the SCC instead of the whole
+edge set. MinMaxPriorityQueue is a double-ended priority queue used by
+the topological sorts that alternate between the least and the most
+branchy ready block.
+"""
+from collections import deque
+from heapq import heappop, heappush
+
+#-------------------------------------------------------------------------
+# kosaraju_scc
+#-------------------------------------------------------------------------
+
+def kosaraju_scc( G, G_T ):
+
+    #---------------------------------------------------------------------
+    # Run Kosaraju's algorithm to shrink all strongly connected components
+    # (SCCs) into super nodes
+    #---------------------------------------------------------------------
+
+    # First dfs on G to generate reverse post-order (RPO)
+    # Shunning: we emulate the system stack to implement non-recursive
+    # post-order DFS algorithm. At the beginning, I implemented a more
+    # succinct recursive DFS but it turned out that a 1500-depth chain in
+    # the graph will reach the CPython max recursion depth.
+    # https://docs.python.org/3/library/sys.html#sys.getrecursionlimit
+
+    PO = []
+
+    vertices = list(G.keys())
+    # random.shuffle(vertices)
+    visited = set()
+
+    # The commented algorithm loyally emulates the system stack by storing
+    # the loop index in each stack element and push only one new element
+    # to stack in every iteration. This is basically what recursive dfs
+    # does.
+    #
+    # for u in vertices:
+    #   if u not in visited:
+    #     stack = [ (u, False) ]
+    #     while stack:
+    #       u, idx = stack.pop()
+    #       visited.add( u )
+    #       if idx == len(G[u]):
+    #         PO.append( u )
+    #       else:
+    #         while idx < len(G[u]) and G[u][-idx] in visited:
+    #           idx += 1
+    #         if idx < len(G[u]):
+    #           stack.append( (u, idx) )
+    #           stack.append( (G[u][-idx], 0) )
+    #         else:
+    #           PO.append( u )
+
+    # The following algorithm push all adjacent elements to the stack at
+    # once and later check visited set to avoid redundant visit (instead
+    # of checking visited set when pushing element to the stack). I added
+    # a second_visit flag to add the node to post-order.
+
+    for u in vertices:
+      stack = [ (u, False) ]
+      while stack:
+        u, second_visit = stack.pop()
+
+        if second_visit:
+          PO.append( u )
+        elif u not in visited:
+          visited.add( u )
+          stack.append( (u, True) )
+          for v in reversed(G[u]):
+            stack.append( (v, False) )
+
+    RPO = PO[::-1]
+
+    # Second bfs on G_T to generate SCCs
+
+    SCCs  = []
+    v_SCC = {}
+    visited = set()
+
+    for u in RPO:
+      if u not in visited:
+        visited.add( u )
+        scc = set()
+        SCCs.append( scc )
+        Q = deque( [u] )
+        scc.add( u )
+        while Q:
+          u = Q.popleft()
+          v_SCC[u] = len(SCCs) - 1
+          for v in G_T[u]:
+            if v not in visited:
+              visited.add( v )
+              Q.append( v )
+              scc.add( v )
+
+    # Construct a new graph of SCCs
+
+    G_new = { i: set() for i in range(len(SCCs)) }
+
+    for u, vs in G.items():
+      for v in vs: # u -> v
+        scc_u, scc_v = v_SCC[u], v_SCC[v]
+        if scc_u != scc_v and scc_v not in G_new[ scc_u ]:
+          G_new[ scc_u ].add( scc_v )
+
+    return SCCs, G_new
+
+#-------------------------------------------------------------------------
+# ScheduleGraph
+#-------------------------------------------------------------------------
+# G maps a vertex to its successors, G_T to its predecessors, and E is the
+# set of edges. Edges whose endpoints are not both in V are ignored and
+# duplicate edges are only added once.
+
+class ScheduleGraph:
+
+  def __init__( s, V, edges=() ):
+    s.V   = V
+    s.G   = { v: [] for v in V }
+    s.G_T = { v: [] for v in V } # transpose graph
+    s.E   = set()
+
+    for (u, v) in edges: # u -> v
+      s.add_edge( u, v )
+
+  def add_edge( s, u, v ):
+    if u in s.G and v in s.G and (u, v) not in s.E:
+      s.E.add( (u, v) )
+      s.G  [u].append( v )
+      s.G_T[v].append( u )
+
+  def in_degrees( s ):
+    return { v: len(us) for v, us in s.G_T.items() }
+
+  def compute_sccs( s ):
+    s.SCCs, s.G_new = kosaraju_scc( s.G, s.G_T )
+
+    s.scc_of = {}
+    for i, scc in enumerate( s.SCCs ):
+      for v in scc:
+        s.scc_of[ v ] = i
+
+    # Bucket the edges inside each SCC in a single pass over E
+    s.scc_edges = [ [] for _ in s.SCCs ]
+    for (u, v) in s.E:
+      i = s.scc_of[u]
+      if i == s.scc_of[v]:
+        s.scc_edges[i].append( (u, v) )
+
+    return s.SCCs, s.G_new
+
+  def scc_in_degrees( s, i ):
+    # In-degree of each vertex counting only the edges inside SCC i
+    InD = { v: 0 for v in s.SCCs[i] }
+    for (u, v) in s.scc_edges[i]:
+      InD[ v ] += 1
+    return InD
+
+#-------------------------------------------------------------------------
+# MinMaxPriorityQueue
+#-------------------------------------------------------------------------
+# A double-ended priority queue made of a min-heap and a max-heap over the
+# same entries with lazy deletion. Among entries with equal keys, pop_min
+# returns the earliest pushed one and pop_max the latest pushed one, which
+# is the behavior of inserting into a sorted list after equal keys and
+# popping from either end.
+
+class _Reversed:
+  __slots__ = ( 'key', )
+
+  def __init__( s, key ):
+    s.key = key
+
+  def __lt__( s, other ):
+    return other.key < s.key
+
+class MinMaxPriorityQueue:
+
+  def __init__( s ):
+    s._min    = []
+    s._max    = []
+    s._popped = set()
+    s._count  = 0
+    s._size   = 0
+
+  def __len__( s ):
+    return s._size
+
+  def push( s, key, item ):
+    s._count += 1
+    s._size  += 1
+    heappush( s._min, ( key, s._count, item ) )
+    heappush( s._max, ( _Reversed( (key, s._count) ), s._count, item ) )
+
+  def _pop( s, heap ):
+    while True:
+      key, count, item = heappop( heap )
+      if count in s._popped:
+        s._popped.remove( count )
+      else:
+        s._popped.add( count )
+        s._size -= 1
+        return key, item
+
+  def pop_min( s ):
+    return s._pop( s._min )
+
+  def pop_max( s ):
+    key, item = s._pop( s._max )
+    return key.key[0], item
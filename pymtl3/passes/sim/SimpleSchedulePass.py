@@ -16,6 +16,9 @@ from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
 from pymtl3.utils import custom_exec
 
+from .KernelCache import get_kernel_cache
+from .ScheduleGraph import ScheduleGraph
+
 
 class SimpleSchedulePass( BasePass ):
   def __call__( self, top ):
@@ -35,16 +38,10 @@ class SimpleSchedulePass( BasePass ):
 
     # Construct the intra-cycle graph based on normal update blocks
 
-    V   = top._dag.final_upblks - top.get_all_update_ff()
-    E   = set()
-    Es  = { v: [] for v in V }
-    InD = { v: 0  for v in V }
-
-    for (u, v) in top._dag.all_constraints: # u -> v
-      if u in V and v in V:
-        InD[v] += 1
-        Es[u].append( v )
-        E.add( (u, v) )
+    V     = top._dag.final_upblks - top.get_all_update_ff()
+    graph = ScheduleGraph( V, top._dag.all_constraints )
+    E, Es = graph.E, graph.G
+    InD   = graph.in_degrees()
 
     import os
     if 'MAMBA_DAG' in os.environ:
@@ -140,7 +137,12 @@ class SimpleSchedulePass( BasePass ):
       import py
       # print(src)
       l = locals()
-      custom_exec(py.code.Source( src ).compile(), globals(), l)
+      kernel_cache = get_kernel_cache()
+      if kernel_cache is not None:
+        code = kernel_cache.compile( src, f"Double buffer at {top!r}" )
+      else:
+        code = py.code.Source( src ).compile()
+      custom_exec(code, globals(), l)
 
       top._sched.schedule_posedge_flip = [ l['compile_double_buffer']( top ) ]
 
@@ -7,10 +7,15 @@ Generate a simple tick function (no Mamba techniques here)
 Author : Shunning Jiang
 Date   : Dec 26, 2018
 """
+from linecache import cache as line_cache
+
 from pymtl3.dsl import MethodPort
 from pymtl3.dsl.errors import UpblkCyclicError
 from pymtl3.passes.BasePass import BasePass
 from pymtl3.passes.errors import PassOrderError
+from pymtl3.utils import custom_exec
+
+from .KernelCache import get_kernel_cache
 
 # Shunning: We are aware of the problem that there may be multiple places
 # that assembles the function for the user to tick the simulator.
@@ -28,6 +33,95 @@ class SimpleTickPass( BasePass ):
         blk()
     return iterative
 
+  # If the signals are kept in a shared-memory store (see
+  # lock_in_simulation( shared_memory=True )), every cycle is marked in the
+  # seqlock of the store so that readers in other processes only see the
+  # values at the end of a cycle. The store is looked up when tick is
+  # called since it is only created by lock_in_simulation.
+
+  @staticmethod
+  def gen_seqlock_tick( top, _tick ):
+    def tick():
+      store = getattr( top._dsl, "signal_store", None )
+      if store is None:
+        _tick()
+      else:
+        store.begin()
+        _tick()
+        store.end( top.simulated_cycles )
+    return tick
+
+  # sim_run( ncycles, until=None ) runs up to ncycles cycles in one call
+  # with the whole tick schedule inlined into the loop body. If until is
+  # given, it is checked before every cycle and the loop exits as soon as
+  # it returns True, like "while not done(): tick()". Returns the number
+  # of cycles simulated. With a shared-memory store, the seqlock calls are
+  # inlined into the loop body as well.
+
+  @staticmethod
+  def gen_sim_run_function( top, pre_schedule, post_schedule ):
+
+    def gen_body( blks, offset ):
+      return [ f"blk{i}() # {x.__name__}" for i, x in enumerate( blks, offset ) ]
+
+    n = len(pre_schedule)
+    body = gen_body( pre_schedule, 0 ) + \
+           [ "s.simulated_cycles += 1" ] + \
+           gen_body( post_schedule, n )
+    locked_body = [ "store_begin()" ] + body + [ "store_end( s.simulated_cycles )" ]
+
+    src = """
+def compile_sim_run( s, schedule ):
+  {}
+  def sim_run_seqlock( store, ncycles, until ):
+    store_begin = store.begin
+    store_end   = store.end
+    if until is None:
+      for _ in range( ncycles ):
+        {}
+      return ncycles
+
+    for i in range( ncycles ):
+      if until():
+        return i
+      {}
+    return ncycles
+
+  def sim_run( ncycles, until=None ):
+    store = getattr( s._dsl, 'signal_store', None )
+    if store is not None:
+      return sim_run_seqlock( store, ncycles, until )
+
+    if until is None:
+      for _ in range( ncycles ):
+        {}
+      return ncycles
+
+    for i in range( ncycles ):
+      if until():
+        return i
+      {}
+    return ncycles
+  return sim_run
+""".format( "\n  ".join( [ f"blk{i} = schedule[{i}]"
+                           for i in range( n + len(post_schedule) ) ] ),
+            "\n        ".join( locked_body ),
+            "\n      ".join( locked_body ),
+            "\n        ".join( body ),
+            "\n      ".join( body ) )
+
+    fname = f"sim_run at {top!r}"
+    kernel_cache = get_kernel_cache()
+    if kernel_cache is not None:
+      code = kernel_cache.compile( src, fname )
+    else:
+      code = compile( src, filename=fname, mode="exec" )
+      line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
+
+    _locals = {}
+    custom_exec( code, {}, _locals )
+    return _locals['compile_sim_run']( top, pre_schedule + post_schedule )
+
   def __call__( self, top ):
     if not hasattr( top._sched, "update_schedule" ):
       raise PassOrderError( "update_schedule" )
@@ -47,6 +141,10 @@ class SimpleTickPass( BasePass ):
     if hasattr( top, "_tracing" ):
       if hasattr( top._tracing, "vcd_func" ):
         final_schedule.append( top._tracing.vcd_func )
+      if hasattr( top._tracing, "pwf_func" ):
+        final_schedule.append( top._tracing.pwf_func )
+      if hasattr( top._tracing, "flight_func" ):
+        final_schedule.append( top._tracing.flight_func )
       if hasattr( top._tracing, "collect_text_sigs" ):
         final_schedule.append( top._tracing.collect_text_sigs )
 
@@ -58,18 +156,23 @@ class SimpleTickPass( BasePass ):
       def advance_sim_cycle():
         top.simulated_cycles += 1
       return advance_sim_cycle
+    pre_schedule = list( final_schedule )
     final_schedule.append( generate_advance_sim_cycle(top) )
+    post_schedule = []
 
     # clear cl method flag
     if hasattr( top, "_tracing" ):
       if hasattr( top._tracing, "clear_cl_trace" ):
-        final_schedule.append( top._tracing.clear_cl_trace )
+        post_schedule.append( top._tracing.clear_cl_trace )
 
     # execute all update blocks
-    final_schedule.extend( top._sched.update_schedule )
+    post_schedule.extend( top._sched.update_schedule )
+    final_schedule.extend( post_schedule )
 
     # Generate tick
-    top.tick = SimpleTickPass.gen_tick_function( final_schedule )
+    top.tick = SimpleTickPass.gen_seqlock_tick( top,
+                 SimpleTickPass.gen_tick_function( final_schedule ) )
+    top.sim_run = SimpleTickPass.gen_sim_run_function( top, pre_schedule, post_schedule )
     # reset sim_cycles
     top.simulated_cycles = 0
 
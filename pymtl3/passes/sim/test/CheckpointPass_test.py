@@ -0,0 +1,145 @@
+#=========================================================================
+# CheckpointPass_test.py
+#=========================================================================
+
+import pytest
+
+from pymtl3.datatypes import Bits8, Bits32, bitstruct
+from pymtl3.dsl import *
+from pymtl3.passes.errors import CheckpointError
+from pymtl3.passes.PassGroups import SimulationPass
+from pymtl3.stdlib.cl.queues import PipeQueueCL
+from pymtl3.stdlib.fl import MemoryFL
+from pymtl3.stdlib.test import TestSrcCL
+
+
+@bitstruct
+class Point:
+  x: Bits8
+  y: [ Bits8, Bits8 ]
+
+class Counter( Component ):
+
+  def construct( s ):
+    s.out = OutPort( Bits32 )
+    s.pt  = OutPort( Point )
+    s.r   = Wire( Bits32 )
+    s.lo  = Wire( Bits8 )
+    s.mid = Wire( Bits8 )
+    s.out //= s.r
+    s.lo  //= s.r[0:8]
+    s.mid //= s.r[8:16]
+
+    @s.update_ff
+    def up_r():
+      if s.reset:
+        s.r <<= Bits32( 0 )
+      else:
+        s.r <<= s.r + Bits32( 3 )
+
+    @s.update
+    def up_pt():
+      s.pt = Point( s.lo, [ s.mid, s.lo ] )
+
+# src -> pipe queue -> pipe queue -> memory, next to an RTL counter
+
+class Harness( Component ):
+
+  def construct( s, nmsgs=40 ):
+    s.src   = TestSrcCL( None, [ Bits32( i * 7 ) for i in range(nmsgs) ], 0, 1 )
+    s.queue = PipeQueueCL( 2 )
+    s.pipe  = PipeQueueCL( 3 )
+    s.mem   = MemoryFL( 1 << 16 )
+    s.cnt   = Counter()
+
+    connect( s.src.send, s.queue.enq )
+
+    s.addr  = 0
+    s.nrecv = 0
+
+    @s.update
+    def up_move():
+      if s.queue.deq.rdy() and s.pipe.enq.rdy():
+        s.pipe.enq( s.queue.deq() )
+
+    @s.update
+    def up_write():
+      if s.pipe.deq.rdy():
+        s.mem.ifc.write( s.addr, 4, s.pipe.deq() + s.cnt.out )
+        s.addr  += 4
+        s.nrecv += 1
+
+  def line_trace( s ):
+    return f"{s.queue.line_trace()}|{s.pipe.line_trace()}|{s.cnt.out}|{s.nrecv}"
+
+def _state( m, trace=True ):
+  return ( m.simulated_cycles, m.line_trace() if trace else None, m.cnt.pt.clone(), m.addr,
+           list( m.src.msgs ), list( m.queue.queue ), list( m.pipe.queue ),
+           bytes( m.mem.mem ) )
+
+def _setup( **kwargs ):
+  m = Harness()
+  m.apply( SimulationPass( **kwargs ) )
+  m.sim_reset()
+  return m
+
+@pytest.mark.parametrize( "kwargs", [ {}, {'event_driven': True} ] )
+def test_checkpoint_restore( tmpdir, kwargs ):
+  path = str( tmpdir.join( "ckpt.bin" ) )
+
+  ref = _setup( **kwargs )
+  ref.sim_run( 25 )
+  ref.sim_checkpoint( path )
+  # Which methods were called in the last cycle is only kept for the
+  # line trace and is not part of the checkpoint
+  ckpt = _state( ref, trace=False )
+  trace = []
+  for i in range(40):
+    ref.tick()
+    trace.append( _state( ref ) )
+
+  # Restore into a fresh model
+  m = _setup( **kwargs )
+  m.sim_restore( path )
+  assert _state( m, trace=False ) == ckpt
+  for i in range(40):
+    m.tick()
+    assert _state( m ) == trace[i]
+
+  # Restore into the model that already moved on. The width of the CL
+  # line trace may differ.
+  ref.sim_restore( path )
+  assert _state( ref, trace=False ) == ckpt
+  for i in range(40):
+    ref.tick()
+    assert _state( ref, trace=False ) == trace[i][:1] + (None,) + trace[i][2:]
+
+def test_checkpoint_blob_alignment( tmpdir ):
+  path = str( tmpdir.join( "ckpt.bin" ) )
+  m = _setup()
+  m.mem.mem[-8:] = b"deadbeef"
+  m.sim_checkpoint( path )
+
+  m.mem.mem[-8:] = bytes(8)
+  old_mem = m.mem.mem
+  m.sim_restore( path )
+  # The memory is restored in place
+  assert m.mem.mem is old_mem
+  assert m.mem.mem[-8:] == b"deadbeef"
+
+def test_restore_different_design( tmpdir ):
+  path = str( tmpdir.join( "ckpt.bin" ) )
+  m = Counter()
+  m.apply( SimulationPass() )
+  m.sim_reset()
+  m.sim_checkpoint( path )
+
+  m2 = _setup()
+  with pytest.raises( CheckpointError ):
+    m2.sim_restore( path )
+
+  path2 = str( tmpdir.join( "garbage.bin" ) )
+  with open( path2, 'wb' ) as f:
+    f.write( bytes(128) )
+  with pytest.raises( CheckpointError ):
+    m2.sim_restore( path2 )
@@ -126,6 +126,56 @@ def test_combinational_loop():
     return
   raise Exception("Should've thrown Exception.")
 
+def test_scc_worklist_reexecutes_downstream_only():
+
+  class Top(Component):
+
+    def construct( s ):
+      s.in_ = InPort( Bits8 )
+      s.x   = Wire( Bits8 )
+      s.a   = Wire( Bits8 )
+      s.b   = Wire( Bits8 )
+      s.c   = Wire( Bits8 )
+      s.out = OutPort( Bits8 )
+
+      @s.update
+      def up0():
+        s.x = s.in_
+
+      # up1 -> up2 -> up3 -> up1 is a false cycle
+      @s.update
+      def up1():
+        s.a   = s.x
+        s.out = s.c + Bits8(1)
+
+      @s.update
+      def up2():
+        s.b = s.a + Bits8(1)
+
+      @s.update
+      def up3():
+        s.c = s.b
+
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( SimpleTickPass() )
+  A.lock_in_simulation()
+
+  stats = A._sched.scc_stats[ "wrapped_SCC_1" ]
+
+  # c changes so only up1 is re-executed in the second sweep
+  A.in_ = Bits8(5)
+  A.eval_combinational()
+  assert A.out == Bits8(7)
+  assert stats == [ 1, 2, 4, 4 ]
+
+  # Nothing changes after the first sweep
+  A.eval_combinational()
+  assert A.out == Bits8(7)
+  assert stats == [ 2, 3, 7, 4 ]
+
 def test_very_deep_dag():
 
   class Inner(Component):
@@ -231,7 +281,7 @@ def test_const_connect_nested_struct_signal_to_struct():
   x.tick()
   assert x.out == SomeMsg2(SomeMsg1(1,2),3)
 
-def test_const_connect_cannot_handle_same_name_nested_struct():
+def test_const_connect_same_name_nested_struct():
 
   class A:
     @bitstruct
@@ -255,12 +305,12 @@ def test_const_connect_cannot_handle_same_name_nested_struct():
       s.out = OutPort(SomeMsg2)
       connect( s.out, SomeMsg2(A.SomeMsg1(1,2),B.SomeMsg1(3,4)) )
 
+  # GenDAGPass aliases the second SomeMsg1 in the generated net block
   x = Top()
   x.elaborate()
-  try:
-    x.apply( GenDAGPass() )
-  except AssertionError as e:
-    print(e)
-    assert str(e) == "Cannot handle two subfields with the same struct name but different structs"
-    return
-  raise Exception("Should've thrown AssertionError")
+  x.apply( GenDAGPass() )
+  x.apply( DynamicSchedulePass() )
+  x.apply( SimpleTickPass() )
+  x.lock_in_simulation()
+  x.tick()
+  assert x.out == SomeMsg2(A.SomeMsg1(1,2),B.SomeMsg1(3,4))
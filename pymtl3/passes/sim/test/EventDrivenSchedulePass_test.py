@@ -0,0 +1,208 @@
+#=========================================================================
+# EventDrivenSchedulePass_test.py
+#=========================================================================
+
+from pymtl3.datatypes import Bits1, Bits4, Bits8, Bits32, bitstruct
+from pymtl3.dsl import *
+
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..EventDrivenSchedulePass import EventDrivenSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..SimpleTickPass import SimpleTickPass
+
+
+@bitstruct
+class Pair:
+  lo: Bits8
+  hi: Bits8
+
+# A tile that only changes its outputs when sel matches its id
+
+class Tile( Component ):
+
+  def construct( s, tile_id ):
+    s.sel = InPort ( Bits4 )
+    s.in_ = InPort ( Bits8 )
+    s.out = OutPort( Pair )
+
+    s.en  = Wire( Bits1 )
+    s.nxt = Wire( Bits8 )
+    s.reg = Wire( Bits8 )
+
+    s.nexec = 0
+
+    @s.update
+    def up_en():
+      s.en = Bits1( s.sel == Bits4( tile_id ) )
+
+    @s.update
+    def up_nxt():
+      s.nexec += 1
+      if s.en:
+        s.nxt = s.reg + s.in_
+      else:
+        s.nxt = s.reg
+
+    @s.update_ff
+    def up_reg():
+      s.reg <<= s.nxt
+
+    @s.update
+    def up_out():
+      s.out = Pair( s.reg, s.in_ )
+
+class Top( Component ):
+
+  def construct( s, ntiles=4 ):
+    s.in_ = InPort ( Bits8 )
+    s.sel = InPort ( Bits4 )
+    s.out = OutPort( Bits32 )
+
+    s.tiles = [ Tile( i ) for i in range(ntiles) ]
+    for i in range(ntiles):
+      s.tiles[i].sel //= s.sel
+      s.tiles[i].in_ //= s.in_
+
+    s.lo = Wire( Pair )
+    s.hi = Wire( Pair )
+    s.lo //= s.tiles[0].out
+    s.hi //= s.tiles[-1].out
+
+    # up_a and up_b form a false cycle and hence an SCC block
+    s.a = Wire( Bits8 )
+    s.b = Wire( Bits8 )
+    s.c = Wire( Bits8 )
+
+    @s.update
+    def up_a():
+      s.a = s.lo.lo + s.c
+
+    @s.update
+    def up_b():
+      s.b = s.a
+      s.c = s.hi.lo
+
+    @s.update
+    def up_out():
+      s.out = Bits32( s.b ) | (Bits32( s.hi.hi ) << 8)
+
+def _run( SchedPass, stimulus ):
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( SchedPass() )
+  A.apply( SimpleTickPass() )
+  A.lock_in_simulation()
+
+  trace = []
+  for sel, in_ in stimulus:
+    A.sel = Bits4( sel )
+    A.in_ = Bits8( in_ )
+    A.eval_combinational()
+    trace.append( (A.out, A.lo, A.hi, A.a, A.c) )
+    A.tick()
+    trace.append( (A.out, A.lo, A.hi, A.a, A.c) )
+  return A, trace
+
+stimulus = [ (0, 1), (0, 1), (1, 2), (15, 2), (15, 2), (15, 2), (3, 3),
+             (3, 3), (2, 7), (15, 7), (15, 0), (0, 0), (0, 0) ]
+
+def test_same_as_static_schedule():
+  _, ref = _run( DynamicSchedulePass, stimulus )
+  A, trace = _run( EventDrivenSchedulePass, stimulus )
+  assert trace == ref
+  assert A._sched.event_driven.static_update_schedule
+
+def test_idle_blocks_are_skipped():
+  A, _  = _run( DynamicSchedulePass, stimulus )
+  B, _  = _run( EventDrivenSchedulePass, stimulus )
+  static_execs = sum( x.nexec for x in A.tiles )
+  event_execs  = sum( x.nexec for x in B.tiles )
+  assert 0 < event_execs < static_execs // 2
+
+  # Nothing changes once the inputs stay the same
+  before = sum( x.nexec for x in B.tiles )
+  for i in range(10):
+    B.tick()
+  assert sum( x.nexec for x in B.tiles ) == before
+
+# Blocks that read Python state that the test bench changes
+
+class Config:
+  bias = 0
+
+class Lookup( Component ):
+
+  def construct( s, log ):
+    s.idx  = InPort ( Bits4 )
+    s.out  = OutPort( Bits8 )
+    s.out2 = OutPort( Bits8 )
+    s.out3 = OutPort( Bits8 )
+
+    s.scale = 1
+    s.cfg   = cfg = Config()
+
+    def last():
+      return log[-1]
+
+    @s.update
+    def up_scale():
+      s.out = Bits8( s.idx * s.scale )
+
+    @s.update
+    def up_bias():
+      s.out2 = Bits8( s.idx + cfg.bias )
+
+    @s.update
+    def up_last():
+      s.out3 = Bits8( last() + s.idx )
+
+def _run_lookup( A, sched_pass, log ):
+  A.apply( GenDAGPass() )
+  A.apply( sched_pass )
+  A.apply( SimpleTickPass() )
+  A.lock_in_simulation()
+
+  trace = []
+  for i in range(6):
+    A.idx = Bits4( 3 )
+    A.scale = i + 1
+    A.cfg.bias = i * 2
+    log.append( i * 3 )
+    A.tick()
+    trace.append( (A.out, A.out2, A.out3) )
+  return trace
+
+def test_python_state_is_read():
+  log = [ 0 ]
+  A = Lookup( log )
+  A.elaborate()
+  ref = _run_lookup( A, DynamicSchedulePass(), log )
+
+  log = [ 0 ]
+  A = Lookup( log )
+  A.elaborate()
+  pass_ = EventDrivenSchedulePass()
+  assert pass_._reads_python_state( A, A.get_update_block( "up_scale" ) )
+  assert pass_._reads_python_state( A, A.get_update_block( "up_bias" ) )
+  # last() hides the list, so it is assumed to be pure
+  assert not pass_._reads_python_state( A, A.get_update_block( "up_last" ) )
+  assert [ x[:2] for x in _run_lookup( A, pass_, log ) ] == [ x[:2] for x in ref ]
+
+def test_always_execute():
+  log = [ 0 ]
+  A = Lookup( log )
+  A.elaborate()
+  ref = _run_lookup( A, DynamicSchedulePass(), log )
+
+  log = [ 0 ]
+  A = Lookup( log )
+  A.elaborate()
+  trace = _run_lookup( A, EventDrivenSchedulePass(), log )
+  assert [ x[2] for x in trace ] != [ x[2] for x in ref ]
+
+  log = [ 0 ]
+  A = Lookup( log )
+  A.elaborate()
+  pass_ = EventDrivenSchedulePass( always_execute=[ A.get_update_block( "up_last" ) ] )
+  assert _run_lookup( A, pass_, log ) == ref
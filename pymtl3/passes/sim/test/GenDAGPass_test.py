@@ -0,0 +1,91 @@
+#=========================================================================
+# GenDAGPass_test.py
+#=========================================================================
+
+from pymtl3.datatypes import Bits4, Bits8, Bits16, Bits32, mk_bitstruct
+from pymtl3.dsl import *
+
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..SimpleTickPass import SimpleTickPass
+
+# Two different structs with the same name
+
+PointA = mk_bitstruct( "Point", { 'x': Bits8, 'y': Bits8 } )
+PointB = mk_bitstruct( "Point", { 'x': Bits16, 'y': Bits4, 'z': Bits4 } )
+Line   = mk_bitstruct( "Line",  { 'a': PointA, 'b': PointB } )
+
+class Inner( Component ):
+
+  def construct( s ):
+    s.in_ = InPort ( Bits32 )
+    s.out = OutPort( Bits32 )
+    s.w   = Wire( Bits32 )
+    s.x   = Wire( Bits32 )
+    s.x //= s.w
+
+    @s.update
+    def up_w():
+      s.w = s.in_ + Bits32(1)
+
+    @s.update
+    def up_out():
+      s.out = s.x
+
+class Top( Component ):
+
+  def construct( s ):
+    s.in_   = InPort ( Bits32 )
+    s.out   = OutPort( Bits32 )
+    s.inner = [ Inner() for _ in range(4) ]
+
+    s.inner[0].in_ //= s.in_
+    for i in range(1, 4):
+      s.inner[i].in_ //= s.inner[i-1].out
+    s.out //= s.inner[3].out
+
+    s.pa   = OutPort( PointA )
+    s.pb   = OutPort( PointB )
+    s.line = OutPort( Line )
+    s.pa   //= PointA( 1, 2 )
+    s.pb   //= PointB( 3, 4, 5 )
+    s.line //= Line( PointA( 6, 7 ), PointB( 8, 9, 10 ) )
+
+def _run( batch ):
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass( batch=batch ) )
+  A.apply( DynamicSchedulePass() )
+  A.apply( SimpleTickPass() )
+  A.lock_in_simulation()
+
+  A.in_ = Bits32( 42 )
+  A.tick()
+  return A
+
+def test_batch_one_module_per_lca():
+  A = _run( batch=True )
+
+  assert A.out == Bits32( 46 )
+  assert A.pa == PointA( 1, 2 )
+  assert A.pb == PointB( 3, 4, 5 )
+  assert A.line == Line( PointA( 6, 7 ), PointB( 8, 9, 10 ) )
+
+  # 10 nets at top and one net inside each inner component. All net
+  # blocks of the same component share one module, and the four inner
+  # components share the same compiled code.
+  genblks = A._dag.genblks
+  assert len(genblks) == 14
+  assert len( { id(blk.__globals__) for blk in genblks } ) == 5
+  assert len( { blk.__code__ for blk in genblks } ) == 11
+  assert "s_inner_2__w__1" in { blk.__name__ for blk in genblks }
+
+def test_batch_matches_per_net():
+  A = _run( batch=True )
+  B = _run( batch=False )
+
+  assert sorted( x.__name__ for x in A._dag.genblks ) == \
+         sorted( x.__name__ for x in B._dag.genblks )
+  assert len( { id(blk.__globals__) for blk in B._dag.genblks } ) == 14
+  assert len( { blk.__code__ for blk in B._dag.genblks } ) == 14
+  assert A.line == B.line and A.pb == B.pb and A.out == B.out
@@ -0,0 +1,137 @@
+#=========================================================================
+# KernelCache_test.py
+#=========================================================================
+
+import pytest
+
+from pymtl3.datatypes import Bits8
+from pymtl3.dsl import *
+
+from .. import KernelCache as kernel_cache_module
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..KernelCache import KernelCache, design_hash, get_kernel_cache
+from ..SimpleTickPass import SimpleTickPass
+
+
+class Incr( Component ):
+
+  def construct( s ):
+    s.in_ = InPort ( Bits8 )
+    s.out = OutPort( Bits8 )
+
+    @s.update
+    def up_incr():
+      s.out = s.in_ + Bits8(1)
+
+# up1 and up2 form a false cycle and hence an SCC block
+
+class Top( Component ):
+
+  def construct( s, nincrs=2 ):
+    s.in_ = InPort ( Bits8 )
+    s.out = OutPort( Bits8 )
+
+    s.a = Wire( Bits8 )
+    s.b = Wire( Bits8 )
+    s.c = Wire( Bits8 )
+    s.r = Wire( Bits8 )
+    s.x = Wire( Bits8 )
+
+    s.incrs = [ Incr() for _ in range(nincrs) ]
+    s.incrs[0].in_ //= s.in_
+    for i in range(1, nincrs):
+      s.incrs[i].in_ //= s.incrs[i-1].out
+    s.x //= s.incrs[-1].out
+
+    @s.update
+    def up1():
+      s.a = s.x + s.c
+
+    @s.update
+    def up2():
+      s.b = s.a
+      s.c = s.r
+
+    @s.update_ff
+    def up_r():
+      s.r <<= s.b
+
+    s.out //= s.b
+
+def _run( nincrs=2 ):
+  A = Top( nincrs )
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( SimpleTickPass() )
+  A.lock_in_simulation()
+
+  outs = []
+  for i in range(5):
+    A.in_ = Bits8( i )
+    A.tick()
+    outs.append( int(A.out) )
+  return A, outs
+
+@pytest.fixture
+def cache_dir( tmp_path, monkeypatch ):
+  monkeypatch.setattr( kernel_cache_module, "_caches", {} )
+  monkeypatch.setenv( "PYMTL_KERNEL_CACHE", str(tmp_path) )
+  return tmp_path
+
+def test_compile_content_addressed( tmp_path ):
+  src = "\n  def f():\n    return 42\n"
+  c = KernelCache( tmp_path )
+  _locals = {}
+  exec( c.compile( src, "f at s" ), {}, _locals )
+  assert _locals['f']() == 42
+  assert (c.hits, c.misses) == (0, 1)
+
+  # A new cache object on the same directory loads from disk
+  c = KernelCache( tmp_path )
+  c.compile( src, "f at s" )
+  assert (c.hits, c.misses) == (1, 0)
+  c.compile( src.replace( "42", "43" ), "f at s" )
+  assert (c.hits, c.misses) == (1, 1)
+
+def test_design_hash():
+  A = Top( 2 )
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  B = Top( 2 )
+  B.elaborate()
+  B.apply( GenDAGPass() )
+  C = Top( 3 )
+  C.elaborate()
+  C.apply( GenDAGPass() )
+
+  assert design_hash( A ) == design_hash( B )
+  assert design_hash( A ) != design_hash( C )
+
+def test_rerun_skips_scheduling( cache_dir, monkeypatch ):
+  _, ref = _run()
+
+  cache = get_kernel_cache()
+  assert cache.hits == 0 and cache.misses > 0
+  assert list( (cache_dir / "sched").rglob( "*-dynamic" ) )
+
+  # A fresh process would start with an empty in-memory cache
+  monkeypatch.setattr( kernel_cache_module, "_caches", {} )
+
+  def fail( self, top ):
+    raise AssertionError( "schedule should come from the kernel cache" )
+  monkeypatch.setattr( DynamicSchedulePass, "schedule_intra_cycle", fail )
+
+  A, outs = _run()
+  assert outs == ref
+  assert any( x.__name__.startswith( "wrapped_SCC" ) for x in A._sched.update_schedule )
+
+  cache = get_kernel_cache()
+  assert cache.misses == 0 and cache.hits > 0
+
+def test_changed_design_reschedules( cache_dir ):
+  _, ref2 = _run( 2 )
+  _, ref3 = _run( 3 )
+  assert ref2 != ref3
+  assert len( list( (cache_dir / "sched").rglob( "*-dynamic" ) ) ) == 2
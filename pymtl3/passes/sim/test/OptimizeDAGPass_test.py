@@ -0,0 +1,174 @@
+#=========================================================================
+# OptimizeDAGPass_test.py
+#=========================================================================
+
+from pymtl3.datatypes import Bits8
+from pymtl3.dsl import *
+from pymtl3.passes.PassGroups import SimulationPass
+from pymtl3.passes.tracing.TracingConfigs import TracingConfigs
+
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..OptimizeDAGPass import OptimizeDAGPass
+from ..SimpleTickPass import SimpleTickPass
+
+
+class Accum( Component ):
+
+  def construct( s ):
+    s.incr  = InPort ( Bits8 )
+    s.out   = OutPort( Bits8 )
+    s.debug = OutPort( Bits8 )
+    s.acc   = Wire( Bits8 )
+    s.out //= s.acc
+
+    @s.update_ff
+    def up_acc():
+      s.acc <<= s.acc + s.incr
+
+    @s.update
+    def up_debug():
+      s.debug = s.acc + s.incr
+
+# Debug logic that nobody reads
+
+class Debug( Component ):
+
+  def construct( s ):
+    s.in_    = InPort( Bits8 )
+    s.debug  = Wire( Bits8 )
+    s.debug2 = Wire( Bits8 )
+    s.debug //= s.in_
+
+    @s.update
+    def up_debug2():
+      s.debug2 = s.debug + Bits8(1)
+
+class Top( Component ):
+
+  def construct( s ):
+    s.out   = OutPort( Bits8 )
+    s.accs  = [ Accum() for _ in range(2) ]
+    s.accs[0].incr //= 3
+    s.accs[1].incr //= s.accs[0].out
+    s.out //= s.accs[1].out
+
+    s.dbg = Debug()
+    s.dbg.in_ //= s.accs[1].debug
+
+class Printer( Component ):
+
+  def construct( s ):
+    s.in_ = InPort( Bits8 )
+    s.out = OutPort( Bits8 )
+    s.log = []
+    s.out //= s.in_
+
+    @s.update
+    def up_print():
+      s.log.append( int(s.in_) )
+
+class HasPrinter( Component ):
+
+  def construct( s ):
+    s.out = OutPort( Bits8 )
+    s.p = Printer()
+    s.p.in_ //= 7
+
+def test_const_nets_hoisted():
+  ref = Top()
+  ref.elaborate()
+  ref.apply( GenDAGPass() )
+  nblks = len( ref._dag.final_upblks )
+
+  m = Top()
+  m.apply( SimulationPass() )
+  assert m._dag.opt_stats == { 'const': 1, 'dead': 0 }
+  assert len( m._dag.final_upblks ) == nblks - 1
+  assert m.accs[0].incr == 3
+
+  for i in range(5):
+    m.tick()
+  assert m.accs[0].out == 3 * 5
+  assert m.out == 3 * (1+2+3+4)
+
+def test_dead_blocks():
+  m = Top()
+  m.apply( SimulationPass() )
+  m.sim_reset()
+  m.sim_run( 8 )
+
+  n = Top()
+  n.apply( SimulationPass( dead_blocks=True ) )
+  n.sim_reset()
+  n.sim_run( 8 )
+  assert n.out == m.out
+
+  # up_debug2 is never read, then the net that feeds it and up_debug of
+  # accs[1]. up_debug of accs[0] is not read either. Sequential blocks
+  # are kept.
+  dead = n._dag.dead_blks
+  assert n.dbg.get_update_block( "up_debug2" ) in dead
+  assert n.accs[0].get_update_block( "up_debug" ) in dead
+  assert n.accs[1].get_update_block( "up_debug" ) in dead
+  assert n.accs[1].get_update_block( "up_acc" ) not in dead
+  assert n._dag.opt_stats[ 'dead' ] == len( n._dag.dead_blks )
+  assert not any( x in n._dag.final_upblks for x in n._dag.dead_blks )
+  assert n.accs[1].debug == 0 and m.accs[1].debug != 0
+
+def test_dead_blocks_keep_and_top():
+  m = Top()
+  m.elaborate()
+  m.apply( GenDAGPass() )
+  m.apply( OptimizeDAGPass( dead_blocks=True, keep=[ m.dbg.debug2 ] ) )
+  assert m.dbg.get_update_block( "up_debug2" ) not in m._dag.dead_blks
+  m.apply( DynamicSchedulePass() )
+  m.apply( SimpleTickPass() )
+  m.lock_in_simulation()
+  OptimizeDAGPass.run_init_blocks( m )
+  m.sim_run( 3 )
+  assert m.dbg.debug2 == m.accs[1].debug + 1
+
+def test_dead_blocks_side_effects_kept():
+  m = HasPrinter()
+  m.apply( SimulationPass( dead_blocks=True ) )
+  assert m._dag.opt_stats[ 'const' ] == 1
+  assert m.p.get_update_block( "up_print" ) not in m._dag.dead_blks
+  m.sim_reset()
+  m.sim_run( 3 )
+  assert m.p.log[-1] == 7
+
+def test_dead_blocks_skipped_with_tracing( tmpdir ):
+  m = Top()
+  m.config_tracing = TracingConfigs( tracing='vcd', vcd_file_name=str( tmpdir.join( "top" ) ) )
+  m.apply( SimulationPass( dead_blocks=True ) )
+  assert m._dag.opt_stats[ 'dead' ] == 0
+
+def test_const_nets_after_relock( tmpdir ):
+  ref = Top()
+  ref.apply( SimulationPass() )
+  ref.sim_reset()
+  ref.sim_run( 5 )
+  path = str( tmpdir.join( "top.ckpt" ) )
+  ref.sim_checkpoint( path )
+
+  # Locking in the model again resets the constant nets to zero
+  m = Top()
+  m.apply( SimulationPass() )
+  m.unlock_simulation()
+  m.lock_in_simulation()
+  assert m.accs[0].incr == 0
+  m.sim_restore( path )
+  assert m.accs[0].incr == 3
+
+  n = Top()
+  n.apply( SimulationPass() )
+  n.unlock_simulation()
+  n.lock_in_simulation()
+  n.sim_reset()
+  n.sim_run( 5 )
+  assert n.accs[0].incr == 3
+
+  for x in [ ref, m, n ]:
+    x.sim_run( 5 )
+  assert m.out == n.out == ref.out
@@ -0,0 +1,155 @@
+#=========================================================================
+# PartitionedSimPass_test.py
+#=========================================================================
+
+import pytest
+
+from pymtl3.datatypes import Bits8, Bits16, bitstruct, concat
+from pymtl3.dsl import *
+from pymtl3.passes import TracingConfigs
+from pymtl3.passes.errors import PartitionError
+from pymtl3.passes.PassGroups import SimulationPass
+
+from ..PartitionedSimPass import PartitionedSimPass
+
+
+@bitstruct
+class Pair:
+  lo: Bits8
+  hi: [ Bits8, Bits8 ]
+
+class Tile( Component ):
+
+  def construct( s, tile_id ):
+    s.in_ = InPort ( Pair )
+    s.out = OutPort( Pair )
+
+    s.acc   = Wire( Bits16 )
+    s.nxt   = Wire( Bits16 )
+    s.out_r = Wire( Pair )
+    s.out //= s.out_r
+    s.in_hi = Wire( Bits8 )
+    s.in_hi //= s.in_.hi[0]
+
+    # Python state that only the tile's own partition updates
+    s.nfires = 0
+
+    @s.update
+    def up_nxt():
+      s.nxt = s.acc + concat( s.in_hi, s.in_.lo ) + Bits16(tile_id)
+
+    @s.update_ff
+    def up_regs():
+      s.acc <<= s.nxt
+      s.out_r <<= Pair( s.nxt[0:8], [ s.nxt[8:16], s.acc[0:8] ] )
+
+    @s.update
+    def up_nfires():
+      if s.nxt[0:1]:
+        s.nfires += 1
+
+class Ring( Component ):
+
+  def construct( s, ntiles=4 ):
+    s.out   = OutPort( Pair )
+    s.tiles = [ Tile( i ) for i in range(ntiles) ]
+    for i in range(ntiles):
+      s.tiles[i].in_ //= s.tiles[i-1].out
+    s.out //= s.tiles[-1].out
+
+def _state( m ):
+  return [ ( x.acc, x.nxt, x.out_r, x.in_, x.nfires ) for x in m.tiles ] + [ m.out ]
+
+def _setup( **kwargs ):
+  m = Ring()
+  m.apply( SimulationPass() )
+  m.apply( PartitionedSimPass( **kwargs ) )
+  m.sim_reset()
+  return m
+
+def test_partitioned_same_as_tick():
+  ref = _setup( nprocs=1 )
+  for i in range(50):
+    ref.tick()
+
+  for kwargs in [ {'nprocs': 2}, {'nprocs': 4}, {'nprocs': 1} ]:
+    m = _setup( **kwargs )
+    assert m.sim_run_partitioned( 20 ) == 20
+    assert m.sim_run_partitioned( 30 ) == 30
+    assert m.simulated_cycles == ref.simulated_cycles
+    assert _state( m ) == _state( ref )
+
+    # The main process can keep simulating after a partitioned run
+    ref2 = _setup( nprocs=1 )
+    ref2.sim_run( 51 )
+    m.tick()
+    assert _state( m ) == _state( ref2 )
+
+def test_explicit_partitions():
+  m = Ring()
+  m.apply( SimulationPass() )
+  t = m.tiles
+  m.apply( PartitionedSimPass( partitions=[ [t[0], t[2]], [t[1], t[3]] ] ) )
+  assert m._partition.nparts == 2
+  assert m._partition.child_part[ t[2] ] == 0
+
+  with pytest.raises( PartitionError ):
+    m2 = Ring()
+    m2.apply( SimulationPass() )
+    m2.apply( PartitionedSimPass( partitions=[ [m2.tiles[0]] ] ) )
+
+def test_combinational_boundary_rejected():
+
+  class CombTile( Component ):
+    def construct( s ):
+      s.in_ = InPort ( Bits8 )
+      s.out = OutPort( Bits8 )
+
+      @s.update
+      def up_out():
+        s.out = s.in_ + Bits8(1)
+
+  class Top( Component ):
+    def construct( s ):
+      s.a = CombTile()
+      s.b = CombTile()
+      s.b.in_ //= s.a.out
+
+  m = Top()
+  m.apply( SimulationPass() )
+  with pytest.raises( PartitionError ) as e:
+    m.apply( PartitionedSimPass( nprocs=2 ) )
+  assert "written combinationally" in str(e.value)
+
+@pytest.mark.parametrize( "tracing", [ "vcd", "pwf", "flight", "text_ascii" ] )
+def test_tracing_rejected( tmpdir, tracing ):
+  m = Ring()
+  m.config_tracing = TracingConfigs( tracing=tracing, vcd_file_name=str( tmpdir.join( "ring" ) ) )
+  m.apply( SimulationPass() )
+  with pytest.raises( PartitionError ) as e:
+    m.apply( PartitionedSimPass( nprocs=2 ) )
+  assert "does not support tracing" in str(e.value)
+
+def test_worker_exception():
+
+  class FailingTile( Tile ):
+    def construct( s, tile_id ):
+      super().construct( tile_id )
+
+      @s.update_ff
+      def up_fail():
+        assert s.acc < Bits16(1000), "accumulator overflow"
+
+  class Top( Component ):
+    def construct( s ):
+      s.a = Tile( 1 )
+      s.b = FailingTile( 1 )
+      s.a.in_ //= s.b.out
+      s.b.in_ //= s.a.out
+
+  m = Top()
+  m.apply( SimulationPass() )
+  m.apply( PartitionedSimPass( partitions=[ [m.a], [m.b] ] ) )
+  m.sim_reset()
+  with pytest.raises( AssertionError, match="accumulator overflow" ):
+    m.sim_run_partitioned( 1000 )
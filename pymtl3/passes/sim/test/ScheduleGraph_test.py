@@ -0,0 +1,56 @@
+#=========================================================================
+# ScheduleGraph_test.py
+#=========================================================================
+
+import random
+
+from ..ScheduleGraph import MinMaxPriorityQueue, ScheduleGraph
+
+
+def test_schedule_graph_scc_buckets():
+  # Two 2-cycles a<->b and c<->d connected by b -> c, plus a self-standing e
+  V = { 'a', 'b', 'c', 'd', 'e' }
+  edges = [ ('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd'), ('d', 'c'),
+            ('d', 'e'), ('a', 'b'), ('a', 'x') ]
+  g = ScheduleGraph( V, edges )
+
+  # Duplicate edges and edges leaving V are dropped
+  assert len(g.E) == 6
+  assert g.G['a'] == ['b'] and g.G_T['c'] == ['b', 'd']
+  assert g.in_degrees() == { 'a': 1, 'b': 1, 'c': 2, 'd': 1, 'e': 1 }
+
+  SCCs, G_new = g.compute_sccs()
+  assert sorted( [ sorted(x) for x in SCCs ] ) == [ ['a', 'b'], ['c', 'd'], ['e'] ]
+
+  i = g.scc_of['c']
+  assert g.scc_of['d'] == i
+  assert sorted( g.scc_edges[i] ) == [ ('c', 'd'), ('d', 'c') ]
+  assert g.scc_in_degrees(i) == { 'c': 1, 'd': 1 }
+  assert g.scc_edges[ g.scc_of['e'] ] == []
+  assert G_new[ g.scc_of['a'] ] == { i }
+
+def test_min_max_priority_queue():
+  # Compare against inserting into a sorted list after equal keys and
+  # popping from both ends
+  rng = random.Random(0)
+  ref = []
+  Q   = MinMaxPriorityQueue()
+
+  for i in range(2000):
+    if ref and rng.random() < 0.45:
+      if rng.random() < 0.5:
+        assert Q.pop_min() == ref.pop(0)
+      else:
+        assert Q.pop_max() == ref.pop()
+    else:
+      key = rng.randrange(10)
+      pos = len(ref)
+      while pos and ref[pos-1][0] > key:
+        pos -= 1
+      ref.insert( pos, (key, f"item{i}") )
+      Q.push( key, f"item{i}" )
+    assert len(Q) == len(ref)
+
+  while ref:
+    assert Q.pop_max() == ref.pop()
+  assert not Q
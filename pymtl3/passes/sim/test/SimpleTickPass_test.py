@@ -0,0 +1,70 @@
+#=========================================================================
+# SimpleTickPass_test.py
+#=========================================================================
+
+from pymtl3.datatypes import Bits8
+from pymtl3.dsl import *
+
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..SimpleTickPass import SimpleTickPass
+
+
+class Counter( Component ):
+
+  def construct( s ):
+    s.incr  = InPort ( Bits8 )
+    s.out   = OutPort( Bits8 )
+    s.count = Wire( Bits8 )
+
+    @s.update_ff
+    def up_count():
+      s.count <<= s.count + s.incr
+
+    @s.update
+    def up_out():
+      s.out = s.count + Bits8(1)
+
+  def done( s ):
+    return s.count >= Bits8(20)
+
+def _setup():
+  A = Counter()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( SimpleTickPass() )
+  A.lock_in_simulation()
+  A.incr = Bits8(3)
+  return A
+
+def test_sim_run_same_as_tick():
+  A = _setup()
+  B = _setup()
+
+  for i in range(5):
+    A.tick()
+  assert B.sim_run( 5 ) == 5
+
+  assert A.simulated_cycles == B.simulated_cycles == 5
+  assert A.count == B.count == Bits8(15)
+  assert A.out == B.out == Bits8(16)
+
+  # Inputs changed between runs are picked up
+  A.incr = B.incr = Bits8(1)
+  A.tick()
+  B.sim_run( 1 )
+  assert A.out == B.out == Bits8(17)
+
+def test_sim_run_until():
+  A = _setup()
+
+  # done() becomes true after 7 cycles
+  assert A.sim_run( 100, until=A.done ) == 7
+  assert A.simulated_cycles == 7
+  assert A.count == Bits8(21)
+
+  # The predicate is checked before every cycle
+  assert A.sim_run( 100, until=A.done ) == 0
+  assert A.sim_run( 0 ) == 0
+  assert A.simulated_cycles == 7
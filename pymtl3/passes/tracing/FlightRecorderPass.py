@@ -0,0 +1,203 @@
+"""
+========================================================================
+FlightRecorderPass.py
+========================================================================
+Keep the value changes of the last flight_cycles cycles in memory when
+top.config_tracing.tracing == 'flight', and only write them to a VCD
+when an exception (e.g. a failing assertion in an update block) escapes
+top.tick or top.sim_run, or when top.dump_flight_recorder() is called.
+
+The changes are collected like the ones of PwfGenerationPass, by a
+function generated by VcdGenerationPass.gen_dump_changes, and copied to
+preallocated circular buffers of nnets * (flight_cycles+1) entries: the
+net ids in an array of uint32 and the values in a list of ints. The
+changes of a cycle are stored contiguously, so the write position wraps
+to 0 at the start of a cycle whose changes do not fit before the end,
+and the last flight_cycles cycles always fit. When a cycle leaves the
+window, its changes are applied to a snapshot of the values at the start
+of the window. The VCD uses the header and symbols of VcdGenerationPass
+and the same timing, cycle i is at time 100*i.
+"""
+import os
+from array import array
+
+from pymtl3.datatypes import to_bits
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+
+from .VcdGenerationPass import VcdGenerationPass
+
+#-------------------------------------------------------------------------
+# FlightRecorder
+#-------------------------------------------------------------------------
+# The changes of cycle c are s.nets/s.values[ p : p+n ] where p and n are
+# s.starts/s.counts[ c % ncycles ], for s.first <= c < s.next. s.base has
+# the values of all nets before cycle s.first.
+
+class FlightRecorder:
+
+  def __init__( s, ncycles, init ):
+    s.ncycles = ncycles
+    s.size    = len(init) * (ncycles + 1)
+    s.nets    = array( 'I', bytes( 4 * s.size ) )
+    s.values  = [ 0 ] * s.size
+    s.starts  = array( 'Q', bytes( 8 * ncycles ) )
+    s.counts  = array( 'I', bytes( 4 * ncycles ) )
+    s.pos     = 0
+    s.first   = 0
+    s.next    = 0
+    s.base    = list( init )
+
+  def start_at( s, cycle ):
+    s.first = s.next = cycle
+
+  # changes is a flat list of net, value pairs
+
+  def record( s, cycle, changes ):
+    k = cycle % s.ncycles
+
+    # Retire the cycle that leaves the window
+    if cycle - s.first == s.ncycles:
+      p, n = s.starts[k], s.counts[k]
+      base = s.base
+      for i, v in zip( s.nets[p:p+n], s.values[p:p+n] ):
+        base[i] = v
+      s.first += 1
+
+    n = len(changes) >> 1
+    p = s.pos
+    if p + n > s.size:
+      p = 0
+    s.nets[p:p+n]   = array( 'I', changes[0::2] )
+    s.values[p:p+n] = changes[1::2]
+    s.starts[k] = p
+    s.counts[k] = n
+    s.pos  = p + n
+    s.next = cycle + 1
+
+  def get_changes( s, cycle ):
+    k = cycle % s.ncycles
+    p, n = s.starts[k], s.counts[k]
+    return zip( s.nets[p:p+n], s.values[p:p+n] )
+
+  # Write the recorded cycles as a VCD with the given header and symbols
+
+  def dump_vcd( s, file_name, header, symbols, clock_idx ):
+    clock_symbol = symbols[ clock_idx ]
+    lines = [ header ]
+
+    # The values at the first cycle
+    values = list( s.base )
+    if s.next > s.first:
+      for i, v in s.get_changes( s.first ):
+        values[i] = v
+    values[ clock_idx ] = 1
+
+    lines.append( f"#{100*s.first}" )
+    for i, v in enumerate( values ):
+      lines.append( f"b{int(v):#b} {symbols[i]}" )
+
+    for cycle in range( s.first, s.next ):
+      if cycle > s.first:
+        for i, v in s.get_changes( cycle ):
+          lines.append( f"b{int(v):#b} {symbols[i]}" )
+      lines.append( f"\n#{100*cycle+50}\nb0b0 {clock_symbol}\n"
+                    f"#{100*cycle+100}\nb0b1 {clock_symbol}\n" )
+
+    with open( file_name, "w" ) as f:
+      f.write( "\n".join( lines ) )
+      f.write( "\n" )
+
+class FlightRecorderPass( BasePass ):
+
+  def __call__( self, top ):
+    if hasattr( top, "config_tracing" ):
+      top.config_tracing.check()
+
+      if top.config_tracing.tracing == 'flight':
+        if hasattr( top, "dump_flight_recorder" ):
+          raise AttributeError( "Please modify the attribute top.dump_flight_recorder to "
+                                "a different name.")
+        if not hasattr( top, "_tracing" ):
+          top._tracing = PassMetadata()
+        top._tracing.flight_func = self.make_flight_func( top, top._tracing )
+        top.dump_flight_recorder = self.gen_dump_flight_recorder( top, top._tracing )
+
+  def make_flight_func( self, top, meta ):
+    config = top.config_tracing
+    file_name = config.vcd_file_name or top.__class__.__name__
+    meta.flight_file_name = str(file_name) + ".vcd"
+
+    print(f"[Tracing mode = flight] Recording the last {config.flight_cycles} cycles, "
+          f"dumped to {os.path.join( os.getcwd(), meta.flight_file_name )} on failures")
+
+    header, nets, symbols, clock_idx = VcdGenerationPass.gen_vcd_header( top,
+                                         VcdGenerationPass.get_signal_filter( config ) )
+    meta.flight_vcd_header = ( header, symbols, clock_idx )
+
+    init = [ int(to_bits( net[0]._dsl.Type() )) for net in nets ]
+    recorder = meta.flight_recorder = FlightRecorder( config.flight_cycles, init )
+
+    last_values = meta.flight_last_values = list( init )
+    net_details = [ (i, net[0], None) for i, net in enumerate( nets ) if i != clock_idx ]
+    dump_changes = VcdGenerationPass.gen_dump_changes( top, net_details, last_values,
+                     lambda i, _: f"changes += ( {i}, v )", "Flight recorder" )
+
+    # When the window starts after cycle 0, every net is recorded again
+    # at its first cycle.
+
+    def begin_flight( cycle ):
+      recorder.start_at( cycle )
+      if cycle > 0:
+        for i in range(len(last_values)):
+          last_values[i] = -1
+
+    def record_flight( cycle ):
+      changes = []
+      try:
+        dump_changes( changes, cycle )
+      except Exception as e:
+        raise TypeError(f'{e}\n - {VcdGenerationPass.find_bad_signal( top, net_details )} '
+                        'becomes another type. Please check your code.')
+      recorder.record( cycle, changes )
+
+    return VcdGenerationPass.gen_windowed_func( top, config, record_flight, begin_flight )
+
+  @staticmethod
+  def gen_dump_flight_recorder( top, meta ):
+    def dump_flight_recorder( file_name=None ):
+      if file_name is None:
+        file_name = meta.flight_file_name
+      recorder = meta.flight_recorder
+      recorder.dump_vcd( file_name, *meta.flight_vcd_header )
+      print(f"[Tracing mode = flight] Dumped cycles {recorder.first} to {recorder.next-1} "
+            f"to {os.path.join( os.getcwd(), file_name )}")
+      return file_name
+    return dump_flight_recorder
+
+  # Dump the flight recorder when an exception escapes tick or sim_run.
+  # This has to be applied after the tick function is generated.
+
+  @staticmethod
+  def wrap_tick( top ):
+    if not hasattr( top, "_tracing" ) or not hasattr( top._tracing, "flight_recorder" ):
+      return
+
+    _tick    = top.tick
+    _sim_run = top.sim_run
+
+    def tick():
+      try:
+        _tick()
+      except Exception:
+        top.dump_flight_recorder()
+        raise
+
+    def sim_run( ncycles, until=None ):
+      try:
+        return _sim_run( ncycles, until )
+      except Exception:
+        top.dump_flight_recorder()
+        raise
+
+    top.tick    = tick
+    top.sim_run = sim_run
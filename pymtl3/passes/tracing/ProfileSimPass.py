@@ -0,0 +1,232 @@
+"""
+========================================================================
+ProfileSimPass.py
+========================================================================
+Measure the wall time spent in every update block of a simulation.
+
+ProfileSimPass is applied after SimulationPass. It wraps every entry of
+top._sched.schedule_ff and top._sched.update_schedule, which include the
+net blocks generated by GenDAGPass, and regenerates top.tick and
+top.sim_run on top of the wrapped schedule. A wrapper counts the calls of
+its block and accumulates the elapsed time from perf_counter_ns.
+
+With sample_every=N only one cycle out of N is simulated with the wrapped
+schedule and the other cycles run the original one, so the overhead is
+roughly divided by N. The reported times and calls are then estimated by
+scaling the measured ones by the ratio of simulated to profiled cycles.
+
+The results are reported per block, per host component and per component
+class, and can be written as a collapsed-stack file for flame graph tools,
+where the stack of a block is the hierarchy of its host component, e.g.
+"s;tiles[0];alu;up_alu 1234" with the time in nanoseconds.
+
+With the event-driven schedule, the entries are the generated comb and ff
+phases, so the time is only reported per phase.
+"""
+from collections import defaultdict
+from time import perf_counter_ns
+
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+from pymtl3.passes.errors import PassOrderError
+from pymtl3.passes.sim.SimpleTickPass import SimpleTickPass
+
+
+def _mk_timed( blk, stats ):
+  def timed():
+    t0 = perf_counter_ns()
+    blk()
+    stats[1] += perf_counter_ns() - t0
+    stats[0] += 1
+  timed.__name__ = blk.__name__
+  return timed
+
+# The frames of the hierarchy of a component, e.g. s.tiles[0].alu gives
+# [ "s", "tiles[0]", "alu" ]
+
+def get_hierarchy_frames( obj ):
+  return repr(obj).split( '.' )
+
+class ProfileSimPass( BasePass ):
+
+  def __init__( self, sample_every=1 ):
+    assert isinstance( sample_every, int ) and sample_every >= 1
+    self.sample_every = sample_every
+
+  def __call__( self, top ):
+    if not hasattr( top, "tick" ) or not hasattr( top._sched, "update_schedule" ):
+      raise PassOrderError( "tick" )
+    if hasattr( top, "_profile" ):
+      raise AttributeError( "ProfileSimPass has already been applied to the model" )
+
+    top._profile = p = PassMetadata()
+    p.sample_every    = self.sample_every
+    p.profiled_cycles = 0
+    p.start_cycles    = top.simulated_cycles
+    p.stats           = {} # blk -> [ ncalls, ns ]
+    p.hosts           = {} # blk -> host component
+
+    sched = top._sched
+    orig_ff, orig_update = list( sched.schedule_ff ), list( sched.update_schedule )
+
+    for blk in orig_ff + orig_update:
+      if blk not in p.stats:
+        p.stats[ blk ] = [ 0, 0 ]
+        p.hosts[ blk ] = self.get_host( top, blk )
+
+    timed = { blk: _mk_timed( blk, p.stats[ blk ] ) for blk in p.stats }
+    sched.schedule_ff     = [ timed[ x ] for x in orig_ff ]
+    sched.update_schedule = [ timed[ x ] for x in orig_update ]
+
+    # Regenerate tick and sim_run on the wrapped schedule. SimpleTickPass
+    # resets the cycle count, so keep the current one.
+
+    cycles = top.simulated_cycles
+    SimpleTickPass()( top )
+    prof_tick, prof_sim_run = top.tick, top.sim_run
+
+    if self.sample_every == 1:
+      def tick():
+        prof_tick()
+        p.profiled_cycles += 1
+
+      def sim_run( ncycles, until=None ):
+        ret = prof_sim_run( ncycles, until )
+        p.profiled_cycles += ret
+        return ret
+
+    else:
+      sched.schedule_ff, sched.update_schedule = orig_ff, orig_update
+      SimpleTickPass()( top )
+      tick, sim_run = self.gen_sampled( top, p, prof_tick, top.tick, top.sim_run )
+      sched.schedule_ff     = [ timed[ x ] for x in orig_ff ]
+      sched.update_schedule = [ timed[ x ] for x in orig_update ]
+
+    top.simulated_cycles = cycles
+    top.tick    = tick
+    top.sim_run = sim_run
+
+    # Wrap the new tick and sim_run again, e.g. for the flight recorder
+    from pymtl3.passes.PassGroups import SimulationPass
+    SimulationPass.wrap_tick( top )
+
+    top.get_profile   = self.gen_get_profile( top )
+    top.print_profile = self.gen_print_profile( top )
+    top.dump_profile  = self.gen_dump_collapsed( top )
+    top.reset_profile = self.gen_reset_profile( top )
+
+  @staticmethod
+  def get_host( top, blk ):
+    try:
+      return top.get_update_block_host_component( blk )
+    except KeyError:
+      pass
+    # Net blocks belong to the lowest common ancestor of their signals, and
+    # SCC blocks and other generated functions to the top component
+    return top._dag.genblk_hostobj.get( blk, top )
+
+  # The profiled cycle is the last one of every sample_every cycles. The
+  # other cycles are simulated in chunks by the original sim_run.
+
+  @staticmethod
+  def gen_sampled( top, p, prof_tick, plain_tick, plain_sim_run ):
+    N = p.sample_every
+    count = [ 0 ]
+
+    def tick():
+      count[0] += 1
+      if count[0] == N:
+        count[0] = 0
+        prof_tick()
+        p.profiled_cycles += 1
+      else:
+        plain_tick()
+
+    def sim_run( ncycles, until=None ):
+      done = 0
+      while done < ncycles:
+        k = min( N - 1 - count[0], ncycles - done )
+        if k > 0:
+          ret = plain_sim_run( k, until )
+          count[0] += ret
+          done     += ret
+          if ret < k:
+            return done
+        else:
+          if until is not None and until():
+            return done
+          tick()
+          done += 1
+      return done
+
+    return tick, sim_run
+
+  #-----------------------------------------------------------------------
+  # Reports
+  #-----------------------------------------------------------------------
+
+  @staticmethod
+  def gen_get_profile( top ):
+    p = top._profile
+
+    # by is "block", "component" or "class". Returns a dict from the name
+    # to ( ncalls, ns ), sorted by decreasing time.
+
+    def get_profile( by="block" ):
+      assert by in [ "block", "component", "class" ], f"Unknown profile grouping {by}"
+      simulated = top.simulated_cycles - p.start_cycles
+      scale = simulated / p.profiled_cycles if p.profiled_cycles else 0
+
+      ret = defaultdict( lambda: [ 0, 0 ] )
+      for blk, (ncalls, ns) in p.stats.items():
+        host = p.hosts[ blk ]
+        if   by == "block":     key = f"{host!r}.{blk.__name__}"
+        elif by == "component": key = repr(host)
+        else:                   key = host.__class__.__name__
+        ret[ key ][0] += ncalls
+        ret[ key ][1] += ns
+
+      return { k: ( round( v[0] * scale ), round( v[1] * scale ) )
+               for k, v in sorted( ret.items(), key=lambda x: -x[1][1] ) }
+
+    return get_profile
+
+  @staticmethod
+  def gen_print_profile( top ):
+
+    def print_profile( by="block", n=20 ):
+      profile = top.get_profile( by )
+      total = sum( x[1] for x in profile.values() ) or 1
+      print( f"{'ncalls':>12} {'time(ms)':>12} {'%':>6}  {by}" )
+      for name, (ncalls, ns) in list( profile.items() )[:n]:
+        print( f"{ncalls:>12} {ns/1e6:>12.3f} {100*ns/total:>6.2f}  {name}" )
+
+    return print_profile
+
+  @staticmethod
+  def gen_dump_collapsed( top ):
+    p = top._profile
+
+    def dump_profile( file_name ):
+      profile = top.get_profile( "block" )
+      lines = []
+      for blk in p.stats:
+        host = p.hosts[ blk ]
+        ns = profile[ f"{host!r}.{blk.__name__}" ][1]
+        if ns:
+          lines.append( f"{';'.join( get_hierarchy_frames( host ) + [ blk.__name__ ] )} {ns}" )
+      with open( file_name, "w" ) as f:
+        f.write( "\n".join( sorted( lines ) ) + "\n" )
+
+    return dump_profile
+
+  @staticmethod
+  def gen_reset_profile( top ):
+    p = top._profile
+
+    def reset_profile():
+      for x in p.stats.values():
+        x[0] = x[1] = 0
+      p.profiled_cycles = 0
+      p.start_cycles    = top.simulated_cycles
+
+    return reset_profile
@@ -0,0 +1,35 @@
+#=========================================================================
+# ProfilingConfigs.py
+#=========================================================================
+"""Configuration class of the sampling profiler"""
+
+
+from pymtl3.passes.PassConfigs import BasePassConfigs, Checker
+
+
+class ProfilingConfigs( BasePassConfigs ):
+
+  Options = {
+    "profiling" : 'none',
+    "sample_interval" : 0.001,
+    "timer" : 'prof',
+  }
+
+  Checkers = {
+    'profiling': Checker(
+      lambda v: v in ['none', 'sample'],
+      "expects a string in ['none', 'sample']"
+    ),
+
+    'sample_interval': Checker(
+      condition = lambda v: isinstance(v, (int, float)) and v > 0,
+      error_msg = "expects a positive number of seconds"
+    ),
+
+    'timer': Checker(
+      condition = lambda v: v in ['prof', 'real', 'thread'],
+      error_msg = "expects a string in ['prof', 'real', 'thread']"
+    ),
+  }
+
+  PassName = 'passes.tracing.SamplingProfilePass'
@@ -0,0 +1,296 @@
+"""
+========================================================================
+PwfFile.py
+========================================================================
+Reader and writer of the PyMTL waveform format (PWF), a compressed
+columnar alternative to VCD.
+
+The simulated cycles are split into blocks of block_cycles cycles. In
+every block, the changes of each net are stored as a separate stream of
+count changes:
+
+  cycle deltas: count uint32, the first one from the block start
+  value deltas: count unsigned integers of ceil(nbits/8) bytes (8 bytes
+                for 5 to 8 bytes, 4 bytes for 3 bytes), the first one is
+                the value and the others are value ^ previous value
+
+all little-endian, and every stream is compressed on its own with raw
+deflate. A net that does not change in a block has no stream in that
+block.
+
+The index is stored at the end of the file as zlib-compressed JSON:
+
+  { "version": 1, "block_cycles": B, "ncycles": N,
+    "signals": { name: net }, "nets": [ [ nbits, initial value ] ],
+    "blocks": [ [ start, end, { net: [ offset, length, count, last ] } ] ] }
+
+where last is the last value of the net in the block, so that the value
+of a net at the start of any block is known from the index alone. The
+file is laid out as
+
+  b"PYMTLWF1" | streams of block 0 | streams of block 1 | ... | index |
+  footer = ( index offset, index length ) as two little-endian uint64,
+           followed by b"PYMTLWF1"
+
+PwfReader reads the index when it is opened and then only reads the
+streams of one net in the blocks that overlap the requested cycles.
+"""
+import atexit
+import json
+import queue
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+
+MAGIC  = b"PYMTLWF1"
+FOOTER = struct.Struct( "<QQ8s" )
+
+# Values up to 64 bits are packed by array, wider ones by int.to_bytes
+
+_TYPECODES = { 1: 'B', 2: 'H', 3: 'I', 4: 'I' }
+for _n in range( 5, 9 ):
+  _TYPECODES[ _n ] = 'Q'
+
+def _to_le( arr ):
+  if sys.byteorder != "little":
+    arr.byteswap()
+  return arr.tobytes()
+
+def _pack_values( values, nbits ):
+  nbytes = max( (nbits + 7) // 8, 1 )
+  if nbytes in _TYPECODES:
+    return _to_le( array( _TYPECODES[ nbytes ], values ) )
+  return b"".join( [ x.to_bytes( nbytes, "little" ) for x in values ] )
+
+def _unpack_values( data, count, nbits ):
+  nbytes = max( (nbits + 7) // 8, 1 )
+  if nbytes in _TYPECODES:
+    arr = array( _TYPECODES[ nbytes ] )
+    arr.frombytes( data )
+    if sys.byteorder != "little":
+      arr.byteswap()
+    return list( arr )
+  return [ int.from_bytes( data[i*nbytes:(i+1)*nbytes], "little" ) for i in range( count ) ]
+
+#-------------------------------------------------------------------------
+# PwfWriter
+#-------------------------------------------------------------------------
+# The simulation appends cycle, value to s.changes[ net ] and calls
+# end_cycle() once per cycle. Every finished block is handed to a
+# background thread that encodes, compresses and writes it, so that the
+# file I/O and most of the compression happen off the simulation thread.
+
+class PwfWriter:
+
+  def __init__( s, file_name, signals, nets, block_cycles=1024, level=6 ):
+    s.file = open( file_name, "wb" )
+    s.file.write( MAGIC )
+    s.offset = len(MAGIC)
+    s.level  = level
+    s.closed = False
+    s.error  = None
+
+    s.block_cycles = block_cycles
+    s.block_start  = 0
+    s.cycle        = 0
+    s.nbits        = [ x[0] for x in nets ]
+    s.changes      = [ [] for _ in nets ]
+
+    # signals: { name: net }, nets: [ (nbits, initial value) ]
+    s.index = { "version": 1, "block_cycles": block_cycles, "ncycles": 0,
+                "signals": signals, "nets": [ list(x) for x in nets ],
+                "blocks": [] }
+
+    s.blocks = queue.Queue( maxsize=8 )
+    s.thread = threading.Thread( target=s._write_blocks, daemon=True )
+    s.thread.start()
+    atexit.register( s.close )
+
+  def end_cycle( s ):
+    s.cycle += 1
+    if s.cycle - s.block_start == s.block_cycles:
+      s._hand_off()
+
+  # Skip the cycles up to cycle, where the values are still the initial
+  # ones unless changes are recorded at cycle.
+
+  def start_at( s, cycle ):
+    if s.cycle > s.block_start:
+      s._hand_off()
+    s.cycle = s.block_start = cycle
+
+  def _hand_off( s ):
+    if s.error is not None:
+      e, s.error = s.error, None
+      raise e
+    s.blocks.put( (s.block_start, s.cycle, s.changes) )
+    s.block_start = s.cycle
+    s.changes     = [ [] for _ in s.nbits ]
+
+  def _write_blocks( s ):
+    while True:
+      item = s.blocks.get()
+      try:
+        if item is None:
+          return
+        if s.error is None:
+          s._write_block( *item )
+      except Exception as e:
+        s.error = e
+      finally:
+        s.blocks.task_done()
+
+  # changes[ net ] is a flat list of cycle, value pairs
+
+  def _write_block( s, start, end, changes ):
+    entries = {}
+    for net, flat in enumerate( changes ):
+      if not flat:
+        continue
+      cycles, values = flat[0::2], flat[1::2]
+      cycle_deltas = [ y - x for x, y in zip( [ start ] + cycles, cycles ) ]
+      value_deltas = [ y ^ x for x, y in zip( [ 0 ] + values, values ) ]
+
+      c = zlib.compressobj( s.level, zlib.DEFLATED, -15 )
+      data = c.compress( _to_le( array( 'I', cycle_deltas ) ) ) + \
+             c.compress( _pack_values( value_deltas, s.nbits[ net ] ) ) + c.flush()
+      s.file.write( data )
+      entries[ net ] = [ s.offset, len(data), len(values), values[-1] ]
+      s.offset += len(data)
+
+    s.index[ "blocks" ].append( [ start, end, entries ] )
+    s.index[ "ncycles" ] = end
+
+  def close( s ):
+    if s.closed:
+      return
+    try:
+      if s.cycle > s.block_start:
+        s._hand_off()
+    finally:
+      s.closed = True
+      s.blocks.put( None )
+      s.thread.join()
+      atexit.unregister( s.close )
+
+      index = zlib.compress( json.dumps( s.index ).encode() )
+      s.file.write( index )
+      s.file.write( FOOTER.pack( s.offset, len(index), MAGIC ) )
+      s.file.close()
+
+    if s.error is not None:
+      e, s.error = s.error, None
+      raise e
+
+#-------------------------------------------------------------------------
+# PwfReader
+#-------------------------------------------------------------------------
+
+class PwfReader:
+
+  def __init__( s, file_name ):
+    s.file = open( file_name, "rb" )
+    if s.file.read( len(MAGIC) ) != MAGIC:
+      raise ValueError( f"{file_name} is not a PyMTL waveform file" )
+
+    s.file.seek( -FOOTER.size, 2 )
+    offset, length, magic = FOOTER.unpack( s.file.read( FOOTER.size ) )
+    if magic != MAGIC:
+      raise ValueError( f"{file_name} is incomplete, was the waveform closed?" )
+
+    s.file.seek( offset )
+    index = json.loads( zlib.decompress( s.file.read( length ) ) )
+
+    s.ncycles  = index[ "ncycles" ]
+    s._signals = index[ "signals" ]
+    s._nets    = index[ "nets" ]
+    s._blocks  = index[ "blocks" ]
+    s._net_blocks = {}
+
+  def __enter__( s ):
+    return s
+
+  def __exit__( s, *args ):
+    s.close()
+
+  def close( s ):
+    s.file.close()
+
+  @property
+  def signals( s ):
+    return sorted( s._signals )
+
+  def nbits( s, name ):
+    return s._nets[ s._signals[ name ] ][0]
+
+  # The blocks that contain changes of a net, as sorted start cycles and
+  # ( start, end, offset, length, count, last ) tuples
+
+  def _get_net_blocks( s, net ):
+    try:
+      return s._net_blocks[ net ]
+    except KeyError:
+      key = str(net)
+      blks = [ (start, end, *entries[ key ])
+               for start, end, entries in s._blocks if key in entries ]
+      ret = s._net_blocks[ net ] = ( [ x[0] for x in blks ], blks )
+      return ret
+
+  def _read_block( s, blk, nbits ):
+    start, _, offset, length, count, _ = blk
+    s.file.seek( offset )
+    data = zlib.decompress( s.file.read( length ), -15 )
+
+    cycle_deltas = array( 'I' )
+    pos = cycle_deltas.itemsize * count
+    cycle_deltas.frombytes( data[:pos] )
+    if sys.byteorder != "little":
+      cycle_deltas.byteswap()
+    value_deltas = _unpack_values( data[pos:], count, nbits )
+
+    ret = []
+    cycle, value = start, 0
+    for dc, dv in zip( cycle_deltas, value_deltas ):
+      cycle += dc
+      value ^= dv
+      ret.append( (cycle, value) )
+    return ret
+
+  # Returns the value of the signal at cycle start followed by all the
+  # changes in start < cycle < end, as a list of ( cycle, value )
+
+  def get_changes( s, name, start=0, end=None ):
+    if end is None:
+      end = s.ncycles
+    net = s._signals[ name ]
+    starts, blks = s._get_net_blocks( net )
+
+    value = s._nets[ net ][1]
+    changes = []
+
+    i = bisect_right( starts, start ) - 1
+    if i >= 0 and blks[i][1] <= start:
+      value = blks[i][5]
+      i += 1
+    elif i < 0:
+      i = 0
+    else:
+      # The block that contains start also has the value at start
+      if i > 0:
+        value = blks[i-1][5]
+
+    while i < len(blks) and blks[i][0] < end:
+      for cycle, v in s._read_block( blks[i], s._nets[ net ][0] ):
+        if cycle <= start:
+          value = v
+        elif cycle < end:
+          changes.append( (cycle, v) )
+      i += 1
+
+    return [ (start, value) ] + changes
+
+  def value_at( s, name, cycle ):
+    return s.get_changes( name, cycle, cycle+1 )[0][1]
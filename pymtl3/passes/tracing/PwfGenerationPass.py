@@ -0,0 +1,120 @@
+"""
+========================================================================
+PwfGenerationPass.py
+========================================================================
+Dump the value changes of all top level signals to a PyMTL waveform
+(PWF) file when top.config_tracing.tracing == 'pwf'. See PwfFile.py for
+the format and for PwfReader.
+
+Connected signals share one net, which is recorded once per cycle
+through the writer of the net if it is a top level signal. The changes
+are collected by a function generated like the one of VcdGenerationPass
+and handed to the writer thread every pwf_block_cycles cycles. The file
+is complete once top.close_pwf() is called, or at exit.
+The cycles are counted like in the VCD: cycle i is the i-th call to
+tick, where the values are recorded after the sequential blocks. The
+include, exclude, start_cycle, end_cycle and trigger options select
+signals and cycles like for the VCD; before the window starts the file
+only has the initial values.
+"""
+import os
+
+from pymtl3.datatypes import get_nbits, to_bits
+from pymtl3.dsl import Const
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+
+from .PwfFile import PwfWriter
+from .VcdGenerationPass import VcdGenerationPass
+
+
+class PwfGenerationPass( BasePass ):
+
+  def __call__( self, top ):
+    if hasattr( top, "config_tracing" ):
+      top.config_tracing.check()
+
+      if top.config_tracing.tracing == 'pwf':
+        if hasattr( top, "close_pwf" ):
+          raise AttributeError( "Please modify the attribute top.close_pwf to "
+                                "a different name.")
+        if not hasattr( top, "_tracing" ):
+          top._tracing = PassMetadata()
+        top._tracing.pwf_func = self.make_pwf_func( top, top._tracing )
+        top.close_pwf = self.gen_close_pwf( top._tracing )
+
+  # Write the rest of the waveform and close the PWF file. The simulation
+  # cannot tick anymore afterwards. Returns the name of the PWF file.
+
+  @staticmethod
+  def gen_close_pwf( meta ):
+    def close_pwf():
+      meta.pwf_file.close()
+      return meta.pwf_file_name
+    return close_pwf
+
+  # Group the top level signals into nets. The recorded signal of a net
+  # is its writer if possible since the other signals of the net are only
+  # updated when the net block runs. Only the signals for which
+  # is_selected returns True are collected.
+
+  @staticmethod
+  def collect_nets( top, is_selected=None ):
+    if is_selected is None:
+      is_selected = lambda x: True
+
+    nets = []
+    for writer, net in top.get_all_value_nets():
+      signals = sorted( [ x for x in net if not isinstance( x, Const ) and
+                          x.is_top_level_signal() and is_selected( x ) ], key=repr )
+      if signals:
+        if writer in signals:
+          signals.remove( writer )
+          signals.insert( 0, writer )
+        nets.append( signals )
+
+    in_net = { x for net in nets for x in net }
+    for x in top._dsl.all_signals:
+      if x.is_top_level_signal() and x not in in_net and is_selected( x ):
+        nets.append( [ x ] )
+
+    return sorted( nets, key=lambda x: repr(x[0]) )
+
+  def make_pwf_func( self, top, meta ):
+    config = top.config_tracing
+    file_name = config.vcd_file_name or top.__class__.__name__
+    meta.pwf_file_name = str(file_name) + ".pwf"
+
+    print(f"[Tracing mode = pwf] Writing PyMTL waveform to "
+          f"{os.path.join( os.getcwd(), meta.pwf_file_name )}")
+
+    nets = self.collect_nets( top, VcdGenerationPass.get_signal_filter( config ) )
+    signals = { repr(x): i for i, net in enumerate( nets ) for x in net }
+    init    = [ int(to_bits( net[0]._dsl.Type() )) for net in nets ]
+
+    writer = meta.pwf_file = PwfWriter( meta.pwf_file_name, signals,
+               [ (get_nbits( net[0]._dsl.Type ), v) for net, v in zip( nets, init ) ],
+               config.pwf_block_cycles )
+
+    last_values = meta.pwf_last_values = list( init )
+    net_details = [ (i, net[0], None) for i, net in enumerate( nets ) ]
+    dump_changes = VcdGenerationPass.gen_dump_changes( top, net_details, last_values,
+                     lambda i, _: f"changes[{i}] += ( cycle, v )", "PWF dump" )
+
+    # When the window starts after cycle 0, every net is recorded again
+    # at its first cycle.
+
+    def begin_pwf( cycle ):
+      writer.start_at( cycle )
+      if cycle > 0:
+        for i in range(len(last_values)):
+          last_values[i] = -1
+
+    def dump_pwf( cycle ):
+      try:
+        dump_changes( writer.changes, cycle )
+      except Exception as e:
+        raise TypeError(f'{e}\n - {VcdGenerationPass.find_bad_signal( top, net_details )} '
+                        'becomes another type. Please check your code.')
+      writer.end_cycle()
+
+    return VcdGenerationPass.gen_windowed_func( top, config, dump_pwf, begin_pwf )
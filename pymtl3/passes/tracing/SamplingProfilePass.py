@@ -0,0 +1,230 @@
+"""
+========================================================================
+SamplingProfilePass.py
+========================================================================
+A sampling profiler that attributes simulation time to the component
+hierarchy without touching the schedule.
+
+The profiler is enabled by top.config_profiling = ProfilingConfigs(
+profiling='sample' ) before applying SimulationPass or Mamba2020. Then a
+timer interrupts the simulation every sample_interval seconds and looks
+for the update block that is executing in the interrupted stack:
+
+- timer='prof' uses SIGPROF from an ITIMER_PROF timer (CPU time)
+- timer='real' uses SIGALRM from an ITIMER_REAL timer (wall time)
+- timer='thread' uses a background thread that samples the stack of the
+  simulating thread, for platforms or threads without signal timers
+
+Update blocks are identified by their code objects. Instances of the
+same component class share the code objects of their blocks, so the host
+component is read from the closure variable of the block that refers to
+it (usually s) in the interrupted frame. Blocks wrapped in greenlets and
+blocks called from the meta blocks of Mamba2020 are found the same way.
+
+The samples are aggregated into a tree following the component
+hierarchy, with the update blocks as leaves. Samples taken outside any
+update block are counted at the root.
+"""
+import atexit
+import signal
+import sys
+import threading
+from collections import defaultdict
+
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+
+from .ProfileSimPass import ProfileSimPass, get_hierarchy_frames
+
+#-------------------------------------------------------------------------
+# ProfileNode
+#-------------------------------------------------------------------------
+
+class ProfileNode:
+
+  def __init__( s, name, interval ):
+    s.name     = name
+    s.interval = interval
+    s.samples  = 0 # samples attributed to this node itself
+    s.children = {}
+
+  def child( s, name ):
+    try:
+      return s.children[ name ]
+    except KeyError:
+      ret = s.children[ name ] = ProfileNode( name, s.interval )
+      return ret
+
+  @property
+  def total_samples( s ):
+    return s.samples + sum( x.total_samples for x in s.children.values() )
+
+  @property
+  def time( s ):
+    return s.total_samples * s.interval
+
+  def collapsed_stacks( s, prefix=() ):
+    path = prefix + ( s.name, )
+    if s.samples:
+      yield ";".join( path ), s.samples
+    for x in s.children.values():
+      yield from x.collapsed_stacks( path )
+
+  def format( s, total=None, indent="" ):
+    total = total or s.total_samples or 1
+    lines = [ f"{indent}{s.name}  {s.time:.3f}s  {100*s.total_samples/total:.1f}%" ]
+    for x in sorted( s.children.values(), key=lambda x: -x.total_samples ):
+      lines.extend( x.format( total, indent + "  " ) )
+    return lines
+
+  def __str__( s ):
+    return "\n".join( s.format() )
+
+#-------------------------------------------------------------------------
+# SamplingProfilePass
+#-------------------------------------------------------------------------
+
+class SamplingProfilePass( BasePass ):
+
+  def __call__( self, top ):
+    if not hasattr( top, "config_profiling" ):
+      return
+
+    config = top.config_profiling
+    config.check()
+    if config.profiling == 'none':
+      return
+
+    top._sampling = p = PassMetadata()
+    p.interval = config.sample_interval
+    p.timer    = config.timer
+    p.code_map = self.build_code_map( top )
+    p.counts   = defaultdict(int) # (host, block name) -> samples
+    p.other    = 0
+    p.running  = False
+
+    top.start_profiling   = self.gen_start( top )
+    top.stop_profiling    = self.gen_stop( top )
+    top.get_profile_tree  = self.gen_get_profile_tree( top )
+    top.dump_profile_tree = self.gen_dump_profile_tree( top )
+
+    top.start_profiling()
+
+  # code object -> ( block name, closure variable of the host or None,
+  # default host )
+
+  @staticmethod
+  def build_code_map( top ):
+    by_code = defaultdict(list)
+    for blk in top.get_all_update_blocks() | top._dag.genblks:
+      by_code[ blk.__code__ ].append( (blk, ProfileSimPass.get_host( top, blk )) )
+
+    code_map = {}
+    for code, blks in by_code.items():
+      blk, host = blks[0]
+      var = None
+      if len(blks) > 1:
+        for i, x in enumerate( code.co_freevars ):
+          if all( b.__closure__[i].cell_contents is h for b, h in blks ):
+            var = x
+            break
+      code_map[ code ] = ( blk.__name__, var, host )
+    return code_map
+
+  @staticmethod
+  def gen_sample( p ):
+    code_map = p.code_map
+    counts   = p.counts
+
+    def sample( frame ):
+      while frame is not None:
+        x = code_map.get( frame.f_code )
+        if x is not None:
+          name, var, host = x
+          if var is not None:
+            host = frame.f_locals.get( var, host )
+          counts[ (host, name) ] += 1
+          return
+        frame = frame.f_back
+      p.other += 1
+
+    return sample
+
+  @staticmethod
+  def gen_start( top ):
+    p = top._sampling
+
+    def start_profiling():
+      if p.running:
+        return
+      sample = SamplingProfilePass.gen_sample( p )
+
+      if p.timer == 'thread':
+        ident = threading.get_ident()
+        p.stop_event = stop = threading.Event()
+
+        def sampler():
+          while not stop.wait( p.interval ):
+            sample( sys._current_frames().get( ident ) )
+
+        p.thread = threading.Thread( target=sampler, daemon=True )
+        p.thread.start()
+
+      else:
+        which, signum = ( signal.ITIMER_PROF, signal.SIGPROF ) if p.timer == 'prof' else \
+                        ( signal.ITIMER_REAL, signal.SIGALRM )
+        p.old_handler = signal.signal( signum, lambda _, frame: sample( frame ) )
+        signal.setitimer( which, p.interval, p.interval )
+        p.signal = ( which, signum )
+
+        # The default action of SIGPROF/SIGALRM terminates the process, so
+        # the timer must not outlive the interpreter
+        atexit.register( top.stop_profiling )
+
+      p.running = True
+
+    return start_profiling
+
+  @staticmethod
+  def gen_stop( top ):
+    p = top._sampling
+
+    def stop_profiling():
+      if not p.running:
+        return
+      if p.timer == 'thread':
+        p.stop_event.set()
+        p.thread.join()
+      else:
+        which, signum = p.signal
+        signal.setitimer( which, 0 )
+        signal.signal( signum, p.old_handler )
+        atexit.unregister( top.stop_profiling )
+      p.running = False
+
+    return stop_profiling
+
+  @staticmethod
+  def gen_get_profile_tree( top ):
+    p = top._sampling
+
+    def get_profile_tree():
+      root = ProfileNode( repr(top), p.interval )
+      root.samples = p.other
+      for (host, name), n in list( p.counts.items() ):
+        node = root
+        for x in get_hierarchy_frames( host )[1:] + [ name ]:
+          node = node.child( x )
+        node.samples += n
+      return root
+
+    return get_profile_tree
+
+  @staticmethod
+  def gen_dump_profile_tree( top ):
+
+    def dump_profile_tree( file_name ):
+      with open( file_name, "w" ) as f:
+        for stack, n in top.get_profile_tree().collapsed_stacks():
+          print( f"{stack} {n}", file=f )
+
+    return dump_profile_tree
@@ -15,12 +15,27 @@ class TracingConfigs( BasePassConfigs ):
     "tracing" : 'none',
     "vcd_file_name" : "",
     "method_trace" : True,
+    "pwf_block_cycles" : 1024,
+    "flight_cycles" : 1024,
+
+    # Selective and windowed waveforms. include/exclude are lists of
+    # hierarchical globs like "top.tile[*].core.*" where * matches any
+    # string. The dump covers cycles start_cycle <= cycle < end_cycle
+    # (None means forever) and starts at the first cycle in that window
+    # where trigger is true. trigger is either an expression on s (the
+    # top component) like "s.core.pc == 0x200" or a callable that takes
+    # the top component.
+    "include" : [],
+    "exclude" : [],
+    "start_cycle" : 0,
+    "end_cycle" : None,
+    "trigger" : None,
   }
 
   Checkers = {
     'tracing': Checker(
-      lambda v: v in ['none', 'vcd', 'text_ascii', 'text_fancy' ],
-      "expects a string in ['none', 'vcd', 'text_ascii', 'text_fancy']"
+      lambda v: v in ['none', 'vcd', 'text_ascii', 'text_fancy', 'pwf', 'flight' ],
+      "expects a string in ['none', 'vcd', 'text_ascii', 'text_fancy', 'pwf', 'flight']"
     ),
 
     'vcd_file_name': Checker(
@@ -32,6 +47,31 @@ class TracingConfigs( BasePassConfigs ):
       condition = lambda v: isinstance(v, bool),
       error_msg = "expects a boolean"
     ),
+
+    ('pwf_block_cycles', 'flight_cycles'): Checker(
+      condition = lambda v: isinstance(v, int) and v > 0,
+      error_msg = "expects a positive integer"
+    ),
+
+    ('include', 'exclude'): Checker(
+      condition = lambda v: isinstance(v, (list, tuple)) and all( isinstance(x, str) for x in v ),
+      error_msg = "expects a list of strings"
+    ),
+
+    'start_cycle': Checker(
+      condition = lambda v: isinstance(v, int) and v >= 0,
+      error_msg = "expects a non-negative integer"
+    ),
+
+    'end_cycle': Checker(
+      condition = lambda v: v is None or (isinstance(v, int) and v >= 0),
+      error_msg = "expects None or a non-negative integer"
+    ),
+
+    'trigger': Checker(
+      condition = lambda v: v is None or isinstance(v, str) or callable(v),
+      error_msg = "expects None, a string expression or a callable"
+    ),
   }
 
   PassName = 'passes.tracing.*'
@@ -7,15 +7,102 @@ Author : Shunning Jiang, Yanghui Ou, Peitian Pan
 Date   : Sep 8, 2019
 """
 
+import atexit
 import os
+import queue
+import re
+import sys
+import threading
 import time
 from collections import defaultdict
+from linecache import cache as line_cache
 
-from pymtl3.datatypes import Bits, concat, get_nbits, to_bits
+from pymtl3.datatypes import Bits, concat, get_nbits, is_bitstruct_class, to_bits
 from pymtl3.dsl import Const
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
-
+from pymtl3.passes.sim.KernelCache import get_kernel_cache
+from pymtl3.utils import custom_exec
+
+
+#-------------------------------------------------------------------------
+# BufferedVcdWriter
+#-------------------------------------------------------------------------
+# A file-like object that accumulates the text of the dump in memory and
+# hands chunks of about chunk_size characters to a background thread
+# that writes them to the file. The chunks go through a ring of nchunks
+# slots, so the simulation only waits for the disk when all slots are
+# full. The file is flushed by flush() (called by sim_reset), close()
+# (called by top.close_vcd()) and at exit, never in the middle of a
+# simulation. Writing to a closed writer raises ValueError like a file.
+
+class BufferedVcdWriter:
+
+  def __init__( s, file_name, chunk_size=1<<20, nchunks=8 ):
+    s.file       = open( file_name, "w" )
+    s.chunk_size = chunk_size
+    s.pending    = []
+    s.pending_len = 0
+    s.closed     = False
+    s.error      = None
+
+    s.chunks = queue.Queue( maxsize=nchunks )
+    s.thread = threading.Thread( target=s._write_chunks, daemon=True )
+    s.thread.start()
+    atexit.register( s.close )
+
+  def _write_chunks( s ):
+    while True:
+      chunk = s.chunks.get()
+      try:
+        if chunk is None:
+          return
+        if s.error is None:
+          s.file.write( chunk )
+      except Exception as e:
+        s.error = e
+      finally:
+        s.chunks.task_done()
+
+  def _check_error( s ):
+    if s.error is not None:
+      e, s.error = s.error, None
+      raise e
+
+  def _hand_off( s ):
+    if s.pending:
+      s._check_error()
+      s.chunks.put( "".join( s.pending ) )
+      s.pending     = []
+      s.pending_len = 0
+
+  def write( s, text ):
+    if s.closed:
+      raise ValueError( "I/O operation on closed VCD file." )
+    s.pending.append( text )
+    s.pending_len += len(text)
+    if s.pending_len >= s.chunk_size:
+      s._hand_off()
+
+  def flush( s ):
+    if s.closed:
+      return
+    s._hand_off()
+    s.chunks.join()
+    s._check_error()
+    s.file.flush()
+
+  def close( s ):
+    if s.closed:
+      return
+    try:
+      s.flush()
+    finally:
+      s.closed = True
+      s.chunks.put( None )
+      s.thread.join()
+      s.file.close()
+      atexit.unregister( s.close )
 
 class VcdGenerationPass( BasePass ):
 
@@ -24,10 +111,24 @@ class VcdGenerationPass( BasePass ):
     if hasattr( top, "config_tracing" ):
       top.config_tracing.check()
 
-      if top.config_tracing.tracing != 'none':
+      if top.config_tracing.tracing not in [ 'none', 'pwf', 'flight' ]:
+        if hasattr( top, "close_vcd" ):
+          raise AttributeError( "Please modify the attribute top.close_vcd to "
+                                "a different name.")
         if not hasattr( top, "_tracing" ):
           top._tracing = PassMetadata()
         top._tracing.vcd_func = self.make_vcd_func( top, top._tracing )
+        top.close_vcd = self.gen_close_vcd( top._tracing )
+
+  # Write the rest of the waveform and close the VCD file. The simulation
+  # cannot tick anymore afterwards. Returns the name of the VCD file.
+
+  @staticmethod
+  def gen_close_vcd( meta ):
+    def close_vcd():
+      meta.vcd_file.close()
+      return meta.vcd_file_name
+    return close_vcd
 
   def make_vcd_func( self, top, vcdmeta ):
 
@@ -38,11 +139,168 @@ class VcdGenerationPass( BasePass ):
     else:
       vcdmeta.vcd_file_name = str(top.__class__.__name__) + ".vcd"
 
-    vcd_file = vcdmeta.vcd_file = open( vcdmeta.vcd_file_name, "w" )
+    vcd_file = vcdmeta.vcd_file = BufferedVcdWriter( vcdmeta.vcd_file_name )
 
     print(f"[Tracing mode = {top.config_tracing.tracing}] "
           f"Writing value change dump (VCD) to {os.getcwd()}/{(vcdmeta.vcd_file_name)}")
 
+    header, trimmed_value_nets, net_symbol_mapping, vcdmeta.vcd_clock_net_idx = \
+      self.gen_vcd_header( top, self.get_signal_filter( top.config_tracing ) )
+    vcd_file.write( header )
+
+    # vcdmeta.last_values holds the integer value of every net from the
+    # previous cycle
+
+    last_values = vcdmeta.last_values = [0 for _ in range(len(trimmed_value_nets))]
+
+    for i, net in enumerate(trimmed_value_nets):
+      # Convert everything to Bits to get around lack of bit struct support.
+      # The first cycle VCD contains the default value
+      value = int(to_bits( net[0]._dsl.Type() ))
+
+      print( f"b{value:#b} {net_symbol_mapping[i]}", file=vcd_file )
+
+      last_values[i] = value
+
+    # Now we create per-cycle signal value collect functions
+
+    vcdmeta.vcd_sim_ncycles = 0
+
+    # Separate clock net from normal nets ahead of time
+    clock_symbol = net_symbol_mapping[ vcdmeta.vcd_clock_net_idx ]
+
+    net_details = [ ( i, trimmed_value_nets[i][0], net_symbol_mapping[i] )
+                    for i in range(len(trimmed_value_nets))
+                      if i != vcdmeta.vcd_clock_net_idx ]
+
+    # Flip clock for the first cycle
+    print( '\n#0\nb0b1 {}\n'.format( clock_symbol ), file=vcd_file, flush=True )
+
+    dump_changes = self.gen_dump_changes( top, net_details, last_values,
+      lambda i, symbol: f"changes.append( 'b' + bin(v) + {' '+symbol+chr(10)!r} )",
+      "VCD dump" )
+
+    # Returns a dump_vcd function that is ready to be appended to _sched.
+    # When the window starts after cycle 0, every net is dumped again at
+    # its first cycle.
+
+    def begin_vcd( cycle ):
+      if cycle > 0:
+        for i in range(len(last_values)):
+          last_values[i] = -1
+        vcd_file.write( f'#{100*cycle-50}\nb0b0 {clock_symbol}\n'
+                        f'#{100*cycle}\nb0b1 {clock_symbol}\n' )
+
+    def dump_vcd( cycle ):
+      changes = []
+      try:
+        dump_changes( changes )
+      except Exception as e:
+        raise TypeError(f'{e}\n - {self.find_bad_signal( top, net_details )} '
+                        'becomes another type. Please check your code.')
+
+      # Flop clock at the end of cycle, and flip clock of the next cycle
+      next_neg_edge = 100 * cycle + 50
+      next_pos_edge = next_neg_edge + 50
+      changes.append( f'\n#{next_neg_edge}\nb0b0 {clock_symbol}\n'
+                      f'#{next_pos_edge}\nb0b1 {clock_symbol}\n\n' )
+      vcd_file.write( "".join( changes ) )
+      vcdmeta.vcd_sim_ncycles = cycle + 1
+
+    return self.gen_windowed_func( top, top.config_tracing, dump_vcd, begin_vcd )
+
+  #-----------------------------------------------------------------------
+  # Selective and windowed dumps
+  #-----------------------------------------------------------------------
+  # A signal is selected by a glob of include/exclude if the glob matches
+  # the hierarchical name of the signal with "top" for the top component,
+  # like top.tile[0].core.pc, or the name of any component or interface
+  # that contains it. * matches any string and ? any character. Returns
+  # None if every signal is selected.
+
+  @staticmethod
+  def get_signal_filter( config ):
+
+    def compile_globs( patterns ):
+      if not patterns:
+        return None
+      regex = "|".join( re.escape(x).replace( r"\*", ".*" ).replace( r"\?", "." )
+                        for x in patterns )
+      return re.compile( f"(?:{regex})" ).fullmatch
+
+    include = compile_globs( config.include )
+    exclude = compile_globs( config.exclude )
+    if include is None and exclude is None:
+      return None
+
+    def matches( match, name ):
+      pos = name.find( '.' )
+      while pos >= 0:
+        if match( name[:pos] ):
+          return True
+        pos = name.find( '.', pos+1 )
+      return match( name ) is not None
+
+    def is_selected( signal ):
+      name = "top" + repr(signal)[1:]
+      if include is not None and not matches( include, name ):
+        return False
+      return exclude is None or not matches( exclude, name )
+
+    return is_selected
+
+  # Wrap dump( cycle ) so that it is only called in the cycles between
+  # start_cycle and end_cycle from the first one where the trigger is
+  # true. begin( cycle ) is called right before the first dump. Cycle i
+  # is the i-th call of the returned function, i.e. the i-th tick
+  # including the ones of sim_reset. Outside the window a cycle costs a
+  # counter increment and a comparison, plus the trigger while waiting.
+
+  @staticmethod
+  def gen_windowed_func( top, config, dump, begin ):
+    start = config.start_cycle
+    end   = sys.maxsize if config.end_cycle is None else config.end_cycle
+
+    trigger = config.trigger
+    if isinstance( trigger, str ):
+      trigger = eval( compile( f"lambda: {trigger}", f"trigger at {top!r}", "eval" ),
+                      { 's': top } )
+    elif trigger is not None:
+      trigger_func = trigger
+      trigger = lambda: trigger_func( top )
+
+    cycle = 0
+    state = 0 # 0: waiting, 1: dumping, 2: done
+
+    def windowed_dump():
+      nonlocal cycle, state
+      c = cycle
+      cycle = c + 1
+      if state == 1:
+        if c < end:
+          dump( c )
+        else:
+          state = 2
+      elif state == 0 and c >= start:
+        if c >= end:
+          state = 2
+        elif trigger is None or trigger():
+          state = 1
+          begin( c )
+          dump( c )
+
+    return windowed_dump
+
+  # Returns the header of the VCD of top up to $enddefinitions, the nets
+  # to dump as lists of connected top level signals, the symbol of every
+  # net and the index of the clock net. Only the signals for which
+  # is_selected returns True are declared, plus the clock.
+
+  @staticmethod
+  def gen_vcd_header( top, is_selected=None ):
+
+    lines = []
+
     # Get vcd timescale
 
     try:                    vcd_timescale = top.vcd_timescale
@@ -50,9 +308,8 @@ class VcdGenerationPass( BasePass ):
 
     # Print vcd header
 
-    print( "$date\n  {}\n$end\n$version\n  PyMTL 3 (Mamba)\n$end\n"
-           "$timescale\n {}\n$end\n".format( time.asctime(), vcd_timescale ),
-           file=vcd_file )
+    lines.append( "$date\n  {}\n$end\n$version\n  PyMTL 3 (Mamba)\n$end\n"
+                  "$timescale\n {}\n$end\n".format( time.asctime(), vcd_timescale ) )
 
     # Utility generator to create new symbols for each VCD signal.
     # Code inspired by MyHDL 0.7.
@@ -83,29 +340,44 @@ class VcdGenerationPass( BasePass ):
 
     all_components = set()
 
+    # Only the selected signals are dumped. The clock is always dumped
+    # because it marks the cycles.
+
+    if is_selected is None:
+      is_traced = lambda x: True
+    else:
+      is_traced = lambda x: repr(x) == "s.clk" or is_selected( x )
+
     # We only collect top level signals, and squash bitstruct into a long
     # bits object
     for x in top._dsl.all_signals:
-      if x.is_top_level_signal():
+      if x.is_top_level_signal() and is_traced( x ):
         host = x.get_host_component()
         component_signals[ host ].add( x )
 
+        # Components without any dumped signal below them get no scope
+        while host not in all_components:
+          all_components.add( host )
+          if host is top:
+            break
+          host = host.get_parent_object()
+
     # We pre-process all nets in order to remove all sliced wires because
     # they belong to a top level wire and we count that wire
 
     trimmed_value_nets = []
-    vcdmeta.vcd_clock_net_idx = None
+    clock_net_idx = None
 
     # FIXME handle the case where the top level signal is in a value net
     for writer, net in top.get_all_value_nets():
       new_net = []
       for x in net:
-        if not isinstance(x, Const) and x.is_top_level_signal():
+        if not isinstance(x, Const) and x.is_top_level_signal() and is_traced( x ):
           new_net.append( x )
           if repr(x) == "s.clk":
             # Hardcode clock net because it needs to go up and down
-            assert vcdmeta.vcd_clock_net_idx is None
-            vcdmeta.vcd_clock_net_idx = len(trimmed_value_nets)
+            assert clock_net_idx is None
+            clock_net_idx = len(trimmed_value_nets)
 
       if new_net:
         trimmed_value_nets.append( new_net )
@@ -128,6 +400,7 @@ class VcdGenerationPass( BasePass ):
       return name.replace('[','(').replace(']',')').replace(':', '__')
 
     def recurse_models( m, spaces ):
+      nonlocal clock_net_idx
 
       # Special case the top level "s" to "top"
 
@@ -136,8 +409,7 @@ class VcdGenerationPass( BasePass ):
         my_name = "top"
 
       # Create a new scope for this module
-      print( f"{spaces}$scope module {vcd_mangle_name(my_name)} $end",
-             file=vcd_file )
+      lines.append( f"{spaces}$scope module {vcd_mangle_name(my_name)} $end" )
 
       m_name = repr(m)
 
@@ -156,8 +428,8 @@ class VcdGenerationPass( BasePass ):
 
           # Check if it's clock. Hardcode clock net
           if repr(signal) == "s.clk":
-            assert vcdmeta.vcd_clock_net_idx is None
-            vcdmeta.vcd_clock_net_idx = len(trimmed_value_nets)
+            assert clock_net_idx is None
+            clock_net_idx = len(trimmed_value_nets)
 
           # This is a signal whose connection is not captured by the
           # global net data structure. This might be a sliced signal or
@@ -174,90 +446,82 @@ class VcdGenerationPass( BasePass ):
         # to get the actual name like enq.rdy
         # TODO struct
         signal_name = vcd_mangle_name( repr(signal)[ len(m_name)+1: ] )
-        print( f"{spaces}  $var reg {get_nbits(signal._dsl.Type)} {symbol} {signal_name} $end",
-               file=vcd_file )
+        lines.append( f"{spaces}  $var reg {get_nbits(signal._dsl.Type)} {symbol} {signal_name} $end" )
 
       # Recursively visit all submodels.
       for child in m.get_child_components():
-        recurse_models( child, spaces+'  ' )
+        if child in all_components:
+          recurse_models( child, spaces+'  ' )
 
-      print( f"{spaces}$upscope $end", file=vcd_file )
+      lines.append( f"{spaces}$upscope $end" )
 
     # Begin recursive descent from the top-level model.
     recurse_models( top, '' )
 
     # Once all models and their signals have been defined, end the
-    # definition section of the vcd and print the initial values of all
-    # nets in the design.
-    print( "$enddefinitions $end\n", file=vcd_file )
-
-    # vcdmeta.last_values is an array of values from the previous cycle
-
-    last_values = vcdmeta.last_values = [0 for _ in range(len(trimmed_value_nets))]
-
-    for i, net in enumerate(trimmed_value_nets):
-      # Convert everything to Bits to get around lack of bit struct support.
-      # The first cycle VCD contains the default value
-      bin_str = bin(int(to_bits( net[0]._dsl.Type() )))
-
-      print( f"b{bin_str} {net_symbol_mapping[i]}", file=vcd_file )
-
-      # Set this to be the last cycle value str
-      last_values[i] = bin_str
-
-    # Now we create per-cycle signal value collect functions
-
-    vcdmeta.vcd_sim_ncycles = 0
-
-    # Separate clock net from normal nets ahead of time
-    clock_symbol = net_symbol_mapping[ vcdmeta.vcd_clock_net_idx ]
-
-    net_details = [ ( trimmed_value_nets[i][0], net_symbol_mapping[i] )
-                    for i in range(len(trimmed_value_nets))
-                      if i != vcdmeta.vcd_clock_net_idx ]
-
-    # Flip clock for the first cycle
-    print( '\n#0\nb0b1 {}\n'.format( clock_symbol ), file=vcd_file, flush=True )
-
-    # Returns a dump_vcd function that is ready to be appended to _sched.
-    # TODO: type check?
-
-    # Adding this 's' argument is for eval to correctly evaluate 's.x'...
-    # Python 3 destroys a lot of our hacks .. sigh
-
-    def dump_vcd_inner( s ):
-
-      for i, (signal, symbol) in enumerate( net_details ):
-
-        # If we encounter a BitStruct then dump it as a concatenation of
-        # all fields.
-        # TODO: treat each field in a BitStruct as a separate signal?
-
-        try:
-          net_bits_bin = to_bits( eval(repr(signal)) )
-        except Exception as e:
-          raise TypeError(f'{e}\n - {signal} becomes another type. Please check your code.')
-
-        net_bits_bin_str = bin(int(net_bits_bin))
-        # `last_value` is the string form of a Bits object in binary
-        # e.g. '0b000' == Bits3(0).bin()
-        # We store strings instead of values ...
-        if last_values[i] != net_bits_bin_str:
-          last_values[i] = net_bits_bin_str
-          print( f'b{net_bits_bin_str} {symbol}', file=vcd_file )
-
-      # Flop clock at the end of cycle
-      next_neg_edge = 100 * vcdmeta.vcd_sim_ncycles + 50
-      print( f'\n#{next_neg_edge}\nb0b0 {clock_symbol}', file=vcd_file )
-
-      # Flip clock of the next cycle
-      next_pos_edge = next_neg_edge + 50
-      print( f'#{next_pos_edge}\nb0b1 {clock_symbol}\n', file=vcd_file, flush=True )
-      vcdmeta.vcd_sim_ncycles += 1
-
-    def gen_dump_vcd( s ):
-      def dump_vcd():
-        dump_vcd_inner( s )
-      return dump_vcd
-
-    return gen_dump_vcd( top )
+    # definition section of the vcd.
+    lines.append( "$enddefinitions $end\n\n" )
+
+    return "\n".join( lines ), trimmed_value_nets, net_symbol_mapping, clock_net_idx
+
+  # Generate a function that reads every net with direct attribute access
+  # and compares the raw integer against the value of the previous cycle.
+  # Only the nets that changed are recorded by the statement that
+  # gen_append( i, symbol ) returns for net i. Signals are grouped by
+  # their host component like schedule_posedge_flip does:
+  #   x = s.x.y
+  #   v = int(x.z)
+  #   if v != last[3]:
+  #     last[3] = v
+  #     changes.append( 'b' + bin(v) + ' $\n' )
+
+  @staticmethod
+  def gen_dump_changes( top, net_details, last_values, gen_append, name ):
+
+    host_signals = defaultdict(list)
+    for i, signal, symbol in net_details:
+      host_signals[ signal.get_host_component() ].append( (i, signal, symbol) )
+
+    strs = []
+    for host, signals in sorted( host_signals.items(), key=lambda x: repr(x[0]) ):
+      pos = len(repr(host))
+      strs.append( f"x = {host!r}" )
+
+      for i, signal, symbol in sorted( signals, key=lambda x: x[0] ):
+        attr = f"x{repr(signal)[pos:]}"
+        if is_bitstruct_class( signal._dsl.Type ):
+          strs.append( f"v = {attr}._to_bits_value()" )
+        else:
+          strs.append( f"v = int({attr})" )
+        strs.append( f"if v != last[{i}]:" )
+        strs.append( f"  last[{i}] = v" )
+        strs.append( f"  {gen_append( i, symbol )}" )
+
+    src = """
+def compile_dump_changes( s, last ):
+  def dump_changes( changes, cycle=0 ):
+    {}
+  return dump_changes
+""".format( "\n    ".join( strs or [ "pass" ] ) )
+
+    fname = f"{name} at {top!r}"
+    kernel_cache = get_kernel_cache()
+    if kernel_cache is not None:
+      code = kernel_cache.compile( src, fname )
+    else:
+      code = compile( src, filename=fname, mode="exec" )
+      line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
+
+    _locals = {}
+    custom_exec( code, {}, _locals )
+    return _locals['compile_dump_changes']( top, last_values )
+
+  # Find the first net that cannot be converted to Bits for error messages
+
+  @staticmethod
+  def find_bad_signal( top, net_details ):
+    for _, signal, _ in net_details:
+      try:
+        to_bits( eval( repr(signal), {}, { 's': top } ) )
+      except Exception:
+        return signal
@@ -0,0 +1,116 @@
+#=========================================================================
+# FlightRecorderPass_test.py
+#=========================================================================
+
+import os
+
+import pytest
+
+from pymtl3.datatypes import *
+from pymtl3.dsl import *
+from pymtl3.passes import TracingConfigs
+from pymtl3.passes.PassGroups import SimulationPass
+
+from ..FlightRecorderPass import FlightRecorder
+from .PwfGenerationPass_test import Chain
+from .VcdGenerationPass_test import read_vcd_changes
+
+
+def value_at( changes, time ):
+  return [ v for t, v in changes if t <= time ][-1]
+
+def _run( tracing, file_name, ncycles, **kwargs ):
+  m = Chain()
+  m.config_tracing = TracingConfigs( tracing=tracing, vcd_file_name=file_name, **kwargs )
+  m.apply( SimulationPass() )
+  m.sim_reset()
+  for i in range( ncycles ):
+    m.in_ = Bits8( (i * 7) % 5 )
+    m.tick()
+  return m
+
+def test_flight_same_as_vcd( tmpdir ):
+  ncycles = 50
+  m = _run( 'vcd', str( tmpdir.join( "full" ) ), ncycles )
+  m.close_vcd()
+  m = _run( 'flight', str( tmpdir.join( "flight" ) ), ncycles, flight_cycles=8 )
+  assert m.dump_flight_recorder() == str( tmpdir.join( "flight.vcd" ) )
+  assert ( m._tracing.flight_recorder.first, m._tracing.flight_recorder.next ) == (44, 52)
+
+  full   = read_vcd_changes( str( tmpdir.join( "full.vcd" ) ) )
+  flight = read_vcd_changes( str( tmpdir.join( "flight.vcd" ) ) )
+  assert sorted( full ) == sorted( flight )
+  for name, changes in flight.items():
+    # Nothing before the window
+    assert changes[0][0] == 4400
+    # Only compare the nets with a single signal, the recorded signal of
+    # the other nets may be any of them
+    if not name.endswith( ( "cnt", "st", "clk" ) ):
+      continue
+    for cycle in range( 44, 52 ):
+      assert value_at( changes, 100*cycle ) == value_at( full[ name ], 100*cycle ), name
+
+def test_dump_on_exception( tmpdir ):
+  class Checked( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits8 )
+      s.cnt = Wire( Bits8 )
+
+      @s.update_ff
+      def up_cnt():
+        s.cnt <<= s.cnt + s.in_
+
+      @s.update
+      def up_check():
+        assert s.cnt < 20
+
+  for use_sim_run in [ False, True ]:
+    m = Checked()
+    file_name = str( tmpdir.join( f"checked{int(use_sim_run)}" ) )
+    m.config_tracing = TracingConfigs( tracing='flight', vcd_file_name=file_name,
+                                       flight_cycles=4 )
+    m.apply( SimulationPass() )
+    m.sim_reset()
+    m.in_ = Bits8( 3 )
+    assert not os.path.exists( file_name + ".vcd" )
+
+    with pytest.raises( AssertionError ):
+      if use_sim_run:
+        m.sim_run( 100 )
+      else:
+        for i in range( 100 ):
+          m.tick()
+
+    # The assertion fails in cycle 8 where cnt becomes 21, which the
+    # waveform shows from cycle 9 on like the VCD
+    changes = read_vcd_changes( file_name + ".vcd" )
+    assert changes[ "top.cnt" ] == [ (500, 9), (600, 12), (700, 15), (800, 18) ]
+
+def test_flight_include( tmpdir ):
+  m = _run( 'flight', str( tmpdir.join( "chain" ) ), 10, include=[ "top.stages[2].*" ] )
+  file_name = m.dump_flight_recorder( str( tmpdir.join( "other.vcd" ) ) )
+  changes = read_vcd_changes( file_name )
+  assert "top.stages(2).cnt" in changes
+  assert "top.stages(1).cnt" not in changes
+  assert changes[ "top.clk" ][0] == (0, 1)
+
+def test_flight_recorder_wraps():
+  # Every cycle has a different number of changes
+  r = FlightRecorder( 5, [ 0, 0, 0 ] )
+  expected = {}
+  values = [ 0, 0, 0 ]
+  for cycle in range( 40 ):
+    changes = []
+    for i in range( cycle % 4 ):
+      changes += ( i, cycle )
+    r.record( cycle, changes )
+    expected[ cycle ] = list( values )
+    for i in range( cycle % 4 ):
+      values[i] = cycle
+
+    if cycle >= 4:
+      assert ( r.first, r.next ) == ( cycle-4, cycle+1 )
+      # base is the value before the first recorded cycle
+      assert r.base == expected[ r.first ]
+      for c in range( r.first, r.next ):
+        assert list( r.get_changes( c ) ) == [ (i, c) for i in range( c % 4 ) ]
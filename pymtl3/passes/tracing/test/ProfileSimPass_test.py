@@ -0,0 +1,142 @@
+#=========================================================================
+# ProfileSimPass_test.py
+#=========================================================================
+
+import os
+
+import pytest
+
+from pymtl3.datatypes import Bits32
+from pymtl3.dsl import *
+from pymtl3.passes import TracingConfigs
+from pymtl3.passes.PassGroups import SimulationPass
+
+from ..ProfileSimPass import ProfileSimPass
+
+
+class Stage( Component ):
+
+  def construct( s ):
+    s.in_ = InPort ( Bits32 )
+    s.out = OutPort( Bits32 )
+    s.r   = Wire( Bits32 )
+    s.out //= s.r
+
+    @s.update_ff
+    def up_r():
+      s.r <<= s.in_ + Bits32( 1 )
+
+class Pipe( Component ):
+
+  def construct( s, n=3 ):
+    s.in_    = InPort ( Bits32 )
+    s.out    = OutPort( Bits32 )
+    s.stages = [ Stage() for _ in range(n) ]
+
+    s.stages[0].in_ //= s.in_
+    for i in range(1, n):
+      s.stages[i].in_ //= s.stages[i-1].out
+    s.out //= s.stages[-1].out
+
+def _setup( **kwargs ):
+  m = Pipe()
+  m.apply( SimulationPass() )
+  m.apply( ProfileSimPass( **kwargs ) )
+  m.sim_reset()
+  return m
+
+def test_profile_counts():
+  ref = Pipe()
+  ref.apply( SimulationPass() )
+  ref.sim_reset()
+  ref.sim_run( 20 )
+
+  m = _setup()
+  m.in_ = Bits32( 0 )
+  assert m.sim_run( 10 ) == 10
+  for i in range(10):
+    m.tick()
+  assert m.out == ref.out and m.simulated_cycles == ref.simulated_cycles
+
+  # Every block is called once per cycle
+  profile = m.get_profile()
+  assert profile[ "s.stages[1].up_r" ][0] == m.simulated_cycles
+  assert all( ncalls == m.simulated_cycles for ncalls, _ in profile.values() )
+
+  by_comp = m.get_profile( "component" )
+  assert by_comp[ "s.stages[2]" ][0] == m.simulated_cycles
+
+  by_class = m.get_profile( "class" )
+  assert by_class[ "Stage" ][0] == 3 * m.simulated_cycles
+  assert by_class[ "Stage" ][1] == sum( by_comp[ f"s.stages[{i}]" ][1] for i in range(3) )
+
+  m.reset_profile()
+  assert all( x == (0, 0) for x in m.get_profile().values() )
+
+def test_profile_sampled():
+  m = _setup( sample_every=4 )
+  assert m.sim_run( 37 ) == 37
+  assert m._profile.profiled_cycles == 39 // 4
+  for i in range(3):
+    m.tick()
+  assert m._profile.profiled_cycles == 42 // 4
+
+  # Calls are estimated from the profiled cycles
+  profile = m.get_profile()
+  assert profile[ "s.stages[0].up_r" ][0] == m.simulated_cycles
+
+  # sim_run stops at until like the unprofiled one
+  m.in_ = Bits32( 0 )
+  start = m.simulated_cycles
+  assert m.sim_run( 100, until=lambda: m.simulated_cycles - start == 7 ) == 7
+
+def test_profile_collapsed_stacks( tmpdir ):
+  m = _setup()
+  m.sim_run( 10 )
+  path = str( tmpdir.join( "profile.folded" ) )
+  m.dump_profile( path )
+
+  stacks = {}
+  for line in open( path ):
+    stack, ns = line.rsplit( ' ', 1 )
+    stacks[ stack ] = int( ns )
+  assert "s;stages[1];up_r" in stacks
+  assert all( x.startswith( "s;" ) or x == "s" for x in stacks )
+  assert sum( stacks.values() ) == sum( x[1] for x in m.get_profile().values() )
+
+def test_profile_applied_twice():
+  m = _setup()
+  with pytest.raises( AttributeError ):
+    m.apply( ProfileSimPass() )
+
+def test_profile_flight_recorder( tmpdir ):
+  class Checked( Component ):
+    def construct( s ):
+      s.cnt = Wire( Bits32 )
+
+      @s.update_ff
+      def up_cnt():
+        s.cnt <<= s.cnt + Bits32( 1 )
+
+      @s.update
+      def up_check():
+        assert s.cnt < 10
+
+  for sample_every in [ 1, 3 ]:
+    for use_sim_run in [ False, True ]:
+      m = Checked()
+      file_name = str( tmpdir.join( f"checked{sample_every}{int(use_sim_run)}" ) )
+      m.config_tracing = TracingConfigs( tracing='flight', vcd_file_name=file_name,
+                                         flight_cycles=4 )
+      m.apply( SimulationPass() )
+      m.apply( ProfileSimPass( sample_every=sample_every ) )
+      m.sim_reset()
+
+      # The profiled tick and sim_run still dump the flight recorder
+      with pytest.raises( AssertionError ):
+        if use_sim_run:
+          m.sim_run( 100 )
+        else:
+          for i in range( 100 ):
+            m.tick()
+      assert os.path.exists( file_name + ".vcd" )
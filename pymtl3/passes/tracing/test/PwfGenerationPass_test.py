@@ -0,0 +1,155 @@
+#=========================================================================
+# PwfGenerationPass_test.py
+#=========================================================================
+
+import pytest
+
+from pymtl3.datatypes import *
+from pymtl3.dsl import *
+from pymtl3.passes import TracingConfigs
+from pymtl3.passes.PassGroups import SimulationPass
+
+from ..PwfFile import PwfReader, PwfWriter
+from .VcdGenerationPass_test import read_vcd_changes
+
+bs = mk_bitstruct( "PwfStruct", {
+  'foo' : Bits1,
+  'bar' : Bits32,
+} )
+
+class Stage( Component ):
+
+  def construct( s ):
+    s.in_ = InPort ( Bits8 )
+    s.out = OutPort( Bits8 )
+    s.st  = OutPort( bs )
+    s.cnt = Wire( Bits8 )
+
+    @s.update_ff
+    def up_cnt():
+      s.cnt <<= s.cnt + s.in_
+
+    @s.update
+    def up_out():
+      s.out = s.cnt
+      s.st  = bs( Bits1( s.cnt & 1 ), zext( s.cnt, 32 ) )
+
+class Chain( Component ):
+
+  def construct( s ):
+    s.in_    = InPort ( Bits8 )
+    s.out    = OutPort( Bits8 )
+    s.stages = [ Stage() for _ in range(3) ]
+    s.stages[0].in_ //= s.in_
+    s.stages[1].in_ //= s.stages[0].out
+    s.stages[2].in_ //= s.stages[1].out
+    s.out //= s.stages[2].out
+
+def _run( tracing, file_name, ncycles, **kwargs ):
+  m = Chain()
+  m.config_tracing = TracingConfigs( tracing=tracing, vcd_file_name=file_name, **kwargs )
+  m.apply( SimulationPass() )
+  m.sim_reset()
+  for i in range( ncycles ):
+    m.in_ = Bits8( i % 3 )
+    m.tick()
+  if tracing == 'pwf':
+    assert m.close_pwf() == file_name + ".pwf"
+  else:
+    m.close_vcd()
+  return m
+
+def test_pwf_counter( tmpdir ):
+  file_name = str( tmpdir.join( "chain" ) )
+  _run( 'pwf', file_name, 20, pwf_block_cycles=4 )
+
+  with PwfReader( file_name + ".pwf" ) as r:
+    assert r.ncycles == 22
+    assert "s.stages[1].cnt" in r.signals
+    assert r.nbits( "s.stages[0].st" ) == 33
+
+    # in_ is set before every tick from cycle 2 on
+    changes = r.get_changes( "s.in_" )
+    assert changes[0] == (0, 0)
+    assert [ x[1] for x in changes[1:] ] == [ 1, 2, 0 ] * 6 + [ 1 ]
+
+    # The value at the start of a range comes from the index
+    cnt = r.get_changes( "s.stages[0].cnt" )
+    for start, end in [ (0, 22), (3, 9), (8, 9), (13, 17), (21, 22) ]:
+      part = r.get_changes( "s.stages[0].cnt", start, end )
+      assert part[0] == ( start, r.value_at( "s.stages[0].cnt", start ) )
+      assert part[1:] == [ x for x in cnt[1:] if start < x[0] < end ]
+
+    assert r.value_at( "s.stages[0].cnt", 21 ) == sum( i % 3 for i in range(19) )
+    assert r.value_at( "s.stages[0].out", 21 ) == r.value_at( "s.stages[1].in_", 21 )
+
+def test_pwf_same_as_vcd( tmpdir ):
+  ncycles = 50
+  _run( 'vcd', str( tmpdir.join( "chain" ) ), ncycles )
+  _run( 'pwf', str( tmpdir.join( "chain" ) ), ncycles, pwf_block_cycles=16 )
+
+  vcd = read_vcd_changes( str( tmpdir.join( "chain.vcd" ) ) )
+  with PwfReader( str( tmpdir.join( "chain.pwf" ) ) ) as r:
+    for i in range(3):
+      for name in [ "cnt", "out", "st" ]:
+        vcd_changes = vcd[ f"top.stages({i}).{name}" ]
+        expected = {}
+        for time, value in vcd_changes[1:]:
+          expected[ time // 100 ] = value
+        pwf_changes = r.get_changes( f"s.stages[{i}].{name}" )
+        assert dict( pwf_changes[1:] ) == expected
+
+def test_pwf_smaller_than_vcd( tmpdir ):
+  _run( 'vcd', str( tmpdir.join( "chain" ) ), 2000 )
+  _run( 'pwf', str( tmpdir.join( "chain" ) ), 2000 )
+  assert tmpdir.join( "chain.pwf" ).size() * 10 < tmpdir.join( "chain.vcd" ).size()
+
+def test_pwf_not_closed( tmpdir ):
+  m = Chain()
+  file_name = str( tmpdir.join( "open" ) )
+  m.config_tracing = TracingConfigs( tracing='pwf', vcd_file_name=file_name )
+  m.apply( SimulationPass() )
+  m.sim_reset()
+  with pytest.raises( ValueError ):
+    PwfReader( file_name + ".pwf" )
+  m.close_pwf()
+  with PwfReader( file_name + ".pwf" ) as r:
+    assert r.ncycles == 2
+
+def test_pwf_writer_reader( tmpdir ):
+  file_name = str( tmpdir.join( "raw.pwf" ) )
+  nbits = [ 1, 24, 64, 100 ]
+  w = PwfWriter( file_name, { f"s.x{i}": i for i in range(4) },
+                 [ (n, 0) for n in nbits ], block_cycles=10 )
+  expected = [ [] for _ in nbits ]
+  for cycle in range( 95 ):
+    for i, n in enumerate( nbits ):
+      if cycle % (i+2) == 0:
+        v = ( cycle * 0x9e3779b97f4a7c15 ) & ((1 << n) - 1)
+        w.changes[i] += ( cycle, v )
+        expected[i].append( (cycle, v) )
+    w.end_cycle()
+  w.close()
+
+  with PwfReader( file_name ) as r:
+    assert r.ncycles == 95
+    for i in range(4):
+      assert r.get_changes( f"s.x{i}" )[1:] == expected[i][1:]
+      assert r.value_at( f"s.x{i}", 57 ) == [ v for c, v in expected[i] if c <= 57 ][-1]
+
+def test_pwf_window( tmpdir ):
+  ncycles = 40
+  _run( 'pwf', str( tmpdir.join( "full" ) ), ncycles, pwf_block_cycles=8 )
+  _run( 'pwf', str( tmpdir.join( "win" ) ), ncycles, pwf_block_cycles=8,
+        include=[ "top.stages[1]" ], exclude=[ "*.st" ], start_cycle=13, end_cycle=30 )
+
+  with PwfReader( str( tmpdir.join( "full.pwf" ) ) ) as full, \
+       PwfReader( str( tmpdir.join( "win.pwf" ) ) ) as win:
+    assert win.ncycles == 30
+    assert "s.stages[1].cnt" in win.signals
+    assert "s.stages[1].st" not in win.signals
+    assert "s.stages[0].cnt" not in win.signals
+    for name in win.signals:
+      assert win.get_changes( name, 13, 30 ) == full.get_changes( name, 13, 30 )
+      # Before the window only the initial values are known
+      assert win.get_changes( name, 0, 13 ) == [ (0, 0) ]
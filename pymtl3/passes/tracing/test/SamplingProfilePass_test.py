@@ -0,0 +1,89 @@
+#=========================================================================
+# SamplingProfilePass_test.py
+#=========================================================================
+
+import pytest
+
+from pymtl3.datatypes import Bits32
+from pymtl3.dsl import *
+from pymtl3.passes.errors import InvalidPassOptionValue
+from pymtl3.passes.mamba import Mamba2020
+from pymtl3.passes.PassGroups import SimulationPass
+
+from ..ProfilingConfigs import ProfilingConfigs
+
+
+class Busy( Component ):
+
+  def construct( s, work ):
+    s.in_ = InPort ( Bits32 )
+    s.out = OutPort( Bits32 )
+    s.work = work
+
+    @s.update
+    def up_busy():
+      x = 0
+      for i in range( s.work ):
+        x += i
+      s.out = s.in_ + Bits32( x & 0xff )
+
+class Top( Component ):
+
+  def construct( s ):
+    s.in_  = InPort ( Bits32 )
+    s.out  = OutPort( Bits32 )
+    s.light = Busy( 10 )
+    s.heavy = Busy( 20000 )
+
+    s.light.in_ //= s.in_
+    s.heavy.in_ //= s.light.out
+    s.out //= s.heavy.out
+
+def _run( m, ncycles=100 ):
+  m.in_ = Bits32( 1 )
+  m.sim_run( ncycles )
+  m.stop_profiling()
+  return m.get_profile_tree()
+
+@pytest.mark.parametrize( "timer", [ "prof", "real", "thread" ] )
+def test_sampling_profile_tree( timer ):
+  m = Top()
+  m.config_profiling = ProfilingConfigs( profiling='sample', sample_interval=0.0005, timer=timer )
+  m.apply( SimulationPass() )
+  tree = _run( m )
+
+  assert tree.name == "s"
+  heavy = tree.children[ "heavy" ]
+  assert heavy.children[ "up_busy" ].samples > 0
+  # Instances of the same class are told apart
+  light = tree.children.get( "light" )
+  assert light is None or light.total_samples < heavy.total_samples
+
+  # Stopped profilers don't record anything
+  total = tree.total_samples
+  m.sim_run( 20 )
+  assert m.get_profile_tree().total_samples == total
+
+def test_sampling_profile_mamba( tmpdir ):
+  pytest.importorskip( "greenlet" )
+  m = Top()
+  m.config_profiling = ProfilingConfigs( profiling='sample', sample_interval=0.0005 )
+  m.apply( Mamba2020() )
+  m.sim_reset()
+  tree = _run( m )
+  assert tree.children[ "heavy" ].children[ "up_busy" ].samples > 0
+
+  path = str( tmpdir.join( "profile.folded" ) )
+  m.dump_profile_tree( path )
+  stacks = dict( line.rsplit( ' ', 1 ) for line in open( path ).read().splitlines() )
+  assert int( stacks[ "s;heavy;up_busy" ] ) == tree.children[ "heavy" ].children[ "up_busy" ].samples
+
+def test_profiling_configs():
+  m = Top()
+  m.apply( SimulationPass() )
+  assert not hasattr( m, "start_profiling" )
+
+  m = Top()
+  m.config_profiling = ProfilingConfigs( profiling='sample', sample_interval=-1 )
+  with pytest.raises( InvalidPassOptionValue ):
+    m.apply( SimulationPass() )
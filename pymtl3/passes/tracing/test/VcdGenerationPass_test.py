@@ -11,11 +11,15 @@
 # Author: Peitian Pan
 # Date:   Nov 1, 2019
 
+import pytest
+
 from pymtl3.datatypes import *
 from pymtl3.dsl import *
 from pymtl3.passes import TracingConfigs
 from pymtl3.passes.PassGroups import SimulationPass
 
+from ..VcdGenerationPass import BufferedVcdWriter
+
 
 def run_test( dut, tv, tv_in, tv_out ):
   vcd_file_name = dut.__class__.__name__ + "_funky"
@@ -26,6 +30,7 @@ def run_test( dut, tv, tv_in, tv_out ):
     tv_in( dut, v )
     dut.tick()
     tv_out( dut, v )
+  assert dut.close_vcd() == vcd_file_name+".vcd"
   with open(vcd_file_name+".vcd") as fd:
     file_str = ''.join( fd.readlines() )
     all_signals = dut.get_input_value_ports() | \
@@ -89,3 +94,183 @@ def test_bitstruct_signals():
     [ bs(b1(0), b32(-1)),  b32(0), b32(-1), ],
     [ bs(b1(0), b32(42)), b32(42), b32(84), ],
   ], tv_in, tv_out )
+
+# Collect the value changes of every variable from the VCD file
+
+def read_vcd_changes( file_name ):
+  scopes, names, changes, time = [], {}, {}, 0
+  for line in open( file_name ):
+    words = line.split()
+    if not words:
+      continue
+    if words[0] == "$scope":
+      scopes.append( words[2] )
+    elif words[0] == "$upscope":
+      scopes.pop()
+    elif words[0] == "$var":
+      names.setdefault( words[3], [] ).append( ".".join( scopes + [ words[4] ] ) )
+    elif words[0].startswith( "#" ):
+      time = int( words[0][1:] )
+    elif words[0].startswith( "b" ) and len(words) == 2:
+      for name in names[ words[1] ]:
+        changes.setdefault( name, [] ).append( (time, int( words[0][3:], 2 )) )
+  return changes
+
+def test_value_changes( tmpdir ):
+  class Toggle( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits8 )
+      s.out = OutPort( Bits8 )
+      s.cnt = Wire( Bits8 )
+
+      @s.update_ff
+      def up_cnt():
+        s.cnt <<= s.cnt + s.in_
+
+      @s.update
+      def up_out():
+        s.out = s.cnt
+
+  m = Toggle()
+  vcd_file_name = str( tmpdir.join( "toggle" ) )
+  m.config_tracing = TracingConfigs( tracing='vcd', vcd_file_name=vcd_file_name )
+  m.apply( SimulationPass() )
+  for i in [ 1, 1, 0, 0, 2 ]:
+    m.in_ = Bits8( i )
+    m.tick()
+  m.tick()
+  m.close_vcd()
+
+  changes = read_vcd_changes( vcd_file_name + ".vcd" )
+  # Only the initial value and the cycles where the value changed
+  assert changes[ "top.in_" ] == [ (0, 0), (0, 1), (200, 0), (400, 2) ]
+  assert changes[ "top.cnt" ] == [ (0, 0), (100, 1), (200, 2), (500, 4) ]
+
+def test_signal_becomes_another_type( tmpdir ):
+  class A3( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits8 )
+
+  m = A3()
+  m.config_tracing = TracingConfigs( tracing='vcd', vcd_file_name=str( tmpdir.join( "a3" ) ) )
+  m.apply( SimulationPass() )
+  m.in_ = None
+  with pytest.raises( TypeError ) as e:
+    m._tracing.vcd_func()
+  assert "s.in_ becomes another type" in str( e.value )
+
+def test_buffered_writer( tmpdir ):
+  file_name = str( tmpdir.join( "buffered.vcd" ) )
+  writer = BufferedVcdWriter( file_name, chunk_size=64, nchunks=2 )
+  lines = [ f"b{i:#b} !\n" for i in range(1000) ]
+  for x in lines:
+    writer.write( x )
+  # Nothing is flushed until asked to
+  writer.flush()
+  assert open( file_name ).read() == "".join( lines )
+  writer.write( "#100\n" )
+  writer.close()
+  writer.close()
+  assert open( file_name ).read() == "".join( lines ) + "#100\n"
+
+def test_flush_on_sim_reset( tmpdir ):
+  class A4( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits8 )
+      s.out = OutPort( Bits8 )
+
+      @s.update
+      def up_out():
+        s.out = s.in_ + 1
+
+  m = A4()
+  vcd_file_name = str( tmpdir.join( "a4" ) )
+  m.config_tracing = TracingConfigs( tracing='vcd', vcd_file_name=vcd_file_name )
+  m.apply( SimulationPass() )
+  m.sim_reset()
+  assert "#200" in open( vcd_file_name + ".vcd" ).read()
+
+  for i in range(10):
+    m.in_ = Bits8( i )
+    m.tick()
+  assert m.close_vcd() == vcd_file_name + ".vcd"
+  changes = read_vcd_changes( vcd_file_name + ".vcd" )
+  assert changes[ "top.out" ][-1] == ( 1100, 9 )
+
+  # The dump cannot continue after close_vcd
+  with pytest.raises( ValueError ):
+    m.tick()
+
+class Core( Component ):
+  def construct( s ):
+    s.in_ = InPort( Bits8 )
+    s.out = OutPort( Bits8 )
+    s.cnt = Wire( Bits8 )
+
+    @s.update_ff
+    def up_cnt():
+      s.cnt <<= s.cnt + s.in_
+
+    @s.update
+    def up_out():
+      s.out = s.cnt
+
+class Tile( Component ):
+  def construct( s ):
+    s.in_  = InPort( Bits8 )
+    s.out  = OutPort( Bits8 )
+    s.core = Core()
+    s.core.in_ //= s.in_
+    s.out //= s.core.out
+
+class Tiles( Component ):
+  def construct( s ):
+    s.in_  = InPort( Bits8 )
+    s.tile = [ Tile() for _ in range(2) ]
+    for x in s.tile:
+      x.in_ //= s.in_
+
+def run_tiles( tmpdir, ncycles, **kwargs ):
+  m = Tiles()
+  vcd_file_name = str( tmpdir.join( "tiles" ) )
+  m.config_tracing = TracingConfigs( tracing='vcd', vcd_file_name=vcd_file_name, **kwargs )
+  m.apply( SimulationPass() )
+  for i in range( ncycles ):
+    m.in_ = Bits8( 1 )
+    m.tick()
+  m.close_vcd()
+  return read_vcd_changes( vcd_file_name + ".vcd" )
+
+def test_include_exclude( tmpdir ):
+  changes = run_tiles( tmpdir, 4, include=[ "top.tile[*].core.*" ] )
+  assert sorted( changes ) == sorted( [ "top.clk" ] +
+    [ f"top.tile({i}).core.{x}" for i in range(2)
+                                for x in [ "clk", "reset", "in_", "out", "cnt" ] ] )
+
+  changes = run_tiles( tmpdir, 4, include=[ "top.tile[1]" ],
+                       exclude=[ "*.cnt", "top.tile[?].in_", "*.clk", "*.reset" ] )
+  assert sorted( changes ) == [ "top.clk", "top.tile(1).core.in_", "top.tile(1).core.out",
+                                "top.tile(1).out" ]
+  assert changes[ "top.tile(1).out" ][-1] == (300, 2)
+
+# core.in_ is updated by the net block after the sequential blocks, so
+# cnt is c-1 in cycle c > 0
+
+def test_cycle_window( tmpdir ):
+  changes = run_tiles( tmpdir, 10, start_cycle=3, end_cycle=6 )
+  # All nets are dumped again when the window starts, the clock keeps
+  # toggling inside the window only
+  assert changes[ "top.tile(0).core.cnt" ] == [ (0, 0), (300, 2), (400, 3), (500, 4) ]
+  assert changes[ "top.in_" ] == [ (0, 0), (300, 1) ]
+  assert changes[ "top.clk" ][-1] == (600, 1)
+
+def test_trigger( tmpdir ):
+  changes = run_tiles( tmpdir, 7, trigger="s.tile[0].core.cnt == 4" )
+  assert changes[ "top.tile(1).core.cnt" ] == [ (0, 0), (500, 4), (600, 5) ]
+
+  changes = run_tiles( tmpdir, 7, trigger=lambda m: m.tile[0].core.cnt >= 2, end_cycle=5 )
+  assert changes[ "top.tile(1).core.cnt" ] == [ (0, 0), (300, 2), (400, 3) ]
+
+  # The trigger is not checked before start_cycle
+  changes = run_tiles( tmpdir, 7, trigger="s.tile[0].core.cnt > 1", start_cycle=4 )
+  assert changes[ "top.tile(1).core.cnt" ] == [ (0, 0), (400, 3), (500, 4), (600, 5) ]
@@ -10,10 +10,10 @@ Date   : Mar 12, 2018
 from pymtl3 import *
 
 
-def mk_mem_msg( opq, addr, data ):
-  return mk_mem_req_msg( opq, addr, data ), mk_mem_resp_msg( opq, data )
+def mk_mem_msg( opq, addr, data, packed=False ):
+  return mk_mem_req_msg( opq, addr, data, packed ), mk_mem_resp_msg( opq, data, packed )
 
-def mk_mem_req_msg( opq, addr, data ):
+def mk_mem_req_msg( opq, addr, data, packed=False ):
   OpqType  = mk_bits( opq            )
   AddrType = mk_bits( addr           )
   LenType  = mk_bits( clog2(data>>3) )
@@ -37,6 +37,7 @@ def mk_mem_req_msg( opq, addr, data ):
     'len':    LenType,
     'data':   DataType,
   },
+  packed = packed,
   namespace = {
     '__str__' : req_to_str
   })
@@ -44,7 +45,7 @@ def mk_mem_req_msg( opq, addr, data ):
   req_cls.data_nbits = data
   return req_cls
 
-def mk_mem_resp_msg( opq, data ):
+def mk_mem_resp_msg( opq, data, packed=False ):
   OpqType  = mk_bits( opq            )
   LenType  = mk_bits( clog2(data>>3) )
   DataType = mk_bits( data           )
@@ -67,6 +68,7 @@ def mk_mem_resp_msg( opq, data ):
     'len':    LenType,
     'data':   DataType,
   },
+  packed = packed,
   namespace = {
     '__str__' : resp_to_str
   })
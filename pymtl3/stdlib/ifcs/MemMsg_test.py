@@ -124,3 +124,19 @@ def test_resp_str():
   # Verify string
 
   assert str(msg) == "wr:9:1:0:          "
+
+#-------------------------------------------------------------------------
+# test_packed
+#-------------------------------------------------------------------------
+
+def test_packed():
+
+  ReqType, RespType = mk_mem_msg(8,32,32)
+  PackedReqType, PackedRespType = mk_mem_msg(8,32,32, packed=True)
+
+  assert not hasattr( ReqType, "__bitstruct_packed__" )
+  assert PackedReqType.__bitstruct_packed__ == get_nbits( ReqType )
+
+  msg = PackedReqType( MemMsgType.WRITE, 9, 0x2000, 0, 0xdeadbeef )
+  assert str(msg) == str( ReqType( MemMsgType.WRITE, 9, 0x2000, 0, 0xdeadbeef ) )
+  assert to_bits(msg) == to_bits( ReqType( MemMsgType.WRITE, 9, 0x2000, 0, 0xdeadbeef ) )
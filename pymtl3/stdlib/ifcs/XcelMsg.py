@@ -10,10 +10,10 @@ Date   : June 3, 2019
 from pymtl3 import *
 
 
-def mk_xcel_msg( addr, data ):
-  return mk_xcel_req_msg( addr, data ), mk_xcel_resp_msg( data )
+def mk_xcel_msg( addr, data, packed=False ):
+  return mk_xcel_req_msg( addr, data, packed ), mk_xcel_resp_msg( data, packed )
 
-def mk_xcel_req_msg( addr, data ):
+def mk_xcel_req_msg( addr, data, packed=False ):
   AddrType = mk_bits( addr )
   DataType = mk_bits( data )
   cls_name = "XcelReqMsg_{}_{}".format( addr, data )
@@ -31,12 +31,13 @@ def mk_xcel_req_msg( addr, data ):
     'addr':  AddrType,
     'data':  DataType,
   },
+  packed = packed,
   namespace = {
     '__str__' : req_to_str
   })
   return req_cls
 
-def mk_xcel_resp_msg( data ):
+def mk_xcel_resp_msg( data, packed=False ):
   DataType = mk_bits( data )
   cls_name = "XcelRespMsg_{}".format( data )
 
@@ -51,6 +52,7 @@ def mk_xcel_resp_msg( data ):
     'type_': Bits1,
     'data':  DataType,
   },
+  packed = packed,
   namespace = {
     '__str__' : resp_to_str
   })
@@ -113,10 +113,12 @@ def run_sim( model, dump_vcd=None, test_verilog=False, line_trace=True, max_cycl
 
   # Run simulation
 
-  while not model.done() and model.simulated_cycles < max_cycles:
-    if line_trace:
+  if line_trace:
+    while not model.done() and model.simulated_cycles < max_cycles:
       model.print_line_trace()
-    model.tick()
+      model.tick()
+  else:
+    model.sim_run( max_cycles - model.simulated_cycles, until=model.done )
 
   # Force a test failure if we timed out
 
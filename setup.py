@@ -9,7 +9,7 @@ https://github.com/pypa/sampleproject/blob/master/setup.py
 
 from os import path
 
-from setuptools import find_packages, setup
+from setuptools import Extension, find_packages, setup
 
 #-------------------------------------------------------------------------
 # get_version
@@ -81,6 +81,14 @@ setup(
     ],
   },
 
+  # The C implementation of Bits is optional. If it fails to build we
+  # fall back to the pure-Python implementation at import time.
+  ext_modules = [
+    Extension( 'pymtl3.datatypes.CBits',
+               sources  = [ 'pymtl3/datatypes/CBits.c' ],
+               optional = True ),
+  ],
+
   install_requires = [
     'pytest',
     'hypothesis >= 4.18.1',